@@ -1,30 +1,148 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
     # Apify
     apify_api_token: str
+    apify_video_actor_id: str = "h7sDV53CddomktSi5"  # YouTube channel/playlist scraper
     
     # OpenAI
     openai_api_key: str
+    embedding_batch_max_wait_ms: int = 5
+    embedding_max_in_flight: int = 4
     
     # Google Gemini
     google_api_key: str
+    gemini_digest_enabled: bool = True  # Cluster comments locally and send Gemini a topic digest
+    gemini_digest_min_comments: int = 100  # Fewer comments are sent to Gemini one by one
+    gemini_digest_max_clusters: int = 12
+    gemini_digest_exemplars: int = 5  # Representative comments shown per cluster
+    gemini_digest_exemplar_chars: int = 300
+    
+    # Local sentiment & lead classifier (digest analyses)
+    classifier_enabled: bool = True
+    classifier_weights_path: str = "models/comment_classifier.npz"  # Not shipped; train with tools/train_classifier.py
+    classifier_confidence: float = 0.6  # Sentiment predictions below this go to Gemini for review
+    classifier_lead_review_min: float = 0.3  # Lead probability from which a comment is reviewed (capped at the lead threshold)
+    classifier_max_reviews: int = 40  # Comments Gemini reviews per analysis
     
     # Pinecone
     pinecone_api_key: str
     pinecone_index_name: str = "quill-ai-comments"
     
+    # Local comment document store (text of indexed comments)
+    comment_store_dir: str = "data/comment_store"
+    comment_store_index_cache_entries: int = 256
+    
+    # Columnar export (needs the pyarrow package)
+    export_chunk_rows: int = 2000  # Comments per Arrow record batch / Parquet row group
+    export_parquet_compression: str = "zstd"
+    
     # Supabase
     supabase_url: str
     supabase_key: str
     
+    # Shared HTTP connection pool
+    http_pool_max_connections: int = 100
+    http_pool_max_keepalive: int = 40
+    http_pool_max_per_host: int = 20
+    http_pool_keepalive_expiry_seconds: float = 30.0
+    http_pool_http2: bool = True  # Needs the h2 package
+    http_timeout_seconds: float = 60.0
+    http_connect_timeout_seconds: float = 5.0
+    
+    # Provider resilience
+    circuit_failure_threshold: int = 5  # Consecutive failures that open a circuit
+    circuit_reset_seconds: float = 30.0
+    retry_max_attempts: int = 3
+    retry_base_delay_ms: int = 250
+    retry_max_delay_ms: int = 4000
+    job_retry_budget: int = 8  # Retries and hedges one analysis job may spend
+    chat_retry_budget: int = 2
+    hedge_quantile: float = 0.95
+    hedge_min_delay_ms: int = 25
+    hedge_default_delay_ms: int = 200  # Until enough latency samples exist
+    
     # Server
     port: int = 8000
     cors_origins: str = "http://localhost:5173,http://localhost:3000"
     
+    # Event-loop stall detection
+    loop_monitor_enabled: bool = False
+    loop_stall_threshold_ms: int = 100
+    loop_monitor_interval_ms: int = 50
+    loop_monitor_stack_samples: int = 5
+    
+    # Chat semantic cache
+    chat_cache_similarity: float = 0.95
+    chat_cache_ttl_seconds: int = 3600
+    chat_cache_max_entries: int = 64
+    chat_cache_max_analyses: int = 256
+    
+    # Chat context assembly
+    chat_context_fetch_k: int = 40
+    chat_context_dedupe_similarity: float = 0.97
+    chat_context_mmr_lambda: float = 0.7
+    chat_context_max_comment_chars: int = 400
+    
+    # Hybrid chat retrieval (vector + BM25 keyword search, filters from the question)
+    chat_hybrid_enabled: bool = True
+    chat_hybrid_alpha: float = 0.6  # Weight of vector similarity; the rest is BM25
+    chat_hybrid_top_k: int = 20  # Fused candidates passed on to context assembly
+    chat_filter_popular_quantile: float = 0.9  # "Highly liked" = top 10% of the analysis by likes
+    sparse_index_dir: str = "data/sparse_index"
+    sparse_index_cache_entries: int = 32
+    
+    # Chat sessions
+    chat_session_max_history_tokens: int = 800
+    chat_session_recent_turns: int = 4
+    chat_session_summary_tokens: int = 250
+    chat_session_topic_similarity: float = 0.85
+    chat_session_ttl_seconds: int = 3600
+    chat_session_max_sessions: int = 1000
+    
+    # Report cache
+    report_cache_max_entries: int = 128
+    report_cache_max_bytes: int = 64 * 1024 * 1024
+    
+    # Jobs
+    job_deadline_seconds: int = 600
+    incremental_max_delta_ratio: float = 0.5  # Above this, incremental runs re-analyze all comments
+    
+    # Statistical sampling (analyses requested with "sampling": true)
+    sampling_max_comments: int = 200000  # Comments scraped before sampling
+    sampling_margin_of_error: float = 0.02  # Target half-width of percentage intervals
+    sampling_confidence: float = 0.95
+    sampling_date_buckets: int = 6
+    sampling_take_all: int = 200  # Most-engaged comments always analyzed
+    sampling_deadline_seconds: int = 3600  # Deadline of sampled jobs, which scrape far more comments
+    
+    # Vector index lifecycle
+    vector_gc_interval_minutes: int = 60  # 0 disables scheduled collection
+    vector_keep_analyses_per_url: int = 1  # Newest analyses of a video, per tenant, that keep their vectors
+    vector_ttl_days: int = 0  # 0 keeps vectors until superseded
+    vector_orphan_grace_minutes: int = 70  # Raised to the longest job deadline plus 10 minutes if set below it
+    admin_api_key: Optional[str] = None  # X-Admin-Key for deleting namespaces over HTTP; unset allows only dry runs
+    
+    # Admission control
+    max_concurrent_jobs: int = 4
+    max_running_jobs_per_user: int = 2
+    max_queued_jobs_per_user: int = 3
+    max_job_queue_depth: int = 50
+    tenant_weights: str = ""  # e.g. "agency-1:3,agency-2:2"
+    trust_user_id_header: bool = False  # Only behind a proxy that sets X-User-Id from an authenticated user
+    
+    # Bulk analysis
+    bulk_max_videos: int = 50
+    bulk_gemini_concurrency: int = 3
+    bulk_deadline_seconds: int = 3600
+    
+    # ETA estimation
+    eta_quantile: float = 0.5
+    eta_window: int = 50
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,15 +1,30 @@
-from supabase import create_client, Client
+import asyncio
+from supabase import create_client, Client, ClientOptions
 from app.config import settings
+from app.services.http_pool import http_pool
+from app.services.resilience import resilience
+from postgrest.exceptions import APIError
 import logging
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQL error classes that are transient: connection exceptions,
+# insufficient resources, operator intervention, transaction rollbacks
+# (serialization failures, deadlocks); PGRST0xx are PostgREST connection errors
+TRANSIENT_ERROR_CODES = ("08", "53", "57", "40", "PGRST0")
+
 
 class SupabaseDB:
     def __init__(self):
+        options = ClientOptions()
+        if hasattr(options, "httpx_client"):
+            options.httpx_client = http_pool.client
+        else:
+            logger.warning("Installed supabase client cannot share the HTTP pool; using its own connections")
         self.client: Client = create_client(
             settings.supabase_url,
-            settings.supabase_key
+            settings.supabase_key,
+            options=options
         )
     
     def get_client(self) -> Client:
@@ -24,5 +39,33 @@ def get_supabase() -> Client:
     return db.get_client()
 
 
+def _run(query):
+    try:
+        return query.execute()
+    except APIError as e:
+        # PostgREST errors carry a PostgreSQL error code, not an HTTP status;
+        # give them one so that only transient errors are retried and trip the breaker
+        e.status_code = 503 if str(e.code or "").startswith(TRANSIENT_ERROR_CODES) else 400
+        raise
+
+
+async def execute(query, retry: bool = True):
+    """
+    Run a Supabase query from async code, through the Supabase circuit breaker.
+
+    The client is synchronous and may wait for a slot in the shared HTTP
+    pool, so queries run in a worker thread, never on the event loop.
+    Transient failures are retried; inserts are not idempotent (a retry after
+    a lost response could store the row twice), so they pass retry=False.
+
+    Args:
+        query: Query builder, e.g. get_supabase().table(...).update(...).eq(...)
+        retry: False for inserts and other non-idempotent writes
 
+    Returns:
+        The query's response
 
+    Raises:
+        CircuitOpenError: If Supabase's circuit is open
+    """
+    return await resilience.call("supabase", lambda: asyncio.to_thread(_run, query), retry=retry)
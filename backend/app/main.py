@@ -1,7 +1,14 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.routes import analyze, chat
+from app.routes import analyze, chat, diagnostics
+from app.services.comment_classifier import comment_classifier
+from app.services.http_pool import http_pool
+from app.services.loop_monitor import loop_monitor
+from app.services.namespace_lifecycle import namespace_lifecycle
+from app.services.metrics import registry
 import logging
 
 # Configure logging
@@ -12,10 +19,24 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await loop_monitor.start()
+    await namespace_lifecycle.start()
+    # Loads the weights, or warns that Gemini estimates sentiment and leads
+    await comment_classifier.ensure_ready()
+    yield
+    await namespace_lifecycle.stop()
+    await loop_monitor.stop()
+    await http_pool.aclose()
+
+
 app = FastAPI(
     title="Quill-AI Backend",
     description="Backend API for YouTube comment analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -30,6 +51,7 @@ app.add_middleware(
 # Include routers
 app.include_router(analyze.router, prefix="/api", tags=["Analysis"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
+app.include_router(diagnostics.router, prefix="/api", tags=["Diagnostics"])
 
 
 @app.get("/")
@@ -42,6 +64,15 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=settings.port)
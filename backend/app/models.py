@@ -1,4 +1,4 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, field_validator
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from enum import Enum
@@ -9,10 +9,14 @@ class JobStatus(str, Enum):
     PROCESSING = "PROCESSING"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
 
 
 class AnalyzeRequest(BaseModel):
     url: str
+    incremental: bool = False  # Refresh the latest analysis of this URL with only new comments
+    base_analysis_id: Optional[str] = None  # Analysis to refresh; defaults to the latest for the URL
+    sampling: bool = False  # Scrape up to SAMPLING_MAX_COMMENTS and analyze a stratified sample
 
 
 class AnalyzeResponse(BaseModel):
@@ -20,6 +24,34 @@ class AnalyzeResponse(BaseModel):
     status: JobStatus
 
 
+class BulkAnalyzeRequest(BaseModel):
+    urls: List[str] = []
+    channel_url: Optional[str] = None
+    playlist_url: Optional[str] = None
+    max_videos: int = 50
+    max_comments_per_video: int = 500
+
+
+class BulkAnalyzeResponse(BaseModel):
+    bulk_id: str
+    status: JobStatus
+
+
+class BulkVideoStatus(BaseModel):
+    url: str
+    status: JobStatus
+    analysis_id: Optional[str]
+    error: Optional[str]
+
+
+class BulkStatusResponse(BaseModel):
+    status: JobStatus
+    source: str
+    videos: List[BulkVideoStatus]
+    rollup: Optional[Dict[str, Any]]
+    error: Optional[str]
+
+
 class JobStatusResponse(BaseModel):
     status: JobStatus
     embeddings_progress: int
@@ -29,6 +61,12 @@ class JobStatusResponse(BaseModel):
     analysis_id: Optional[str]
 
 
+class ReportPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+    total: int
+
+
 class Comment(BaseModel):
     id: str
     author: str
@@ -71,6 +109,24 @@ class EngagementSpike(BaseModel):
     count: int
 
 
+class ConfidenceInterval(BaseModel):
+    estimate: float
+    lower: Optional[float] = None  # None when the estimate's error is unquantified
+    upper: Optional[float] = None
+
+
+class SamplingSummary(BaseModel):
+    population: int
+    frame_complete: bool = True  # False when the scrape hit SAMPLING_MAX_COMMENTS
+    sample_size: int
+    strata: int
+    confidence: float
+    margin_of_error: float
+    method: str  # "stratified" (per-comment labels) or "unquantified" (Gemini estimates)
+    sentiment_breakdown: Dict[str, ConfidenceInterval]
+    lead_percentage: ConfidenceInterval
+
+
 class AnalysisResult(BaseModel):
     sentiment_score: int
     sentiment_breakdown: SentimentBreakdown
@@ -85,14 +141,25 @@ class AnalysisResult(BaseModel):
     top_influencers: List[Influencer]
     total_comments: int
     vibe_trend: List[int]
+    sampling: Optional[SamplingSummary] = None  # Set when a sample was analyzed
 
 
 class ChatRequest(BaseModel):
     message: str
     model: str
     analysis_id: str
+    session_id: Optional[str] = None  # Continue a server-side conversation
+
+    @field_validator("message")
+    @classmethod
+    def message_not_blank(cls, message: str) -> str:
+        # A blank message cannot be embedded for retrieval
+        if not message.strip():
+            raise ValueError("message must not be empty")
+        return message
 
 
 class ChatResponse(BaseModel):
     response: str
+    session_id: Optional[str] = None
 
@@ -1,13 +1,28 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Callable, Optional
 from app.models import (
     AnalyzeRequest,
     AnalyzeResponse,
+    BulkAnalyzeRequest,
+    BulkAnalyzeResponse,
+    BulkStatusResponse,
     JobStatusResponse,
+    ReportPage,
     AnalysisResult,
     JobStatus
 )
-from app.database import get_supabase
+from app.database import execute, get_supabase
 from app.services.job_manager import job_manager
+from app.services.admission import admission_controller, AdmissionRejected
+from app.services.bulk_manager import bulk_manager
+from app.services.export_service import EXPORT_FORMATS, export_service
+from app.services.report_cache import EncodedBody, report_cache
+from app.services.report_pages import DEFAULT_PAGE_SIZE, TOPIC_SECTIONS, paginate, parse_fields
+from app.config import settings
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics import supabase_seconds
+import asyncio
 import logging
 import uuid
 import re
@@ -25,14 +40,43 @@ def validate_youtube_url(url: str) -> bool:
     return any(re.match(pattern, url) for pattern in youtube_patterns)
 
 
+def validate_youtube_list_url(url: str) -> bool:
+    """Validate if the URL is a YouTube channel or playlist URL."""
+    list_patterns = [
+        r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/(?:@[\w.-]+|channel\/[\w-]+|c\/[\w-]+|user\/[\w-]+)',
+        r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/playlist\?list=[\w-]+'
+    ]
+    return any(re.match(pattern, url) for pattern in list_patterns)
+
+
+def get_user_id(http_request: Request, x_user_id: Optional[str]) -> str:
+    """
+    Identify the tenant for admission control and vector retention.
+
+    The API has no authentication of its own, so X-User-Id is only used when
+    TRUST_USER_ID_HEADER says a proxy in front sets it; otherwise any client
+    could claim another tenant's quota. The client IP is used instead.
+    """
+    if x_user_id and settings.trust_user_id_header:
+        return x_user_id
+    return http_request.client.host if http_request.client else "anonymous"
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
+@loop_monitor.track("routes.analyze_video")
 async def analyze_video(
     request: AnalyzeRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request,
+    x_user_id: Optional[str] = Header(None)
 ):
     """
     Start analysis for a YouTube video URL.
-    Creates a job and processes it in the background.
+    Creates a job and processes it in the background, or queues it when the
+    user or the service is at capacity. Returns 429 with Retry-After when
+    the queues are full. With `incremental`, the previous analysis of the
+    URL is refreshed in place using only new and edited comments. With
+    `sampling`, up to SAMPLING_MAX_COMMENTS comments are scraped and a
+    stratified sample is analyzed, with confidence intervals.
     """
     try:
         # Validate URL
@@ -41,35 +85,52 @@ async def analyze_video(
                 status_code=400,
                 detail="Invalid YouTube URL. Please provide a valid YouTube video URL."
             )
+        if request.sampling and request.incremental:
+            raise HTTPException(
+                status_code=400,
+                detail="Sampled analyses cannot be refreshed incrementally."
+            )
         
         # Create job ID
         job_id = str(uuid.uuid4())
+        user_id = get_user_id(http_request, x_user_id)
         
-        # Create job in database
+        # Create the job row first: once admitted, the job updates it
         supabase = get_supabase()
-        supabase.table("analysis_jobs").insert({
-            "id": job_id,
-            "url": request.url,
-            "status": "PROCESSING",
-            "embeddings_progress": 0,
-            "gemini_progress": 0
-        }).execute()
-        
-        # Create job in memory
-        job_manager.create_job(job_id, request.url)
-        
-        # Start background processing
-        background_tasks.add_task(
-            job_manager.process_analysis,
-            job_id,
-            request.url
-        )
+        with supabase_seconds.time(table="analysis_jobs", operation="insert"):
+            await execute(supabase.table("analysis_jobs").insert({
+                "id": job_id,
+                "url": request.url,
+                "status": JobStatus.PENDING.value,
+                "embeddings_progress": 0,
+                "gemini_progress": 0
+            }), retry=False)
         
-        logger.info(f"Started analysis job {job_id} for URL: {request.url}")
+        # Admit the job: starts it now or queues it fairly behind other users
+        try:
+            queued = admission_controller.submit(
+                user_id,
+                job_id,
+                request.url,
+                incremental=request.incremental,
+                base_analysis_id=request.base_analysis_id,
+                sampling=request.sampling
+            )
+        except AdmissionRejected as e:
+            with supabase_seconds.time(table="analysis_jobs", operation="delete"):
+                await execute(supabase.table("analysis_jobs").delete().eq("id", job_id))
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        status = JobStatus.PENDING if queued else JobStatus.PROCESSING
+        
+        logger.info(f"Accepted analysis job {job_id} ({status.value}) for URL: {request.url}")
         
         return AnalyzeResponse(
             job_id=job_id,
-            status=JobStatus.PROCESSING
+            status=status
         )
         
     except HTTPException:
@@ -79,7 +140,171 @@ async def analyze_video(
         raise HTTPException(status_code=500, detail=f"Failed to start analysis: {str(e)}")
 
 
+@router.post("/analyze/bulk", response_model=BulkAnalyzeResponse)
+@loop_monitor.track("routes.analyze_bulk")
+async def analyze_bulk(
+    request: BulkAnalyzeRequest,
+    http_request: Request,
+    x_user_id: Optional[str] = Header(None)
+):
+    """
+    Start analysis for many videos: a channel, a playlist and/or a URL list.
+    All videos are scraped in one actor run and share embedding batches.
+    Each video gets its own analysis, plus a roll-up across all of them.
+    """
+    try:
+        list_url = request.channel_url or request.playlist_url
+        if list_url and not validate_youtube_list_url(list_url):
+            raise HTTPException(status_code=400, detail="Invalid YouTube channel or playlist URL.")
+        
+        invalid = [url for url in request.urls if not validate_youtube_url(url)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid YouTube URLs: {', '.join(invalid)}")
+        
+        if not list_url and not request.urls:
+            raise HTTPException(status_code=400, detail="Provide urls, channel_url or playlist_url.")
+        
+        max_videos = max(1, min(request.max_videos, settings.bulk_max_videos))
+        bulk_id = str(uuid.uuid4())
+        user_id = get_user_id(http_request, x_user_id)
+        source = list_url or f"{len(request.urls)} URLs"
+        
+        # Create the bulk row first: once admitted, the bulk job updates it
+        supabase = get_supabase()
+        with supabase_seconds.time(table="bulk_analyses", operation="insert"):
+            await execute(supabase.table("bulk_analyses").insert({
+                "id": bulk_id,
+                "source": source,
+                "status": JobStatus.PENDING.value,
+                "videos": []
+            }), retry=False)
+        
+        # A bulk job is admitted as one job per video it may analyze
+        videos = min(max_videos, len(request.urls) + (max_videos if list_url else 0))
+        try:
+            queued = admission_controller.submit_task(
+                user_id,
+                bulk_id,
+                lambda: bulk_manager.start_bulk_job(
+                    bulk_id,
+                    request.urls,
+                    list_url,
+                    max_videos,
+                    request.max_comments_per_video
+                ),
+                lambda queued: bulk_manager.create_bulk_job(
+                    bulk_id,
+                    source,
+                    status="PENDING" if queued else "PROCESSING",
+                    user_id=user_id
+                ),
+                cost=videos
+            )
+        except AdmissionRejected as e:
+            with supabase_seconds.time(table="bulk_analyses", operation="delete"):
+                await execute(supabase.table("bulk_analyses").delete().eq("id", bulk_id))
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        
+        return BulkAnalyzeResponse(
+            bulk_id=bulk_id,
+            status=JobStatus.PENDING if queued else JobStatus.PROCESSING
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting bulk analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to start bulk analysis: {str(e)}")
+
+
+@router.get("/bulk/{bulk_id}", response_model=BulkStatusResponse)
+@loop_monitor.track("routes.get_bulk_status")
+async def get_bulk_status(bulk_id: str):
+    """
+    Get the status of a bulk analysis, per-video results and the roll-up.
+    """
+    try:
+        # Try to get from memory first
+        bulk_status = bulk_manager.get_bulk_status(bulk_id)
+        
+        if not bulk_status:
+            # Fallback to database
+            supabase = get_supabase()
+            result = await execute(supabase.table("bulk_analyses").select("*").eq("id", bulk_id))
+            
+            if not result.data:
+                raise HTTPException(status_code=404, detail="Bulk job not found")
+            
+            bulk_status = result.data[0]
+        
+        return BulkStatusResponse(
+            status=JobStatus(bulk_status["status"]),
+            source=bulk_status["source"],
+            videos=bulk_status["videos"],
+            rollup=bulk_status.get("rollup"),
+            error=bulk_status.get("error")
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting bulk status: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get bulk status: {str(e)}")
+
+
+@router.delete("/bulk/{bulk_id}", response_model=BulkAnalyzeResponse)
+@loop_monitor.track("routes.cancel_bulk")
+async def cancel_bulk(bulk_id: str):
+    """
+    Cancel a queued or running bulk analysis.
+    Videos already analyzed keep their analyses; vectors of the rest are deleted.
+    """
+    try:
+        supabase = get_supabase()
+        if admission_controller.withdraw(bulk_id):
+            # Never started, so nothing else records the cancellation
+            await execute(supabase.table("bulk_analyses").update({
+                "status": "CANCELLED",
+                "error": "Cancelled by user"
+            }).eq("id", bulk_id))
+            return BulkAnalyzeResponse(bulk_id=bulk_id, status=JobStatus.CANCELLED)
+        if bulk_manager.cancel_bulk_job(bulk_id):
+            return BulkAnalyzeResponse(bulk_id=bulk_id, status=JobStatus.CANCELLED)
+        
+        # Not running in this process: check the stored bulk job
+        bulk_status = bulk_manager.get_bulk_status(bulk_id)
+        if not bulk_status:
+            result = await execute(supabase.table("bulk_analyses").select("status").eq("id", bulk_id))
+            if not result.data:
+                raise HTTPException(status_code=404, detail="Bulk job not found")
+            bulk_status = result.data[0]
+            
+            if bulk_status["status"] in ("PENDING", "PROCESSING"):
+                # Orphaned by a restart; nothing is running, just record it
+                await execute(supabase.table("bulk_analyses").update({
+                    "status": "CANCELLED",
+                    "error": "Cancelled by user"
+                }).eq("id", bulk_id))
+                return BulkAnalyzeResponse(bulk_id=bulk_id, status=JobStatus.CANCELLED)
+        
+        raise HTTPException(
+            status_code=409,
+            detail=f"Bulk job is already {bulk_status['status']}"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cancelling bulk job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to cancel bulk job: {str(e)}")
+
+
 @router.get("/status/{job_id}", response_model=JobStatusResponse)
+@loop_monitor.track("routes.get_job_status")
 async def get_job_status(job_id: str):
     """
     Get the current status of an analysis job.
@@ -92,7 +317,7 @@ async def get_job_status(job_id: str):
         if not job_status:
             # Fallback to database
             supabase = get_supabase()
-            result = supabase.table("analysis_jobs").select("*").eq("id", job_id).execute()
+            result = await execute(supabase.table("analysis_jobs").select("*").eq("id", job_id))
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Job not found")
@@ -106,12 +331,11 @@ async def get_job_status(job_id: str):
                 "analysis_id": job_data.get("analysis_id")
             }
         
-        # Calculate estimated time remaining
-        avg_progress = (job_status["embeddings_progress"] + job_status["gemini_progress"]) / 2
-        estimated_time = None
-        if avg_progress > 0 and avg_progress < 100:
-            # Rough estimation: ~2 minutes total
-            estimated_time = int(120 * (100 - avg_progress) / 100)
+        # Estimate time remaining from historical stage timings.
+        # Jobs only known to the database are not running in this process.
+        estimated_time = job_manager.estimate_time_remaining(job_id)
+        if estimated_time is not None and job_status["status"] == "PENDING":
+            estimated_time += admission_controller.estimated_wait(job_id)
         
         return JobStatusResponse(
             status=JobStatus(job_status["status"]),
@@ -129,49 +353,71 @@ async def get_job_status(job_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get job status: {str(e)}")
 
 
+@router.delete("/jobs/{job_id}", response_model=AnalyzeResponse)
+@loop_monitor.track("routes.cancel_job")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running analysis job.
+    Stops the Apify run, remaining embedding batches and the pending Gemini
+    request, and deletes any vectors already upserted for the job.
+    """
+    try:
+        supabase = get_supabase()
+        if admission_controller.withdraw(job_id):
+            # Never started, so nothing else records the cancellation
+            await execute(supabase.table("analysis_jobs").update({
+                "status": "CANCELLED",
+                "error": "Cancelled by user"
+            }).eq("id", job_id))
+            return AnalyzeResponse(job_id=job_id, status=JobStatus.CANCELLED)
+        if job_manager.cancel_job(job_id):
+            return AnalyzeResponse(job_id=job_id, status=JobStatus.CANCELLED)
+        
+        # Not running in this process: check the stored job
+        job_status = job_manager.get_job_status(job_id)
+        if not job_status:
+            result = await execute(supabase.table("analysis_jobs").select("status").eq("id", job_id))
+            if not result.data:
+                raise HTTPException(status_code=404, detail="Job not found")
+            job_status = result.data[0]
+            
+            if job_status["status"] in ("PENDING", "PROCESSING"):
+                # Orphaned by a restart; nothing is running, just record it
+                await execute(supabase.table("analysis_jobs").update({
+                    "status": "CANCELLED",
+                    "error": "Cancelled by user"
+                }).eq("id", job_id))
+                return AnalyzeResponse(job_id=job_id, status=JobStatus.CANCELLED)
+        
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is already {job_status['status']}"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cancelling job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to cancel job: {str(e)}")
+
+
 @router.get("/analysis/{analysis_id}")
-async def get_analysis(analysis_id: str):
+@loop_monitor.track("routes.get_analysis")
+async def get_analysis(
+    analysis_id: str,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
     """
     Get the complete analysis results for a given analysis ID.
     Returns data for the report page.
+
+    Reports are served from a read-through cache, pre-serialized and
+    gzip-compressed, with a strong ETag; a matching If-None-Match gets 304.
     """
     try:
-        supabase = get_supabase()
-        
-        # Fetch from analysis_history
-        history_result = supabase.table("analysis_history").select("*").eq("id", analysis_id).execute()
-        
-        if not history_result.data:
-            raise HTTPException(status_code=404, detail="Analysis not found")
-        
-        history = history_result.data[0]
-        
-        # Fetch from analysis_details
-        details_result = supabase.table("analysis_details").select("*").eq("analysis_history_id", analysis_id).execute()
-        
-        if not details_result.data:
-            raise HTTPException(status_code=404, detail="Analysis details not found")
-        
-        details = details_result.data[0]
-        
-        # Combine and return
-        return {
-            "sentimentScore": history["sentiment_score"],
-            "leadPercentage": history["lead_percentage"],
-            "totalComments": history["total_comments"],
-            "sentimentBreakdown": details["sentiment_breakdown"],
-            "leads": details["leads"],
-            "topFeedbackTopics": details["top_feedback_topics"],
-            "topTopics": details["top_discussed_topics"],
-            "actionableTodos": details.get("actionable_todos", []),
-            "creatorInsights": details.get("creator_insights", []),
-            "competitorInsights": details.get("competitor_insights", []),
-            "engagementTimeline": details["engagement_spikes"],
-            "topInfluencers": details["top_influencers"],
-            "vibeTrend": details["vibe_trend"],
-            "url": history["url"],
-            "createdAt": history["created_at"]
-        }
+        report = await report_cache.get_or_load(analysis_id, _load_report)
+        return _encoded_response(report.full, if_none_match, accept_encoding)
         
     except HTTPException:
         raise
@@ -179,3 +425,213 @@ async def get_analysis(analysis_id: str):
         logger.error(f"Error getting analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get analysis: {str(e)}")
 
+
+@router.get("/analysis/{analysis_id}/summary")
+@loop_monitor.track("routes.get_analysis_summary")
+async def get_analysis_summary(
+    analysis_id: str,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    Get the KPIs, breakdowns and charts needed for the report's first render.
+    Leads, influencers and topic comments are fetched from the paginated
+    sub-resources below.
+    """
+    try:
+        report = await report_cache.get_or_load(analysis_id, _load_report)
+        return _encoded_response(report.summary, if_none_match, accept_encoding)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting analysis summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get analysis summary: {str(e)}")
+
+
+@router.get("/analysis/{analysis_id}/leads", response_model=ReportPage)
+@loop_monitor.track("routes.get_analysis_leads")
+async def get_analysis_leads(
+    analysis_id: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None
+):
+    """Get one page of leads, optionally projected to `fields`."""
+    return await _section_page(analysis_id, "leads", lambda report: report["leads"], cursor, limit, fields)
+
+
+@router.get("/analysis/{analysis_id}/influencers", response_model=ReportPage)
+@loop_monitor.track("routes.get_analysis_influencers")
+async def get_analysis_influencers(
+    analysis_id: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None
+):
+    """Get one page of top influencers, optionally projected to `fields`."""
+    return await _section_page(analysis_id, "influencers", lambda report: report["topInfluencers"], cursor, limit, fields)
+
+
+@router.get("/analysis/{analysis_id}/topics/{section}/{topic_index}/comments", response_model=ReportPage)
+@loop_monitor.track("routes.get_topic_comments")
+async def get_topic_comments(
+    analysis_id: str,
+    section: str,
+    topic_index: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None
+):
+    """
+    Get one page of comments for a topic.
+
+    Args:
+        section: "feedback" or "discussed"
+        topic_index: Position of the topic in the summary's topic list
+    """
+    if section not in TOPIC_SECTIONS:
+        raise HTTPException(status_code=400, detail="Section must be 'feedback' or 'discussed'")
+
+    def topic_comments(report: dict) -> list:
+        topics = report[TOPIC_SECTIONS[section]]
+        if not 0 <= topic_index < len(topics):
+            raise HTTPException(status_code=404, detail="Topic not found")
+        return topics[topic_index].get("comments", [])
+
+    return await _section_page(analysis_id, "topic_comments", topic_comments, cursor, limit, fields)
+
+
+@router.get("/analysis/{analysis_id}/export")
+@loop_monitor.track("routes.export_analysis")
+async def export_analysis(analysis_id: str, format: str = "arrow"):
+    """
+    Stream every comment of an analysis with its embedding and classifier
+    scores as an Arrow IPC stream (format=arrow) or a Parquet file
+    (format=parquet), for loading into notebooks.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be 'arrow' or 'parquet'")
+    if not export_service.available:
+        raise HTTPException(status_code=501, detail="Columnar export needs the pyarrow package")
+
+    try:
+        chunks = await export_service.stream(analysis_id, format)
+
+    except Exception as e:
+        logger.error(f"Error exporting analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to export analysis: {str(e)}")
+
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="No stored comments for this analysis")
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{analysis_id}.{extension}"'}
+    )
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Whether Accept-Encoding allows gzip: listed, or covered by "*", with q > 0."""
+    qualities = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def _encoded_response(encoded: EncodedBody, if_none_match: Optional[str], accept_encoding: Optional[str]) -> Response:
+    """Serve a pre-serialized body, honouring If-None-Match and gzip."""
+    gzipped = _accepts_gzip(accept_encoding)
+    etag = encoded.gzip_etag if gzipped else encoded.etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding"
+    }
+    # If-None-Match uses weak comparison
+    tags = [tag.strip().removeprefix("W/") for tag in (if_none_match or "").split(",")]
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(encoded.gzip_body, media_type="application/json", headers=headers)
+    return Response(encoded.body, media_type="application/json", headers=headers)
+
+
+async def _section_page(
+    analysis_id: str,
+    section: str,
+    get_items: Callable[[dict], list],
+    cursor: Optional[str],
+    limit: int,
+    fields: Optional[str]
+) -> ReportPage:
+    try:
+        projection = parse_fields(section, fields)
+        report = await report_cache.get_or_load(analysis_id, _load_report)
+        # Cursors are tied to the report version so they fail loudly after a re-analysis
+        version = report.etag.strip('"')[:12]
+        return ReportPage(**paginate(get_items(report.report), cursor, limit, version, projection))
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting analysis {section}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get analysis {section}: {str(e)}")
+
+
+async def _select_rows(table: str, column: str, value: str) -> list:
+    with supabase_seconds.time(table=table, operation="select"):
+        return (await execute(get_supabase().table(table).select("*").eq(column, value))).data
+
+
+async def _load_report(analysis_id: str) -> dict:
+    """Build the report payload from analysis_history and analysis_details."""
+    # Both rows are keyed by the analysis ID, so fetch them concurrently
+    history_rows, details_rows = await asyncio.gather(
+        _select_rows("analysis_history", "id", analysis_id),
+        _select_rows("analysis_details", "analysis_history_id", analysis_id)
+    )
+    
+    if not history_rows:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if not details_rows:
+        raise HTTPException(status_code=404, detail="Analysis details not found")
+    
+    history = history_rows[0]
+    details = details_rows[0]
+    
+    # Combine and return
+    return {
+        "sentimentScore": history["sentiment_score"],
+        "leadPercentage": history["lead_percentage"],
+        "totalComments": history["total_comments"],
+        "sentimentBreakdown": details["sentiment_breakdown"],
+        "leads": details["leads"],
+        "topFeedbackTopics": details["top_feedback_topics"],
+        "topTopics": details["top_discussed_topics"],
+        "actionableTodos": details.get("actionable_todos", []),
+        "creatorInsights": details.get("creator_insights", []),
+        "competitorInsights": details.get("competitor_insights", []),
+        "engagementTimeline": details["engagement_spikes"],
+        "topInfluencers": details["top_influencers"],
+        "vibeTrend": details["vibe_trend"],
+        "sampling": details.get("sampling"),
+        "url": history["url"],
+        "createdAt": history["created_at"]
+    }
@@ -1,109 +1,426 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models import ChatRequest, ChatResponse
 from app.services.embeddings_service import embeddings_service
 from app.services.pinecone_service import pinecone_service
-from openai import OpenAI
+from app.services.chat_cache import chat_cache
+from app.services.chat_sessions import ChatSession, Turn, chat_session_store
+from app.services.context_assembler import context_assembler
+from app.services.hybrid_retrieval import has_filters, hybrid_retriever
+from app.services.intent_router import intent_router
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics import chat_requests_total, chat_stage_seconds, record_llm_usage
+from app.services.openai_clients import async_openai_client as openai_client
+from app.services.resilience import CircuitOpenError, resilience
 import google.generativeai as genai
 from app.config import settings
+from typing import AsyncIterator, List, Optional, Tuple
+import json
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize AI clients
-openai_client = OpenAI(api_key=settings.openai_api_key)
+OPENAI_CHAT_MODEL = "gpt-4o"
+GEMINI_CHAT_MODEL = "gemini-2.0-flash-exp"
+SUMMARY_MODEL = "gpt-4o-mini"
+
+SYSTEM_PROMPT = """You are Quill AI, an expert analyst for YouTube comment analysis.
+Answer questions based ONLY on the provided comment context.
+Be direct, blunt, and data-driven. Use bullet points for readability.
+If the context doesn't contain relevant information, say so."""
+
+# Both clients are async so completions never block the loop; the OpenAI one
+# is shared and runs on the pooled HTTP transport
 genai.configure(api_key=settings.google_api_key)
+gemini_chat_model = genai.GenerativeModel(GEMINI_CHAT_MODEL)
 
 
 @router.post("/chat", response_model=ChatResponse)
+@loop_monitor.track("routes.chat_with_analysis")
 async def chat_with_analysis(request: ChatRequest):
     """
     Chat with AI about the analysis using RAG.
     Queries Pinecone for relevant comments and sends to AI.
+    Pass the returned session_id back to continue the conversation.
+    Returns 503 with Retry-After while a provider's circuit is open.
     """
+    resilience.start_budget(settings.chat_retry_budget)
     try:
         logger.info(f"Chat request for analysis {request.analysis_id} using {request.model}")
-        
-        # Step 1: Generate embedding for the user's message
-        query_embeddings = await embeddings_service.get_embeddings([request.message])
-        query_embedding = query_embeddings[0]
-        
-        # Step 2: Query Pinecone for similar comments
-        similar_comments = await pinecone_service.query_similar(
-            query_embedding,
-            request.analysis_id,
-            top_k=10
-        )
-        
-        # Step 3: Prepare context from similar comments
-        context = "Relevant comments from the analysis:\n\n"
-        for i, comment in enumerate(similar_comments, 1):
-            metadata = comment["metadata"]
-            context += f"{i}. @{metadata['author']} (Likes: {metadata['voteCount']}, Replies: {metadata['replyCount']})\n"
-            context += f"   {metadata['comment_text']}\n"
-            context += f"   Date: {metadata['date']}\n\n"
-        
+        session = chat_session_store.get_or_create(request.session_id, request.analysis_id)
+
+        fast_answer = await _fast_path(request)
+        if fast_answer is not None:
+            chat_session_store.record_turn(session, request.message, fast_answer, _summarize)
+            return ChatResponse(response=fast_answer, session_id=session.session_id)
+
+        query_embedding, cached_response, context = await _prepare_context(request, session)
+        if cached_response is not None:
+            chat_session_store.record_turn(session, request.message, cached_response, _summarize)
+            return ChatResponse(response=cached_response, session_id=session.session_id)
+
         # Step 4: Send to AI with context
-        if request.model == "gpt-4o":
-            response_text = await _chat_with_openai(request.message, context)
-        else:  # gemini-2.0-flash-exp
-            response_text = await _chat_with_gemini(request.message, context)
-        
-        return ChatResponse(response=response_text)
-        
+        with chat_stage_seconds.time(stage="complete"):
+            if request.model == OPENAI_CHAT_MODEL:
+                response_text = await _chat_with_openai(request.message, context, session)
+            else:  # gemini-2.0-flash-exp
+                response_text = await _chat_with_gemini(request.message, context, session)
+
+        _remember_answer(request, session, query_embedding, response_text)
+
+        return ChatResponse(response=response_text, session_id=session.session_id)
+
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise _unavailable(e)
+    except Exception as e:
+        logger.error(f"Error in chat: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+
+@router.post("/chat/stream")
+@loop_monitor.track("routes.chat_stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Chat with AI about the analysis, streaming the answer as Server-Sent Events.
+
+    Events:
+        data: {"delta": "<text>"}          one per generated chunk
+        event: done, {"session_id": ...}   after the last chunk
+        event: error                       if generation fails mid-stream
+
+    The upstream stream is opened before the response starts, so an open
+    circuit still returns 503 with Retry-After.
+    """
+    resilience.start_budget(settings.chat_retry_budget)
+    try:
+        logger.info(f"Streaming chat request for analysis {request.analysis_id} using {request.model}")
+        session = chat_session_store.get_or_create(request.session_id, request.analysis_id)
+        ready_answer = await _fast_path(request)
+        if ready_answer is None:
+            query_embedding, ready_answer, context = await _prepare_context(request, session)
+        if ready_answer is None:
+            started = time.perf_counter()
+            if request.model == OPENAI_CHAT_MODEL:
+                chunks = await _stream_openai(request.message, context, session)
+            else:  # gemini-2.0-flash-exp
+                chunks = await _stream_gemini(request.message, context, session)
+
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise _unavailable(e)
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
+    done = {"session_id": session.session_id}
+
+    async def events() -> AsyncIterator[str]:
+        # Fast-path and cached answers are sent as a single event
+        if ready_answer is not None:
+            chat_session_store.record_turn(session, request.message, ready_answer, _summarize)
+            yield _sse({"delta": ready_answer})
+            yield _sse(done, event="done")
+            return
+
+        parts: List[str] = []
+        try:
+            async for delta in chunks:
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as e:
+            logger.error(f"Error streaming chat: {str(e)}")
+            yield _sse({"detail": f"Chat failed: {str(e)}"}, event="error")
+            return
+        finally:
+            # Closes the provider stream when the client disconnects mid-answer
+            await chunks.aclose()
+
+        chat_stage_seconds.observe(time.perf_counter() - started, stage="complete")
+        _remember_answer(request, session, query_embedding, "".join(parts))
+        yield _sse(done, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _unavailable(error: CircuitOpenError) -> HTTPException:
+    """Fail fast while a provider is known to be down."""
+    logger.warning(f"Chat unavailable: {str(error)}")
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _filtered(request: ChatRequest) -> bool:
+    # Answers to "last week" or "highly liked" questions must not be served to
+    # similar questions with other bounds, or after the dates move on
+    return settings.chat_hybrid_enabled and has_filters(request.message)
+
+
+def _remember_answer(request: ChatRequest, session: ChatSession, query_embedding: List[float], answer: str):
+    # Answers to follow-ups depend on the conversation, so only first turns are cached
+    if not session.has_history and not _filtered(request):
+        chat_cache.store(request.analysis_id, request.model, query_embedding, answer)
+    chat_session_store.record_turn(session, request.message, answer, _summarize)
+
+
+async def _fast_path(request: ChatRequest) -> Optional[str]:
+    """Answer aggregate questions from the stored analysis, skipping RAG."""
+    with chat_stage_seconds.time(stage="route"):
+        answer = await intent_router.answer(request.analysis_id, request.message)
+    if answer is not None:
+        chat_requests_total.inc(route="fast_path")
+    return answer
+
+
+async def _prepare_context(request: ChatRequest, session: ChatSession) -> Tuple[List[float], Optional[str], str]:
+    """
+    Embed the question, check the semantic cache and retrieve context.
+    Within a session, context from the previous turn is reused while the topic holds.
+
+    Returns:
+        (query embedding, cached answer or None, context for the model)
+
+    Raises:
+        HTTPException: 410 if the analysis's vectors were garbage-collected
+    """
+    if await intent_router.vectors_expired(request.analysis_id):
+        raise HTTPException(
+            status_code=410,
+            detail="This analysis's comments were removed from the search index by retention; "
+                   "re-run the analysis to chat about its comments"
+        )
+
+    # Step 1: Generate embedding for the user's message
+    with chat_stage_seconds.time(stage="embed"):
+        query_embeddings = await embeddings_service.get_embeddings([request.message])
+    query_embedding = query_embeddings[0]
+
+    # Serve near-identical opening questions from the semantic cache
+    filtered = _filtered(request)
+    if not session.has_history and not filtered:
+        cached_response = chat_cache.lookup(request.analysis_id, request.model, query_embedding)
+        if cached_response is not None:
+            logger.info(f"Chat cache hit for analysis {request.analysis_id}")
+            chat_requests_total.inc(route="cache")
+            return query_embedding, cached_response, ""
+
+    context = None if filtered else chat_session_store.reusable_context(session, query_embedding)
+    if context is not None:
+        chat_requests_total.inc(route="session_context")
+        return query_embedding, None, context
+
+    chat_requests_total.inc(route="rag")
+
+    # Step 2: Over-fetch similar comments, fusing keyword matches and
+    # applying engagement/date filters from the question when hybrid is on
+    with chat_stage_seconds.time(stage="retrieve"):
+        if settings.chat_hybrid_enabled:
+            similar_comments = await hybrid_retriever.search(request.message, query_embedding, request.analysis_id)
+        else:
+            similar_comments = await pinecone_service.query_similar(
+                query_embedding,
+                request.analysis_id,
+                top_k=settings.chat_context_fetch_k,
+                include_values=True
+            )
+
+    # Step 3: Dedupe, diversify and pack into the model's token budget
+    with chat_stage_seconds.time(stage="assemble"):
+        context = context_assembler.assemble(query_embedding, similar_comments, request.model)
+
+    # Filtered context only answers its own bounds, so a follow-up must not reuse it
+    if not filtered:
+        chat_session_store.remember_context(session, query_embedding, context)
+    return query_embedding, None, context
+
+
+def _openai_messages(message: str, context: str, session: ChatSession) -> List[dict]:
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": f"Context:\n{context}"}
+    ]
+    if session.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{session.summary}"})
+    for question, answer in session.turns:
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+    messages.append({"role": "user", "content": message})
+    return messages
+
 
-async def _chat_with_openai(message: str, context: str) -> str:
+def _gemini_prompt(message: str, context: str, session: ChatSession) -> str:
+    history = ""
+    if session.has_history:
+        turns = "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in session.turns)
+        history = f"\nConversation so far:\n{session.summary}\n{turns}\n"
+    return f"""{SYSTEM_PROMPT}
+
+Context:
+{context}
+{history}
+User question: {message}"""
+
+
+def _record_gemini_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        record_llm_usage(
+            "gemini",
+            GEMINI_CHAT_MODEL,
+            usage.prompt_token_count,
+            usage.candidates_token_count
+        )
+
+
+@loop_monitor.track("chat.openai")
+async def _chat_with_openai(message: str, context: str, session: ChatSession) -> str:
     """Send chat request to OpenAI."""
     try:
-        system_prompt = """You are Quill AI, an expert analyst for YouTube comment analysis. 
-Answer questions based ONLY on the provided comment context. 
-Be direct, blunt, and data-driven. Use bullet points for readability.
-If the context doesn't contain relevant information, say so."""
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "system", "content": f"Context:\n{context}"},
-                {"role": "user", "content": message}
-            ],
+        messages = _openai_messages(message, context, session)
+        response = await resilience.call("openai", lambda: openai_client.chat.completions.create(
+            model=OPENAI_CHAT_MODEL,
+            messages=messages,
             temperature=0.7,
             max_tokens=500
-        )
-        
+        ))
+        if response.usage:
+            record_llm_usage(
+                "openai",
+                OPENAI_CHAT_MODEL,
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens
+            )
+
         return response.choices[0].message.content
-        
+
     except Exception as e:
         logger.error(f"OpenAI chat error: {str(e)}")
         raise
 
 
-async def _chat_with_gemini(message: str, context: str) -> str:
+@loop_monitor.track("chat.gemini")
+async def _chat_with_gemini(message: str, context: str, session: ChatSession) -> str:
     """Send chat request to Gemini."""
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"""You are Quill AI, an expert analyst for YouTube comment analysis.
-Answer questions based ONLY on the provided comment context.
-Be direct, blunt, and data-driven. Use bullet points for readability.
-If the context doesn't contain relevant information, say so.
-
-Context:
-{context}
-
-User question: {message}"""
-        
-        response = model.generate_content(prompt)
+        prompt = _gemini_prompt(message, context, session)
+        response = await resilience.call("gemini", lambda: gemini_chat_model.generate_content_async(prompt))
+        _record_gemini_usage(response)
         return response.text
-        
+
     except Exception as e:
         logger.error(f"Gemini chat error: {str(e)}")
         raise
 
 
+@loop_monitor.track("chat.openai_stream_open")
+async def _stream_openai(message: str, context: str, session: ChatSession) -> AsyncIterator[str]:
+    """
+    Open a chat completion stream from OpenAI and return its text deltas.
+    Only opening the stream is retried, and its errors are raised here.
+    """
+    messages = _openai_messages(message, context, session)
+    stream = await resilience.call("openai", lambda: openai_client.chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=500,
+        stream=True,
+        stream_options={"include_usage": True}
+    ))
+    return _openai_deltas(stream)
+
+
+@loop_monitor.track("chat.openai_stream")
+async def _openai_deltas(stream) -> AsyncIterator[str]:
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                record_llm_usage(
+                    "openai",
+                    OPENAI_CHAT_MODEL,
+                    chunk.usage.prompt_tokens,
+                    chunk.usage.completion_tokens
+                )
+    finally:
+        # Releases the HTTP response if the answer is abandoned part-way
+        await stream.close()
 
 
+@loop_monitor.track("chat.gemini_stream_open")
+async def _stream_gemini(message: str, context: str, session: ChatSession) -> AsyncIterator[str]:
+    """
+    Open a chat completion stream from Gemini and return its text deltas.
+    Only opening the stream is retried, and its errors are raised here.
+    """
+    prompt = _gemini_prompt(message, context, session)
+    response = await resilience.call(
+        "gemini",
+        lambda: gemini_chat_model.generate_content_async(prompt, stream=True)
+    )
+    return _gemini_deltas(response)
+
+
+@loop_monitor.track("chat.gemini_stream")
+async def _gemini_deltas(response) -> AsyncIterator[str]:
+    last_chunk = None
+    answered = False
+    async for chunk in response:
+        last_chunk = chunk
+        # .text raises ValueError for chunks without text parts, such as
+        # a final chunk that only carries the finish reason
+        try:
+            text = chunk.text
+        except ValueError:
+            continue
+        if text:
+            answered = True
+            yield text
+    if last_chunk is not None:
+        _record_gemini_usage(last_chunk)
+    if not answered:
+        raise Exception("Gemini returned no text (the response may have been blocked)")
+
+
+async def _summarize(summary: str, turns: List[Turn]) -> str:
+    """Fold older conversation turns into the session's rolling summary."""
+    transcript = "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+    response = await resilience.call("openai", lambda: openai_client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": (
+                "Update the running summary of a conversation about a YouTube comment analysis. "
+                "Keep facts, numbers, names and open questions the user may refer back to. "
+                "Reply with the new summary only."
+            )},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        temperature=0,
+        max_tokens=settings.chat_session_summary_tokens
+    ))
+    if response.usage:
+        record_llm_usage(
+            "openai",
+            SUMMARY_MODEL,
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens
+        )
+    return response.choices[0].message.content.strip()
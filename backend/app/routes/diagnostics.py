@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Header, HTTPException
+from app.config import settings
+from app.services.loop_monitor import loop_monitor
+from app.services.eta_service import eta_estimator
+from app.services.http_pool import http_pool
+from app.services.namespace_lifecycle import namespace_lifecycle
+from app.services.resilience import resilience
+from typing import Optional
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/diagnostics/loop")
+async def get_loop_stalls():
+    """
+    Get event-loop lag and stall histograms per instrumented call site.
+    Enable with LOOP_MONITOR_ENABLED=true.
+    """
+    return loop_monitor.snapshot()
+
+
+@router.get("/diagnostics/eta")
+async def get_eta_model():
+    """Get the rolling per-stage unit costs used for ETA estimation."""
+    return eta_estimator.snapshot()
+
+
+@router.get("/diagnostics/http")
+async def get_http_pool():
+    """Get shared HTTP pool limits, open connections and per-host request counters."""
+    return http_pool.snapshot()
+
+
+@router.get("/diagnostics/providers")
+async def get_provider_health():
+    """Get circuit breaker state and hedge delay per external provider."""
+    return resilience.snapshot()
+
+
+@router.get("/diagnostics/vectors")
+async def get_vector_index_size():
+    """Get Pinecone index size per tenant and the last namespace collection."""
+    try:
+        return await namespace_lifecycle.report()
+    except Exception as e:
+        logger.error(f"Error reporting vector index size: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to report vector index size: {str(e)}")
+
+
+@router.post("/diagnostics/vectors/gc")
+async def collect_vector_namespaces(dry_run: bool = True, x_admin_key: Optional[str] = Header(None)):
+    """
+    Garbage-collect orphaned, superseded and expired Pinecone namespaces now.
+    Defaults to a dry run that only lists what would be deleted; deleting
+    requires the ADMIN_API_KEY in X-Admin-Key, and is refused when no key
+    is configured.
+    """
+    if not dry_run:
+        if not settings.admin_api_key:
+            raise HTTPException(status_code=403, detail="Namespace deletion over HTTP is disabled; set ADMIN_API_KEY")
+        if not x_admin_key or not secrets.compare_digest(x_admin_key, settings.admin_api_key):
+            raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Key")
+    try:
+        return await namespace_lifecycle.collect(dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"Error collecting vector namespaces: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to collect vector namespaces: {str(e)}")
+
+
+@router.delete("/diagnostics/loop")
+async def reset_loop_stalls():
+    """Clear recorded event-loop stalls."""
+    loop_monitor.reset()
+    return {"status": "reset"}
@@ -0,0 +1,328 @@
+import asyncio
+import math
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+from app.config import settings
+from app.services.bulk_manager import bulk_manager
+from app.services.job_manager import job_manager
+
+logger = logging.getLogger(__name__)
+
+# Starts admitted work and returns its task
+Starter = Callable[[], asyncio.Task]
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted; carries a Retry-After hint."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Entry:
+    """Admitted work: a job, or a bulk analysis costing one unit per video."""
+
+    def __init__(self, job_id: str, starter: Starter, cost: int, slots: int):
+        self.job_id = job_id
+        self.starter = starter
+        self.cost = cost
+        # Concurrency slots held while running
+        self.slots = slots
+
+
+class _Tenant:
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.queue: Deque[_Entry] = deque()
+        # Work items and slots currently running
+        self.active = 0
+        self.running = 0
+        # Virtual start time for weighted fair queueing
+        self.vtime = 0.0
+
+
+class AdmissionController:
+    """
+    Admission control and weighted-fair scheduling in front of JobManager.
+
+    Each tenant (user) has its own FIFO queue. Whenever global slots are
+    free, the tenant with the smallest virtual time that is under its own
+    concurrency cap starts its next job, and its virtual time advances by
+    cost / weight. A heavy submitter therefore cannot starve other tenants.
+
+    A job costs 1 and holds one slot. A bulk analysis costs one per video
+    and holds that many slots, up to what a single tenant may hold.
+    """
+
+    def __init__(self):
+        self.max_concurrent = settings.max_concurrent_jobs
+        self.max_running_per_user = settings.max_running_jobs_per_user
+        self.max_queued_per_user = settings.max_queued_jobs_per_user
+        self.max_queue_depth = settings.max_job_queue_depth
+        self.weights = self._parse_weights(settings.tenant_weights)
+
+        self._tenants: Dict[str, _Tenant] = {}
+        self._job_tenants: Dict[str, str] = {}
+        self._job_slots: Dict[str, int] = {}
+        self._running = 0
+        self._vclock = 0.0
+
+    @staticmethod
+    def _parse_weights(spec: str) -> Dict[str, float]:
+        """Parse "user_a:3,user_b:2" into a weight mapping."""
+        weights = {}
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            user_id, _, weight = entry.partition(":")
+            try:
+                weights[user_id.strip()] = max(float(weight), 0.1)
+            except ValueError:
+                logger.warning(f"Ignoring invalid tenant weight: {entry}")
+        return weights
+
+    @property
+    def queued(self) -> int:
+        return sum(len(tenant.queue) for tenant in self._tenants.values())
+
+    def submit(
+        self,
+        user_id: str,
+        job_id: str,
+        url: str,
+        incremental: bool = False,
+        base_analysis_id: Optional[str] = None,
+        sampling: bool = False
+    ) -> bool:
+        """
+        Admit a single-video analysis job, starting it now or queueing it.
+
+        Args:
+            user_id: Tenant submitting the job
+            job_id: Job ID
+            url: Video URL to analyze
+            incremental: Refresh a previous analysis with only new comments
+            base_analysis_id: Previous analysis to refresh, if not the latest
+            sampling: Analyze a stratified sample of a very large video
+
+        Returns:
+            True if the job was queued, False if it started immediately
+
+        Raises:
+            AdmissionRejected: If the tenant or global queue is full
+        """
+        def on_admit(queued: bool):
+            job_manager.create_job(
+                job_id,
+                url,
+                status="PENDING" if queued else "PROCESSING",
+                incremental=incremental,
+                base_analysis_id=base_analysis_id,
+                user_id=user_id,
+                sampling=sampling
+            )
+
+        # The job records itself as PROCESSING in the database once it runs
+        return self.submit_task(user_id, job_id, lambda: job_manager.start_job(job_id, url), on_admit)
+
+    def submit_task(
+        self,
+        user_id: str,
+        job_id: str,
+        starter: Starter,
+        on_admit: Optional[Callable[[bool], None]] = None,
+        cost: int = 1
+    ) -> bool:
+        """
+        Admit arbitrary work, such as a bulk analysis, under the same caps.
+
+        Args:
+            user_id: Tenant submitting the work
+            job_id: Unique ID for the work item
+            starter: Starts the work and returns its task
+            on_admit: Called with `queued` once the work is accepted
+            cost: Jobs the work amounts to, e.g. a bulk analysis's video count
+
+        Returns:
+            True if the work was queued, False if it started immediately
+
+        Raises:
+            AdmissionRejected: If the tenant or global queue is full
+        """
+        tenant = self._tenants.get(user_id)
+        if tenant is None:
+            tenant = _Tenant(self.weights.get(user_id, 1.0))
+            self._tenants[user_id] = tenant
+
+        if len(tenant.queue) + tenant.active >= self.max_running_per_user + self.max_queued_per_user:
+            raise AdmissionRejected(
+                "Too many analyses in progress for this user",
+                self._retry_after(tenant)
+            )
+        if self.queued >= self.max_queue_depth:
+            self._prune(user_id)
+            raise AdmissionRejected(
+                "Analysis queue is full",
+                self._retry_after(None)
+            )
+
+        # An idle tenant re-joins at the current virtual clock, so it cannot
+        # bank credit while inactive
+        if not tenant.queue and tenant.running == 0:
+            tenant.vtime = max(tenant.vtime, self._vclock)
+
+        self._job_tenants[job_id] = user_id
+        cost = max(1, cost)
+        entry = _Entry(job_id, starter, cost, min(cost, self.max_concurrent, self.max_running_per_user))
+
+        # Fast path: capacity is free, and anything queued would already
+        # have been dispatched into it
+        if not tenant.queue and self._fits(tenant, entry):
+            if on_admit:
+                on_admit(False)
+            self._start(user_id, tenant, entry)
+            return False
+
+        if on_admit:
+            on_admit(True)
+        tenant.queue.append(entry)
+        logger.info(f"Queued job {job_id} for user {user_id} ({len(tenant.queue)} queued)")
+        return True
+
+    def withdraw(self, job_id: str) -> bool:
+        """
+        Remove a queued job before it starts. The caller records the
+        cancellation in the database.
+
+        Returns:
+            True if the job was queued and has been cancelled
+        """
+        user_id = self._job_tenants.get(job_id)
+        tenant = self._tenants.get(user_id) if user_id else None
+        if not tenant:
+            return False
+
+        for entry in tenant.queue:
+            if entry.job_id == job_id:
+                tenant.queue.remove(entry)
+                break
+        else:
+            return False
+
+        self._job_tenants.pop(job_id, None)
+        self._prune(user_id)
+        if job_id in job_manager.jobs:
+            job_manager.mark_cancelled(job_id, "Cancelled by user")
+        elif job_id in bulk_manager.jobs:
+            bulk_manager.mark_cancelled(job_id, "Cancelled by user")
+        return True
+
+    def estimated_wait(self, job_id: str) -> int:
+        """Estimate seconds until a queued job starts."""
+        user_id = self._job_tenants.get(job_id)
+        tenant = self._tenants.get(user_id) if user_id else None
+        if not tenant:
+            return 0
+
+        position = next(
+            (i for i, entry in enumerate(tenant.queue) if entry.job_id == job_id),
+            None
+        )
+        if position is None:
+            return 0
+
+        # Slots needed by work ahead of this job across all tenants, weighted-fair order
+        ahead = sum(entry.slots for entry in list(tenant.queue)[:position]) + sum(
+            entry.slots
+            for other in self._tenants.values()
+            if other is not tenant
+            for entry in list(other.queue)[:math.ceil((position + 1) * other.weight / tenant.weight)]
+        )
+        return self._slot_wait(ahead)
+
+    def _fits(self, tenant: _Tenant, entry: _Entry) -> bool:
+        return (
+            tenant.running + entry.slots <= self.max_running_per_user
+            and self._running + entry.slots <= self.max_concurrent
+        )
+
+    def _dispatch(self):
+        """Start queued jobs while global and per-tenant capacity allows."""
+        while self._running < self.max_concurrent:
+            eligible = [
+                (user_id, tenant)
+                for user_id, tenant in self._tenants.items()
+                if tenant.queue and tenant.running + tenant.queue[0].slots <= self.max_running_per_user
+            ]
+            if not eligible:
+                return
+
+            user_id, tenant = min(eligible, key=lambda item: item[1].vtime)
+            # The fairest head waits for enough free slots rather than being overtaken
+            if not self._fits(tenant, tenant.queue[0]):
+                return
+            entry = tenant.queue.popleft()
+            try:
+                self._start(user_id, tenant, entry)
+            except Exception as e:
+                if entry.job_id in bulk_manager.jobs:
+                    bulk_manager.mark_failed(entry.job_id, f"Failed to start: {str(e)}")
+                else:
+                    job_manager.mark_failed(entry.job_id, f"Failed to start: {str(e)}")
+                continue
+            logger.info(f"Dispatched queued job {entry.job_id} for user {user_id}")
+
+    def _start(self, user_id: str, tenant: _Tenant, entry: _Entry):
+        self._vclock = tenant.vtime
+        tenant.vtime += entry.cost / tenant.weight
+        tenant.active += 1
+        tenant.running += entry.slots
+        self._running += entry.slots
+        self._job_slots[entry.job_id] = entry.slots
+
+        try:
+            task = entry.starter()
+        except Exception as e:
+            logger.error(f"Error starting job {entry.job_id}: {str(e)}")
+            self._release(user_id, entry.job_id)
+            raise
+        task.add_done_callback(lambda _: self._release(user_id, entry.job_id))
+
+    def _release(self, user_id: str, job_id: str):
+        slots = self._job_slots.pop(job_id, 0)
+        self._running -= slots
+        self._job_tenants.pop(job_id, None)
+        tenant = self._tenants.get(user_id)
+        if tenant:
+            tenant.active -= 1
+            tenant.running -= slots
+            self._prune(user_id)
+        self._dispatch()
+
+    def _prune(self, user_id: str):
+        tenant = self._tenants.get(user_id)
+        if tenant and not tenant.queue and tenant.active == 0:
+            del self._tenants[user_id]
+
+    def _retry_after(self, tenant: Optional[_Tenant]) -> int:
+        """Seconds until the tenant (or anyone, if None) is likely to get capacity."""
+        queues = self._tenants.values() if tenant is None else [tenant]
+        ahead = sum(entry.slots for queue in queues for entry in queue.queue)
+        return self._slot_wait(ahead)
+
+    def _slot_wait(self, slots_ahead: int) -> int:
+        """Estimate seconds until a slot frees after `slots_ahead` queued slots are taken."""
+        remaining = [
+            job_manager.estimate_time_remaining(job_id) or 0
+            for job_id in job_manager.tasks
+        ]
+        # A bulk analysis frees all its slots at once
+        for bulk_id in bulk_manager.tasks:
+            remaining.extend([bulk_manager.estimate_time_remaining(bulk_id)] * self._job_slots.get(bulk_id, 1))
+        first_free = min(remaining) if len(remaining) >= self.max_concurrent else 0
+        rounds = slots_ahead // max(self.max_concurrent, 1)
+        return max(1, int(first_free + rounds * job_manager.expected_job_seconds()))
+
+
+# Singleton instance
+admission_controller = AdmissionController()
@@ -1,22 +1,67 @@
+import asyncio
+import re
 from apify_client import ApifyClient
 from app.config import settings
+from app.services.http_pool import http_pool
+from app.services.loop_monitor import loop_monitor
+from app.services.resilience import CircuitOpenError, resilience
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 
 logger = logging.getLogger(__name__)
 
+# YouTube comments scraper actor
+COMMENTS_ACTOR_ID = "p7UMdpQnjKmmpR21D"
+
+# commentsSortBy values of the comments actor, from its input schema
+# (https://apify.com/streamers/youtube-comments-scraper/input-schema):
+# "0" is "Top comments" and "1" is "Newest first", in the order of
+# YouTube's own sort menu
+SORT_BY_RELEVANCE = "0"
+SORT_BY_NEWEST = "1"
+
+# Seconds to block per poll while waiting for an actor run
+RUN_POLL_SECONDS = 5
+
+VIDEO_ID_PATTERN = re.compile(r'(?:v=|youtu\.be/|/shorts/)([\w-]{11})')
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """Extract the 11-character YouTube video ID from a URL."""
+    match = VIDEO_ID_PATTERN.search(url or "")
+    return match.group(1) if match else None
+
 
 class ApifyService:
     def __init__(self):
-        self.client = ApifyClient(settings.apify_api_token)
+        # Retries are handled by the resilience layer, under the job's budget
+        self.client = ApifyClient(
+            settings.apify_api_token,
+            max_retries=0,
+            timeout_secs=int(settings.http_timeout_seconds)
+        )
+        # The SDK builds its own httpx client; move it onto the shared pool
+        http_client = getattr(self.client, "http_client", None)
+        if http_client is not None and hasattr(http_client, "httpx_client"):
+            http_client.httpx_client = http_pool.adopt(http_client.httpx_client)
+        # Aborts of runs whose start outlived the task that requested them
+        self._aborts: Set[asyncio.Task] = set()
     
-    async def fetch_comments(self, url: str, max_comments: int = 500) -> List[Dict[str, Any]]:
+    @loop_monitor.track("apify.fetch_comments")
+    async def fetch_comments(
+        self,
+        url: str,
+        max_comments: int = 500,
+        newest_first: bool = False
+    ) -> List[Dict[str, Any]]:
         """
         Fetch YouTube comments using Apify actor.
         
         Args:
             url: YouTube video URL
             max_comments: Maximum number of comments to fetch
+            newest_first: Scrape the newest comments instead of the most
+                relevant, so a capped scrape covers everything recent
             
         Returns:
             List of raw comment data from Apify
@@ -28,26 +73,173 @@ class ApifyService:
             run_input = {
                 "startUrls": [{"url": url}],
                 "maxComments": max_comments,
-                "commentsSortBy": "1",  # Sort by relevance
+                "commentsSortBy": SORT_BY_NEWEST if newest_first else SORT_BY_RELEVANCE,
             }
             
-            # Run the Actor and wait for it to finish
-            run = self.client.actor("p7UMdpQnjKmmpR21D").call(run_input=run_input)
+            # Start the Actor and wait for it to finish
+            run = await self._run_actor(COMMENTS_ACTOR_ID, run_input)
             
             logger.info(f"Apify actor completed. Dataset ID: {run['defaultDatasetId']}")
             
             # Fetch results from the dataset
-            items = []
-            for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
-                items.append(item)
+            items = await self._dataset_items(run["defaultDatasetId"])
             
             logger.info(f"Fetched {len(items)} items from Apify")
             return items
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error fetching comments from Apify: {str(e)}")
             raise Exception(f"Failed to fetch comments: {str(e)}")
 
+    
+    @loop_monitor.track("apify.fetch_comments_bulk")
+    async def fetch_comments_bulk(
+        self,
+        urls: List[str],
+        max_comments: int = 500
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch comments for several videos in a single actor run.
+        
+        Args:
+            urls: YouTube video URLs
+            max_comments: Maximum number of comments to fetch per video
+            
+        Returns:
+            Mapping of each requested URL to its raw comment items
+        """
+        try:
+            logger.info(f"Starting Apify actor for {len(urls)} URLs")
+            
+            run_input = {
+                "startUrls": [{"url": url} for url in urls],
+                "maxComments": max_comments,
+                "commentsSortBy": SORT_BY_RELEVANCE,
+            }
+            run = await self._run_actor(COMMENTS_ACTOR_ID, run_input)
+            items = await self._dataset_items(run["defaultDatasetId"])
+            
+            # Items carry the page they were scraped from; group them back by video
+            by_video_id = {extract_video_id(url): url for url in urls}
+            grouped: Dict[str, List[Dict[str, Any]]] = {url: [] for url in urls}
+            for item in items:
+                video_id = item.get("videoId") or extract_video_id(item.get("pageUrl", ""))
+                url = by_video_id.get(video_id)
+                if url:
+                    grouped[url].append(item)
+            
+            logger.info(f"Fetched {len(items)} items from Apify for {len(urls)} videos")
+            return grouped
+            
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching bulk comments from Apify: {str(e)}")
+            raise Exception(f"Failed to fetch comments: {str(e)}")
+    
+    @loop_monitor.track("apify.list_videos")
+    async def list_videos(self, url: str, max_videos: int = 50) -> List[str]:
+        """
+        List the most recent video URLs of a channel or playlist.
+        
+        Args:
+            url: YouTube channel or playlist URL
+            max_videos: Maximum number of videos to return
+            
+        Returns:
+            List of video URLs, newest first
+        """
+        try:
+            logger.info(f"Listing up to {max_videos} videos for {url}")
+            
+            run_input = {
+                "startUrls": [{"url": url}],
+                "maxResults": max_videos,
+                "maxResultsShorts": 0,
+                "maxResultStreams": 0,
+            }
+            run = await self._run_actor(settings.apify_video_actor_id, run_input)
+            items = await self._dataset_items(run["defaultDatasetId"])
+            
+            urls = []
+            for item in items:
+                video_id = item.get("id") or extract_video_id(item.get("url", ""))
+                if video_id:
+                    urls.append(f"https://www.youtube.com/watch?v={video_id}")
+            
+            logger.info(f"Found {len(urls)} videos for {url}")
+            return urls[:max_videos]
+            
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error listing videos from Apify: {str(e)}")
+            raise Exception(f"Failed to list videos: {str(e)}")
+    
+    async def _run_actor(self, actor_id: str, run_input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Start an actor run and poll until it finishes.
+        
+        If the awaiting task is cancelled, the Apify run is aborted so it
+        stops consuming compute units. A cancellation while the run is still
+        starting cannot stop the start request, so the run is aborted in the
+        background as soon as it has an ID.
+        """
+        # Starting a run is not idempotent, so it is never retried
+        start = asyncio.ensure_future(resilience.call(
+            "apify",
+            lambda: asyncio.to_thread(self.client.actor(actor_id).start, run_input=run_input),
+            retry=False
+        ))
+        try:
+            run = await asyncio.shield(start)
+        except asyncio.CancelledError:
+            abort = asyncio.ensure_future(self._abort_when_started(start))
+            self._aborts.add(abort)
+            abort.add_done_callback(self._aborts.discard)
+            raise
+        run_client = self.client.run(run["id"])
+        
+        try:
+            while run.get("status") not in ("SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT"):
+                run = await resilience.call(
+                    "apify",
+                    lambda: asyncio.to_thread(run_client.wait_for_finish, wait_secs=RUN_POLL_SECONDS)
+                ) or run
+        except asyncio.CancelledError:
+            await self._abort(run["id"])
+            raise
+        
+        if run["status"] != "SUCCEEDED":
+            raise Exception(f"Apify run {run['id']} finished with status {run['status']}")
+        
+        return run
+    
+    async def _abort_when_started(self, start: "asyncio.Future[Dict[str, Any]]"):
+        """Abort a run whose requester was cancelled once its start returns."""
+        try:
+            run = await start
+        except Exception:
+            # The run never started, so there is nothing to abort
+            return
+        await self._abort(run["id"])
+    
+    async def _abort(self, run_id: str):
+        logger.info(f"Aborting Apify run {run_id}")
+        try:
+            await asyncio.to_thread(self.client.run(run_id).abort)
+        except Exception as e:
+            logger.error(f"Error aborting Apify run {run_id}: {str(e)}")
+    
+    async def _dataset_items(self, dataset_id: str) -> List[Dict[str, Any]]:
+        """Download all items of a finished run's dataset."""
+        return await resilience.call(
+            "apify",
+            lambda: asyncio.to_thread(lambda: list(self.client.dataset(dataset_id).iterate_items()))
+        )
+
 
 # Singleton instance
 apify_service = ApifyService()
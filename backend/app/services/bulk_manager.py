@@ -0,0 +1,402 @@
+import asyncio
+import math
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from app.config import settings
+from app.database import execute, get_supabase
+from app.services.apify_service import apify_service
+from app.services.parser_service import parse_quill_comments
+from app.services.embeddings_service import embeddings_service
+from app.services.pinecone_service import pinecone_service
+from app.services.sparse_index import sparse_index
+from app.services.gemini_service import gemini_service
+from app.services.job_manager import job_manager
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics import analysis_stage_seconds
+from app.services.resilience import resilience
+
+logger = logging.getLogger(__name__)
+
+
+class BulkManager:
+    """
+    Analyzes many videos (a channel, playlist or URL list) as one job.
+
+    Work is shared across videos wherever the providers allow it: all videos
+    are scraped in a single Apify run, and every comment goes through one
+    embeddings pass so batches are full regardless of per-video size.
+    Pinecone namespaces and Gemini analyses remain per video, but run
+    concurrently under a bounded semaphore.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Background database writes for jobs that fail before they start
+        self._writes: Set[asyncio.Task] = set()
+
+    def create_bulk_job(
+        self,
+        bulk_id: str,
+        source: str,
+        status: str = "PROCESSING",
+        user_id: Optional[str] = None
+    ):
+        """Create a new bulk job tracking entry."""
+        self.jobs[bulk_id] = {
+            "status": status,
+            "source": source,
+            "user_id": user_id,
+            "videos": [],
+            "rollup": None,
+            "error": None,
+            "cancel_reason": None
+        }
+        logger.info(f"Created bulk job {bulk_id} for {source}")
+
+    def mark_failed(self, bulk_id: str, error: str):
+        """Mark a bulk job that could not be started as failed, here and in Supabase."""
+        job = self.jobs.get(bulk_id)
+        if not job:
+            return
+        job["status"] = "FAILED"
+        job["error"] = error
+        logger.error(f"Bulk job {bulk_id} failed: {error}")
+        write = asyncio.ensure_future(self._save(bulk_id))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    def mark_cancelled(self, bulk_id: str, reason: str):
+        """Mark a bulk job as cancelled; the caller records it in Supabase."""
+        if bulk_id in self.jobs:
+            self.jobs[bulk_id]["status"] = "CANCELLED"
+            self.jobs[bulk_id]["error"] = reason
+            logger.info(f"Bulk job {bulk_id} cancelled: {reason}")
+
+    def get_bulk_status(self, bulk_id: str) -> Optional[Dict[str, Any]]:
+        """Get current status of a bulk job."""
+        return self.jobs.get(bulk_id)
+
+    def estimate_time_remaining(self, bulk_id: str) -> int:
+        """
+        Rough seconds left for a running bulk job: one expected job duration
+        per round of BULK_GEMINI_CONCURRENCY videos, minus the time spent.
+        """
+        job = self.jobs.get(bulk_id)
+        if not job or "started_at" not in job:
+            return 0
+        videos = len(job["videos"]) or job["max_videos"]
+        rounds = math.ceil(videos / max(settings.bulk_gemini_concurrency, 1))
+        expected = rounds * job_manager.expected_job_seconds(job["max_comments"])
+        return max(0, int(expected - (time.monotonic() - job["started_at"])))
+
+    def start_bulk_job(
+        self,
+        bulk_id: str,
+        urls: List[str],
+        list_url: Optional[str],
+        max_videos: int,
+        max_comments: int
+    ) -> asyncio.Task:
+        """
+        Start processing a bulk job as a cancellable task with a deadline.
+        The task is cancelled if it runs longer than BULK_DEADLINE_SECONDS.
+        """
+        self.jobs[bulk_id].update(
+            status="PROCESSING",
+            started_at=time.monotonic(),
+            max_videos=max_videos,
+            max_comments=max_comments
+        )
+        task = asyncio.create_task(
+            self.process_bulk(bulk_id, urls, list_url, max_videos, max_comments)
+        )
+        self.tasks[bulk_id] = task
+        
+        deadline = asyncio.get_running_loop().call_later(
+            settings.bulk_deadline_seconds,
+            self._cancel_task,
+            bulk_id,
+            f"Deadline of {settings.bulk_deadline_seconds}s exceeded"
+        )
+        
+        def _on_done(_):
+            deadline.cancel()
+            self.tasks.pop(bulk_id, None)
+        
+        task.add_done_callback(_on_done)
+        return task
+
+    def cancel_bulk_job(self, bulk_id: str) -> bool:
+        """
+        Cancel a running bulk job.
+
+        Returns:
+            True if a running task was cancelled, False if none was running
+        """
+        return self._cancel_task(bulk_id, "Cancelled by user")
+
+    def _cancel_task(self, bulk_id: str, reason: str) -> bool:
+        task = self.tasks.get(bulk_id)
+        if not task or task.done():
+            return False
+        if bulk_id in self.jobs:
+            self.jobs[bulk_id]["cancel_reason"] = reason
+        task.cancel()
+        return True
+
+    async def _save(self, bulk_id: str, **columns):
+        """
+        Write a bulk job's status, videos and error to its bulk_analyses row.
+        Errors are logged, not raised, so recording a failure never masks it.
+        """
+        job = self.jobs[bulk_id]
+        try:
+            await execute(get_supabase().table("bulk_analyses").update({
+                "status": job["status"],
+                "videos": job["videos"],
+                "error": job["error"],
+                **columns
+            }).eq("id", bulk_id))
+        except Exception as e:
+            logger.error(f"Error saving bulk job {bulk_id}: {str(e)}")
+
+    @loop_monitor.track("bulk_manager.process_bulk")
+    async def process_bulk(
+        self,
+        bulk_id: str,
+        urls: List[str],
+        list_url: Optional[str],
+        max_videos: int,
+        max_comments: int
+    ):
+        """
+        Orchestrate a bulk analysis. This runs as a background task.
+
+        Args:
+            bulk_id: Bulk job ID
+            urls: Explicit video URLs (may be empty when list_url is given)
+            list_url: Channel or playlist URL to expand into videos
+            max_videos: Maximum number of videos to analyze
+            max_comments: Maximum comments per video
+        """
+        job = self.jobs[bulk_id]
+        resilience.start_budget(settings.job_retry_budget)
+
+        try:
+            # The row is inserted as PENDING before the job is admitted
+            await self._save(bulk_id)
+
+            # Step 1: Resolve the video list
+            if list_url:
+                urls = urls + await apify_service.list_videos(list_url, max_videos)
+            urls = list(dict.fromkeys(urls))[:max_videos]
+            if not urls:
+                raise Exception("No videos found to analyze")
+
+            videos = [
+                {"url": url, "status": "PROCESSING", "analysis_id": None, "error": None}
+                for url in urls
+            ]
+            job["videos"] = videos
+
+            # Step 2: Scrape every video in a single actor run
+            with analysis_stage_seconds.time(stage="fetch_comments"):
+                raw_by_url = await apify_service.fetch_comments_bulk(urls, max_comments)
+
+            parsed_by_video: List[List[Dict[str, Any]]] = []
+            for video in videos:
+                parsed = parse_quill_comments(raw_by_url.get(video["url"], []))
+                if parsed:
+                    video["analysis_id"] = str(uuid.uuid4())
+                else:
+                    video["status"] = "FAILED"
+                    video["error"] = "No valid comments"
+                parsed_by_video.append(parsed)
+
+            active = [i for i, video in enumerate(videos) if video["analysis_id"]]
+            if not active:
+                raise Exception("No valid comments for any video")
+
+            # Step 3: Shared embeddings pass and per-video Gemini in parallel.
+            # With topic digests, Gemini needs the embeddings first and runs
+            # alongside the upserts instead.
+            gemini_limit = asyncio.Semaphore(settings.bulk_gemini_concurrency)
+            embeddings_by_video: Dict[int, List[List[float]]] = {}
+
+            async def analyze(i: int) -> Dict[str, Any]:
+                # Each video's analysis gets the retry budget of a single job
+                resilience.start_budget(settings.job_retry_budget)
+                embeddings = embeddings_by_video.get(i) if gemini_service.uses_digest(len(parsed_by_video[i])) else None
+                async with gemini_limit:
+                    with analysis_stage_seconds.time(stage="gemini" if embeddings is None else "gemini_digest"):
+                        return await gemini_service.analyze_with_gemini(parsed_by_video[i], embeddings=embeddings)
+
+            if settings.gemini_digest_enabled:
+                embeddings_by_video.update(await self._embed(parsed_by_video, active))
+            embeddings_result, *gemini_results = await asyncio.gather(
+                self._embed_and_upsert(videos, parsed_by_video, active, embeddings_by_video or None),
+                *(analyze(i) for i in active),
+                return_exceptions=True
+            )
+            if isinstance(embeddings_result, Exception):
+                raise embeddings_result
+
+            # Step 4: Store each video's analysis
+            completed = []
+            with analysis_stage_seconds.time(stage="store"):
+                for i, result in zip(active, gemini_results):
+                    video = videos[i]
+                    if isinstance(result, Exception):
+                        video["status"] = "FAILED"
+                        video["error"] = str(result)
+                        await pinecone_service.delete_namespace(video["analysis_id"])
+                        continue
+                    await job_manager.save_analysis(
+                        video["analysis_id"],
+                        video["url"],
+                        result,
+                        parsed_by_video[i],
+                        job.get("user_id")
+                    )
+                    video["status"] = "COMPLETED"
+                    completed.append(result)
+
+                if not completed:
+                    raise Exception("Analysis failed for every video")
+
+                # Step 5: Roll up across videos
+                job["rollup"] = build_rollup(completed)
+                job["status"] = "COMPLETED"
+                await execute(get_supabase().table("bulk_analyses").update({
+                    "status": "COMPLETED",
+                    "videos": videos,
+                    "rollup": job["rollup"],
+                    "completed_at": datetime.now().isoformat()
+                }).eq("id", bulk_id))
+
+            logger.info(f"Bulk job {bulk_id} completed: {len(completed)}/{len(videos)} videos")
+
+        except asyncio.CancelledError:
+            reason = job.get("cancel_reason") or "Cancelled"
+            self.mark_cancelled(bulk_id, reason)
+            # Videos already saved keep their analyses; the rest free their vectors
+            await self._abandon_videos(job, "CANCELLED", reason)
+            await self._save(bulk_id)
+
+        except Exception as e:
+            logger.error(f"Error processing bulk job {bulk_id}: {str(e)}")
+            job["status"] = "FAILED"
+            job["error"] = str(e)
+            await self._abandon_videos(job, "FAILED", str(e))
+            await self._save(bulk_id)
+
+    async def _abandon_videos(self, job: Dict[str, Any], status: str, error: str):
+        """Give unfinished videos a final status and delete their vectors."""
+        for video in job["videos"]:
+            if video["status"] == "PROCESSING":
+                video["status"] = status
+                video["error"] = error
+                if video["analysis_id"]:
+                    await pinecone_service.delete_namespace(video["analysis_id"])
+
+    async def _embed(
+        self,
+        parsed_by_video: List[List[Dict[str, Any]]],
+        active: List[int]
+    ) -> Dict[int, List[List[float]]]:
+        """Embed all videos' comments in shared batches; returns each video's embeddings."""
+        texts = [
+            comment["text_for_embedding"]
+            for i in active
+            for comment in parsed_by_video[i]
+        ]
+        with analysis_stage_seconds.time(stage="embeddings"):
+            embeddings = await embeddings_service.get_embeddings(texts)
+
+        by_video = {}
+        offset = 0
+        for i in active:
+            count = len(parsed_by_video[i])
+            by_video[i] = embeddings[offset:offset + count]
+            offset += count
+        return by_video
+
+    async def _embed_and_upsert(
+        self,
+        videos: List[Dict[str, Any]],
+        parsed_by_video: List[List[Dict[str, Any]]],
+        active: List[int],
+        embeddings_by_video: Optional[Dict[int, List[List[float]]]] = None
+    ):
+        """Embed all videos' comments (unless already embedded), then upsert per namespace."""
+        if embeddings_by_video is None:
+            embeddings_by_video = await self._embed(parsed_by_video, active)
+
+        upserts = [
+            pinecone_service.upsert_to_pinecone(
+                parsed_by_video[i],
+                embeddings_by_video[i],
+                videos[i]["analysis_id"]
+            )
+            for i in active
+        ]
+
+        with analysis_stage_seconds.time(stage="pinecone_upsert"):
+            await asyncio.gather(*upserts)
+        for i in active:
+            await asyncio.to_thread(sparse_index.build, videos[i]["analysis_id"])
+
+
+def build_rollup(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine per-video analyses into a channel-level summary.
+    Scores and percentages are weighted by each video's comment count.
+    """
+    total = sum(result["total_comments"] for result in results) or 1
+
+    def weighted(get) -> int:
+        return round(sum(get(result) * result["total_comments"] for result in results) / total)
+
+    def merge_topics(key: str) -> List[Dict[str, Any]]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            for topic in result.get(key, []):
+                name = topic["topic"].strip()
+                entry = merged.setdefault(name.lower(), {"topic": name, "count": 0, "comments": []})
+                entry["count"] += topic.get("count", 0)
+                entry["comments"].extend(topic.get("comments", [])[:2])
+        return sorted(merged.values(), key=lambda topic: topic["count"], reverse=True)[:10]
+
+    influencers: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for influencer in result.get("top_influencers", []):
+            entry = influencers.setdefault(influencer["username"], {**influencer, "influenceScore": 0, "engagementCount": 0})
+            entry["influenceScore"] += influencer.get("influenceScore", 0)
+            entry["engagementCount"] += influencer.get("engagementCount", 0)
+
+    return {
+        "video_count": len(results),
+        "total_comments": sum(result["total_comments"] for result in results),
+        "sentiment_score": weighted(lambda result: result["sentiment_score"]),
+        "lead_percentage": weighted(lambda result: result["lead_percentage"]),
+        "sentiment_breakdown": {
+            key: weighted(lambda result: result["sentiment_breakdown"].get(key, 0))
+            for key in ("positive", "neutral", "negative")
+        },
+        "top_feedback_topics": merge_topics("top_feedback_topics"),
+        "top_discussed_topics": merge_topics("top_discussed_topics"),
+        "top_influencers": sorted(
+            influencers.values(),
+            key=lambda influencer: influencer["influenceScore"],
+            reverse=True
+        )[:10],
+        "total_leads": sum(len(result.get("leads", [])) for result in results)
+    }
+
+
+# Singleton instance
+bulk_manager = BulkManager()
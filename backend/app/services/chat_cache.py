@@ -0,0 +1,123 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+
+
+class _Bucket:
+    """Cached answers for one (analysis_id, model) pair."""
+
+    def __init__(self, dimensions: int, capacity: int):
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self.answers: List[str] = []
+        self.created_at: List[float] = []
+        self.capacity = capacity
+
+    def add(self, vector: np.ndarray, answer: str):
+        if len(self.answers) >= self.capacity:
+            # Drop the oldest entry
+            self.vectors = self.vectors[1:]
+            self.answers.pop(0)
+            self.created_at.pop(0)
+        self.vectors = np.vstack([self.vectors, vector[None, :]])
+        self.answers.append(answer)
+        self.created_at.append(time.monotonic())
+
+    def expire(self, ttl: float):
+        cutoff = time.monotonic() - ttl
+        keep = [i for i, created in enumerate(self.created_at) if created >= cutoff]
+        if len(keep) != len(self.answers):
+            self.vectors = self.vectors[keep]
+            self.answers = [self.answers[i] for i in keep]
+            self.created_at = [self.created_at[i] for i in keep]
+
+
+class SemanticChatCache:
+    """
+    Maps question embeddings to previous chat answers per analysis and model.
+
+    A question hits when its cosine similarity to a cached question is at
+    least CHAT_CACHE_SIMILARITY. Entries expire after CHAT_CACHE_TTL_SECONDS;
+    each analysis keeps at most CHAT_CACHE_MAX_ENTRIES answers and the least
+    recently used analyses are evicted beyond CHAT_CACHE_MAX_ANALYSES.
+    """
+
+    def __init__(self):
+        self.threshold = settings.chat_cache_similarity
+        self.ttl = settings.chat_cache_ttl_seconds
+        self.max_entries = settings.chat_cache_max_entries
+        self.max_analyses = settings.chat_cache_max_analyses
+        self._buckets: "OrderedDict[CacheKey, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, analysis_id: str, model: str, embedding: List[float]) -> Optional[str]:
+        """
+        Return a cached answer for a semantically equivalent question.
+
+        Args:
+            analysis_id: Analysis the question is about
+            model: Chat model that produced the answer
+            embedding: Embedding of the new question
+
+        Returns:
+            Cached answer, or None on a miss
+        """
+        answer = None
+        with self._lock:
+            bucket = self._buckets.get((analysis_id, model))
+            if bucket:
+                self._buckets.move_to_end((analysis_id, model))
+                bucket.expire(self.ttl)
+                if bucket.answers:
+                    similarities = bucket.vectors @ self._normalize(embedding)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        answer = bucket.answers[best]
+
+        record_cache_lookup("chat_semantic", answer is not None)
+        return answer
+
+    def store(self, analysis_id: str, model: str, embedding: List[float], answer: str):
+        """Cache an answer for a question embedding."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            key = (analysis_id, model)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(vector.shape[0], self.max_entries)
+                self._buckets[key] = bucket
+                while len(self._buckets) > self.max_analyses:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            bucket.add(vector, answer)
+
+    def invalidate(self, analysis_id: str):
+        """Drop all cached answers for an analysis, e.g. after it is recomputed."""
+        with self._lock:
+            for key in [key for key in self._buckets if key[0] == analysis_id]:
+                del self._buckets[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "analyses": len(self._buckets),
+                "entries": sum(len(bucket.answers) for bucket in self._buckets.values())
+            }
+
+
+# Singleton instance
+chat_cache = SemanticChatCache()
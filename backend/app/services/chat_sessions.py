@@ -0,0 +1,176 @@
+import asyncio
+import time
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.services.context_assembler import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# (user message, assistant answer)
+Turn = Tuple[str, str]
+
+# Folds turns into the previous summary and returns the new summary
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+# Appended to turn text shortened to fit the history budget
+TRUNCATED = " [...]"
+
+
+def _turn_tokens(turn: Turn) -> int:
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+def _shorten(text: str, tokens: int) -> str:
+    """Cut text to at most `tokens` estimated tokens, marking the cut."""
+    if estimate_tokens(text) <= tokens:
+        return text
+    keep = tokens * CHARS_PER_TOKEN - len(TRUNCATED)
+    return text[:keep] + TRUNCATED if keep > 0 else ""
+
+
+class ChatSession:
+    """Conversation state for one chat about one analysis."""
+
+    def __init__(self, session_id: str, analysis_id: str):
+        self.session_id = session_id
+        self.analysis_id = analysis_id
+        self.summary = ""
+        self.turns: List[Turn] = []
+        # Retrieved context from the last RAG turn, reused while the topic holds
+        self.context = ""
+        self.context_embedding: Optional[np.ndarray] = None
+        self.last_used = time.monotonic()
+        self.compacting: Optional[asyncio.Task] = None
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(
+            estimate_tokens(question) + estimate_tokens(answer)
+            for question, answer in self.turns
+        )
+
+
+class ChatSessionStore:
+    """
+    Server-side chat sessions with bounded memory.
+
+    Each session keeps a rolling summary plus the most recent turns. Once
+    the history exceeds CHAT_SESSION_MAX_HISTORY_TOKENS, older turns are
+    folded into the summary in the background, so prompt size stays flat
+    however long the conversation runs. The recent turns themselves are
+    shortened, oldest first, to fit the budget left after the summary. Idle sessions expire after
+    CHAT_SESSION_TTL_SECONDS and the store holds at most
+    CHAT_SESSION_MAX_SESSIONS.
+    """
+
+    def __init__(self):
+        self.max_history_tokens = settings.chat_session_max_history_tokens
+        self.recent_turns = settings.chat_session_recent_turns
+        self.summary_tokens = settings.chat_session_summary_tokens
+        self.topic_similarity = settings.chat_session_topic_similarity
+        self.ttl = settings.chat_session_ttl_seconds
+        self.max_sessions = settings.chat_session_max_sessions
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str], analysis_id: str) -> ChatSession:
+        """
+        Return the session for session_id, or start a new one.
+
+        An unknown, expired or other-analysis session_id starts a fresh session.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session and (session.analysis_id != analysis_id or now - session.last_used > self.ttl):
+                del self._sessions[session_id]
+                session = None
+
+            if session is None:
+                session = ChatSession(str(uuid.uuid4()), analysis_id)
+                self._sessions[session.session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+            session.last_used = now
+            self._sessions.move_to_end(session.session_id)
+            return session
+
+    def reusable_context(self, session: ChatSession, query_embedding: List[float]) -> Optional[str]:
+        """Return the session's last retrieved context if the question is on the same topic."""
+        if session.context_embedding is None:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or float(session.context_embedding @ (query / norm)) < self.topic_similarity:
+            return None
+        return session.context
+
+    def remember_context(self, session: ChatSession, query_embedding: List[float], context: str):
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        session.context = context
+        session.context_embedding = vector / norm if norm else None
+
+    def record_turn(self, session: ChatSession, message: str, answer: str, summarize: Summarizer):
+        """
+        Append a turn and, if the history is over budget, compact it in the background.
+
+        Args:
+            session: Session the turn belongs to
+            message: User's message
+            answer: Assistant's answer
+            summarize: Folds old turns into the summary
+        """
+        session.turns.append((message, answer))
+        self._fit_recent(session)
+        if (
+            session.history_tokens() > self.max_history_tokens
+            and len(session.turns) > self.recent_turns
+            and (session.compacting is None or session.compacting.done())
+        ):
+            session.compacting = asyncio.create_task(self._compact(session, summarize))
+
+    def _fit_recent(self, session: ChatSession):
+        """
+        Shorten the recent turns, oldest first and answers before questions,
+        until they fit in CHAT_SESSION_MAX_HISTORY_TOKENS less the summary's
+        share, so a few long answers cannot keep the history over budget.
+        """
+        budget = max(self.max_history_tokens - self.summary_tokens, 0)
+        start = max(len(session.turns) - self.recent_turns, 0)
+        excess = sum(_turn_tokens(turn) for turn in session.turns[start:]) - budget
+        for i in range(start, len(session.turns)):
+            if excess <= 0:
+                break
+            question, answer = session.turns[i]
+            shorter_answer = _shorten(answer, max(estimate_tokens(answer) - excess, 0))
+            excess -= estimate_tokens(answer) - estimate_tokens(shorter_answer)
+            shorter_question = _shorten(question, max(estimate_tokens(question) - max(excess, 0), 0))
+            excess -= estimate_tokens(question) - estimate_tokens(shorter_question)
+            session.turns[i] = (shorter_question, shorter_answer)
+
+    async def _compact(self, session: ChatSession, summarize: Summarizer):
+        # Turns are only ever appended, so the oldest ones stay at the front
+        fold = session.turns[:len(session.turns) - self.recent_turns]
+        try:
+            summary = await summarize(session.summary, fold)
+        except Exception as e:
+            # Fall back to dropping the oldest turns so history stays bounded
+            logger.error(f"Error summarizing chat session {session.session_id}: {str(e)}")
+            summary = session.summary
+        session.summary = summary
+        del session.turns[:len(fold)]
+        logger.info(f"Compacted chat session {session.session_id}: folded {len(fold)} turns")
+
+
+# Singleton instance
+chat_session_store = ChatSessionStore()
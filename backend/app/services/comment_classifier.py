@@ -0,0 +1,330 @@
+import asyncio
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.services.embeddings_service import embeddings_service
+
+logger = logging.getLogger(__name__)
+
+SENTIMENTS = ("positive", "neutral", "negative")
+LEAD_CLASSES = ("none", "lead")
+
+# Temperatures searched when calibrating a head
+TEMPERATURES = np.geomspace(0.05, 20.0, 100)
+# Share of the labelled sample held out to calibrate temperatures and the lead threshold
+CALIBRATION_SHARE = 0.2
+# Full-batch gradient descent for the logistic heads
+TRAINING_EPOCHS = 500
+LEARNING_RATE = 2.0
+L2_PENALTY = 1e-4
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def fit_temperature(logits: np.ndarray, labels: np.ndarray) -> float:
+    """
+    Temperature scaling: the temperature minimizing the negative
+    log-likelihood of the labels under softmax(logits / temperature).
+    """
+    rows = np.arange(len(labels))
+    losses = [
+        -np.mean(np.log(_softmax(logits / temperature)[rows, labels] + 1e-12))
+        for temperature in TEMPERATURES
+    ]
+    return float(TEMPERATURES[int(np.argmin(losses))])
+
+
+def fit_softmax(vectors: np.ndarray, labels: np.ndarray, classes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Multinomial logistic regression with an L2 penalty on the weights.
+
+    The bias starts at the log class prior of the labels and is learned,
+    so class frequencies in the training sample carry into predictions.
+
+    Returns:
+        (weights of shape (classes, dimension), bias of shape (classes,))
+    """
+    counts = np.bincount(labels, minlength=classes).astype(np.float64)
+    weights = np.zeros((classes, vectors.shape[1]), dtype=np.float64)
+    bias = np.log((counts + 1) / (counts.sum() + classes))
+    targets = np.eye(classes)[labels]
+    for _ in range(TRAINING_EPOCHS):
+        error = (_softmax(vectors @ weights.T + bias) - targets) / len(labels)
+        weights -= LEARNING_RATE * (error.T @ vectors + L2_PENALTY * weights)
+        bias -= LEARNING_RATE * error.sum(axis=0)
+    return weights.astype(np.float32), bias.astype(np.float32)
+
+
+def fit_lead_threshold(probabilities: np.ndarray, labels: np.ndarray) -> float:
+    """
+    Lead probability from which a comment counts as a lead: the cut that
+    maximizes F1 on the calibration sample (0.5 without any leads in it).
+    """
+    if not labels.any():
+        return 0.5
+    best, best_f1 = 0.5, -1.0
+    for threshold in np.unique(probabilities):
+        predicted = probabilities >= threshold
+        true_positives = np.sum(predicted & (labels == 1))
+        f1 = 2 * true_positives / (predicted.sum() + labels.sum())
+        if f1 > best_f1:
+            best, best_f1 = float(threshold), f1
+    return best
+
+
+def _split(labels: np.ndarray, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Stratified random train / calibration split of sample indices."""
+    rng = np.random.default_rng(seed)
+    train, calibration = [], []
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        held_out = int(round(len(members) * CALIBRATION_SHARE))
+        calibration.extend(members[:held_out])
+        train.extend(members[held_out:])
+    return np.array(sorted(train)), np.array(sorted(calibration))
+
+
+def train(
+    embeddings: List[List[float]],
+    sentiments: List[str],
+    leads: List[bool],
+    embedding_model: str,
+    seed: int = 0
+) -> Dict[str, np.ndarray]:
+    """
+    Train both heads on a labelled, representative sample of comments.
+
+    CALIBRATION_SHARE of the sample is held out: each head's temperature
+    and the lead threshold are fitted on it, after training on the rest.
+
+    Args:
+        embeddings: Embedding of each labelled comment
+        sentiments: Sentiment label of each comment
+        leads: Whether each comment shows buying intent
+        embedding_model: Model the embeddings come from
+        seed: Seed of the train / calibration split
+
+    Returns:
+        Arrays for a weights file, plus held-out metrics under "metric_*"
+    """
+    vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+    labels = {
+        "sentiment": np.array([SENTIMENTS.index(label) for label in sentiments]),
+        "lead": np.array([int(bool(lead)) for lead in leads])
+    }
+    # Stratify on both heads' labels so the held-out sample keeps the lead share
+    train_rows, calibration_rows = _split(labels["sentiment"] * 2 + labels["lead"], seed)
+
+    arrays = {"embedding_model": np.array(embedding_model)}
+    for head, classes in (("sentiment", SENTIMENTS), ("lead", LEAD_CLASSES)):
+        weights, bias = fit_softmax(vectors[train_rows], labels[head][train_rows], len(classes))
+        logits = vectors[calibration_rows] @ weights.T + bias
+        temperature = fit_temperature(logits, labels[head][calibration_rows])
+        arrays.update({
+            f"{head}_weights": weights,
+            f"{head}_bias": bias,
+            f"{head}_temperature": np.array(temperature)
+        })
+        if head == "lead":
+            probabilities = _softmax(logits / temperature)[:, 1]
+            arrays["lead_threshold"] = np.array(fit_lead_threshold(probabilities, labels["lead"][calibration_rows]))
+            predicted = probabilities >= arrays["lead_threshold"]
+            actual = labels["lead"][calibration_rows] == 1
+            arrays["metric_lead_precision"] = np.array(np.sum(predicted & actual) / max(1, predicted.sum()))
+            arrays["metric_lead_recall"] = np.array(np.sum(predicted & actual) / max(1, actual.sum()))
+        else:
+            arrays["metric_sentiment_accuracy"] = np.array(
+                np.mean(np.argmax(logits, axis=1) == labels[head][calibration_rows])
+            )
+    arrays["metric_calibration_samples"] = np.array(len(calibration_rows))
+    return arrays
+
+
+def save_weights(path: str, arrays: Dict[str, np.ndarray]):
+    """Write a weights file atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # np.savez appends .npz to names without it, so write through a file object
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+class _Head:
+    """Softmax linear model: softmax((x @ weights.T + bias) / temperature)."""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, temperature: float):
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.temperature = temperature
+
+    def logits(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors @ self.weights.T + self.bias
+
+    def probabilities(self, vectors: np.ndarray) -> np.ndarray:
+        return _softmax(self.logits(vectors) / self.temperature)
+
+
+class CommentClassifier:
+    """
+    Local sentiment and lead-intent classifier over comment embeddings.
+
+    Two softmax linear heads (sentiment: positive/neutral/negative; lead:
+    none/lead) score every comment with one matrix product. The weights,
+    temperatures and lead threshold are trained offline on a labelled,
+    representative comment sample (tools/train_classifier.py) and deployed
+    at CLASSIFIER_WEIGHTS_PATH. No weights file is in the repository, so
+    the classifier is unavailable until one is trained. The file is read once
+    and never written by the service, so concurrent jobs always score with
+    the same model.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.classifier_weights_path
+        self._heads: Optional[Dict[str, _Head]] = None
+        self.lead_threshold = 0.5
+        self._missing_logged = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_ready(self) -> bool:
+        """
+        Load the shipped weights.
+
+        Returns:
+            Whether the classifier can score comments
+        """
+        if not settings.classifier_enabled:
+            return False
+        if self._heads:
+            return True
+        async with self._lock:
+            if self._heads:
+                return True
+            try:
+                return await asyncio.to_thread(self._load)
+            except Exception as e:
+                logger.error(f"Error loading comment classifier: {str(e)}")
+                return False
+
+    def _load(self) -> bool:
+        if not os.path.exists(self.path):
+            if not self._missing_logged:
+                logger.warning(f"No comment classifier weights at {self.path}; Gemini estimates sentiment and leads")
+                self._missing_logged = True
+            return False
+        with np.load(self.path) as data:
+            if str(data["embedding_model"]) != embeddings_service.model:
+                logger.warning(f"Ignoring classifier weights for {data['embedding_model']}")
+                return False
+            heads = {
+                head: _Head(data[f"{head}_weights"], data[f"{head}_bias"], float(data[f"{head}_temperature"]))
+                for head in ("sentiment", "lead")
+            }
+            self.lead_threshold = float(data["lead_threshold"])
+        self._heads = heads
+        logger.info(f"Loaded comment classifier weights from {self.path} (lead threshold {self.lead_threshold:.3f})")
+        return True
+
+    def score(self, embeddings: List[List[float]]) -> Dict[str, np.ndarray]:
+        """
+        Score comments in one vectorized pass.
+
+        Args:
+            embeddings: Embedding of each comment
+
+        Returns:
+            "sentiment": (n, 3) positive/neutral/negative probabilities and
+            "lead": (n,) probability of buying intent
+        """
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        return {
+            "sentiment": self._heads["sentiment"].probabilities(vectors),
+            "lead": self._heads["lead"].probabilities(vectors)[:, 1]
+        }
+
+    def review_candidates(self, comments: List[Dict[str, Any]], scores: Dict[str, np.ndarray]) -> List[int]:
+        """
+        Pick the comments Gemini should label: uncertain sentiment or a
+        possible lead, most uncertain and most engaged first.
+
+        Returns:
+            Indices of at most CLASSIFIER_MAX_REVIEWS comments
+        """
+        confidence = scores["sentiment"].max(axis=1)
+        lead = scores["lead"]
+        candidates = np.flatnonzero(
+            (confidence < settings.classifier_confidence)
+            | (lead >= min(settings.classifier_lead_review_min, self.lead_threshold))
+        )
+        engagement = np.array([comments[i]["voteCount"] + comments[i]["replyCount"] for i in candidates])
+        priority = ((1 - confidence[candidates]) + lead[candidates]) * (1 + np.log1p(np.maximum(engagement, 0)))
+        return candidates[np.argsort(-priority, kind="stable")][:settings.classifier_max_reviews].tolist()
+
+    def parse_reviews(self, reviews: List[Dict[str, Any]], review_ids: Dict[str, int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Read Gemini's reviews.
+
+        Args:
+            reviews: "reviews" entries of Gemini's response
+            review_ids: Review reference in the prompt -> comment index
+
+        Returns:
+            Comment index -> {"sentiment": label, "lead": bool}, for valid reviews
+        """
+        parsed = {}
+        for review in reviews:
+            if not isinstance(review, dict):
+                continue
+            index = review_ids.get(str(review.get("comment", "")).strip("[]"))
+            sentiment = str(review.get("sentiment", "")).lower()
+            if index is None or sentiment not in SENTIMENTS:
+                continue
+            lead = review.get("lead")
+            parsed[index] = {
+                "sentiment": sentiment,
+                "lead": lead is True or str(lead).lower() in ("true", "yes", "1")
+            }
+        return parsed
+
+    def apply(self, scores: Dict[str, np.ndarray], reviews: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Final per-comment labels: the classifier's, overridden by reviews.
+
+        Returns:
+            "sentiment": label per comment, "lead": buying intent per comment,
+            "lead_probability": lead probability (1 or 0 once reviewed) and
+            "positivity": 0.0-1.0 sentiment per comment
+        """
+        probabilities = scores["sentiment"]
+        sentiment = [SENTIMENTS[label] for label in np.argmax(probabilities, axis=1)]
+        positivity = probabilities[:, 0] + probabilities[:, 1] / 2
+        lead_probability = scores["lead"].copy()
+
+        for index, review in reviews.items():
+            sentiment[index] = review["sentiment"]
+            positivity[index] = {"positive": 1.0, "neutral": 0.5, "negative": 0.0}[review["sentiment"]]
+            lead_probability[index] = 1.0 if review["lead"] else 0.0
+
+        return {
+            "sentiment": sentiment,
+            "lead": (lead_probability >= self.lead_threshold).tolist(),
+            "lead_probability": lead_probability,
+            "positivity": positivity
+        }
+
+
+# Singleton instance
+comment_classifier = CommentClassifier()
@@ -0,0 +1,306 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QCS1"
+# Magic, then the length of the JSON column directory that follows
+PREAMBLE = struct.Struct("<4sI")
+FILE_SUFFIX = ".qcs"
+
+# Columns stored per comment, in parsed-comment field names
+STRING_COLUMNS = ("id", "author", "comment", "date")
+INT_COLUMNS = ("voteCount", "replyCount")
+
+# (inode, mtime_ns) of a segment file, identifying one version of it
+FileVersion = Tuple[int, int]
+
+
+def published_timestamp(day: Optional[str]) -> int:
+    """Unix time of a comment's "YYYY-MM-DD" date, or 0 if it cannot be parsed."""
+    try:
+        return int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def _encode(rows: List[Dict[str, Any]]) -> bytes:
+    """
+    Encode comments as one columnar segment.
+
+    Rows are sorted by id. Each string column is an offset index of
+    count + 1 little-endian uint32s followed by the UTF-8 values; each
+    integer column is count little-endian int64s. The JSON directory in the
+    preamble gives every column's offset from the end of the directory.
+    """
+    rows = sorted(rows, key=lambda row: row["id"])
+    columns = {}
+    sections = []
+    position = 0
+
+    for name in STRING_COLUMNS:
+        values = [str(row.get(name) or "").encode("utf-8") for row in rows]
+        offsets = [0]
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        sections.append(struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(values))
+        columns[name] = {"kind": "str", "offset": position}
+        position += len(sections[-1])
+
+    for name in INT_COLUMNS:
+        sections.append(struct.pack(f"<{len(rows)}q", *(int(row.get(name) or 0) for row in rows)))
+        columns[name] = {"kind": "int", "offset": position}
+        position += len(sections[-1])
+
+    directory = json.dumps({"count": len(rows), "columns": columns}).encode("utf-8")
+    return PREAMBLE.pack(MAGIC, len(directory)) + directory + b"".join(sections)
+
+
+class _Segment:
+    """Reads rows out of a mapped segment without decoding the whole file."""
+
+    def __init__(self, buffer: mmap.mmap):
+        magic, directory_length = PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a comment store segment")
+        directory = json.loads(buffer[PREAMBLE.size:PREAMBLE.size + directory_length])
+        self.buffer = buffer
+        self.count = directory["count"]
+        self.body = PREAMBLE.size + directory_length
+        self.columns = directory["columns"]
+
+    def _string_base(self, name: str) -> Tuple[int, int]:
+        base = self.body + self.columns[name]["offset"]
+        return base, base + 4 * (self.count + 1)
+
+    def string(self, name: str, row: int) -> str:
+        base, values = self._string_base(name)
+        start, end = struct.unpack_from("<2I", self.buffer, base + 4 * row)
+        return self.buffer[values + start:values + end].decode("utf-8")
+
+    def integer(self, name: str, row: int) -> int:
+        return struct.unpack_from("<q", self.buffer, self.body + self.columns[name]["offset"] + 8 * row)[0]
+
+    def strings(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Decode a string column, or the rows [start, stop) of it."""
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return []
+        base, values = self._string_base(name)
+        offsets = struct.unpack_from(f"<{stop - start + 1}I", self.buffer, base + 4 * start)
+        data = self.buffer[values + offsets[0]:values + offsets[-1]]
+        first = offsets[0]
+        return [data[offsets[i] - first:offsets[i + 1] - first].decode("utf-8") for i in range(stop - start)]
+
+    def integers(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        """Decode an integer column, or the rows [start, stop) of it."""
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return []
+        return list(struct.unpack_from(
+            f"<{stop - start}q", self.buffer, self.body + self.columns[name]["offset"] + 8 * start
+        ))
+
+    def row(self, row: int) -> Dict[str, Any]:
+        return {
+            **{name: self.string(name, row) for name in STRING_COLUMNS},
+            **{name: self.integer(name, row) for name in INT_COLUMNS}
+        }
+
+
+class CommentStore:
+    """
+    Local columnar store of comment documents, one segment file per analysis.
+
+    Pinecone vectors only carry numeric filter fields; the text, author and
+    date of matched comments are read back from here by (analysis_id,
+    comment id) in one batched read. Each segment is written whole and
+    swapped in atomically, so readers never see a partial file. The id ->
+    row index of recently read segments is cached in memory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, index_cache_entries: Optional[int] = None):
+        self.directory = directory or settings.comment_store_dir
+        self.index_cache_entries = index_cache_entries or settings.comment_store_index_cache_entries
+        os.makedirs(self.directory, exist_ok=True)
+        # analysis_id -> (file version, comment id -> row)
+        self._indexes: "OrderedDict[str, Tuple[FileVersion, Dict[str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _path(self, analysis_id: str) -> str:
+        return os.path.join(self.directory, f"{analysis_id}{FILE_SUFFIX}")
+
+    def _index(self, analysis_id: str, version: FileVersion, segment: _Segment) -> Dict[str, int]:
+        with self._lock:
+            cached = self._indexes.get(analysis_id)
+            if cached and cached[0] == version:
+                self._indexes.move_to_end(analysis_id)
+                return cached[1]
+
+        index = {comment_id: row for row, comment_id in enumerate(segment.strings("id"))}
+        with self._lock:
+            self._indexes[analysis_id] = (version, index)
+            self._indexes.move_to_end(analysis_id)
+            while len(self._indexes) > self.index_cache_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def get(self, analysis_id: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Read the documents of several comments of an analysis.
+
+        Args:
+            analysis_id: Analysis the comments belong to
+            ids: Comment IDs
+
+        Returns:
+            Comment ID -> document, for the IDs that are stored
+        """
+        try:
+            with open(self._path(analysis_id), "rb") as f:
+                stat = os.fstat(f.fileno())
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    segment = _Segment(buffer)
+                    index = self._index(analysis_id, (stat.st_ino, stat.st_mtime_ns), segment)
+                    return {
+                        comment_id: segment.row(index[comment_id])
+                        for comment_id in ids
+                        if comment_id in index
+                    }
+        except FileNotFoundError:
+            return {}
+
+    def scan(self, analysis_id: str, chunk_rows: int) -> Optional[Iterator[Dict[str, List[Any]]]]:
+        """
+        Read an analysis's comments column by column, chunk_rows rows at a time.
+
+        The segment is opened before returning, so the scan reads one
+        version of it even if the analysis is re-indexed meanwhile. Close
+        the iterator to release the file early.
+
+        Args:
+            analysis_id: Analysis to read
+            chunk_rows: Rows per chunk
+
+        Returns:
+            Iterator of column name -> values chunks in id order, or None
+            when the analysis has no stored comments
+        """
+        try:
+            f = open(self._path(analysis_id), "rb")
+        except FileNotFoundError:
+            return None
+        return self._scan(f, chunk_rows)
+
+    def _scan(self, f, chunk_rows: int) -> Iterator[Dict[str, List[Any]]]:
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            segment = _Segment(buffer)
+            for start in range(0, segment.count, chunk_rows):
+                stop = start + chunk_rows
+                yield {
+                    **{name: segment.strings(name, start, stop) for name in STRING_COLUMNS},
+                    **{name: segment.integers(name, start, stop) for name in INT_COLUMNS}
+                }
+
+    def _read_all(self, analysis_id: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._path(analysis_id), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    segment = _Segment(buffer)
+                    return {row["id"]: row for row in map(segment.row, range(segment.count))}
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, analysis_id: str, rows: Dict[str, Dict[str, Any]]):
+        path = self._path(analysis_id)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(_encode(list(rows.values())))
+        os.replace(temporary, path)
+
+    def put(self, analysis_id: str, comments: List[Dict[str, Any]]):
+        """
+        Store parsed comments, replacing stored comments with the same IDs.
+
+        The whole segment is read, merged and rewritten on every call, so
+        callers should store an analysis's comments in one call rather than
+        per batch; repeated puts to a large analysis cost quadratic I/O.
+
+        Args:
+            analysis_id: Analysis the comments belong to
+            comments: Parsed comment objects
+        """
+        with self._write_lock:
+            rows = self._read_all(analysis_id)
+            for comment in comments:
+                if not comment["id"]:
+                    continue
+                rows[comment["id"]] = {name: comment.get(name) for name in STRING_COLUMNS + INT_COLUMNS}
+            self._write(analysis_id, rows)
+        logger.info(f"Stored {len(comments)} comment documents for analysis {analysis_id}")
+
+    def delete(self, analysis_id: str, ids: List[str]):
+        """Remove comments from an analysis's segment."""
+        with self._write_lock:
+            rows = self._read_all(analysis_id)
+            for comment_id in ids:
+                rows.pop(comment_id, None)
+            self._write(analysis_id, rows)
+
+    def drop(self, analysis_id: str):
+        """Remove an analysis's segment."""
+        with self._lock:
+            self._indexes.pop(analysis_id, None)
+        try:
+            os.remove(self._path(analysis_id))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, keep: Set[str], min_age_seconds: float) -> List[str]:
+        """
+        Drop segments of analyses not in keep that are older than min_age_seconds.
+
+        Returns:
+            Analysis IDs whose segments were dropped
+        """
+        dropped = []
+        cutoff = time.time() - min_age_seconds
+        for name in os.listdir(self.directory):
+            analysis_id, suffix = os.path.splitext(name)
+            if suffix != FILE_SUFFIX or analysis_id in keep:
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.drop(analysis_id)
+            dropped.append(analysis_id)
+        return dropped
+
+    def exists(self, analysis_id: str) -> bool:
+        """
+        Whether an analysis has stored comments. Analyses indexed before the
+        store existed have none; their vectors carry text and a date string.
+        """
+        return os.path.exists(self._path(analysis_id))
+
+    def size_bytes(self, analysis_id: str) -> int:
+        try:
+            return os.path.getsize(self._path(analysis_id))
+        except FileNotFoundError:
+            return 0
+
+
+# Singleton instance
+comment_store = CommentStore()
@@ -0,0 +1,139 @@
+import logging
+from typing import Any, Dict, List
+import numpy as np
+from app.config import settings
+from app.services.metrics import chat_context_tokens
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate for English comment text; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+# Token budget for retrieved comments in one chat prompt, per chat model
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-4o": 1200,
+    "gemini-2.0-flash-exp": 2000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1200
+
+CONTEXT_HEADER = "Relevant comments from the analysis:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContextAssembler:
+    """
+    Builds the chat prompt context from an over-fetched set of Pinecone matches.
+
+    Matches are de-duplicated (near-identical vectors or text), ordered by
+    maximal marginal relevance so the context covers different viewpoints
+    instead of ten rephrasings of the same comment, and packed into the
+    chat model's token budget.
+    """
+
+    def __init__(self):
+        self.dedupe_similarity = settings.chat_context_dedupe_similarity
+        self.mmr_lambda = settings.chat_context_mmr_lambda
+        self.max_comment_chars = settings.chat_context_max_comment_chars
+
+    def assemble(self, query_embedding: List[float], matches: List[Dict[str, Any]], model: str) -> str:
+        """
+        Select and format comments for a chat prompt.
+
+        Args:
+            query_embedding: Embedding of the user's question
+            matches: Pinecone matches, ideally with "values"
+            model: Chat model the context is for
+
+        Returns:
+            Context string within the model's token budget
+        """
+        budget = CONTEXT_TOKEN_BUDGETS.get(model, DEFAULT_CONTEXT_TOKEN_BUDGET)
+        used = estimate_tokens(CONTEXT_HEADER)
+        lines = [CONTEXT_HEADER]
+
+        for match in self.select(query_embedding, matches):
+            entry = self._format(len(lines), match["metadata"])
+            cost = estimate_tokens(entry)
+            if used + cost > budget:
+                # A shorter comment further down may still fit
+                continue
+            lines.append(entry)
+            used += cost
+
+        chat_context_tokens.observe(used, model=model)
+        logger.info(f"Assembled chat context: {len(lines) - 1}/{len(matches)} comments, ~{used} tokens")
+        return "\n".join(lines)
+
+    def select(self, query_embedding: List[float], matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop near-duplicates and order the remaining matches by MMR.
+
+        Falls back to Pinecone score order (still removing exact duplicate
+        text) when vectors were not returned.
+        """
+        if not matches:
+            return []
+        if any(not match.get("values") for match in matches):
+            return self._dedupe_text(sorted(matches, key=lambda match: match["score"], reverse=True))
+
+        vectors = self._normalize(np.asarray([match["values"] for match in matches], dtype=np.float32))
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+
+        selected: List[int] = []
+        remaining = list(range(len(matches)))
+        seen_text = set()
+        # Highest similarity of each candidate to anything already selected
+        redundancy = np.full(len(matches), -1.0, dtype=np.float32)
+
+        while remaining:
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * np.maximum(redundancy[remaining], 0)
+            best = remaining.pop(int(np.argmax(scores)))
+
+            text = self._text_key(matches[best])
+            if redundancy[best] >= self.dedupe_similarity or text in seen_text:
+                continue
+
+            selected.append(best)
+            seen_text.add(text)
+            redundancy = np.maximum(redundancy, similarity[best])
+
+        return [matches[i] for i in selected]
+
+    def _format(self, position: int, metadata: Dict[str, Any]) -> str:
+        text = metadata["comment_text"]
+        if len(text) > self.max_comment_chars:
+            text = text[:self.max_comment_chars].rsplit(" ", 1)[0] + "…"
+        return (
+            f"{position}. @{metadata['author']} (Likes: {metadata['voteCount']}, Replies: {metadata['replyCount']})\n"
+            f"   {text}\n"
+            f"   Date: {metadata['date']}\n"
+        )
+
+    def _dedupe_text(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        seen = set()
+        unique = []
+        for match in matches:
+            key = self._text_key(match)
+            if key not in seen:
+                seen.add(key)
+                unique.append(match)
+        return unique
+
+    @staticmethod
+    def _text_key(match: Dict[str, Any]) -> str:
+        return " ".join(match["metadata"]["comment_text"].lower().split())
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+# Singleton instance
+context_assembler = ContextAssembler()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+from app.services.resilience import is_retryable
+
+logger = logging.getLogger(__name__)
+
+# Sends one embeddings request for a list of texts
+SendBatch = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingBatcher:
+    """
+    Process-wide micro-batcher for embedding requests.
+
+    Texts from all concurrent callers are collected for up to `max_wait_ms`
+    or until `max_batch` texts are pending, sent as one combined request,
+    and each caller gets back exactly the vectors for its own texts. Texts
+    are validated before they are queued, and a batch rejected as a client
+    error is retried one text at a time, so one caller's bad input does not
+    fail the others.
+    """
+
+    def __init__(
+        self,
+        send: SendBatch,
+        max_batch: int = 100,
+        max_wait_ms: int = 5,
+        max_in_flight: int = 4
+    ):
+        self.send = send
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, sharing the request with other concurrent callers.
+
+        Args:
+            texts: Text strings to embed
+
+        Returns:
+            One embedding vector per input text, in order
+
+        Raises:
+            ValueError: If a text is empty or not a string
+        """
+        if not texts:
+            return []
+        for text in texts:
+            if not isinstance(text, str) or not text.strip():
+                raise ValueError("Cannot embed an empty text")
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+
+        while len(self._pending) >= self.max_batch:
+            self._flush()
+
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self):
+        """Send up to one full batch of pending texts."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        # Skip texts whose caller has gone away
+        self._pending = [(text, future) for text, future in self._pending if not future.done()]
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        if batch:
+            asyncio.create_task(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        try:
+            async with self._semaphore:
+                embeddings = await self.send([text for text, _ in batch])
+        except Exception as e:
+            if len(batch) > 1 and not is_retryable(e):
+                # Transient errors were already retried; a client error may
+                # come from a single text, so find it by sending each alone
+                logger.warning(f"Embedding batch of {len(batch)} texts rejected, retrying one by one: {str(e)}")
+                await asyncio.gather(*(self._send([item]) for item in batch if not item[1].done()))
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+        if len(embeddings) < len(batch):
+            error = Exception(f"Embeddings response has {len(embeddings)} vectors for {len(batch)} texts")
+            for _, future in batch[len(embeddings):]:
+                if not future.done():
+                    future.set_exception(error)
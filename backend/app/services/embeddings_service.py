@@ -1,5 +1,9 @@
-from openai import OpenAI
 from app.config import settings
+from app.services.loop_monitor import loop_monitor
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.metrics import embedding_batch_seconds, embedding_texts_total, record_llm_usage
+from app.services.openai_clients import openai_client
+from app.services.resilience import CircuitOpenError, resilience
 import logging
 from typing import List, Callable, Optional
 import asyncio
@@ -9,10 +13,18 @@ logger = logging.getLogger(__name__)
 
 class EmbeddingsService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        self.client = openai_client
         self.model = "text-embedding-3-small"
         self.batch_size = 100
+        # Shared by all callers so concurrent requests fill the same batches
+        self.batcher = EmbeddingBatcher(
+            self._create_embeddings,
+            max_batch=self.batch_size,
+            max_wait_ms=settings.embedding_batch_max_wait_ms,
+            max_in_flight=settings.embedding_max_in_flight
+        )
     
+    @loop_monitor.track("openai.get_embeddings")
     async def get_embeddings(
         self,
         texts: List[str],
@@ -21,6 +33,9 @@ class EmbeddingsService:
         """
         Generate embeddings for a list of texts using OpenAI.
         
+        Requests go through the process-wide micro-batcher, so texts from
+        concurrent callers (chat queries, other jobs) share API calls.
+        
         Args:
             texts: List of text strings to embed
             progress_callback: Optional callback to report progress (0-100)
@@ -38,14 +53,8 @@ class EmbeddingsService:
             for i in range(0, total_texts, self.batch_size):
                 batch = texts[i:i + self.batch_size]
                 
-                # Call OpenAI API (synchronous, but we'll run in background)
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=batch
-                )
-                
-                # Extract embeddings from response
-                batch_embeddings = [item.embedding for item in response.data]
+                # Cancelling the caller skips all remaining batches
+                batch_embeddings = await self.batcher.embed(batch)
                 all_embeddings.extend(batch_embeddings)
                 
                 # Report progress
@@ -55,16 +64,39 @@ class EmbeddingsService:
                 
                 logger.info(f"Processed batch {i//self.batch_size + 1}/{(total_texts + self.batch_size - 1)//self.batch_size}")
                 
-                # Small delay to avoid rate limits
-                await asyncio.sleep(0.1)
+                # Small delay between batches to avoid rate limits
+                if i + self.batch_size < total_texts:
+                    await asyncio.sleep(0.1)
             
             logger.info(f"Generated {len(all_embeddings)} embeddings")
             return all_embeddings
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise Exception(f"Failed to generate embeddings: {str(e)}")
 
+    
+    async def _create_embeddings(self, batch: List[str]) -> List[List[float]]:
+        """
+        Send one embeddings request, off the event loop.
+        Batches mix texts from several callers, so retries are not charged to
+        any one job's budget.
+        """
+        with embedding_batch_seconds.time():
+            response = await resilience.call(
+                "openai",
+                lambda: asyncio.to_thread(self.client.embeddings.create, model=self.model, input=batch),
+                budgeted=False
+            )
+        embedding_texts_total.inc(len(batch))
+        if response.usage:
+            record_llm_usage("openai", self.model, response.usage.total_tokens)
+        
+        # Extract embeddings from response
+        return [item.embedding for item in response.data]
+
 
 # Singleton instance
 embeddings_service = EmbeddingsService()
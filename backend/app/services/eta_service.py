@@ -0,0 +1,178 @@
+import threading
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in execution order. After parse the pipeline forks into
+# (embeddings -> pinecone_upsert) and gemini, which run in parallel. With a
+# topic digest, gemini_digest instead starts after embeddings, in parallel
+# with pinecone_upsert.
+PRE_STAGES = ("fetch_comments", "parse")
+EMBEDDING_BRANCH = ("embeddings", "pinecone_upsert")
+GEMINI_BRANCH = ("gemini",)
+DIGEST_BRANCH = ("gemini_digest",)
+POST_STAGES = ("store",)
+
+# What each stage's duration scales with. Stages mapped to None are
+# modelled as a fixed cost.
+STAGE_SIZE_KEYS: Dict[str, Optional[str]] = {
+    "fetch_comments": "comments",
+    "parse": None,
+    "embeddings": "comments",
+    "pinecone_upsert": "comments",
+    "gemini": "prompt_chars",
+    "gemini_digest": None,
+    "store": None,
+}
+
+# Typical prompt characters per comment, used before the prompt is measured
+AVG_PROMPT_CHARS_PER_COMMENT = 230
+
+# Priors used until a stage has recorded history: seconds per unit for
+# scaling stages, seconds for fixed stages.
+DEFAULT_STAGE_COSTS: Dict[str, float] = {
+    "fetch_comments": 0.06,
+    "parse": 0.1,
+    "embeddings": 0.01,
+    "pinecone_upsert": 0.004,
+    "gemini": 0.0006,
+    "gemini_digest": 10.0,
+    "store": 1.0,
+}
+
+
+class RollingQuantile:
+    """Quantiles over the most recent N observations."""
+
+    def __init__(self, window: int):
+        self.values: Deque[float] = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.values.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        position = q * (len(ordered) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        fraction = position - lower
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class EtaEstimator:
+    """
+    Predicts remaining job time from recent per-stage timings.
+
+    Each completed stage records its duration normalised by the job's input
+    size (comments or prompt characters). Predictions multiply a rolling
+    quantile of that unit cost by the current job's size, so estimates
+    follow both video size and current provider latency.
+    """
+
+    def __init__(self):
+        self.quantile = settings.eta_quantile
+        self._costs: Dict[str, RollingQuantile] = {
+            stage: RollingQuantile(settings.eta_window) for stage in STAGE_SIZE_KEYS
+        }
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, sizes: Dict[str, Optional[int]]):
+        """
+        Record a completed stage.
+
+        Args:
+            stage: Stage name
+            seconds: Wall time the stage took
+            sizes: Measured input sizes of the job
+        """
+        if stage not in self._costs:
+            return
+        size_key = STAGE_SIZE_KEYS[stage]
+        if size_key:
+            size = sizes.get(size_key)
+            if not size:
+                return
+            cost = seconds / size
+        else:
+            cost = seconds
+        with self._lock:
+            self._costs[stage].add(cost)
+
+    def predict_stage(self, stage: str, sizes: Dict[str, Optional[int]]) -> float:
+        """Predict the total duration of a stage for the given input sizes."""
+        with self._lock:
+            cost = self._costs[stage].quantile(self.quantile)
+        if cost is None:
+            cost = DEFAULT_STAGE_COSTS[stage]
+
+        size_key = STAGE_SIZE_KEYS[stage]
+        if not size_key:
+            return cost
+        return cost * (sizes.get(size_key) or 0)
+
+    def estimate_remaining(
+        self,
+        stage_states: Dict[str, str],
+        stage_elapsed: Dict[str, float],
+        sizes: Dict[str, Optional[int]],
+        digest: bool = False
+    ) -> int:
+        """
+        Estimate seconds until the job completes.
+
+        Args:
+            stage_states: Stage name -> "RUNNING" or "DONE"; missing means pending
+            stage_elapsed: Seconds spent so far in each running stage
+            sizes: Measured (or expected) input sizes of the job
+            digest: Whether Gemini analyzes a topic digest after embeddings
+
+        Returns:
+            Estimated remaining seconds
+        """
+        def remaining(stages: Iterable[str]) -> float:
+            total = 0.0
+            for stage in stages:
+                state = stage_states.get(stage)
+                if state == "DONE":
+                    continue
+                predicted = self.predict_stage(stage, sizes)
+                if state == "RUNNING":
+                    # Never report an overdue stage as already finished
+                    predicted = max(predicted - stage_elapsed.get(stage, 0.0), 1.0)
+                total += predicted
+            return total
+
+        if digest:
+            branches = remaining(("embeddings",)) + max(
+                remaining(("pinecone_upsert",)),
+                remaining(DIGEST_BRANCH)
+            )
+        else:
+            branches = max(remaining(EMBEDDING_BRANCH), remaining(GEMINI_BRANCH))
+        estimate = remaining(PRE_STAGES) + branches + remaining(POST_STAGES)
+        return int(round(estimate))
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Return sample counts and quantiles of the unit cost per stage."""
+        with self._lock:
+            return {
+                stage: {
+                    "samples": len(costs),
+                    "p50": costs.quantile(0.5),
+                    "p90": costs.quantile(0.9),
+                    "per": STAGE_SIZE_KEYS[stage] or "job"
+                }
+                for stage, costs in self._costs.items()
+            }
+
+
+# Singleton instance
+eta_estimator = EtaEstimator()
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import numpy as np
+from app.config import settings
+from app.services.comment_classifier import SENTIMENTS, comment_classifier
+from app.services.comment_store import comment_store
+from app.services.embeddings_service import embeddings_service
+from app.services.metrics import export_rows_total
+from app.services.pinecone_service import EMBEDDING_DIMENSION, pinecone_service
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Exports are disabled without pyarrow
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+
+class _Drain:
+    """
+    Write-only file for pyarrow writers whose bytes are taken out after
+    each chunk, so only one encoded chunk is ever held in memory.
+    """
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+class ExportService:
+    """
+    Streams an analysis's comments, embeddings and classifier scores as
+    Apache Arrow IPC or Parquet.
+
+    Comments are read from the local comment store EXPORT_CHUNK_ROWS at a
+    time; each chunk's embeddings are fetched from Pinecone by ID, scored
+    and encoded as one record batch (Arrow) or row group (Parquet) before
+    the next chunk is read, so server memory does not grow with the
+    analysis.
+    """
+
+    @property
+    def available(self) -> bool:
+        return pa is not None
+
+    def schema(self, analysis_id: str) -> "pa.Schema":
+        fields = [
+            pa.field("id", pa.string(), nullable=False),
+            pa.field("author", pa.string()),
+            pa.field("comment", pa.string()),
+            pa.field("date", pa.date32()),
+            pa.field("voteCount", pa.int64()),
+            pa.field("replyCount", pa.int64()),
+            pa.field("embedding", pa.list_(pa.float32(), EMBEDDING_DIMENSION)),
+            pa.field("sentiment", pa.string()),
+            *(pa.field(f"sentiment_{label}", pa.float32()) for label in SENTIMENTS),
+            pa.field("lead_probability", pa.float32())
+        ]
+        return pa.schema(fields, metadata={
+            "analysis_id": analysis_id,
+            "embedding_model": embeddings_service.model
+        })
+
+    def _batch(
+        self,
+        schema: "pa.Schema",
+        columns: Dict[str, List[Any]],
+        vectors: Dict[str, List[float]],
+        scored: bool
+    ) -> "pa.RecordBatch":
+        """Build one record batch; comments without a vector get null embeddings and scores."""
+        rows = len(columns["id"])
+        present = np.array([comment_id in vectors for comment_id in columns["id"]], dtype=bool)
+        embeddings = np.zeros((rows, EMBEDDING_DIMENSION), dtype=np.float32)
+        if present.any():
+            embeddings[present] = np.asarray(
+                [vectors[comment_id] for comment_id in columns["id"] if comment_id in vectors],
+                dtype=np.float32
+            )
+
+        missing = ~present
+        sentiment = pa.nulls(rows, pa.string())
+        probabilities = {label: pa.nulls(rows, pa.float32()) for label in SENTIMENTS}
+        lead = pa.nulls(rows, pa.float32())
+        if scored and present.any():
+            scores = comment_classifier.score(embeddings[present])
+            sentiment_scores = np.full((rows, len(SENTIMENTS)), np.nan, dtype=np.float32)
+            lead_scores = np.full(rows, np.nan, dtype=np.float32)
+            sentiment_scores[present] = scores["sentiment"]
+            lead_scores[present] = scores["lead"]
+            labels = np.asarray(SENTIMENTS, dtype=object)[np.argmax(np.nan_to_num(sentiment_scores), axis=1)]
+            sentiment = pa.array(labels, type=pa.string(), mask=missing)
+            probabilities = {
+                label: pa.array(sentiment_scores[:, i], mask=missing)
+                for i, label in enumerate(SENTIMENTS)
+            }
+            lead = pa.array(lead_scores, mask=missing)
+
+        return pa.record_batch([
+            pa.array(columns["id"], type=pa.string()),
+            pa.array(columns["author"], type=pa.string()),
+            pa.array(columns["comment"], type=pa.string()),
+            pa.array([_parse_date(value) for value in columns["date"]], type=pa.date32()),
+            pa.array(columns["voteCount"], type=pa.int64()),
+            pa.array(columns["replyCount"], type=pa.int64()),
+            pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.ravel()),
+                EMBEDDING_DIMENSION,
+                mask=pa.array(missing)
+            ),
+            sentiment,
+            *(probabilities[label] for label in SENTIMENTS),
+            lead
+        ], schema=schema)
+
+    def _writer(self, sink: _Drain, schema: "pa.Schema", export_format: str):
+        if export_format == "parquet":
+            return pq.ParquetWriter(sink, schema, compression=settings.export_parquet_compression)
+        return pa.ipc.new_stream(sink, schema)
+
+    def _write(self, writer, batch: "pa.RecordBatch"):
+        if isinstance(writer, pq.ParquetWriter):
+            writer.write_batch(batch, row_group_size=batch.num_rows)
+        else:
+            writer.write_batch(batch)
+
+    async def stream(self, analysis_id: str, export_format: str) -> Optional[AsyncIterator[bytes]]:
+        """
+        Start an export of an analysis.
+
+        Args:
+            analysis_id: Analysis to export
+            export_format: "arrow" (IPC stream) or "parquet"
+
+        Returns:
+            Async iterator of encoded bytes, or None when the analysis has
+            no stored comments
+        """
+        chunks = await asyncio.to_thread(comment_store.scan, analysis_id, settings.export_chunk_rows)
+        if chunks is None:
+            return None
+        scored = await comment_classifier.ensure_ready()
+        return self._encode(analysis_id, export_format, chunks, scored)
+
+    async def _encode(
+        self,
+        analysis_id: str,
+        export_format: str,
+        chunks: Iterator[Dict[str, List[Any]]],
+        scored: bool
+    ) -> AsyncIterator[bytes]:
+        sink = _Drain()
+        schema = self.schema(analysis_id)
+        rows = 0
+        try:
+            writer = await asyncio.to_thread(self._writer, sink, schema, export_format)
+            while True:
+                columns = await asyncio.to_thread(next, chunks, None)
+                if columns is None:
+                    break
+                vectors = await pinecone_service.fetch_vectors(columns["id"], analysis_id)
+                batch = await asyncio.to_thread(self._batch, schema, columns, vectors, scored)
+                await asyncio.to_thread(self._write, writer, batch)
+                rows += batch.num_rows
+                export_rows_total.inc(batch.num_rows, format=export_format)
+                yield sink.take()
+
+            await asyncio.to_thread(writer.close)
+            yield sink.take()
+            logger.info(f"Exported {rows} comments of analysis {analysis_id} as {export_format}")
+
+        except Exception as e:
+            # Headers are already sent; the truncated stream (no Arrow
+            # end-of-stream marker or Parquet footer) fails to load
+            logger.error(f"Error exporting analysis {analysis_id}: {str(e)}")
+            raise
+
+        finally:
+            chunks.close()
+
+
+# Singleton instance
+export_service = ExportService()
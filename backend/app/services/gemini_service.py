@@ -1,22 +1,40 @@
+import asyncio
 import google.generativeai as genai
 from app.config import settings
+from app.services.loop_monitor import loop_monitor
+from app.services.comment_classifier import comment_classifier
+from app.services.metrics import classifier_comments_total, record_llm_usage
+from app.services.resilience import CircuitOpenError, resilience
+from app.services.sampling import apply_estimates
+from app.services.topic_clusters import assemble_result, build_digest
 import logging
 import json
-from typing import List, Dict, Any, Callable, Optional
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import re
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of comments included in the analysis prompt
+MAX_PROMPT_COMMENTS = 500
+
 
 class GeminiService:
     def __init__(self):
         genai.configure(api_key=settings.google_api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        self.model_name = 'gemini-1.5-pro'
+        self.model = genai.GenerativeModel(self.model_name)
+    
+    def uses_digest(self, comment_count: int) -> bool:
+        """Whether an analysis of this many comments goes through the topic digest."""
+        return settings.gemini_digest_enabled and comment_count >= settings.gemini_digest_min_comments
     
+    @loop_monitor.track("gemini.analyze_with_gemini")
     async def analyze_with_gemini(
         self,
         parsed_comments: List[Dict[str, Any]],
-        progress_callback: Optional[Callable[[int], None]] = None
+        progress_callback: Optional[Callable[[int], None]] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        design: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Analyze comments using Gemini 1.5 Pro to extract insights.
@@ -24,10 +42,17 @@ class GeminiService:
         Args:
             parsed_comments: List of parsed comment objects
             progress_callback: Optional callback to report progress (0-100)
+            embeddings: Embedding of each comment; when given and the video is
+                large enough, Gemini gets a topic digest instead of every comment
+            design: Sample design when parsed_comments are a stratified
+                sample; digest analyses then report estimates for all comments
             
         Returns:
             Analysis results as a structured dictionary
         """
+        if embeddings is not None and self.uses_digest(len(parsed_comments)):
+            return await self.analyze_digest(parsed_comments, embeddings, progress_callback, design)
+        
         try:
             logger.info(f"Analyzing {len(parsed_comments)} comments with Gemini")
             
@@ -42,7 +67,9 @@ class GeminiService:
             
             # Call Gemini API
             logger.info("Sending request to Gemini API")
-            response = self.model.generate_content(prompt)
+            # Async call so cancelling the job also cancels the pending request
+            response = await resilience.call("gemini", lambda: self.model.generate_content_async(prompt))
+            self._record_usage(response)
             
             if progress_callback:
                 progress_callback(80)
@@ -60,16 +87,216 @@ class GeminiService:
             logger.info("Successfully parsed Gemini response")
             return analysis
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error analyzing with Gemini: {str(e)}")
             raise Exception(f"Failed to analyze with Gemini: {str(e)}")
     
+    @loop_monitor.track("gemini.analyze_digest")
+    async def analyze_digest(
+        self,
+        parsed_comments: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+        progress_callback: Optional[Callable[[int], None]] = None,
+        design: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze comments from a local topic clustering of their embeddings.
+        
+        Comments are grouped by k-means over their embeddings; Gemini only
+        sees each cluster's size, engagement and a few exemplars, and
+        returns a label per cluster plus insights. Sentiment and buying
+        intent come from the local comment classifier for every comment,
+        with Gemini reviewing only its borderline and high-value calls; if
+        the classifier is unavailable, Gemini estimates them per cluster.
+        Topic counts are weighted by cluster size, so the analysis covers
+        every comment at a fraction of the prompt tokens.
+        
+        Args:
+            parsed_comments: List of parsed comment objects
+            embeddings: Embedding of each comment
+            progress_callback: Optional callback to report progress (0-100)
+            design: Sample design when parsed_comments are a stratified
+                sample: topic counts are weighted up to all comments, and
+                sentiment and lead percentages get confidence intervals
+            
+        Returns:
+            Analysis results as a structured dictionary
+        """
+        try:
+            logger.info(f"Analyzing {len(parsed_comments)} comments with a Gemini topic digest")
+            
+            classify = await comment_classifier.ensure_ready()
+            
+            # Clustering and scoring are CPU-bound, so they run off the event loop
+            clusters = await asyncio.to_thread(
+                build_digest,
+                parsed_comments,
+                embeddings,
+                settings.gemini_digest_max_clusters,
+                settings.gemini_digest_exemplars,
+                design["weights"] if design else None
+            )
+            scores = await asyncio.to_thread(comment_classifier.score, embeddings) if classify else None
+            reviews = comment_classifier.review_candidates(parsed_comments, scores) if classify else []
+            
+            if progress_callback:
+                progress_callback(30)
+            
+            prompt, exemplar_ids, review_ids = self._build_digest_prompt(
+                parsed_comments, clusters, reviews if classify else None
+            )
+            response = await resilience.call("gemini", lambda: self.model.generate_content_async(prompt))
+            self._record_usage(response)
+            
+            if progress_callback:
+                progress_callback(80)
+            
+            labelling = self._extract_json_from_response(response.text)
+            classified = None
+            if classify:
+                reviewed = comment_classifier.parse_reviews(labelling.get("reviews", []), review_ids)
+                classified = comment_classifier.apply(scores, reviewed)
+                classifier_comments_total.inc(len(parsed_comments) - len(reviewed), source="local")
+                classifier_comments_total.inc(len(reviewed), source="review")
+            analysis = assemble_result(parsed_comments, clusters, labelling, exemplar_ids, classified)
+            if design:
+                analysis = apply_estimates(analysis, design, classified)
+            analysis["vibe_trend"] = self._vibe_trend(analysis["sentiment_score"])
+            
+            if progress_callback:
+                progress_callback(100)
+            
+            logger.info(f"Labelled {len(clusters)} topic clusters with Gemini")
+            return analysis
+            
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error analyzing topic digest with Gemini: {str(e)}")
+            raise Exception(f"Failed to analyze with Gemini: {str(e)}")
+    
+    def _record_usage(self, response):
+        """Record prompt/output token counts from a Gemini response."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            record_llm_usage(
+                "gemini",
+                self.model_name,
+                usage.prompt_token_count,
+                usage.candidates_token_count
+            )
+    
+    def prompt_size(self, comments: List[Dict[str, Any]]) -> int:
+        """Approximate prompt size in characters, used for ETA estimation."""
+        return sum(len(comment["comment"]) + 80 for comment in comments[:MAX_PROMPT_COMMENTS])
+    
+    def _build_digest_prompt(
+        self,
+        comments: List[Dict[str, Any]],
+        clusters: List[Dict[str, Any]],
+        reviews: Optional[List[int]] = None
+    ) -> Tuple[str, Dict[str, int], Dict[str, int]]:
+        """
+        Build the topic digest prompt for Gemini.
+        
+        Args:
+            comments: Parsed comments
+            clusters: Output of build_digest
+            reviews: Indices of comments for Gemini to label; None when the
+                local classifier is unavailable, so Gemini estimates
+                sentiment and lead shares per cluster instead
+        
+        Returns:
+            The prompt, exemplar reference (e.g. "E3") -> comment index and
+            review reference (e.g. "R2") -> comment index
+        """
+        exemplar_ids = {}
+        digest_text = ""
+        for number, cluster in enumerate(clusters, 1):
+            digest_text += (
+                f"\nCLUSTER {number}: {cluster['size']} comments, "
+                f"{cluster['likes']} likes, {cluster['replies']} replies\n"
+            )
+            for index in cluster["exemplars"]:
+                reference = f"E{len(exemplar_ids) + 1}"
+                exemplar_ids[reference] = index
+                comment = comments[index]
+                text = " ".join(comment["comment"].split())[:settings.gemini_digest_exemplar_chars]
+                digest_text += f"  [{reference}] @{comment['author']} (Likes: {comment['voteCount']}): {text}\n"
+        
+        review_ids = {}
+        review_text = ""
+        for index in reviews or []:
+            reference = f"R{len(review_ids) + 1}"
+            review_ids[reference] = index
+            comment = comments[index]
+            text = " ".join(comment["comment"].split())[:settings.gemini_digest_exemplar_chars]
+            review_text += f"[{reference}] @{comment['author']} (Likes: {comment['voteCount']}): {text}\n"
+        
+        if reviews is None:
+            cluster_fields = """,
+      "positive": <percentage of the cluster's comments that are positive>,
+      "neutral": <percentage neutral>,
+      "negative": <percentage negative>,
+      "lead_share": <percentage of the cluster's comments showing buying intent>"""
+            labels_section = """
+  "leads": [
+    {"exemplar": "<reference of a representative comment showing buying intent, e.g. E3>", "sentiment": <0.0-1.0>}
+  ],"""
+        else:
+            cluster_fields = ""
+            labels_section = """
+  "reviews": [
+    {"comment": "<reference of a comment to review, e.g. R2>", "sentiment": "<positive, neutral or negative>", "lead": <true if it shows buying intent>}
+  ],""" if review_ids else ""
+        review_section = f"""
+COMMENTS TO REVIEW (label each one individually):
+{review_text}""" if review_text else ""
+        
+        prompt = f"""You are an expert data analyst specializing in social media sentiment analysis and lead generation.
+
+The {len(comments)} comments on a YouTube video were grouped into {len(clusters)} topic clusters by semantic similarity. For each cluster you get its size, its total likes and replies, and its most representative comments.
+
+IMPORTANT NOTES:
+- Clusters with many comments or likes represent the opinions of many viewers
+- Representative comments stand for the whole cluster; judge shares for the cluster, not just the examples
+- Focus on actionable insights for the content creator
+
+TOPIC CLUSTERS:
+{digest_text}{review_section}
+
+Provide your analysis in STRICTLY VALID JSON format with the following structure:
+
+{{
+  "clusters": [
+    {{
+      "cluster": <cluster number>,
+      "topic": "<short topic label, 2-5 words>",
+      "kind": "<feedback if viewers give the creator feedback, requests or complaints; otherwise discussion>"{cluster_fields}
+    }}
+  ],{labels_section}
+  "creator_insights": [
+    "<actionable insight 1 IF this is the creator's video - what should THEY do based on audience feedback>",
+    "<insights 2-5 for creator>"
+  ],
+  "competitor_insights": [
+    "<strategic insight 1 IF analyzing a COMPETITOR - what can the USER learn and apply to their own content>",
+    "<insights 2-5 for competitor analysis>"
+  ]
+}}
+
+Label every cluster{" and review every listed comment" if review_ids else ""}. Return ONLY the JSON object, no markdown formatting or additional text."""
+
+        return prompt, exemplar_ids, review_ids
+    
     def _build_analysis_prompt(self, comments: List[Dict[str, Any]]) -> str:
         """Build the analysis prompt for Gemini."""
         
         # Format comments for the prompt
         comments_text = ""
-        for i, comment in enumerate(comments[:500], 1):  # Limit to 500 for token limits
+        for i, comment in enumerate(comments[:MAX_PROMPT_COMMENTS], 1):  # Limit for token limits
             comments_text += f"\n{i}. Author: @{comment['author']}\n"
             comments_text += f"   Date: {comment['date']}\n"
             comments_text += f"   Likes: {comment['voteCount']} | Replies: {comment['replyCount']}\n"
@@ -174,15 +401,7 @@ Return ONLY the JSON object, no markdown formatting or additional text."""
             result = json.loads(text)
             
             # Calculate vibe_trend (simple approximation)
-            sentiment_score = result.get('sentiment_score', 50)
-            vibe_trend = [
-                max(0, min(100, sentiment_score - 15)),
-                max(0, min(100, sentiment_score - 10)),
-                max(0, min(100, sentiment_score - 5)),
-                sentiment_score,
-                max(0, min(100, sentiment_score + 3))
-            ]
-            result['vibe_trend'] = vibe_trend
+            result['vibe_trend'] = self._vibe_trend(result.get('sentiment_score', 50))
             
             return result
             
@@ -190,6 +409,15 @@ Return ONLY the JSON object, no markdown formatting or additional text."""
             logger.error(f"Failed to parse JSON from Gemini: {str(e)}")
             logger.error(f"Response text: {text[:500]}")
             raise Exception("Invalid JSON response from Gemini")
+    
+    def _vibe_trend(self, sentiment_score: int) -> List[int]:
+        return [
+            max(0, min(100, sentiment_score - 15)),
+            max(0, min(100, sentiment_score - 10)),
+            max(0, min(100, sentiment_score - 5)),
+            sentiment_score,
+            max(0, min(100, sentiment_score + 3))
+        ]
 
 
 # Singleton instance
@@ -0,0 +1,294 @@
+import asyncio
+import threading
+import logging
+from typing import Any, Callable, Dict, Iterator, AsyncIterator
+import httpx
+from app.config import settings
+from app.services.metrics import http_pool_waits_total, http_requests_total
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HostStats:
+    """Request counters for one upstream host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.waits = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "waits": self.waits,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight
+        }
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    """
+    Response body that releases its host slot once closed, or once it is
+    garbage-collected without being closed.
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, done: Callable[[], None]):
+        self._stream = stream
+        self._done = done
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self):
+        self._closed = True
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+    def __del__(self):
+        if not self._closed:
+            # The collector may run while this thread holds a pool lock, so
+            # the slot is released from another thread
+            logger.warning("HTTP response was never closed; releasing its connection slot")
+            threading.Thread(target=self.close, daemon=True).start()
+
+
+class _AsyncTrackedStream(httpx.AsyncByteStream):
+    """
+    Async response body that releases its host slot once closed, or once it
+    is garbage-collected without being closed.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, done: Callable[[], None]):
+        self._stream = stream
+        self._done = done
+        self._closed = False
+        self._loop = asyncio.get_running_loop()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        self._closed = True
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+    def __del__(self):
+        if not self._closed and not self._loop.is_closed():
+            # Released on the loop: the slot is an asyncio semaphore
+            logger.warning("HTTP response was never closed; releasing its connection slot")
+            self._loop.call_soon_threadsafe(self._done)
+
+
+def _connection_counts(transport: Any) -> Dict[str, int]:
+    connections = getattr(getattr(transport, "_pool", None), "connections", [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+class _PooledTransport(httpx.BaseTransport):
+    """Keep-alive transport with a per-host limit on concurrent requests."""
+
+    def __init__(self, pool: "HttpPool"):
+        self.pool = pool
+        self._transport = httpx.HTTPTransport(http2=pool.http2, limits=pool.limits)
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        with self._lock:
+            slots = self._slots.setdefault(host, threading.BoundedSemaphore(self.pool.max_per_host))
+        if not slots.acquire(blocking=False):
+            self.pool._record_wait(host)
+            if not slots.acquire(timeout=self.pool.timeout.pool):
+                raise httpx.PoolTimeout(f"No connection slot available for {host}", request=request)
+
+        done = self.pool._begin(host, slots.release)
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            done(True)
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TrackedStream(response.stream, lambda: done(response.status_code >= 500)),
+            extensions=response.extensions
+        )
+
+    def connection_counts(self) -> Dict[str, int]:
+        return _connection_counts(self._transport)
+
+    def close(self):
+        self._transport.close()
+
+
+class _AsyncPooledTransport(httpx.AsyncBaseTransport):
+    """Async keep-alive transport with a per-host limit on concurrent requests."""
+
+    def __init__(self, pool: "HttpPool"):
+        self.pool = pool
+        self._transport = httpx.AsyncHTTPTransport(http2=pool.http2, limits=pool.limits)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slots = self._slots.setdefault(host, asyncio.Semaphore(self.pool.max_per_host))
+        if not slots.locked():
+            await slots.acquire()
+        else:
+            self.pool._record_wait(host)
+            try:
+                await asyncio.wait_for(slots.acquire(), timeout=self.pool.timeout.pool)
+            except asyncio.TimeoutError:
+                raise httpx.PoolTimeout(f"No connection slot available for {host}", request=request)
+
+        done = self.pool._begin(host, slots.release)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            done(True)
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncTrackedStream(response.stream, lambda: done(response.status_code >= 500)),
+            extensions=response.extensions
+        )
+
+    def connection_counts(self) -> Dict[str, int]:
+        return _connection_counts(self._transport)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HttpPool:
+    """
+    Shared keep-alive HTTP transport for provider SDKs.
+
+    One sync and one async connection pool serve every httpx-based client,
+    so TLS sessions are reused across services and the number of sockets per
+    upstream host is bounded. HTTP/2 is used when the `h2` package is
+    installed. The sync client is for SDKs called from worker threads.
+    """
+
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=settings.http_pool_max_connections,
+            max_keepalive_connections=settings.http_pool_max_keepalive,
+            keepalive_expiry=settings.http_pool_keepalive_expiry_seconds
+        )
+        self.timeout = httpx.Timeout(
+            settings.http_timeout_seconds,
+            connect=settings.http_connect_timeout_seconds
+        )
+        self.max_per_host = settings.http_pool_max_per_host
+        self.http2 = settings.http_pool_http2 and _http2_available()
+        if settings.http_pool_http2 and not self.http2:
+            logger.warning("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, HostStats] = {}
+
+        self.transport = _PooledTransport(self)
+        self.async_transport = _AsyncPooledTransport(self)
+        self.client = httpx.Client(transport=self.transport, timeout=self.timeout)
+        self.async_client = httpx.AsyncClient(transport=self.async_transport, timeout=self.timeout)
+
+    def adopt(self, client: httpx.Client) -> httpx.Client:
+        """
+        Rebuild an SDK-owned client on the shared transport.
+
+        Args:
+            client: Client created by an SDK that does not accept one
+
+        Returns:
+            Client with the same base URL, headers and timeout over the shared pool
+        """
+        return httpx.Client(
+            transport=self.transport,
+            base_url=client.base_url,
+            headers=client.headers,
+            timeout=client.timeout,
+            follow_redirects=client.follow_redirects
+        )
+
+    def _host(self, host: str) -> HostStats:
+        with self._lock:
+            return self._hosts.setdefault(host, HostStats())
+
+    def _record_wait(self, host: str):
+        stats = self._host(host)
+        with self._lock:
+            stats.waits += 1
+        http_pool_waits_total.inc(host=host)
+
+    def _begin(self, host: str, release: Callable[[], None]) -> Callable[[bool], None]:
+        """Count a request as in flight; the returned callback ends it once."""
+        stats = self._host(host)
+        with self._lock:
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        http_requests_total.inc(host=host)
+
+        finished = False
+
+        def done(error: bool = False):
+            nonlocal finished
+            with self._lock:
+                if finished:
+                    return
+                finished = True
+                stats.in_flight -= 1
+                if error:
+                    stats.errors += 1
+            release()
+
+        return done
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return pool configuration, open connections and per-host counters."""
+        with self._lock:
+            hosts = {host: stats.to_dict() for host, stats in sorted(self._hosts.items())}
+        return {
+            "http2": self.http2,
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "max_per_host": self.max_per_host,
+                "keepalive_expiry_seconds": self.limits.keepalive_expiry
+            },
+            "connections": {
+                "sync": self.transport.connection_counts(),
+                "async": self.async_transport.connection_counts()
+            },
+            "hosts": hosts
+        }
+
+    async def aclose(self):
+        """Close both pools; called on application shutdown."""
+        await self.async_client.aclose()
+        await asyncio.to_thread(self.client.close)
+
+
+# Singleton instance
+http_pool = HttpPool()
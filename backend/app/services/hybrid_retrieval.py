@@ -0,0 +1,290 @@
+import asyncio
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple
+import numpy as np
+from app.config import settings
+from app.services.comment_store import comment_store, published_timestamp
+from app.services.metrics import chat_retrieval_filters_total
+from app.services.pinecone_service import pinecone_service
+from app.services.sparse_index import OPERATORS, sparse_index
+
+logger = logging.getLogger(__name__)
+
+# Pinecone-style filter: field -> {operator: bound}
+MetadataFilter = Dict[str, Dict[str, int]]
+
+PERIOD_DAYS = {"day": 1, "week": 7, "fortnight": 14, "month": 30, "year": 365}
+
+# Explicit thresholds: "at least 50 likes", "more than 10 replies", "100+ likes"
+COUNT_NOUNS = {
+    "voteCount": r"likes?|upvotes?|votes?",
+    "replyCount": r"replies|reply|responses?"
+}
+THRESHOLD_PATTERNS: Dict[str, Pattern] = {
+    field: re.compile(
+        rf"\b(?:(?:at least|min(?:imum)?(?: of)?|(?P<strict>more than|over|above))\s+(?P<n>\d[\d,]*)"
+        rf"|(?P<plus>\d[\d,]*)\+)\s*(?:{nouns})\b",
+        re.I
+    )
+    for field, nouns in COUNT_NOUNS.items()
+}
+# Relative engagement ("highly liked"), resolved to the analysis's own quantile
+POPULAR_PATTERNS: Dict[str, Pattern] = {
+    "voteCount": re.compile(
+        r"\b(?:highly|most|top|well|heavily)[- ]liked\b|\b(?:popular|top|upvoted|most upvoted)\s+comments?\b"
+        r"|\b(?:most|lots of|many)\s+likes\b",
+        re.I
+    ),
+    "replyCount": re.compile(
+        r"\b(?:most|highly|heavily)[- ]replied(?:[- ]to)?\b|\b(?:most|lots of|many)\s+replies\b",
+        re.I
+    )
+}
+RELATIVE_PERIOD = re.compile(
+    r"\b(?:(?:in|over|during) the\s+)?(?:last|past|previous)\s+(?:(?P<n>\d+)\s+)?(?P<unit>day|week|fortnight|month|year)s?\b",
+    re.I
+)
+CURRENT_PERIOD = re.compile(r"\bthis\s+(?P<unit>week|month|year)\b", re.I)
+SINGLE_DAY = re.compile(r"\b(?P<day>today|yesterday)\b", re.I)
+DATE_BOUND = re.compile(r"\b(?P<op>since|after|from|before|until)\s+(?P<date>\d{4}-\d{2}-\d{2})\b", re.I)
+
+
+def _tighten(metadata_filter: MetadataFilter, field: str, operator: str, bound: int):
+    conditions = metadata_filter.setdefault(field, {})
+    if operator not in conditions:
+        conditions[operator] = bound
+    elif operator.startswith("$g"):
+        conditions[operator] = max(conditions[operator], bound)
+    else:
+        conditions[operator] = min(conditions[operator], bound)
+
+
+def _timestamp(moment: datetime) -> int:
+    return int(moment.timestamp())
+
+
+def parse_filters(message: str, now: Optional[datetime] = None) -> Tuple[MetadataFilter, Set[str], str]:
+    """
+    Pull engagement and date constraints out of a chat question.
+
+    "at least 50 likes" or "100+ replies" become absolute thresholds;
+    "highly liked" or "most replied" are returned as fields to resolve
+    against the analysis; "last week", "past 3 months", "this month",
+    "today", "yesterday" and "since/before YYYY-MM-DD" bound published_at.
+
+    Args:
+        message: User's chat message
+        now: Reference time for relative dates (default: now, UTC)
+
+    Returns:
+        (metadata filter, fields asking for popular comments, message with
+        the matched phrases removed, for keyword search)
+    """
+    now = now or datetime.now(timezone.utc)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    metadata_filter: MetadataFilter = {}
+    popular: Set[str] = set()
+    spans: List[Tuple[int, int]] = []
+
+    for field, pattern in THRESHOLD_PATTERNS.items():
+        for match in pattern.finditer(message):
+            value = int((match.group("n") or match.group("plus")).replace(",", ""))
+            _tighten(metadata_filter, field, "$gte", value + 1 if match.group("strict") else value)
+            spans.append(match.span())
+
+    for field, pattern in POPULAR_PATTERNS.items():
+        for match in pattern.finditer(message):
+            popular.add(field)
+            spans.append(match.span())
+
+    for match in RELATIVE_PERIOD.finditer(message):
+        days = int(match.group("n") or 1) * PERIOD_DAYS[match.group("unit").lower()]
+        _tighten(metadata_filter, "published_at", "$gte", _timestamp(now - timedelta(days=days)))
+        spans.append(match.span())
+
+    for match in CURRENT_PERIOD.finditer(message):
+        unit = match.group("unit").lower()
+        if unit == "week":
+            start = midnight - timedelta(days=midnight.weekday())
+        elif unit == "month":
+            start = midnight.replace(day=1)
+        else:
+            start = midnight.replace(month=1, day=1)
+        _tighten(metadata_filter, "published_at", "$gte", _timestamp(start))
+        spans.append(match.span())
+
+    for match in SINGLE_DAY.finditer(message):
+        start = midnight if match.group("day").lower() == "today" else midnight - timedelta(days=1)
+        _tighten(metadata_filter, "published_at", "$gte", _timestamp(start))
+        _tighten(metadata_filter, "published_at", "$lt", _timestamp(start + timedelta(days=1)))
+        spans.append(match.span())
+
+    for match in DATE_BOUND.finditer(message):
+        try:
+            day = datetime.strptime(match.group("date"), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        operator = match.group("op").lower()
+        if operator in ("since", "from"):
+            _tighten(metadata_filter, "published_at", "$gte", _timestamp(day))
+        elif operator == "after":
+            _tighten(metadata_filter, "published_at", "$gte", _timestamp(day + timedelta(days=1)))
+        elif operator == "before":
+            _tighten(metadata_filter, "published_at", "$lt", _timestamp(day))
+        else:
+            _tighten(metadata_filter, "published_at", "$lt", _timestamp(day + timedelta(days=1)))
+        spans.append(match.span())
+
+    text = message
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    return metadata_filter, popular, text
+
+
+def _within(value: int, conditions: Dict[str, int]) -> bool:
+    return all(OPERATORS[operator](value, bound) for operator, bound in conditions.items())
+
+
+def has_filters(message: str) -> bool:
+    """Whether a chat question constrains engagement or dates."""
+    metadata_filter, popular, _ = parse_filters(message)
+    return bool(metadata_filter or popular)
+
+
+def _scale(values: np.ndarray) -> np.ndarray:
+    """Min-max scale to [0, 1]; a constant positive input scales to 1."""
+    low, high = float(values.min()), float(values.max())
+    if high - low < 1e-9:
+        return np.full(len(values), 1.0 if high > 0 else 0.0, dtype=np.float32)
+    return (values - low) / (high - low)
+
+
+class HybridRetriever:
+    """
+    Chat retrieval that fuses Pinecone vector search with BM25 keyword search.
+
+    Engagement and date constraints in the question become a metadata filter
+    applied before ranking on both sides, so low-engagement or out-of-range
+    comments never compete for the context. Vector and keyword candidates
+    are merged, their scores min-max scaled and mixed with CHAT_HYBRID_ALPHA,
+    and the best CHAT_HYBRID_TOP_K are passed on with their vectors for
+    MMR context assembly.
+    """
+
+    def __init__(self):
+        self.alpha = settings.chat_hybrid_alpha
+        self.top_k = settings.chat_hybrid_top_k
+        self.fetch_k = settings.chat_context_fetch_k
+        self.popular_quantile = settings.chat_filter_popular_quantile
+
+    async def _resolve(self, analysis_id: str, message: str) -> Tuple[MetadataFilter, str]:
+        metadata_filter, popular, text = parse_filters(message)
+        for field in popular:
+            threshold = await asyncio.to_thread(sparse_index.quantile, analysis_id, field, self.popular_quantile)
+            if threshold is not None:
+                _tighten(metadata_filter, field, "$gte", threshold)
+        for field in metadata_filter:
+            chat_retrieval_filters_total.inc(field=field)
+        return metadata_filter, text
+
+    async def _keyword_only(
+        self,
+        ids: List[str],
+        analysis_id: str,
+        query: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """Load vectors and documents for keyword hits the vector search missed."""
+        if not ids:
+            return []
+        vectors = await pinecone_service.fetch_vectors(ids, analysis_id)
+        documents = await asyncio.to_thread(comment_store.get, analysis_id, list(vectors))
+        matches = []
+        for comment_id, values in vectors.items():
+            document = documents.get(comment_id)
+            if not document:
+                continue
+            vector = np.asarray(values, dtype=np.float32)
+            matches.append({
+                "id": comment_id,
+                "score": float(vector @ query / (np.linalg.norm(vector) or 1.0)),
+                "metadata": {
+                    "voteCount": document["voteCount"],
+                    "replyCount": document["replyCount"],
+                    "author": document["author"],
+                    "comment_text": document["comment"],
+                    "date": document["date"]
+                },
+                "values": values
+            })
+        return matches
+
+    async def search(self, message: str, query_embedding: List[float], analysis_id: str) -> List[Dict[str, Any]]:
+        """
+        Retrieve chat context candidates for a question.
+
+        Args:
+            message: User's chat message
+            query_embedding: Embedding of the message
+            analysis_id: Analysis to search
+
+        Returns:
+            Matches shaped like pinecone_service.query_similar results (with
+            "values"), best first; "score" is the fused score
+        """
+        metadata_filter, text = await self._resolve(analysis_id, message)
+        if metadata_filter:
+            logger.info(f"Chat filters for analysis {analysis_id}: {metadata_filter}")
+
+        # Vectors indexed before the comment store have no published_at, so
+        # a date filter would exclude all of them; their dates are checked
+        # after the query instead
+        dates = metadata_filter.get("published_at")
+        legacy = dates is not None and not await asyncio.to_thread(comment_store.exists, analysis_id)
+        dense_filter = metadata_filter
+        if legacy:
+            dense_filter = {field: conditions for field, conditions in metadata_filter.items() if field != "published_at"}
+        dense = await pinecone_service.query_similar(
+            query_embedding,
+            analysis_id,
+            top_k=self.fetch_k,
+            include_values=True,
+            metadata_filter=dense_filter or None
+        )
+        if legacy:
+            dense = [match for match in dense if _within(published_timestamp(match["metadata"].get("date")), dates)]
+        keyword = await asyncio.to_thread(
+            sparse_index.search,
+            analysis_id,
+            text,
+            metadata_filter,
+            self.fetch_k,
+            [match["id"] for match in dense]
+        )
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        seen = {match["id"] for match in dense}
+        candidates = dense + await self._keyword_only(
+            [comment_id for comment_id in keyword if comment_id not in seen],
+            analysis_id,
+            query
+        )
+        if not candidates:
+            return []
+
+        dense_scores = _scale(np.asarray([match["score"] for match in candidates], dtype=np.float32))
+        keyword_scores = _scale(np.asarray([keyword.get(match["id"], 0.0) for match in candidates], dtype=np.float32))
+        fused = self.alpha * dense_scores + (1 - self.alpha) * keyword_scores
+
+        order = np.argsort(-fused, kind="stable")[:self.top_k]
+        logger.info(
+            f"Hybrid retrieval for analysis {analysis_id}: {len(dense)} vector candidates, "
+            f"{len(candidates) - len(dense)} more from keywords, {len(order)} kept"
+        )
+        return [{**candidates[i], "score": float(fused[i])} for i in order]
+
+
+# Singleton instance
+hybrid_retriever = HybridRetriever()
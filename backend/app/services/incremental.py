@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from app.database import execute, get_supabase
+from app.services.comment_store import comment_store
+from app.services.metrics import supabase_seconds
+
+logger = logging.getLogger(__name__)
+
+# Merged report sections are capped like a single Gemini analysis
+MAX_TOPICS = 10
+MAX_TOPIC_COMMENTS = 5
+MAX_INFLUENCERS = 10
+MAX_LEADS = 20
+# Dates reported as engagement spikes
+MAX_SPIKES = 10
+
+# cid -> fingerprint of the comment text
+Manifest = Dict[str, str]
+
+
+def comment_fingerprint(comment: Dict[str, Any]) -> str:
+    """Fingerprint of a comment's text; changes when the comment is edited."""
+    return hashlib.sha1(comment["comment"].encode("utf-8")).hexdigest()[:16]
+
+
+def build_manifest(parsed_comments: List[Dict[str, Any]]) -> Manifest:
+    return {comment["id"]: comment_fingerprint(comment) for comment in parsed_comments if comment["id"]}
+
+
+def engagement_spikes(comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The dates with the most comments, in date order."""
+    dates = Counter(comment["date"] for comment in comments)
+    return [{"time": date, "count": count} for date, count in sorted(dates.most_common(MAX_SPIKES))]
+
+
+def diff_comments(
+    previous: Manifest,
+    parsed_comments: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[str], int]:
+    """
+    Compare a fresh scrape with the manifest of the previous analysis.
+
+    Args:
+        previous: Manifest stored with the previous analysis
+        parsed_comments: Freshly scraped and parsed comments
+
+    Returns:
+        (new or edited comments, cids no longer present, count of unchanged comments)
+    """
+    changed = []
+    unchanged = 0
+    current = set()
+    for comment in parsed_comments:
+        current.add(comment["id"])
+        if previous.get(comment["id"]) == comment_fingerprint(comment):
+            unchanged += 1
+        else:
+            changed.append(comment)
+    removed = [cid for cid in previous if cid not in current]
+    return changed, removed, unchanged
+
+
+def merge_results(
+    previous: Dict[str, Any],
+    delta: Dict[str, Any],
+    unchanged: int,
+    delta_count: int,
+    current: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Merge the analysis of new comments into the previous analysis.
+
+    Scores and percentages are weighted by comment count: the previous
+    analysis by the comments that are still unchanged, the delta by the
+    comments it covered. The previous analysis also covered comments that
+    were since edited or removed, so its topic counts are scaled to the
+    unchanged share before the delta's are added. With the current comments
+    given, engagement spikes are recounted from them, and previous leads and
+    topic examples whose comment is gone or was edited are dropped.
+    Insights come from the delta when it has any, since they should reflect
+    the latest audience feedback.
+
+    Args:
+        previous: Stored analysis (AnalysisResult shape)
+        delta: Gemini analysis of the new and edited comments
+        unchanged: Number of comments carried over unchanged
+        delta_count: Number of new and edited comments the delta covers
+        current: Every comment of the analysis after the refresh, with
+            "author", "comment" and "date"
+
+    Returns:
+        Merged analysis (AnalysisResult shape)
+    """
+    total = unchanged + delta_count
+    carried = min(1.0, unchanged / previous["total_comments"]) if previous.get("total_comments") else 1.0
+    by_author: Optional[Dict[str, List[str]]] = None
+    if current is not None:
+        by_author = {}
+        for comment in current:
+            by_author.setdefault(comment["author"], []).append(comment["comment"])
+
+    def weighted(get) -> int:
+        if not delta_count:
+            return get(previous)
+        return round((get(previous) * unchanged + get(delta) * delta_count) / total)
+
+    def still_present(author: str, text: str) -> bool:
+        """Whether a quoted comment (or excerpt of one) is still among the current comments."""
+        text = text.strip().rstrip(".…").strip()
+        return by_author is None or any(text in comment for comment in by_author.get(author, []))
+
+    def merge_topics(key: str) -> List[Dict[str, Any]]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for result, share in ((delta, 1.0), (previous, carried)):
+            for topic in result.get(key, []):
+                name = topic["topic"].strip()
+                entry = merged.setdefault(name.lower(), {"topic": name, "count": 0, "comments": []})
+                entry["count"] += topic.get("count", 0) * share
+                entry["comments"].extend(
+                    example for example in topic.get("comments", [])
+                    if result is delta or still_present(str(example.get("author", "")), str(example.get("text", "")))
+                )
+        for entry in merged.values():
+            entry["count"] = round(entry["count"])
+            entry["comments"] = entry["comments"][:MAX_TOPIC_COMMENTS]
+        topics = [entry for entry in merged.values() if entry["count"] > 0]
+        return sorted(topics, key=lambda topic: topic["count"], reverse=True)[:MAX_TOPICS]
+
+    leads: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for lead in delta.get("leads", []):
+        leads.setdefault((lead["username"], lead["text"].strip()), lead)
+    for lead in previous.get("leads", []):
+        if still_present(lead["username"], lead["text"]):
+            leads.setdefault((lead["username"], lead["text"].strip()), lead)
+
+    influencers: Dict[str, Dict[str, Any]] = {}
+    for result in (delta, previous):
+        for influencer in result.get("top_influencers", []):
+            entry = influencers.get(influencer["username"])
+            if entry is None:
+                influencers[influencer["username"]] = dict(influencer)
+            else:
+                entry["influenceScore"] = max(entry.get("influenceScore", 0), influencer.get("influenceScore", 0))
+                entry["engagementCount"] = entry.get("engagementCount", 0) + influencer.get("engagementCount", 0)
+
+    if current is not None:
+        spikes = engagement_spikes(current)
+    else:
+        counts: Dict[str, float] = {}
+        for result, share in ((previous, carried), (delta, 1.0)):
+            for spike in result.get("engagement_spikes", []):
+                counts[spike["time"]] = counts.get(spike["time"], 0) + spike.get("count", 0) * share
+        spikes = [{"time": time, "count": round(count)} for time, count in sorted(counts.items()) if round(count) > 0]
+
+    sentiment_score = weighted(lambda result: result["sentiment_score"])
+    vibe_trend = list(previous.get("vibe_trend", []))
+    if delta_count:
+        vibe_trend = vibe_trend[1:] + [sentiment_score]
+
+    return {
+        "sentiment_score": sentiment_score,
+        "sentiment_breakdown": {
+            key: weighted(lambda result: result["sentiment_breakdown"].get(key, 0))
+            for key in ("positive", "neutral", "negative")
+        },
+        "lead_percentage": weighted(lambda result: result["lead_percentage"]),
+        "leads": list(leads.values())[:MAX_LEADS],
+        "top_feedback_topics": merge_topics("top_feedback_topics"),
+        "top_discussed_topics": merge_topics("top_discussed_topics"),
+        "actionable_todos": delta.get("actionable_todos") or previous.get("actionable_todos", []),
+        "creator_insights": delta.get("creator_insights") or previous.get("creator_insights", []),
+        "competitor_insights": delta.get("competitor_insights") or previous.get("competitor_insights", []),
+        "engagement_spikes": spikes,
+        "top_influencers": sorted(
+            influencers.values(),
+            key=lambda influencer: influencer.get("influenceScore", 0),
+            reverse=True
+        )[:MAX_INFLUENCERS],
+        "total_comments": total,
+        "vibe_trend": vibe_trend or [sentiment_score]
+    }
+
+
+class IncrementalService:
+    """Loads and stores what an incremental re-analysis diffs against."""
+
+    async def find_base_analysis(self, url: str, analysis_id: Optional[str] = None) -> Optional[str]:
+        """
+        Return the analysis to refresh: analysis_id if it has a manifest,
+        otherwise the latest analysis of the URL that has one.
+        Analyses whose vectors were garbage-collected are skipped, since a
+        refresh only re-embeds the delta, and so are analyses indexed before
+        the comment store: their vectors lack the published_at filter field,
+        and a namespace must not mix both kinds.
+        """
+        supabase = get_supabase()
+        query = supabase.table("analysis_history").select("id, vectors_expired_at")
+        if analysis_id:
+            query = query.eq("id", analysis_id)
+        else:
+            query = query.eq("url", url).order("created_at", desc=True).limit(5)
+        with supabase_seconds.time(table="analysis_history", operation="select"):
+            rows = (await execute(query)).data
+        candidates = [
+            row["id"] for row in rows
+            if not row.get("vectors_expired_at") and await asyncio.to_thread(comment_store.exists, row["id"])
+        ]
+
+        for candidate in candidates:
+            with supabase_seconds.time(table="analysis_comment_manifests", operation="select"):
+                rows = (await execute(supabase.table("analysis_comment_manifests").select("analysis_history_id").eq(
+                    "analysis_history_id", candidate
+                ))).data
+            if rows:
+                return candidate
+        return None
+
+    async def load_manifest(self, analysis_id: str) -> Optional[Manifest]:
+        with supabase_seconds.time(table="analysis_comment_manifests", operation="select"):
+            rows = (await execute(get_supabase().table("analysis_comment_manifests").select("comments").eq(
+                "analysis_history_id", analysis_id
+            ))).data
+        return rows[0]["comments"] if rows else None
+
+    async def save_manifest(self, analysis_id: str, manifest: Manifest):
+        with supabase_seconds.time(table="analysis_comment_manifests", operation="upsert"):
+            await execute(get_supabase().table("analysis_comment_manifests").upsert({
+                "analysis_history_id": analysis_id,
+                "comments": manifest,
+                "updated_at": datetime.now().isoformat()
+            }))
+
+    async def load_result(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Load a stored analysis back into AnalysisResult shape."""
+        supabase = get_supabase()
+        with supabase_seconds.time(table="analysis_history", operation="select"):
+            history = (await execute(supabase.table("analysis_history").select("*").eq("id", analysis_id))).data
+        with supabase_seconds.time(table="analysis_details", operation="select"):
+            details = (await execute(
+                supabase.table("analysis_details").select("*").eq("analysis_history_id", analysis_id)
+            )).data
+        if not history or not details:
+            return None
+
+        history, details = history[0], details[0]
+        return {
+            "sentiment_score": history["sentiment_score"],
+            "lead_percentage": history["lead_percentage"],
+            "total_comments": history["total_comments"],
+            "sentiment_breakdown": details["sentiment_breakdown"],
+            "leads": details["leads"],
+            "top_feedback_topics": details["top_feedback_topics"],
+            "top_discussed_topics": details["top_discussed_topics"],
+            "actionable_todos": details.get("actionable_todos") or [],
+            "creator_insights": details.get("creator_insights") or [],
+            "competitor_insights": details.get("competitor_insights") or [],
+            "engagement_spikes": details["engagement_spikes"],
+            "top_influencers": details["top_influencers"],
+            "vibe_trend": details["vibe_trend"]
+        }
+
+
+# Singleton instance
+incremental_service = IncrementalService()
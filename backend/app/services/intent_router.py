@@ -0,0 +1,237 @@
+import re
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from app.config import settings
+from app.database import execute, get_supabase
+from app.services.metrics import supabase_seconds
+
+logger = logging.getLogger(__name__)
+
+# Questions asking for reasons, examples or opinions need the comments themselves
+OPEN_ENDED = re.compile(r"\b(why|how come|explain|example|examples|quote|quotes|suggest|should|compare|what do .* say)\b", re.I)
+MAX_FAST_PATH_CHARS = 120
+
+# Filler allowed around an aggregate question; anything else (e.g. "how many
+# comments are negative?") leaves qualifiers the stored fields cannot answer
+QUESTION_PREFIX = r"(?:(?:hey|ok|so|please)[,\s]+)?(?:(?:can|could) you (?:please )?(?:tell|show|give) me\s+)?"
+QUESTION_SUFFIX = (
+    r"(?:\s+(?:are|were) there|\s+(?:did|do) (?:we|i|you) (?:get|have|find)|\s+(?:are|were) (?:found|identified))?"
+    r"(?:\s+(?:in (?:this|the) (?:video|analysis)|here|overall|in total|total|so far))?"
+    r"\s*(?:please)?\s*[?.!]*"
+)
+WHAT_IS_THE = r"(?:what(?:'s| is| are)\s+)?(?:the\s+)?"
+
+
+def _question(body: str) -> Pattern:
+    """A pattern that must match the whole question, filler included."""
+    return re.compile(rf"{QUESTION_PREFIX}(?:{body}){QUESTION_SUFFIX}", re.I)
+
+
+# (intent, pattern) pairs, checked in order against the whole question
+INTENT_PATTERNS: List[Tuple[str, Pattern]] = [
+    ("lead_count", _question(
+        r"(?:how many|number of|count of|percent(?:age)? of|% of|"
+        r"what(?:'s| is) the (?:number|count|percent(?:age)?) of)\s+(?:potential |possible |sales )?leads?"
+    )),
+    ("leads", _question(
+        r"(?:who are|list|show(?: me)?|give me|what are)\s+(?:the\s+)?(?:(?:top|best|all|potential)\s+)*leads?"
+        r"|top leads?"
+    )),
+    ("influencers", _question(
+        r"(?:who are |list |show(?: me)? |give me )?(?:the\s+)?"
+        r"(?:(?:(?:top|biggest|most influential)\s+)?influencers?|(?:top|biggest|most influential)\s+commenters?)"
+    )),
+    ("sentiment", _question(
+        WHAT_IS_THE + r"(?:overall\s+)?(?:sentiment|vibe score|mood|vibe|tone)(?:\s+(?:split|breakdown|score))?"
+        r"|positive vs\.? negative(?: comments)?|negative vs\.? positive(?: comments)?"
+    )),
+    ("comment_count", _question(
+        r"how many comments|" + WHAT_IS_THE + r"(?:total\s+)?(?:number|count) of comments"
+    )),
+    ("feedback_topics", _question(
+        WHAT_IS_THE + r"(?:top|main|key)\s+feedback(?:\s+(?:topics?|themes?|points?))?"
+    )),
+    ("discussed_topics", _question(
+        WHAT_IS_THE + r"(?:top|main|key|most discussed)\s+(?:topics?|themes?)"
+        r"|what are (?:people|viewers) (?:talking|discussing) about"
+    )),
+]
+
+# Columns the fast path reads; avoids pulling the full analysis
+HISTORY_COLUMNS = "sentiment_score,lead_percentage,total_comments,vectors_expired_at"
+DETAILS_COLUMNS = "sentiment_breakdown,leads,top_feedback_topics,top_discussed_topics,top_influencers"
+
+
+def classify(message: str) -> Optional[str]:
+    """
+    Return the aggregate intent of a chat question, or None for open-ended questions.
+
+    A pattern has to match the whole question, so qualifiers outside the
+    matched phrase ("how many leads mention pricing") send it to RAG.
+
+    Args:
+        message: User's chat message
+
+    Returns:
+        Intent name from INTENT_PATTERNS, or None
+    """
+    text = message.strip()
+    if len(text) > MAX_FAST_PATH_CHARS or OPEN_ENDED.search(text):
+        return None
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.fullmatch(text):
+            return intent
+    return None
+
+
+def _format_topics(title: str, topics: List[Dict[str, Any]]) -> str:
+    if not topics:
+        return f"No {title.lower()} were identified in this analysis."
+    lines = [f"**{title}:**"]
+    for topic in topics[:5]:
+        lines.append(f"- {topic['topic']} ({topic.get('count', 0)} comments)")
+    return "\n".join(lines)
+
+
+def _answer_sentiment(record: Dict[str, Any]) -> str:
+    breakdown = record["sentiment_breakdown"]
+    return "\n".join([
+        f"**Overall sentiment score:** {record['sentiment_score']}/100",
+        f"- Positive: {breakdown.get('positive', 0)}%",
+        f"- Neutral: {breakdown.get('neutral', 0)}%",
+        f"- Negative: {breakdown.get('negative', 0)}%",
+    ])
+
+
+def _answer_lead_count(record: Dict[str, Any]) -> str:
+    count = len(record["leads"])
+    return (
+        f"**{count} lead{'' if count == 1 else 's'}** identified "
+        f"({record['lead_percentage']}% of {record['total_comments']} analyzed comments)."
+    )
+
+
+def _answer_leads(record: Dict[str, Any]) -> str:
+    leads = record["leads"]
+    if not leads:
+        return "No leads were identified in this analysis."
+    lines = [f"**Top leads ({len(leads)} total):**"]
+    for lead in leads[:10]:
+        lines.append(f"- @{lead['username']}: \"{lead['text'][:150]}\"")
+    return "\n".join(lines)
+
+
+def _answer_influencers(record: Dict[str, Any]) -> str:
+    influencers = record["top_influencers"]
+    if not influencers:
+        return "No influencers were identified in this analysis."
+    lines = ["**Top influencers:**"]
+    for influencer in influencers[:10]:
+        lines.append(
+            f"- @{influencer['username']} (influence {influencer.get('influenceScore', 0)}, "
+            f"{influencer.get('engagementCount', 0)} engagements) on {influencer.get('mainTopic', 'n/a')}"
+        )
+    return "\n".join(lines)
+
+
+def _answer_comment_count(record: Dict[str, Any]) -> str:
+    return f"**{record['total_comments']} comments** were analyzed."
+
+
+ANSWERS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "sentiment": _answer_sentiment,
+    "lead_count": _answer_lead_count,
+    "leads": _answer_leads,
+    "influencers": _answer_influencers,
+    "comment_count": _answer_comment_count,
+    "feedback_topics": lambda record: _format_topics("Top feedback topics", record["top_feedback_topics"]),
+    "discussed_topics": lambda record: _format_topics("Top discussed topics", record["top_discussed_topics"]),
+}
+
+
+class IntentRouter:
+    """
+    Answers aggregate chat questions directly from the stored analysis.
+
+    Questions like "what's the sentiment split?" or "how many leads?" are
+    lookups against fields Gemini already produced, so they skip the
+    embedding call, Pinecone query and LLM completion entirely. The
+    projected analysis record is kept in a small LRU per analysis_id.
+    """
+
+    def __init__(self):
+        self.max_records = settings.chat_cache_max_analyses
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def answer(self, analysis_id: str, message: str) -> Optional[str]:
+        """
+        Answer an aggregate question from stored results.
+
+        Args:
+            analysis_id: Analysis the question is about
+            message: User's chat message
+
+        Returns:
+            Formatted answer, or None if the question needs the RAG pipeline
+        """
+        intent = classify(message)
+        if intent is None:
+            return None
+
+        record = await self._load(analysis_id)
+        if record is None:
+            return None
+
+        logger.info(f"Answering chat intent '{intent}' for analysis {analysis_id} from stored results")
+        return ANSWERS[intent](record)
+
+    async def vectors_expired(self, analysis_id: str) -> bool:
+        """Whether an analysis's vectors were garbage-collected, so chat has no comments to search."""
+        record = await self._load(analysis_id)
+        return bool(record and record.get("vectors_expired_at"))
+
+    def invalidate(self, analysis_id: str):
+        """Drop the cached record for an analysis, e.g. after it is recomputed."""
+        with self._lock:
+            self._records.pop(analysis_id, None)
+
+    async def _load(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(analysis_id)
+            if record is not None:
+                self._records.move_to_end(analysis_id)
+                return record
+
+        try:
+            record = await self._fetch(analysis_id)
+        except Exception as e:
+            logger.error(f"Error loading analysis {analysis_id} for chat: {str(e)}")
+            return None
+        if record is None:
+            return None
+
+        with self._lock:
+            self._records[analysis_id] = record
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+        return record
+
+    @staticmethod
+    async def _fetch(analysis_id: str) -> Optional[Dict[str, Any]]:
+        supabase = get_supabase()
+        with supabase_seconds.time(table="analysis_history", operation="select"):
+            history = await execute(supabase.table("analysis_history").select(HISTORY_COLUMNS).eq("id", analysis_id))
+        with supabase_seconds.time(table="analysis_details", operation="select"):
+            details = await execute(
+                supabase.table("analysis_details").select(DETAILS_COLUMNS).eq("analysis_history_id", analysis_id)
+            )
+        if not history.data or not details.data:
+            return None
+        return {**history.data[0], **details.data[0]}
+
+
+# Singleton instance
+intent_router = IntentRouter()
@@ -1,32 +1,94 @@
 import asyncio
-from typing import Dict, Optional
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 import uuid
 import logging
-from app.database import get_supabase
+from app.config import settings
+from app.database import execute, get_supabase
 from app.services.apify_service import apify_service
 from app.services.parser_service import parse_quill_comments
 from app.services.embeddings_service import embeddings_service
 from app.services.pinecone_service import pinecone_service
+from app.services.comment_store import comment_store
+from app.services.sparse_index import sparse_index
 from app.services.gemini_service import gemini_service
+from app.services.chat_cache import chat_cache
+from app.services.intent_router import intent_router
+from app.services.report_cache import report_cache
+from app.services.incremental import Manifest, build_manifest, diff_comments, incremental_service, merge_results
+from app.services.eta_service import eta_estimator, AVG_PROMPT_CHARS_PER_COMMENT
+from app.services.loop_monitor import loop_monitor
+from app.services.resilience import resilience
+from app.services.sampling import finalize, max_sample_size, stratified_sample
+from app.services.metrics import (
+    analysis_stage_seconds,
+    analysis_jobs_total,
+    jobs_in_flight,
+    queue_depth
+)
 
 logger = logging.getLogger(__name__)
 
+# Comments scraped per video
+MAX_COMMENTS = 500
+
 
 class JobManager:
     def __init__(self):
         # In-memory storage for active jobs
         self.jobs: Dict[str, Dict] = {}
+        # Running pipeline tasks, kept so jobs can be cancelled
+        self.tasks: Dict[str, asyncio.Task] = {}
+        jobs_in_flight.set_function(lambda: self._count_jobs("PROCESSING"))
+        queue_depth.set_function(lambda: self._count_jobs("PENDING"))
+    
+    def _count_jobs(self, status: str) -> int:
+        """Count in-memory jobs with the given status."""
+        return sum(1 for job in self.jobs.values() if job["status"] == status)
     
-    def create_job(self, job_id: str, url: str):
+    def create_job(
+        self,
+        job_id: str,
+        url: str,
+        max_comments: int = 500,
+        status: str = "PROCESSING",
+        incremental: bool = False,
+        base_analysis_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        sampling: bool = False
+    ):
         """Create a new job tracking entry."""
+        if sampling:
+            # Only the sample is embedded and analyzed
+            max_comments = max_sample_size()
         self.jobs[job_id] = {
-            "status": "PROCESSING",
+            "status": status,
             "embeddings_progress": 0,
             "gemini_progress": 0,
             "estimated_time_remaining": None,
             "error": None,
-            "analysis_id": None
+            "analysis_id": None,
+            # Namespace being written before its analysis row exists
+            "pending_analysis_id": None,
+            # New comments upserted into the base analysis by a refresh not yet saved
+            "added_comment_ids": None,
+            "max_comments": max_comments,
+            # Stage name -> "RUNNING" / "DONE", used for ETA estimation
+            "stages": {},
+            "stage_started_at": {},
+            "sizes": {"comments": None, "prompt_chars": None},
+            # Gemini analyzes a topic digest, so it waits for the embeddings
+            "digest": None,
+            "cancel_reason": None,
+            # Refresh a previous analysis with only new comments
+            "incremental": incremental,
+            "base_analysis_id": base_analysis_id,
+            # Analyze a stratified sample of up to SAMPLING_MAX_COMMENTS comments
+            "sampling": sampling,
+            # Tenant that owns the analysis and its vectors
+            "user_id": user_id
         }
         logger.info(f"Created job {job_id} for URL: {url}")
     
@@ -46,6 +108,65 @@ class JobManager:
         """Get current status of a job."""
         return self.jobs.get(job_id)
     
+    def estimate_time_remaining(self, job_id: str) -> Optional[int]:
+        """Estimate seconds remaining for a running job from historical stage timings."""
+        job = self.jobs.get(job_id)
+        if not job or job["status"] not in ("PENDING", "PROCESSING"):
+            return None
+        
+        now = time.monotonic()
+        sizes = self._expected_sizes(job["sizes"], job["max_comments"])
+        digest = job["digest"]
+        if digest is None:
+            digest = gemini_service.uses_digest(sizes["comments"])
+        return eta_estimator.estimate_remaining(
+            job["stages"],
+            {stage: now - started for stage, started in job["stage_started_at"].items()},
+            sizes,
+            digest
+        )
+    
+    def expected_job_seconds(self, max_comments: int = 500) -> int:
+        """Predict the full duration of a job that has not started yet."""
+        return eta_estimator.estimate_remaining(
+            {},
+            {},
+            self._expected_sizes({"comments": None, "prompt_chars": None}, max_comments),
+            gemini_service.uses_digest(max_comments)
+        )
+    
+    def _expected_sizes(self, sizes: Dict, max_comments: int) -> Dict:
+        """Fill in input sizes that have not been measured yet."""
+        sizes = dict(sizes)
+        if sizes["comments"] is None:
+            # Not fetched yet: assume the requested maximum
+            sizes["comments"] = max_comments
+        if sizes["prompt_chars"] is None:
+            sizes["prompt_chars"] = sizes["comments"] * AVG_PROMPT_CHARS_PER_COMMENT
+        return sizes
+    
+    @contextmanager
+    def _stage(self, job_id: str, stage: str) -> Iterator[None]:
+        """Track a pipeline stage for metrics and ETA estimation."""
+        job = self.jobs.get(job_id)
+        started = time.monotonic()
+        if job:
+            job["stages"][stage] = "RUNNING"
+            job["stage_started_at"][stage] = started
+        
+        with analysis_stage_seconds.time(stage=stage):
+            yield
+        
+        if job:
+            job["stages"][stage] = "DONE"
+            job["stage_started_at"].pop(stage, None)
+            eta_estimator.record(stage, time.monotonic() - started, job["sizes"])
+    
+    def _set_size(self, job_id: str, key: str, value: int):
+        """Record a measured input size for a job."""
+        if job_id in self.jobs:
+            self.jobs[job_id]["sizes"][key] = value
+    
     def mark_complete(self, job_id: str, analysis_id: str):
         """Mark a job as completed."""
         if job_id in self.jobs:
@@ -53,6 +174,7 @@ class JobManager:
             self.jobs[job_id]["analysis_id"] = analysis_id
             self.jobs[job_id]["embeddings_progress"] = 100
             self.jobs[job_id]["gemini_progress"] = 100
+            analysis_jobs_total.inc(status="COMPLETED")
             logger.info(f"Job {job_id} completed with analysis {analysis_id}")
     
     def mark_failed(self, job_id: str, error: str):
@@ -60,150 +182,497 @@ class JobManager:
         if job_id in self.jobs:
             self.jobs[job_id]["status"] = "FAILED"
             self.jobs[job_id]["error"] = error
+            analysis_jobs_total.inc(status="FAILED")
             logger.error(f"Job {job_id} failed: {error}")
     
+    def mark_cancelled(self, job_id: str, reason: str):
+        """Mark a job as cancelled."""
+        if job_id in self.jobs:
+            self.jobs[job_id]["status"] = "CANCELLED"
+            self.jobs[job_id]["error"] = reason
+            analysis_jobs_total.inc(status="CANCELLED")
+            logger.info(f"Job {job_id} cancelled: {reason}")
+    
+    def start_job(self, job_id: str, url: str) -> asyncio.Task:
+        """
+        Start processing a job as a cancellable task with a deadline.
+        The task is cancelled if it runs longer than JOB_DEADLINE_SECONDS, or
+        SAMPLING_DEADLINE_SECONDS for a sampled job, whose scrape alone can
+        take longer than a whole regular job.
+        """
+        job = self.jobs.get(job_id) or {}
+        if job:
+            job["status"] = "PROCESSING"
+        deadline_seconds = settings.sampling_deadline_seconds if job.get("sampling") else settings.job_deadline_seconds
+        
+        task = asyncio.create_task(self.process_analysis(job_id, url))
+        self.tasks[job_id] = task
+        
+        deadline = asyncio.get_running_loop().call_later(
+            deadline_seconds,
+            self._cancel_task,
+            job_id,
+            f"Deadline of {deadline_seconds}s exceeded"
+        )
+        
+        def _on_done(_):
+            deadline.cancel()
+            self.tasks.pop(job_id, None)
+        
+        task.add_done_callback(_on_done)
+        return task
+    
+    def cancel_job(self, job_id: str) -> bool:
+        """
+        Cancel a running job.
+        
+        Returns:
+            True if a running task was cancelled, False if none was running
+        """
+        return self._cancel_task(job_id, "Cancelled by user")
+    
+    def _cancel_task(self, job_id: str, reason: str) -> bool:
+        task = self.tasks.get(job_id)
+        if not task or task.done():
+            return False
+        if job_id in self.jobs:
+            self.jobs[job_id]["cancel_reason"] = reason
+        task.cancel()
+        return True
+    
+    async def save_analysis(
+        self,
+        analysis_id: str,
+        url: str,
+        gemini_result: Dict,
+        parsed_comments: Optional[List[Dict]] = None,
+        tenant_id: Optional[str] = None
+    ):
+        """
+        Insert an analysis into analysis_history and analysis_details.
+        When parsed_comments is given, also store the comment manifest that
+        later incremental runs diff against. tenant_id attributes the
+        analysis's vectors in index size reports.
+        """
+        supabase = get_supabase()
+        history_data, details_data = self._analysis_rows(gemini_result)
+        
+        # Insert into analysis_history
+        await execute(supabase.table("analysis_history").insert({
+            "id": analysis_id,
+            "url": url,
+            "platform": "youtube",
+            "tenant_id": tenant_id,
+            **history_data
+        }), retry=False)
+        
+        # Insert into analysis_details
+        await execute(supabase.table("analysis_details").insert({
+            "analysis_history_id": analysis_id,
+            **details_data
+        }), retry=False)
+        
+        if parsed_comments is not None:
+            await self._save_manifest(analysis_id, build_manifest(parsed_comments))
+        
+        self._invalidate_caches(analysis_id)
+    
+    async def update_analysis(self, analysis_id: str, gemini_result: Dict, manifest: Manifest):
+        """Rewrite an existing analysis in place after an incremental refresh."""
+        supabase = get_supabase()
+        history_data, details_data = self._analysis_rows(gemini_result)
+        
+        await execute(supabase.table("analysis_history").update({
+            **history_data,
+            "updated_at": datetime.now().isoformat()
+        }).eq("id", analysis_id))
+        
+        await execute(supabase.table("analysis_details").update(details_data).eq(
+            "analysis_history_id", analysis_id
+        ))
+        
+        await self._save_manifest(analysis_id, manifest)
+        self._invalidate_caches(analysis_id)
+    
+    def _analysis_rows(self, gemini_result: Dict) -> Tuple[Dict, Dict]:
+        """Split an analysis into its analysis_history and analysis_details columns."""
+        history_data = {
+            "sentiment_score": gemini_result["sentiment_score"],
+            "lead_percentage": gemini_result["lead_percentage"],
+            "total_comments": gemini_result["total_comments"]
+        }
+        details_data = {
+            "sentiment_breakdown": gemini_result["sentiment_breakdown"],
+            "leads": gemini_result["leads"],
+            "top_feedback_topics": gemini_result["top_feedback_topics"],
+            "top_discussed_topics": gemini_result["top_discussed_topics"],
+            "actionable_todos": gemini_result.get("actionable_todos", []),
+            "creator_insights": gemini_result.get("creator_insights", []),
+            "competitor_insights": gemini_result.get("competitor_insights", []),
+            "engagement_spikes": gemini_result["engagement_spikes"],
+            "top_influencers": gemini_result["top_influencers"],
+            "vibe_trend": gemini_result["vibe_trend"],
+            "sampling": gemini_result.get("sampling")
+        }
+        return history_data, details_data
+    
+    async def _save_manifest(self, analysis_id: str, manifest: Manifest):
+        # A missing manifest only disables incremental refresh, so never fail the job
+        try:
+            await incremental_service.save_manifest(analysis_id, manifest)
+        except Exception as e:
+            logger.error(f"Error saving comment manifest for {analysis_id}: {str(e)}")
+    
+    def _invalidate_caches(self, analysis_id: str):
+        # Cached chat answers and reports describe the previous results
+        chat_cache.invalidate(analysis_id)
+        intent_router.invalidate(analysis_id)
+        report_cache.invalidate(analysis_id)
+    
+    @loop_monitor.track("job_manager.process_analysis")
     async def process_analysis(self, job_id: str, url: str):
         """
         Main orchestration function for processing analysis.
-        This runs as a background task.
+        This runs as a background task, so provider retries are charged to
+        this job's own budget.
         """
         supabase = get_supabase()
         analysis_id = None
+        resilience.start_budget(settings.job_retry_budget)
         
         try:
             logger.info(f"Starting analysis for job {job_id}")
+            job = self.jobs.get(job_id) or {}
+            # The job row is inserted as PENDING before the job is admitted
+            await execute(supabase.table("analysis_jobs").update({
+                "status": "PROCESSING"
+            }).eq("id", job_id))
+            
+            # Incremental mode: refresh the previous analysis with only new comments
+            base_analysis_id = None
+            if job.get("incremental"):
+                base_analysis_id = await incremental_service.find_base_analysis(url, job.get("base_analysis_id"))
+                if base_analysis_id:
+                    # Keeps the namespace safe from garbage collection while it is refreshed
+                    job["base_analysis_id"] = base_analysis_id
+                else:
+                    logger.info(f"No previous analysis with a manifest for {url}; running a full analysis")
             
             # Step 1: Fetch comments from Apify
             logger.info("Step 1: Fetching comments from Apify")
-            raw_comments = await apify_service.fetch_comments(url, max_comments=500)
+            with self._stage(job_id, "fetch_comments"):
+                raw_comments = await apify_service.fetch_comments(
+                    url,
+                    max_comments=settings.sampling_max_comments if job.get("sampling") else MAX_COMMENTS,
+                    # A refresh needs every new comment, not the most relevant ones.
+                    # A sample is drawn from the scrape, and a capped scrape in
+                    # relevance order would over-represent engaged comments
+                    newest_first=base_analysis_id is not None or job.get("sampling", False)
+                )
+                self._set_size(job_id, "comments", len(raw_comments))
             
             if not raw_comments:
                 raise Exception("No comments fetched from Apify")
             
             # Step 2: Parse comments
             logger.info("Step 2: Parsing comments")
-            parsed_comments = parse_quill_comments(raw_comments)
+            with self._stage(job_id, "parse"):
+                parsed_comments = parse_quill_comments(raw_comments)
             
             if not parsed_comments:
                 raise Exception("No valid comments after parsing")
             
-            # Step 3: Create analysis_id
-            analysis_id = str(uuid.uuid4())
-            logger.info(f"Created analysis ID: {analysis_id}")
+            if base_analysis_id:
+                await self._process_incremental(
+                    job_id,
+                    base_analysis_id,
+                    parsed_comments,
+                    scrape_complete=len(raw_comments) < MAX_COMMENTS
+                )
+                return
             
-            # Step 4: Run embeddings and Gemini in parallel
-            logger.info("Step 4: Running parallel processing (embeddings + Gemini)")
+            # Sampling mode: embed and analyze a stratified sample of the comments
+            analyzed_comments, design = parsed_comments, None
+            if job.get("sampling"):
+                analyzed_comments, design = await asyncio.to_thread(stratified_sample, parsed_comments, url)
+                if design:
+                    # A capped scrape only covers the newest comments
+                    design["frame_complete"] = len(raw_comments) < settings.sampling_max_comments
             
-            # Create tasks for parallel execution
-            embeddings_task = asyncio.create_task(
-                self._generate_embeddings(job_id, parsed_comments, analysis_id)
-            )
+            self._set_size(job_id, "comments", len(analyzed_comments))
+            self._set_size(job_id, "prompt_chars", gemini_service.prompt_size(analyzed_comments))
+            self._set_digest(job_id, gemini_service.uses_digest(len(analyzed_comments)))
             
-            gemini_task = asyncio.create_task(
-                self._run_gemini_analysis(job_id, parsed_comments)
-            )
+            # Step 3: Create analysis_id
+            analysis_id = str(uuid.uuid4())
+            # Keeps the namespace safe from garbage collection until it is saved
+            job["pending_analysis_id"] = analysis_id
+            logger.info(f"Created analysis ID: {analysis_id}")
             
-            # Wait for both to complete
-            embeddings_result, gemini_result = await asyncio.gather(
-                embeddings_task,
-                gemini_task,
-                return_exceptions=True
+            # Step 4: Run embeddings and Gemini
+            logger.info("Step 4: Running embeddings and Gemini analysis")
+            gemini_result = await self._embed_and_analyze(
+                job_id, analyzed_comments, analysis_id, analyzed_comments, design
             )
-            
-            # Check for errors
-            if isinstance(embeddings_result, Exception):
-                raise embeddings_result
-            if isinstance(gemini_result, Exception):
-                raise gemini_result
+            if design:
+                gemini_result = finalize(gemini_result, design, parsed_comments)
             
             # Step 5: Store results in Supabase
             logger.info("Step 5: Storing results in Supabase")
             
-            # Insert into analysis_history
-            history_data = {
-                "id": analysis_id,
-                "url": url,
-                "platform": "youtube",
-                "sentiment_score": gemini_result["sentiment_score"],
-                "lead_percentage": gemini_result["lead_percentage"],
-                "total_comments": gemini_result["total_comments"]
-            }
-            
-            supabase.table("analysis_history").insert(history_data).execute()
-            
-            # Insert into analysis_details
-            details_data = {
-                "analysis_history_id": analysis_id,
-                "sentiment_breakdown": gemini_result["sentiment_breakdown"],
-                "leads": gemini_result["leads"],
-                "top_feedback_topics": gemini_result["top_feedback_topics"],
-                "top_discussed_topics": gemini_result["top_discussed_topics"],
-                "actionable_todos": gemini_result.get("actionable_todos", []),
-                "creator_insights": gemini_result.get("creator_insights", []),
-                "competitor_insights": gemini_result.get("competitor_insights", []),
-                "engagement_spikes": gemini_result["engagement_spikes"],
-                "top_influencers": gemini_result["top_influencers"],
-                "vibe_trend": gemini_result["vibe_trend"]
-            }
-            
-            supabase.table("analysis_details").insert(details_data).execute()
+            with self._stage(job_id, "store"):
+                await asyncio.to_thread(sparse_index.build, analysis_id)
+                # A sampled analysis keeps no manifest, so it is never refreshed incrementally
+                await self.save_analysis(
+                    analysis_id,
+                    url,
+                    gemini_result,
+                    None if design else parsed_comments,
+                    job.get("user_id")
+                )
+                await self._complete_job(job_id, analysis_id)
             
-            # Update job record in Supabase
-            supabase.table("analysis_jobs").update({
-                "status": "COMPLETED",
-                "analysis_id": analysis_id,
-                "embeddings_progress": 100,
-                "gemini_progress": 100,
-                "completed_at": datetime.now().isoformat()
-            }).eq("id", job_id).execute()
+            logger.info(f"Analysis completed successfully for job {job_id}")
             
-            # Mark job as complete in memory
-            self.mark_complete(job_id, analysis_id)
+        except asyncio.CancelledError:
+            job = self.jobs.get(job_id) or {}
+            reason = job.get("cancel_reason") or "Cancelled"
+            self.mark_cancelled(job_id, reason)
             
-            logger.info(f"Analysis completed successfully for job {job_id}")
+            # Remove partially upserted vectors so abandoned jobs free capacity
+            if analysis_id:
+                await pinecone_service.delete_namespace(analysis_id)
+            elif job.get("added_comment_ids"):
+                await self._discard_added_comments(job["base_analysis_id"], job["added_comment_ids"])
+            
+            await execute(supabase.table("analysis_jobs").update({
+                "status": "CANCELLED",
+                "error": reason
+            }).eq("id", job_id))
             
         except Exception as e:
             logger.error(f"Error processing analysis for job {job_id}: {str(e)}")
             self.mark_failed(job_id, str(e))
             
             # Update job record in Supabase
-            supabase.table("analysis_jobs").update({
+            await execute(supabase.table("analysis_jobs").update({
                 "status": "FAILED",
                 "error": str(e)
-            }).eq("id", job_id).execute()
+            }).eq("id", job_id))
     
-    async def _generate_embeddings(self, job_id: str, parsed_comments: list, analysis_id: str):
-        """Generate embeddings and upsert to Pinecone."""
+    async def _complete_job(self, job_id: str, analysis_id: str):
+        """Record a finished job in Supabase and in memory."""
+        await execute(get_supabase().table("analysis_jobs").update({
+            "status": "COMPLETED",
+            "analysis_id": analysis_id,
+            "embeddings_progress": 100,
+            "gemini_progress": 100,
+            "completed_at": datetime.now().isoformat()
+        }).eq("id", job_id))
+        
+        self.mark_complete(job_id, analysis_id)
+    
+    async def _discard_added_comments(self, analysis_id: str, comment_ids: List[str]):
+        """
+        Delete the new comments a cancelled refresh upserted into its base
+        analysis, which still describes the comments it had before. Edited
+        comments keep their re-embedded vectors, as their old text is gone.
+        """
+        try:
+            await pinecone_service.delete_vectors(comment_ids, analysis_id)
+        except Exception as e:
+            logger.error(f"Error discarding comments added to {analysis_id}: {str(e)}")
+    
+    async def _process_incremental(
+        self,
+        job_id: str,
+        analysis_id: str,
+        parsed_comments: list,
+        scrape_complete: bool
+    ):
+        """
+        Refresh an existing analysis using only new and edited comments.
+        
+        The fresh scrape is diffed against the previous run's manifest by
+        comment ID. Only the delta is embedded and upserted into the existing
+        namespace (IDs are cids, so edited comments overwrite their old
+        vectors) and analyzed by Gemini; the result is merged into the
+        stored analysis. If the delta exceeds INCREMENTAL_MAX_DELTA_RATIO of
+        all comments, Gemini re-analyzes everything instead of merging.
+        
+        The refresh scrapes newest first. When it hit its comment limit,
+        previous comments missing from it that are not newer than its oldest
+        comment may just be past the limit rather than deleted, so they are
+        kept; missing comments newer than that were deleted.
+        """
+        manifest, previous = await asyncio.gather(
+            incremental_service.load_manifest(analysis_id),
+            incremental_service.load_result(analysis_id)
+        )
+        if manifest is None or previous is None:
+            raise Exception(f"Previous analysis {analysis_id} not found")
+        
+        changed, removed, unchanged = diff_comments(manifest, parsed_comments)
+        kept = {}
+        # Every comment of the analysis after the refresh, unless some kept ones are not stored
+        current = parsed_comments
+        if removed and not scrape_complete:
+            oldest = min(comment["date"] for comment in parsed_comments)
+            documents = await asyncio.to_thread(comment_store.get, analysis_id, removed)
+            beyond = [cid for cid in removed if cid not in documents or documents[cid]["date"] <= oldest]
+            kept = {cid: manifest[cid] for cid in beyond}
+            stored = [documents[cid] for cid in beyond if cid in documents]
+            current = parsed_comments + stored if len(stored) == len(beyond) else None
+            unchanged += len(beyond)
+            removed = [cid for cid in removed if cid not in kept]
+        if not scrape_complete and len(changed) == len(parsed_comments):
+            logger.warning(
+                f"Every scraped comment of {analysis_id} is new or edited; "
+                f"new comments past the {len(parsed_comments)}-comment limit are missed"
+            )
+        full_gemini = len(changed) > settings.incremental_max_delta_ratio * len(parsed_comments)
+        gemini_comments = parsed_comments if full_gemini else changed
+        logger.info(
+            f"Incremental refresh of {analysis_id}: {len(changed)} new/edited, "
+            f"{len(removed)} removed, {unchanged} unchanged"
+            f"{' (full Gemini re-analysis)' if full_gemini else ''}"
+        )
+        
+        self._set_size(job_id, "comments", len(changed))
+        self._set_size(job_id, "prompt_chars", gemini_service.prompt_size(gemini_comments))
+        # A full re-analysis covers comments whose embeddings are not recomputed
+        self._set_digest(job_id, not full_gemini and gemini_service.uses_digest(len(changed)))
+        
+        if changed:
+            if job_id in self.jobs:
+                self.jobs[job_id]["added_comment_ids"] = [
+                    comment["id"] for comment in changed if comment["id"] not in manifest
+                ]
+            gemini_result = await self._embed_and_analyze(job_id, changed, analysis_id, gemini_comments)
+            
+            if full_gemini:
+                result = {**gemini_result, "total_comments": unchanged + len(changed)}
+            else:
+                result = merge_results(previous, gemini_result, unchanged, len(changed), current)
+        else:
+            # Only deletions (or nothing) changed; drop their share of the analysis
+            result = merge_results(previous, {}, unchanged, 0, current)
+        
+        with self._stage(job_id, "store"):
+            if removed:
+                await pinecone_service.delete_vectors(removed, analysis_id)
+            if changed or removed:
+                await asyncio.to_thread(sparse_index.build, analysis_id)
+            await self.update_analysis(analysis_id, result, {**kept, **build_manifest(parsed_comments)})
+            if job_id in self.jobs:
+                # The saved analysis now includes the added comments
+                self.jobs[job_id]["added_comment_ids"] = None
+            await self._complete_job(job_id, analysis_id)
+        
+        logger.info(f"Incremental analysis completed for job {job_id}")
+    
+    def _set_digest(self, job_id: str, digest: bool):
+        """Record whether Gemini gets a topic digest of the embedded comments."""
+        if job_id in self.jobs:
+            self.jobs[job_id]["digest"] = digest
+    
+    async def _embed_and_analyze(
+        self,
+        job_id: str,
+        embed_comments: list,
+        analysis_id: str,
+        gemini_comments: list,
+        design: Optional[Dict] = None
+    ):
+        """
+        Embed and upsert comments, and run the Gemini analysis.
+        
+        Both branches run in parallel, unless Gemini analyzes a topic digest
+        of the embedded comments: then it starts once the embeddings are
+        ready, alongside the Pinecone upsert. design is the sample design
+        when the comments are a stratified sample.
+        
+        Returns:
+            Gemini analysis result
+        """
+        if (self.jobs.get(job_id) or {}).get("digest"):
+            embeddings = await self._embed(job_id, embed_comments)
+            branches = (
+                self._generate_embeddings(job_id, embed_comments, analysis_id, embeddings),
+                self._run_gemini_analysis(job_id, gemini_comments, embeddings, design)
+            )
+        else:
+            branches = (
+                self._generate_embeddings(job_id, embed_comments, analysis_id),
+                self._run_gemini_analysis(job_id, gemini_comments)
+            )
+        
+        embeddings_result, gemini_result = await asyncio.gather(*branches, return_exceptions=True)
+        if isinstance(embeddings_result, Exception):
+            raise embeddings_result
+        if isinstance(gemini_result, Exception):
+            raise gemini_result
+        return gemini_result
+    
+    async def _embed(self, job_id: str, parsed_comments: list) -> List[List[float]]:
+        """Generate embeddings with progress tracking."""
         try:
             # Extract texts for embedding
             texts = [comment["text_for_embedding"] for comment in parsed_comments]
             
             # Generate embeddings with progress callback
-            embeddings = await embeddings_service.get_embeddings(
-                texts,
-                progress_callback=lambda p: self.update_embeddings_progress(job_id, p)
-            )
+            with self._stage(job_id, "embeddings"):
+                return await embeddings_service.get_embeddings(
+                    texts,
+                    progress_callback=lambda p: self.update_embeddings_progress(job_id, p)
+                )
             
+        except Exception as e:
+            logger.error(f"Error in embeddings generation: {str(e)}")
+            raise
+    
+    async def _generate_embeddings(
+        self,
+        job_id: str,
+        parsed_comments: list,
+        analysis_id: str,
+        embeddings: Optional[List[List[float]]] = None
+    ):
+        """Generate embeddings (unless already computed) and upsert to Pinecone."""
+        if embeddings is None:
+            embeddings = await self._embed(job_id, parsed_comments)
+        
+        try:
             # Upsert to Pinecone
-            await pinecone_service.upsert_to_pinecone(
-                parsed_comments,
-                embeddings,
-                analysis_id
-            )
+            with self._stage(job_id, "pinecone_upsert"):
+                await pinecone_service.upsert_to_pinecone(
+                    parsed_comments,
+                    embeddings,
+                    analysis_id
+                )
             
             return True
             
         except Exception as e:
-            logger.error(f"Error in embeddings generation: {str(e)}")
+            logger.error(f"Error upserting embeddings: {str(e)}")
             raise
     
-    async def _run_gemini_analysis(self, job_id: str, parsed_comments: list):
-        """Run Gemini analysis with progress tracking."""
+    async def _run_gemini_analysis(
+        self,
+        job_id: str,
+        parsed_comments: list,
+        embeddings: Optional[List[List[float]]] = None,
+        design: Optional[Dict] = None
+    ):
+        """Run Gemini analysis with progress tracking; given embeddings, of a topic digest."""
         try:
-            result = await gemini_service.analyze_with_gemini(
-                parsed_comments,
-                progress_callback=lambda p: self.update_gemini_progress(job_id, p)
-            )
+            with self._stage(job_id, "gemini" if embeddings is None else "gemini_digest"):
+                result = await gemini_service.analyze_with_gemini(
+                    parsed_comments,
+                    progress_callback=lambda p: self.update_gemini_progress(job_id, p),
+                    embeddings=embeddings,
+                    design=design
+                )
             return result
             
         except Exception as e:
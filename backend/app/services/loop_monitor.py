@@ -0,0 +1,218 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import logging
+from collections import Counter, deque
+from types import CodeType, FrameType
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+from app.config import settings
+from app.services.metrics import event_loop_lag_seconds, event_loop_stall_seconds
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Upper bounds (in milliseconds) for the stall histogram buckets
+STALL_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+UNATTRIBUTED_SITE = "unattributed"
+
+
+class StallHistogram:
+    """Cumulative bucket counts for event-loop stall durations."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(STALL_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        for i, bound in enumerate(STALL_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.bucket_counts[i] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {
+                **{f"le_{bound}": n for bound, n in zip(STALL_BUCKETS_MS, self.bucket_counts)},
+                "le_inf": self.count
+            }
+        }
+
+
+class LoopMonitor:
+    """
+    Detects event-loop stalls and attributes them to instrumented call sites.
+
+    A heartbeat coroutine measures how late the loop wakes it up (loop lag).
+    A watchdog thread samples the loop thread's stack while the heartbeat is
+    overdue, and the innermost frame belonging to a function registered with
+    `track()` is blamed for the stall.
+    """
+
+    def __init__(self):
+        self.enabled = settings.loop_monitor_enabled
+        self.threshold_ms = settings.loop_stall_threshold_ms
+        self.interval = settings.loop_monitor_interval_ms / 1000
+        self.max_samples = settings.loop_monitor_stack_samples
+
+        self._sites: Dict[CodeType, str] = {}
+        self._histograms: Dict[str, StallHistogram] = {}
+        self._samples: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._lag = StallHistogram()
+
+        self._lock = threading.Lock()
+        self._pending_sites: Counter = Counter()
+        self._pending_stack: Optional[List[str]] = None
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def track(self, site: str) -> Callable[[F], F]:
+        """
+        Register a function as a stall call site.
+
+        The function is returned unchanged, so tracking adds no per-call
+        overhead; attribution happens by matching code objects on the stack.
+
+        Args:
+            site: Label reported for stalls inside this function
+        """
+        def decorator(func: F) -> F:
+            self._sites[func.__code__] = site
+            return func
+        return decorator
+
+    async def start(self):
+        """Start the heartbeat and watchdog if instrumentation is enabled."""
+        if not self.enabled or self._heartbeat_task:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch,
+            name="loop-monitor-watchdog",
+            daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            f"Loop monitor started (threshold {self.threshold_ms}ms, "
+            f"interval {int(self.interval * 1000)}ms)"
+        )
+
+    async def stop(self):
+        """Stop the heartbeat and watchdog."""
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - scheduled - self.interval) * 1000)
+
+            with self._lock:
+                self._last_tick = now
+                self._lag.observe(lag_ms)
+                event_loop_lag_seconds.observe(lag_ms / 1000)
+                sites = self._pending_sites
+                stack = self._pending_stack
+                self._pending_sites = Counter()
+                self._pending_stack = None
+
+                if lag_ms >= self.threshold_ms:
+                    self._record_stall(lag_ms, sites, stack)
+
+    def _watch(self):
+        # Sample a few times per heartbeat so short stalls still get a stack
+        poll = max(self.interval / 2, 0.005)
+        while not self._stop.wait(poll):
+            overdue_ms = (time.monotonic() - self._last_tick - self.interval) * 1000
+            if overdue_ms < self.threshold_ms / 2:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            site = self._attribute(frame)
+            with self._lock:
+                self._pending_sites[site] += 1
+                if self._pending_stack is None:
+                    self._pending_stack = traceback.format_stack(frame, limit=20)
+
+    def _attribute(self, frame: Optional[FrameType]) -> str:
+        """Return the innermost tracked call site on the given stack."""
+        while frame is not None:
+            site = self._sites.get(frame.f_code)
+            if site:
+                return site
+            frame = frame.f_back
+        return UNATTRIBUTED_SITE
+
+    def _record_stall(self, lag_ms: float, sites: Counter, stack: Optional[List[str]]):
+        site = sites.most_common(1)[0][0] if sites else UNATTRIBUTED_SITE
+
+        self._histograms.setdefault(site, StallHistogram()).observe(lag_ms)
+        event_loop_stall_seconds.observe(lag_ms / 1000, site=site)
+        samples = self._samples.setdefault(site, deque(maxlen=self.max_samples))
+        samples.append({
+            "duration_ms": round(lag_ms, 2),
+            "at": time.time(),
+            "stack": [line.rstrip() for line in stack] if stack else []
+        })
+
+        logger.warning(f"Event loop stalled for {lag_ms:.0f}ms in {site}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return loop lag and per-call-site stall statistics."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_ms": self.threshold_ms,
+                "loop_lag": self._lag.to_dict(),
+                "sites": {
+                    site: {
+                        **histogram.to_dict(),
+                        "samples": list(self._samples.get(site, []))
+                    }
+                    for site, histogram in sorted(
+                        self._histograms.items(),
+                        key=lambda item: item[1].total_ms,
+                        reverse=True
+                    )
+                }
+            }
+
+    def reset(self):
+        """Clear all recorded stalls."""
+        with self._lock:
+            self._histograms.clear()
+            self._samples.clear()
+            self._lag = StallHistogram()
+
+
+# Singleton instance
+loop_monitor = LoopMonitor()
@@ -0,0 +1,406 @@
+import math
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Token count buckets for prompt/output size histograms
+TOKEN_BUCKETS = (100, 500, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+# USD per 1M tokens as (input, output); used for cost estimation only
+MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+    "text-embedding-3-small": (0.02, 0.0),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+}
+
+LabelKey = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed on scrape."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabelled) gauge value at scrape time."""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception as e:
+                logger.error(f"Error computing gauge {self.name}: {str(e)}")
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time of the enclosed block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Singleton registry
+registry = MetricsRegistry()
+
+# Analysis pipeline
+analysis_stage_seconds = registry.histogram(
+    "quill_analysis_stage_duration_seconds",
+    "Wall time of each process_analysis stage.",
+    ["stage"]
+)
+analysis_jobs_total = registry.counter(
+    "quill_analysis_jobs_total",
+    "Finished analysis jobs by terminal status.",
+    ["status"]
+)
+jobs_in_flight = registry.gauge(
+    "quill_jobs_in_flight",
+    "Analysis jobs currently being processed."
+)
+queue_depth = registry.gauge(
+    "quill_job_queue_depth",
+    "Analysis jobs accepted but not yet started."
+)
+
+# Provider calls
+embedding_batch_seconds = registry.histogram(
+    "quill_embedding_batch_duration_seconds",
+    "Latency of one OpenAI embeddings request."
+)
+embedding_texts_total = registry.counter(
+    "quill_embedding_texts_total",
+    "Texts sent to the embeddings API."
+)
+pinecone_batch_seconds = registry.histogram(
+    "quill_pinecone_batch_duration_seconds",
+    "Latency of one Pinecone request.",
+    ["operation"]
+)
+supabase_seconds = registry.histogram(
+    "quill_supabase_duration_seconds",
+    "Latency of Supabase queries.",
+    ["table", "operation"]
+)
+chat_stage_seconds = registry.histogram(
+    "quill_chat_stage_duration_seconds",
+    "Wall time of each chat request stage.",
+    ["stage"]
+)
+chat_requests_total = registry.counter(
+    "quill_chat_requests_total",
+    "Chat requests by route (fast_path, cache or rag).",
+    ["route"]
+)
+chat_context_tokens = registry.histogram(
+    "quill_chat_context_tokens",
+    "Estimated tokens of retrieved comment context per chat request.",
+    ["model"],
+    buckets=TOKEN_BUCKETS
+)
+chat_retrieval_filters_total = registry.counter(
+    "quill_chat_retrieval_filters_total",
+    "Metadata filters taken from chat questions, by field (voteCount, replyCount or published_at).",
+    ["field"]
+)
+comment_store_misses_total = registry.counter(
+    "quill_comment_store_misses_total",
+    "Vector matches dropped because their document is missing from the local comment store."
+)
+
+# Shared HTTP pool
+http_requests_total = registry.counter(
+    "quill_http_requests_total",
+    "Requests sent through the shared HTTP pool by upstream host.",
+    ["host"]
+)
+http_pool_waits_total = registry.counter(
+    "quill_http_pool_waits_total",
+    "Requests that waited for a per-host connection slot.",
+    ["host"]
+)
+
+# Provider resilience
+provider_retries_total = registry.counter(
+    "quill_provider_retries_total",
+    "Retried provider calls.",
+    ["provider"]
+)
+provider_hedges_total = registry.counter(
+    "quill_provider_hedges_total",
+    "Hedged second requests sent for slow idempotent reads.",
+    ["provider"]
+)
+provider_fast_failures_total = registry.counter(
+    "quill_provider_fast_failures_total",
+    "Calls rejected without being sent because the provider's circuit was open.",
+    ["provider"]
+)
+circuit_breaker_state = registry.gauge(
+    "quill_circuit_breaker_state",
+    "Circuit state per provider (0 closed, 1 half-open, 2 open).",
+    ["provider"]
+)
+
+# Vector index lifecycle
+vector_index_vectors = registry.gauge(
+    "quill_vector_index_vectors",
+    "Vectors in the Pinecone index at the last size report or collection."
+)
+vector_namespaces_deleted_total = registry.counter(
+    "quill_vector_namespaces_deleted_total",
+    "Pinecone namespaces garbage-collected by reason (orphaned, superseded or expired).",
+    ["reason"]
+)
+
+# Local comment classifier
+classifier_comments_total = registry.counter(
+    "quill_classifier_comments_total",
+    "Comments labelled in digest analyses, by source (local classifier or Gemini review).",
+    ["source"]
+)
+
+# Columnar export
+export_rows_total = registry.counter(
+    "quill_export_rows_total",
+    "Comments streamed by the columnar export, by format (arrow or parquet).",
+    ["format"]
+)
+
+# LLM usage
+llm_prompt_tokens = registry.histogram(
+    "quill_llm_prompt_tokens",
+    "Prompt tokens per LLM request.",
+    ["provider", "model"],
+    buckets=TOKEN_BUCKETS
+)
+llm_output_tokens = registry.histogram(
+    "quill_llm_output_tokens",
+    "Output tokens per LLM request.",
+    ["provider", "model"],
+    buckets=TOKEN_BUCKETS
+)
+llm_cost_usd_total = registry.counter(
+    "quill_llm_cost_usd_total",
+    "Estimated LLM and embedding spend in USD.",
+    ["provider", "model"]
+)
+
+# Caches
+cache_requests_total = registry.counter(
+    "quill_cache_requests_total",
+    "Cache lookups by cache name and result (hit or miss).",
+    ["cache", "result"]
+)
+
+# Event loop
+event_loop_lag_seconds = registry.histogram(
+    "quill_event_loop_lag_seconds",
+    "Event-loop scheduling lag measured by the loop monitor.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+event_loop_stall_seconds = registry.histogram(
+    "quill_event_loop_stall_seconds",
+    "Event-loop stalls over the threshold by attributed call site.",
+    ["site"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+
+def record_llm_usage(provider: str, model: str, prompt_tokens: int, output_tokens: int = 0):
+    """Record token counts and estimated cost for one model request."""
+    prompt_tokens = prompt_tokens or 0
+    output_tokens = output_tokens or 0
+    llm_prompt_tokens.observe(prompt_tokens, provider=provider, model=model)
+    if output_tokens:
+        llm_output_tokens.observe(output_tokens, provider=provider, model=model)
+
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+    llm_cost_usd_total.inc(cost, provider=provider, model=model)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a cache lookup for hit-rate reporting."""
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
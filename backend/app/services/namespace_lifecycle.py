@@ -0,0 +1,303 @@
+import asyncio
+import time
+import uuid
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.database import execute, get_supabase
+from app.services.comment_store import comment_store
+from app.services.sparse_index import sparse_index
+from app.services.job_manager import job_manager
+from app.services.bulk_manager import bulk_manager
+from app.services.chat_cache import chat_cache
+from app.services.intent_router import intent_router
+from app.services.pinecone_service import EMBEDDING_DIMENSION, pinecone_service
+from app.services.metrics import supabase_seconds, vector_index_vectors, vector_namespaces_deleted_total
+
+logger = logging.getLogger(__name__)
+
+# analysis_history rows looked up per query
+LOOKUP_BATCH = 200
+
+# Estimated metadata stored with each vector (numeric filter fields)
+METADATA_BYTES_PER_VECTOR = 64
+
+# Added to the longest job deadline to get the shortest orphan grace period
+ORPHAN_GRACE_MARGIN_SECONDS = 600
+
+# Report buckets for namespaces without a known tenant
+UNKNOWN_TENANT = "unknown"
+ORPHANED = "orphaned"
+UNMANAGED = "unmanaged"
+
+
+def _is_analysis_id(namespace: str) -> bool:
+    """Only namespaces named after an analysis ID are managed; others are never touched."""
+    try:
+        uuid.UUID(namespace)
+        return True
+    except ValueError:
+        return False
+
+
+def orphan_grace_seconds() -> int:
+    """
+    How long an orphaned namespace is kept: VECTOR_ORPHAN_GRACE_MINUTES, but
+    never less than the longest job deadline plus a margin, so a job that
+    runs to its deadline is not collected before it saves its analysis.
+    """
+    longest = max(settings.job_deadline_seconds, settings.sampling_deadline_seconds, settings.bulk_deadline_seconds)
+    return max(settings.vector_orphan_grace_minutes * 60, longest + ORPHAN_GRACE_MARGIN_SECONDS)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _last_active(row: Dict[str, Any]) -> datetime:
+    """When an analysis was created or last refreshed in place."""
+    times = [t for t in (_parse_time(row.get("created_at")), _parse_time(row.get("updated_at"))) if t]
+    return max(times, default=datetime.min.replace(tzinfo=timezone.utc))
+
+
+class NamespaceLifecycle:
+    """
+    Keeps the Pinecone index proportional to the analyses still in use.
+
+    Every analysis stores its comment vectors in a namespace named after its
+    analysis_history ID. A collection pass matches the index's namespaces
+    against analysis_history and deletes:
+    - orphaned namespaces with no analysis row (failed or abandoned runs),
+      once seen for VECTOR_ORPHAN_GRACE_MINUTES (at least the longest job
+      deadline plus ORPHAN_GRACE_MARGIN_SECONDS)
+    - superseded namespaces: all but the newest VECTOR_KEEP_ANALYSES_PER_URL
+      analyses of a video per tenant
+    - expired namespaces not refreshed within VECTOR_TTL_DAYS, if set
+
+    Comment store segments go with their namespace; segments left without
+    one (a job that died before upserting) are swept after the same grace.
+    Collected analyses keep their reports; `vectors_expired_at` records that
+    their comments can no longer be chatted with or refreshed incrementally.
+    """
+
+    def __init__(self):
+        # Orphaned namespace -> monotonic time it was first seen
+        self._orphans_seen: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_collection: Optional[Dict[str, Any]] = None
+
+    async def start(self):
+        """Start scheduled collection, unless VECTOR_GC_INTERVAL_MINUTES is 0."""
+        grace = orphan_grace_seconds()
+        if settings.vector_orphan_grace_minutes * 60 < grace:
+            logger.warning(
+                f"VECTOR_ORPHAN_GRACE_MINUTES={settings.vector_orphan_grace_minutes} is shorter than the longest "
+                f"job deadline; orphaned namespaces are kept for {grace // 60} min instead"
+            )
+        if settings.vector_gc_interval_minutes <= 0 or self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Vector namespace collection scheduled every {settings.vector_gc_interval_minutes} min")
+
+    async def stop(self):
+        """Stop scheduled collection."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.vector_gc_interval_minutes * 60)
+            try:
+                await self.collect()
+            except Exception as e:
+                logger.error(f"Error collecting vector namespaces: {str(e)}")
+
+    async def _scan(self) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]]]:
+        """Return vector counts per namespace and the analysis rows of managed namespaces."""
+        counts = await pinecone_service.namespace_stats()
+        rows = await self._load_analyses([namespace for namespace in counts if _is_analysis_id(namespace)])
+        vector_index_vectors.set(sum(counts.values()))
+        return counts, rows
+
+    async def _load_analyses(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        supabase = get_supabase()
+        rows = {}
+        for i in range(0, len(ids), LOOKUP_BATCH):
+            with supabase_seconds.time(table="analysis_history", operation="select"):
+                batch = (await execute(supabase.table("analysis_history").select(
+                    "id, url, tenant_id, created_at, updated_at"
+                ).in_("id", ids[i:i + LOOKUP_BATCH]))).data
+            rows.update({row["id"]: row for row in batch})
+        return rows
+
+    def _tenant(self, namespace: str, rows: Dict[str, Dict[str, Any]]) -> str:
+        if namespace in rows:
+            return rows[namespace].get("tenant_id") or UNKNOWN_TENANT
+        return ORPHANED if _is_analysis_id(namespace) else UNMANAGED
+
+    async def report(self) -> Dict[str, Any]:
+        """
+        Report index size per tenant.
+
+        Returns:
+            Totals, and namespaces, vectors, estimated index bytes and local
+            comment store and keyword index bytes per tenant, largest first. Namespaces without
+            an analysis are reported as "orphaned", those not named after one
+            as "unmanaged".
+        """
+        counts, rows = await self._scan()
+        bytes_per_vector = EMBEDDING_DIMENSION * 4 + METADATA_BYTES_PER_VECTOR
+        store_bytes = await asyncio.to_thread(lambda: {
+            namespace: comment_store.size_bytes(namespace) + sparse_index.size_bytes(namespace) for namespace in counts
+        })
+
+        tenants: Dict[str, Dict[str, int]] = defaultdict(lambda: {"namespaces": 0, "vectors": 0, "store_bytes": 0})
+        for namespace, vectors in counts.items():
+            usage = tenants[self._tenant(namespace, rows)]
+            usage["namespaces"] += 1
+            usage["vectors"] += vectors
+            usage["store_bytes"] += store_bytes[namespace]
+
+        total_vectors = sum(counts.values())
+        return {
+            "namespaces": len(counts),
+            "vectors": total_vectors,
+            "estimated_bytes": total_vectors * bytes_per_vector,
+            "store_bytes": sum(store_bytes.values()),
+            "tenants": {
+                tenant: {**usage, "estimated_bytes": usage["vectors"] * bytes_per_vector}
+                for tenant, usage in sorted(tenants.items(), key=lambda item: -item[1]["vectors"])
+            },
+            "last_collection": self.last_collection
+        }
+
+    def _in_use(self) -> Set[str]:
+        """Analyses being written or refreshed in place by a running job."""
+        in_use = set()
+        for job in job_manager.jobs.values():
+            if job["status"] in ("PENDING", "PROCESSING"):
+                in_use.update(filter(None, (job.get("base_analysis_id"), job.get("pending_analysis_id"))))
+        for job in bulk_manager.jobs.values():
+            if job["status"] in ("PENDING", "PROCESSING"):
+                in_use.update(video["analysis_id"] for video in job["videos"] if video["analysis_id"])
+        return in_use
+
+    def _candidates(self, counts: Dict[str, int], rows: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Return namespace -> reason for every namespace due for collection."""
+        candidates: Dict[str, str] = {}
+
+        now = time.monotonic()
+        grace = orphan_grace_seconds()
+        seen = {}
+        for namespace in counts:
+            if _is_analysis_id(namespace) and namespace not in rows:
+                seen[namespace] = self._orphans_seen.get(namespace, now)
+                if now - seen[namespace] >= grace:
+                    candidates[namespace] = "orphaned"
+        self._orphans_seen = seen
+
+        by_video: Dict[Tuple[Optional[str], str], List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows.values():
+            by_video[(row.get("tenant_id"), row["url"])].append(row)
+        keep = max(1, settings.vector_keep_analyses_per_url)
+        for analyses in by_video.values():
+            analyses.sort(key=_last_active, reverse=True)
+            for row in analyses[keep:]:
+                candidates[row["id"]] = "superseded"
+
+        if settings.vector_ttl_days > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=settings.vector_ttl_days)
+            for row in rows.values():
+                if row["id"] not in candidates and _last_active(row) < cutoff:
+                    candidates[row["id"]] = "expired"
+
+        for analysis_id in self._in_use():
+            candidates.pop(analysis_id, None)
+        return candidates
+
+    async def collect(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Run one collection pass.
+
+        Args:
+            dry_run: Only report what would be deleted
+
+        Returns:
+            Deleted (or, in a dry run, collectable) namespaces with their
+            reason and vector count, and the total vectors reclaimed
+        """
+        async with self._lock:
+            counts, rows = await self._scan()
+            candidates = self._candidates(counts, rows)
+
+            deleted = []
+            for namespace, reason in candidates.items():
+                if not dry_run:
+                    if not await pinecone_service.delete_namespace(namespace):
+                        continue
+                    vector_namespaces_deleted_total.inc(reason=reason)
+                deleted.append({"namespace": namespace, "reason": reason, "vectors": counts[namespace]})
+
+            collected = [item["namespace"] for item in deleted if item["namespace"] in rows]
+            if collected and not dry_run:
+                await self._mark_expired(collected)
+            if not dry_run:
+                swept = await asyncio.to_thread(
+                    comment_store.sweep,
+                    set(counts),
+                    orphan_grace_seconds()
+                )
+                if swept:
+                    logger.info(f"Swept {len(swept)} comment store segments without a namespace")
+                swept = await asyncio.to_thread(
+                    sparse_index.sweep,
+                    set(counts),
+                    orphan_grace_seconds()
+                )
+                if swept:
+                    logger.info(f"Swept {len(swept)} keyword indexes without a namespace")
+
+            summary = {
+                "dry_run": dry_run,
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "deleted": deleted,
+                "vectors_reclaimed": sum(item["vectors"] for item in deleted)
+            }
+            if not dry_run:
+                self.last_collection = {key: value for key, value in summary.items() if key != "deleted"}
+                self.last_collection["namespaces_deleted"] = len(deleted)
+                vector_index_vectors.set(sum(counts.values()) - summary["vectors_reclaimed"])
+                if deleted:
+                    logger.info(
+                        f"Collected {len(deleted)} vector namespaces "
+                        f"({summary['vectors_reclaimed']} vectors)"
+                    )
+            return summary
+
+    async def _mark_expired(self, analysis_ids: List[str]):
+        supabase = get_supabase()
+        expired_at = datetime.now(timezone.utc).isoformat()
+        for i in range(0, len(analysis_ids), LOOKUP_BATCH):
+            with supabase_seconds.time(table="analysis_history", operation="update"):
+                await execute(supabase.table("analysis_history").update({
+                    "vectors_expired_at": expired_at
+                }).in_("id", analysis_ids[i:i + LOOKUP_BATCH]))
+        # Chat checks the cached record for expiry; cached answers cited the deleted comments
+        for analysis_id in analysis_ids:
+            intent_router.invalidate(analysis_id)
+            chat_cache.invalidate(analysis_id)
+
+
+# Singleton instance
+namespace_lifecycle = NamespaceLifecycle()
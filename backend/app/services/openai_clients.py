@@ -0,0 +1,19 @@
+from openai import AsyncOpenAI, OpenAI
+from app.config import settings
+from app.services.http_pool import http_pool
+
+# One client per calling style, both on the shared connection pool: the sync
+# client serves embeddings (run in worker threads), the async one chat.
+# SDK retries are off; the resilience layer retries under a budget.
+openai_client = OpenAI(
+    api_key=settings.openai_api_key,
+    http_client=http_pool.client,
+    timeout=http_pool.timeout,
+    max_retries=0
+)
+async_openai_client = AsyncOpenAI(
+    api_key=settings.openai_api_key,
+    http_client=http_pool.async_client,
+    timeout=http_pool.timeout,
+    max_retries=0
+)
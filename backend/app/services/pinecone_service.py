@@ -1,10 +1,31 @@
+import asyncio
 from pinecone import Pinecone, ServerlessSpec
 from app.config import settings
+from app.services.comment_store import comment_store, published_timestamp
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics import comment_store_misses_total, pinecone_batch_seconds
+from app.services.resilience import CircuitOpenError, resilience
+from app.services.sparse_index import sparse_index
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# text-embedding-3-small
+EMBEDDING_DIMENSION = 1536
+
+
+def vector_metadata(comment: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Numeric filter fields stored with a comment's vector.
+    Text, author and date live in the local comment store instead.
+    """
+    return {
+        "voteCount": int(comment["voteCount"] or 0),
+        "replyCount": int(comment["replyCount"] or 0),
+        "published_at": published_timestamp(comment["date"])
+    }
+
 
 class PineconeService:
     def __init__(self):
@@ -21,10 +42,9 @@ class PineconeService:
             
             if self.index_name not in existing_indexes:
                 logger.info(f"Creating Pinecone index: {self.index_name}")
-                # Create index with 1536 dimensions (text-embedding-3-small)
                 self.pc.create_index(
                     name=self.index_name,
-                    dimension=1536,
+                    dimension=EMBEDDING_DIMENSION,
                     metric="cosine",
                     spec=ServerlessSpec(
                         cloud="aws",
@@ -32,14 +52,16 @@ class PineconeService:
                     )
                 )
             
-            # Connect to index
-            self.index = self.pc.Index(self.index_name)
+            # Connect to index. The SDK uses urllib3, not httpx, so its
+            # request threads are capped at the shared per-host limit instead
+            self.index = self.pc.Index(self.index_name, pool_threads=settings.http_pool_max_per_host)
             logger.info(f"Connected to Pinecone index: {self.index_name}")
             
         except Exception as e:
             logger.error(f"Error initializing Pinecone: {str(e)}")
             raise
     
+    @loop_monitor.track("pinecone.upsert_to_pinecone")
     async def upsert_to_pinecone(
         self,
         parsed_comments: List[Dict[str, Any]],
@@ -47,7 +69,11 @@ class PineconeService:
         analysis_id: str
     ):
         """
-        Upsert comment embeddings to Pinecone with metadata.
+        Upsert comment embeddings to Pinecone with numeric metadata.
+        Comment documents are written to the local comment store first, so
+        every vector can be hydrated as soon as it is queryable. The keyword
+        index is not rebuilt here; call sparse_index.build once the job's
+        last upsert or delete is done.
         
         Args:
             parsed_comments: List of parsed comment objects
@@ -60,19 +86,15 @@ class PineconeService:
             
             logger.info(f"Upserting {len(parsed_comments)} vectors to Pinecone namespace: {analysis_id}")
             
+            await asyncio.to_thread(comment_store.put, analysis_id, parsed_comments)
+            
             # Prepare vectors for upsert
             vectors = []
             for comment, embedding in zip(parsed_comments, embeddings):
                 vector = {
                     "id": comment["id"],
                     "values": embedding,
-                    "metadata": {
-                        "author": comment["author"],
-                        "comment_text": comment["comment"][:1000],  # Limit to 1000 chars
-                        "date": comment["date"],
-                        "voteCount": comment["voteCount"],
-                        "replyCount": comment["replyCount"]
-                    }
+                    "metadata": vector_metadata(comment)
                 }
                 vectors.append(vector)
             
@@ -80,56 +102,219 @@ class PineconeService:
             batch_size = 100
             for i in range(0, len(vectors), batch_size):
                 batch = vectors[i:i + batch_size]
-                self.index.upsert(
-                    vectors=batch,
-                    namespace=analysis_id
-                )
+                # Upserts by ID are idempotent, so batches can be retried
+                with pinecone_batch_seconds.time(operation="upsert"):
+                    await resilience.call(
+                        "pinecone",
+                        lambda: asyncio.to_thread(self.index.upsert, vectors=batch, namespace=analysis_id)
+                    )
                 logger.info(f"Upserted batch {i//batch_size + 1}/{(len(vectors) + batch_size - 1)//batch_size}")
             
             logger.info(f"Successfully upserted {len(vectors)} vectors")
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error upserting to Pinecone: {str(e)}")
             raise Exception(f"Failed to upsert to Pinecone: {str(e)}")
     
+    @loop_monitor.track("pinecone.query_similar")
     async def query_similar(
         self,
         query_embedding: List[float],
         analysis_id: str,
-        top_k: int = 5
+        top_k: int = 5,
+        include_values: bool = False,
+        metadata_filter: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
-        Query Pinecone for similar comments.
+        Query Pinecone for similar comments, hydrating their text, author and
+        date from the local comment store in one batched read.
         
         Args:
             query_embedding: Query vector
             analysis_id: Namespace to search in
             top_k: Number of results to return
+            include_values: Also return each match's embedding vector
+            metadata_filter: Pinecone filter on voteCount, replyCount or
+                published_at, applied before ranking
             
         Returns:
-            List of similar comments with metadata
+            List of similar comments with metadata (and "values" if requested).
+            Matches whose document is missing are dropped.
+
+        The comment store is a local directory, so this assumes every
+        instance serving chat reads the same one (one instance, or a shared
+        volume). An instance with its own directory finds no documents for
+        analyses indexed elsewhere; such misses are counted in
+        quill_comment_store_misses_total and logged once per query.
         """
         try:
-            results = self.index.query(
-                vector=query_embedding,
-                namespace=analysis_id,
-                top_k=top_k,
-                include_metadata=True
+            # Hedged: a slow query is raced against a second copy
+            with pinecone_batch_seconds.time(operation="query"):
+                results = await resilience.hedged("pinecone", lambda: asyncio.to_thread(
+                    self.index.query,
+                    vector=query_embedding,
+                    namespace=analysis_id,
+                    top_k=top_k,
+                    include_metadata=True,
+                    include_values=include_values,
+                    filter=metadata_filter
+                ))
+            
+            documents = await asyncio.to_thread(
+                comment_store.get,
+                analysis_id,
+                [match.id for match in results.matches]
             )
             
-            return [
-                {
+            matches = []
+            missing = 0
+            for match in results.matches:
+                metadata = dict(match.metadata or {})
+                document = documents.get(match.id)
+                if document:
+                    metadata.update(
+                        author=document["author"],
+                        comment_text=document["comment"],
+                        date=document["date"]
+                    )
+                elif "comment_text" not in metadata:
+                    # Vectors upserted before the comment store carry their text
+                    missing += 1
+                    continue
+                item = {
                     "id": match.id,
                     "score": match.score,
-                    "metadata": match.metadata
+                    "metadata": metadata
                 }
-                for match in results.matches
-            ]
+                if include_values:
+                    item["values"] = match.values
+                matches.append(item)
+            
+            if missing:
+                comment_store_misses_total.inc(missing)
+                logger.warning(
+                    f"Dropped {missing} of {len(results.matches)} matches in {analysis_id}: "
+                    f"no stored document (is COMMENT_STORE_DIR shared by every instance?)"
+                )
+            return matches
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error querying Pinecone: {str(e)}")
             raise Exception(f"Failed to query Pinecone: {str(e)}")
 
+    
+    async def fetch_vectors(self, ids: List[str], analysis_id: str) -> Dict[str, List[float]]:
+        """
+        Fetch the embeddings of specific comments of an analysis.
+
+        Args:
+            ids: Comment IDs
+            analysis_id: Namespace the vectors live in
+
+        Returns:
+            Comment ID -> embedding, for the IDs that have a vector
+        """
+        try:
+            vectors = {}
+            # IDs are sent in the query string, so batches stay small
+            batch_size = 200
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                with pinecone_batch_seconds.time(operation="fetch"):
+                    response = await resilience.call(
+                        "pinecone",
+                        lambda: asyncio.to_thread(self.index.fetch, ids=batch, namespace=analysis_id)
+                    )
+                vectors.update({vector_id: vector.values for vector_id, vector in response.vectors.items()})
+            return vectors
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching vectors from Pinecone: {str(e)}")
+            raise Exception(f"Failed to fetch vectors from Pinecone: {str(e)}")
+
+    async def delete_vectors(self, ids: List[str], analysis_id: str):
+        """
+        Delete specific comment vectors from an analysis namespace.
+        
+        Args:
+            ids: Comment IDs to delete
+            analysis_id: Namespace the vectors live in
+        """
+        try:
+            batch_size = 1000
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                with pinecone_batch_seconds.time(operation="delete"):
+                    await resilience.call(
+                        "pinecone",
+                        lambda: asyncio.to_thread(self.index.delete, ids=batch, namespace=analysis_id)
+                    )
+            await asyncio.to_thread(comment_store.delete, analysis_id, ids)
+            logger.info(f"Deleted {len(ids)} vectors from namespace: {analysis_id}")
+            
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error deleting vectors from Pinecone: {str(e)}")
+            raise Exception(f"Failed to delete vectors from Pinecone: {str(e)}")
+    
+    async def namespace_stats(self) -> Dict[str, int]:
+        """
+        Get the vector count of every namespace in the index.
+        
+        Returns:
+            Namespace -> vector count
+        """
+        try:
+            with pinecone_batch_seconds.time(operation="describe"):
+                stats = await resilience.call(
+                    "pinecone",
+                    lambda: asyncio.to_thread(self.index.describe_index_stats)
+                )
+            return {name: summary.vector_count for name, summary in (stats.namespaces or {}).items()}
+            
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error describing Pinecone index: {str(e)}")
+            raise Exception(f"Failed to describe Pinecone index: {str(e)}")
+    
+    async def delete_namespace(self, analysis_id: str) -> bool:
+        """
+        Delete all vectors in an analysis namespace, and its comment documents.
+        Errors are logged, not raised, so cleanup never masks the original failure.
+        
+        Args:
+            analysis_id: Namespace to delete
+            
+        Returns:
+            True if the namespace was deleted
+        """
+        try:
+            with pinecone_batch_seconds.time(operation="delete"):
+                await resilience.call(
+                    "pinecone",
+                    lambda: asyncio.to_thread(self.index.delete, delete_all=True, namespace=analysis_id)
+                )
+            logger.info(f"Deleted Pinecone namespace: {analysis_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting Pinecone namespace {analysis_id}: {str(e)}")
+            return False
+        
+        finally:
+            # The vectors are being discarded either way; a failed delete is
+            # retried by the next namespace collection
+            await asyncio.to_thread(comment_store.drop, analysis_id)
+            await asyncio.to_thread(sparse_index.drop, analysis_id)
+
 
 # Singleton instance
 pinecone_service = PineconeService()
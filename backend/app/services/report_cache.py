@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from app.config import settings
+from app.services.metrics import record_cache_lookup
+from app.services.report_pages import build_summary
+
+logger = logging.getLogger(__name__)
+
+ReportLoader = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+class EncodedBody:
+    """
+    A JSON payload serialized once, with its gzip encoding and a strong
+    ETag for each encoding (the bytes differ, so the tags must too).
+    """
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip_body)
+
+
+class CachedReport:
+    """
+    A completed report: the full payload, the summary-first payload, and
+    the parsed dict that paginated sections are sliced from.
+    """
+
+    def __init__(self, report: Dict[str, Any]):
+        self.report = report
+        self.full = EncodedBody(report)
+        self.summary = EncodedBody(build_summary(report))
+        # Version for pagination cursors
+        self.etag = self.full.etag
+
+    @property
+    def size(self) -> int:
+        # The parsed dict is approximated by its serialized size
+        return self.full.size + self.summary.size + len(self.full.body)
+
+
+class ReportCache:
+    """
+    Read-through LRU cache for completed analysis reports.
+
+    A completed report only changes when the analysis is saved again, which
+    invalidates its entry, so entries need no TTL. The cache is bounded by
+    REPORT_CACHE_MAX_ENTRIES and REPORT_CACHE_MAX_BYTES. Concurrent misses
+    for the same analysis share a single database load.
+    """
+
+    def __init__(self):
+        self.max_entries = settings.report_cache_max_entries
+        self.max_bytes = settings.report_cache_max_bytes
+        self._entries: "OrderedDict[str, CachedReport]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._bytes = 0
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    async def get_or_load(self, analysis_id: str, loader: ReportLoader) -> CachedReport:
+        """
+        Return the cached report, loading and caching it on a miss.
+
+        Args:
+            analysis_id: Analysis to fetch
+            loader: Builds the report dict from the database
+
+        Returns:
+            Cached report entry
+        """
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is not None:
+                self._entries.move_to_end(analysis_id)
+        record_cache_lookup("report", entry is not None)
+        if entry is not None:
+            return entry
+
+        # Load in a separate task so a client disconnecting mid-load does
+        # not cancel the load for other requests waiting on it
+        task = self._loading.get(analysis_id)
+        if task is None:
+            task = asyncio.create_task(self._load(analysis_id, loader))
+            self._loading[analysis_id] = task
+            task.add_done_callback(lambda done: self._finish_load(analysis_id, done))
+        return await asyncio.shield(task)
+
+    def invalidate(self, analysis_id: str):
+        """Drop a report, e.g. after its analysis is saved again."""
+        with self._lock:
+            self._invalidations += 1
+            entry = self._entries.pop(analysis_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    async def _load(self, analysis_id: str, loader: ReportLoader) -> CachedReport:
+        invalidations = self._invalidations
+        report = await loader(analysis_id)
+        # Serializing and compressing a large report is CPU work; keep it off the loop
+        entry = await asyncio.to_thread(CachedReport, report)
+        # Skip caching if an invalidation raced with the load
+        if invalidations == self._invalidations:
+            self._put(analysis_id, entry)
+        return entry
+
+    def _finish_load(self, analysis_id: str, task: asyncio.Task):
+        self._loading.pop(analysis_id, None)
+        if not task.cancelled():
+            # Retrieve the exception so a load nobody awaited is not reported as unhandled
+            task.exception()
+
+    def _put(self, analysis_id: str, entry: CachedReport):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(analysis_id, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[analysis_id] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+
+# Singleton instance
+report_cache = ReportCache()
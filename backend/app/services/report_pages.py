@@ -0,0 +1,135 @@
+import base64
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Fields each paginated section may be projected to
+SECTION_FIELDS = {
+    "leads": ("username", "text", "timestamp", "sentiment"),
+    "influencers": ("username", "influenceScore", "mainTopic", "engagementCount"),
+    "topic_comments": ("author", "text"),
+}
+
+# Report keys whose topics carry comment lists
+TOPIC_SECTIONS = {
+    "feedback": "topFeedbackTopics",
+    "discussed": "topTopics",
+}
+
+
+class CursorError(ValueError):
+    """Raised for malformed cursors or cursors from an older report version."""
+
+
+def build_summary(report: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a full report to what the first render needs.
+
+    KPIs, breakdowns and charts are included as-is; topics keep their name
+    and count but not their comments; leads and influencers are replaced by
+    counts and fetched page by page.
+    """
+    def topic_heads(key: str) -> List[Dict[str, Any]]:
+        return [
+            {"topic": topic["topic"], "count": topic.get("count", 0), "commentCount": len(topic.get("comments", []))}
+            for topic in report[key]
+        ]
+
+    return {
+        "sentimentScore": report["sentimentScore"],
+        "leadPercentage": report["leadPercentage"],
+        "totalComments": report["totalComments"],
+        "sentimentBreakdown": report["sentimentBreakdown"],
+        "topFeedbackTopics": topic_heads("topFeedbackTopics"),
+        "topTopics": topic_heads("topTopics"),
+        "actionableTodos": report["actionableTodos"],
+        "creatorInsights": report["creatorInsights"],
+        "competitorInsights": report["competitorInsights"],
+        "engagementTimeline": report["engagementTimeline"],
+        "vibeTrend": report["vibeTrend"],
+        "sampling": report.get("sampling"),
+        "leadCount": len(report["leads"]),
+        "influencerCount": len(report["topInfluencers"]),
+        "url": report["url"],
+        "createdAt": report["createdAt"]
+    }
+
+
+def parse_fields(section: str, fields: Optional[str]) -> Optional[Sequence[str]]:
+    """
+    Parse a comma-separated projection, validating it against the section.
+
+    Raises:
+        ValueError: If a field is not available in the section
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in SECTION_FIELDS[section]]
+    if unknown:
+        raise ValueError(f"Unknown fields for {section}: {', '.join(unknown)}")
+    return requested
+
+
+def encode_cursor(offset: int, version: str) -> str:
+    raw = json.dumps({"o": offset, "v": version}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], version: str) -> int:
+    """
+    Return the offset a cursor points at.
+
+    Raises:
+        CursorError: If the cursor is malformed or belongs to another report version
+    """
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        offset = int(data["o"])
+    except Exception:
+        raise CursorError("Invalid cursor")
+    if data.get("v") != version or offset < 0:
+        raise CursorError("Report has changed; restart pagination")
+    return offset
+
+
+def paginate(
+    items: List[Dict[str, Any]],
+    cursor: Optional[str],
+    limit: int,
+    version: str,
+    fields: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    """
+    Slice one page of a report section.
+
+    Args:
+        items: Full section list
+        cursor: Cursor from the previous page, or None for the first page
+        limit: Page size (clamped to MAX_PAGE_SIZE)
+        version: Report version (ETag) the cursor must match
+        fields: Optional projection
+
+    Returns:
+        {"items", "next_cursor", "total"}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = decode_cursor(cursor, version)
+    page = items[offset:offset + limit]
+    if fields:
+        page = [{field: item.get(field) for field in fields} for item in page]
+
+    end = offset + limit
+    return {
+        "items": page,
+        "next_cursor": encode_cursor(end, version) if end < len(items) else None,
+        "total": len(items)
+    }
@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import numpy as np
+from app.config import settings
+from app.services.metrics import (
+    circuit_breaker_state,
+    provider_fast_failures_total,
+    provider_hedges_total,
+    provider_retries_total,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROVIDERS = ("apify", "openai", "gemini", "pinecone", "supabase")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Client errors that are still worth retrying (timeout, conflict, rate limit)
+RETRYABLE_CLIENT_STATUSES = (408, 409, 429)
+
+# Latency samples of hedged reads kept per provider for the hedge delay
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open; carries a Retry-After hint."""
+
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(f"{provider} is unavailable (circuit open); retry in {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class RetryBudget:
+    """Retries (and hedged requests) one job or request may still spend."""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+
+    def spend(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+_budget: contextvars.ContextVar[Optional[RetryBudget]] = contextvars.ContextVar("retry_budget", default=None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Client errors (4xx other than timeouts and rate limits) are not retried and do not trip breakers."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    for attribute in ("status_code", "status", "code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int) and 400 <= status < 500:
+            return status in RETRYABLE_CLIENT_STATUSES
+    return True
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail immediately for `reset_seconds`. Then a single trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    Thread-safe, since Supabase calls are guarded from worker threads.
+    """
+
+    def __init__(self, provider: str, failure_threshold: int, reset_seconds: float):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        circuit_breaker_state.set(0, provider=provider)
+
+    def before_call(self):
+        """
+        Raises:
+            CircuitOpenError: If the circuit is open or a half-open trial is already running
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    provider_fast_failures_total.inc(provider=self.provider)
+                    raise CircuitOpenError(self.provider, math.ceil(remaining))
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    provider_fast_failures_total.inc(provider=self.provider)
+                    raise CircuitOpenError(self.provider, 1)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.provider} closed")
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                logger.warning(
+                    f"Circuit for {self.provider} opened after {self.failures} consecutive failures"
+                )
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def release(self):
+        """Give up a half-open trial without an outcome (the caller was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        circuit_breaker_state.set(STATE_VALUES[state], provider=self.provider)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_after = 0
+            if self.state == OPEN:
+                retry_after = max(0, math.ceil(self.reset_seconds - (time.monotonic() - self.opened_at)))
+            return {"state": self.state, "consecutive_failures": self.failures, "retry_after": retry_after}
+
+
+class Resilience:
+    """
+    Circuit breakers, budgeted retries and hedged reads around provider calls.
+
+    Operations are passed as zero-argument callables returning a fresh
+    awaitable, so they can be attempted more than once. Retries use full
+    jitter exponential backoff and draw from the retry budget of the current
+    task (see `start_budget`); without a budget only `retry_max_attempts`
+    applies.
+    """
+
+    def __init__(self):
+        self.max_attempts = settings.retry_max_attempts
+        self.base_delay = settings.retry_base_delay_ms / 1000
+        self.max_delay = settings.retry_max_delay_ms / 1000
+        self.breakers = {
+            provider: CircuitBreaker(provider, settings.circuit_failure_threshold, settings.circuit_reset_seconds)
+            for provider in PROVIDERS
+        }
+        self._latencies: Dict[str, Deque[float]] = {provider: deque(maxlen=LATENCY_WINDOW) for provider in PROVIDERS}
+        self._random = random.Random()
+
+    def start_budget(self, retries: int):
+        """
+        Give the current task a fresh retry budget.
+        Jobs and requests run in their own tasks, so the budget is scoped to them
+        and inherited by the tasks they spawn.
+        """
+        _budget.set(RetryBudget(retries))
+
+    def _spend(self, budgeted: bool) -> bool:
+        budget = _budget.get()
+        return budget.spend() if budgeted and budget is not None else True
+
+    async def call(
+        self,
+        provider: str,
+        operation: Callable[[], Awaitable[T]],
+        retry: bool = True,
+        budgeted: bool = True
+    ) -> T:
+        """
+        Call a provider through its circuit breaker, retrying transient failures.
+
+        Args:
+            provider: Provider name (one of PROVIDERS)
+            operation: Returns a new awaitable for each attempt
+            retry: False for non-idempotent calls (e.g. starting an Apify run)
+            budgeted: False for work shared across jobs, which no single budget should pay for
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+        """
+        breaker = self.breakers[provider]
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                result = await operation()
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if not (retry and retryable and attempt < self.max_attempts and self._spend(budgeted)):
+                    raise
+                delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                provider_retries_total.inc(provider=provider)
+                logger.warning(f"{provider} call failed ({str(e)}); retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+
+            breaker.record_success()
+            return result
+
+    async def hedged(
+        self,
+        provider: str,
+        operation: Callable[[], Awaitable[T]],
+        budgeted: bool = True
+    ) -> T:
+        """
+        Call an idempotent read, racing a second copy if the first is slow.
+
+        The hedge starts once the first attempt has run longer than the
+        `hedge_quantile` latency of recent hedged reads, and is paid for from
+        the retry budget. The first successful result wins; the loser is
+        cancelled (a call running in a worker thread finishes unobserved).
+        """
+        return await self.call(provider, lambda: self._race(provider, operation, budgeted), budgeted=budgeted)
+
+    async def _race(self, provider: str, operation: Callable[[], Awaitable[T]], budgeted: bool) -> T:
+        started = time.perf_counter()
+        first = asyncio.ensure_future(operation())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(provider))
+            if done or not self._spend(budgeted):
+                result = await first
+                self._latencies[provider].append(time.perf_counter() - started)
+                return result
+
+            provider_hedges_total.inc(provider=provider)
+            tasks.append(asyncio.ensure_future(operation()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._latencies[provider].append(time.perf_counter() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Mark the loser's error as retrieved
+
+    def hedge_delay(self, provider: str) -> float:
+        """Seconds to wait before hedging: the recent latency quantile, with a floor."""
+        samples = self._latencies[provider]
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return settings.hedge_default_delay_ms / 1000
+        quantile = float(np.quantile(np.asarray(samples), settings.hedge_quantile))
+        return max(settings.hedge_min_delay_ms / 1000, quantile)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return breaker state and hedge delay per provider."""
+        return {
+            provider: {
+                **breaker.snapshot(),
+                "hedge_delay_ms": round(self.hedge_delay(provider) * 1000, 1)
+            }
+            for provider, breaker in self.breakers.items()
+        }
+
+
+# Singleton instance
+resilience = Resilience()
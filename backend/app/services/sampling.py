@@ -0,0 +1,291 @@
+import bisect
+import math
+import random
+import logging
+from collections import defaultdict
+from datetime import date
+from statistics import NormalDist
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from app.config import settings
+from app.services.topic_clusters import SENTIMENTS, engagement_spikes, round_percentages
+
+logger = logging.getLogger(__name__)
+
+# Stratum of the most-engaged comments, which are always analyzed
+TAKE_ALL = "take_all"
+# Date bucket of comments whose date cannot be parsed
+UNDATED = -1
+# Lower bounds (likes + replies) of the engagement tiers above 0
+ENGAGEMENT_TIERS = (1, 10, 100)
+# Smallest sample per stratum that still gives a variance estimate
+MIN_PER_STRATUM = 2
+
+
+def z_score(confidence: float) -> float:
+    """Two-sided normal critical value for a confidence level."""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def sample_size(population: int, margin: float, confidence: float) -> int:
+    """
+    Comments needed to estimate any percentage within ±margin.
+
+    Uses the worst case p = 0.5 with the finite population correction;
+    proportional stratification only lowers the variance.
+    """
+    if population <= 0:
+        return 0
+    needed = z_score(confidence) ** 2 * 0.25 / margin ** 2
+    return min(population, math.ceil(needed / (1 + (needed - 1) / population)))
+
+
+def max_sample_size() -> int:
+    """Largest sample a sampled analysis can embed and analyze."""
+    return settings.sampling_take_all + sample_size(
+        settings.sampling_max_comments,
+        settings.sampling_margin_of_error,
+        settings.sampling_confidence
+    )
+
+
+def _engagement(comment: Dict[str, Any]) -> int:
+    return comment["voteCount"] + comment["replyCount"]
+
+
+def _date_buckets(comments: List[Dict[str, Any]], buckets: int) -> List[int]:
+    """Equal-width date bucket of each comment between the first and last date."""
+    days = []
+    for comment in comments:
+        try:
+            days.append(date.fromisoformat(str(comment["date"])[:10]).toordinal())
+        except ValueError:
+            days.append(None)
+    dated = [day for day in days if day is not None]
+    if not dated:
+        return [UNDATED] * len(comments)
+    first, width = min(dated), (max(dated) - min(dated) + 1) / buckets
+    return [UNDATED if day is None else min(buckets - 1, int((day - first) / width)) for day in days]
+
+
+def _allocate(sizes: Dict[Hashable, int], total: int) -> Dict[Hashable, int]:
+    """
+    Split a sample across strata in proportion to their size (largest
+    remainder), with at least MIN_PER_STRATUM per stratum where possible.
+    """
+    population = sum(sizes.values())
+    exact = {stratum: total * size / population for stratum, size in sizes.items()}
+    allocation = {
+        stratum: min(size, max(MIN_PER_STRATUM, math.floor(exact[stratum])))
+        for stratum, size in sizes.items()
+    }
+
+    while sum(allocation.values()) < total:
+        open_strata = [stratum for stratum in sizes if allocation[stratum] < sizes[stratum]]
+        if not open_strata:
+            break
+        stratum = max(open_strata, key=lambda stratum: exact[stratum] - allocation[stratum])
+        allocation[stratum] += 1
+    while sum(allocation.values()) > total:
+        stratum = max(
+            (stratum for stratum in sizes if allocation[stratum] > MIN_PER_STRATUM),
+            key=lambda stratum: allocation[stratum] - exact[stratum],
+            default=None
+        )
+        if stratum is None:
+            break
+        allocation[stratum] -= 1
+    return allocation
+
+
+def stratified_sample(
+    comments: List[Dict[str, Any]],
+    seed: str
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Draw a stratified random sample sized to SAMPLING_MARGIN_OF_ERROR.
+
+    The SAMPLING_TAKE_ALL most-engaged comments are always included. The
+    rest are stratified by date bucket (SAMPLING_DATE_BUCKETS equal-width
+    buckets) and engagement tier (0, 1-9, 10-99, 100+ likes and replies),
+    and sampled in proportion to stratum size. The sample is returned in
+    random order, so any later truncation is itself a random subsample.
+
+    Args:
+        comments: All parsed comments
+        seed: Seed for the random draw, so re-running a video repeats it
+
+    Returns:
+        The sample, and its design (population size, stratum and weight of
+        each sampled comment, stratum sizes), or all comments and None when
+        the sample would not be smaller than the population
+    """
+    population = len(comments)
+    ranked = sorted(range(population), key=lambda i: _engagement(comments[i]), reverse=True)
+    take_all = ranked[:settings.sampling_take_all]
+    rest = ranked[len(take_all):]
+    size = sample_size(len(rest), settings.sampling_margin_of_error, settings.sampling_confidence)
+    if len(take_all) + size >= population:
+        return comments, None
+
+    buckets = _date_buckets(comments, settings.sampling_date_buckets)
+    strata: Dict[Hashable, List[int]] = defaultdict(list)
+    for index in rest:
+        strata[(buckets[index], bisect.bisect_right(ENGAGEMENT_TIERS, _engagement(comments[index])))].append(index)
+    allocation = _allocate({stratum: len(members) for stratum, members in strata.items()}, size)
+
+    rng = random.Random(seed)
+    chosen = [(index, TAKE_ALL) for index in take_all]
+    for stratum, members in strata.items():
+        chosen.extend((index, stratum) for index in rng.sample(members, allocation[stratum]))
+    rng.shuffle(chosen)
+
+    stratum_sizes = {stratum: len(members) for stratum, members in strata.items()}
+    sampled = dict(allocation)
+    if take_all:
+        stratum_sizes[TAKE_ALL] = sampled[TAKE_ALL] = len(take_all)
+
+    design = {
+        "population": population,
+        "strata": [stratum for _, stratum in chosen],
+        "weights": [stratum_sizes[stratum] / sampled[stratum] for _, stratum in chosen],
+        "stratum_sizes": stratum_sizes,
+        "confidence": settings.sampling_confidence,
+        "margin_of_error": settings.sampling_margin_of_error
+    }
+    logger.info(
+        f"Sampled {len(chosen)} of {population} comments "
+        f"({len(take_all)} most engaged, {len(strata)} strata)"
+    )
+    return [comments[index] for index, _ in chosen], design
+
+
+def _interval(estimate: float, variance: float, confidence: float) -> Dict[str, float]:
+    half_width = z_score(confidence) * math.sqrt(max(variance, 0.0))
+    return {
+        "estimate": round(100 * estimate, 1),
+        "lower": round(100 * max(0.0, estimate - half_width), 1),
+        "upper": round(100 * min(1.0, estimate + half_width), 1)
+    }
+
+
+def estimate_share(flags: Sequence[bool], design: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Stratified estimate of the percentage of comments with a property.
+
+    Args:
+        flags: Whether each sampled comment has the property, in sample order
+        design: Sample design from stratified_sample
+
+    Returns:
+        Percentage estimate with the lower and upper confidence bounds
+    """
+    by_stratum: Dict[Hashable, List[bool]] = defaultdict(list)
+    for flag, stratum in zip(flags, design["strata"]):
+        by_stratum[stratum].append(bool(flag))
+
+    estimate = variance = 0.0
+    for stratum, values in by_stratum.items():
+        size, sampled = design["stratum_sizes"][stratum], len(values)
+        share = sum(values) / sampled
+        weight = size / design["population"]
+        estimate += weight * share
+        if 1 < sampled < size:
+            variance += weight ** 2 * (1 - sampled / size) * share * (1 - share) / (sampled - 1)
+    return _interval(estimate, variance, design["confidence"])
+
+
+def unquantified_share(percentage: float) -> Dict[str, float]:
+    """
+    A percentage not counted per comment, such as Gemini's per-cluster
+    estimate from a few exemplars. Its error is unknown, so no bounds are given.
+    """
+    return {"estimate": round(min(100.0, max(0.0, float(percentage))), 1)}
+
+
+def _summary(
+    design: Dict[str, Any],
+    sentiment: Dict[str, Dict[str, float]],
+    lead: Dict[str, float],
+    method: str
+) -> Dict[str, Any]:
+    return {
+        "population": design["population"],
+        "frame_complete": design.get("frame_complete", True),
+        "sample_size": len(design["strata"]),
+        "strata": len(design["stratum_sizes"]),
+        "confidence": design["confidence"],
+        "margin_of_error": design["margin_of_error"],
+        "method": method,
+        "sentiment_breakdown": sentiment,
+        "lead_percentage": lead
+    }
+
+
+def apply_estimates(
+    analysis: Dict[str, Any],
+    design: Dict[str, Any],
+    classified: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Add confidence intervals to an analysis of a sample.
+
+    With per-comment labels (classified), sentiment and lead percentages
+    are replaced by stratified estimates with confidence intervals;
+    otherwise they are Gemini's estimates and are reported without bounds.
+
+    Args:
+        analysis: Analysis of the sample
+        design: Sample design from stratified_sample
+        classified: Per-comment labels from the comment classifier
+
+    Returns:
+        The analysis with a "sampling" section
+    """
+    if classified:
+        sentiment = {
+            label: estimate_share([value == label for value in classified["sentiment"]], design)
+            for label in SENTIMENTS
+        }
+        lead = estimate_share(classified["lead"], design)
+        breakdown = round_percentages({label: interval["estimate"] for label, interval in sentiment.items()})
+        analysis = {
+            **analysis,
+            "sentiment_score": round(breakdown["positive"] + breakdown["neutral"] / 2),
+            "sentiment_breakdown": breakdown,
+            "lead_percentage": round(lead["estimate"])
+        }
+        method = "stratified"
+    else:
+        sentiment = {
+            label: unquantified_share(share)
+            for label, share in analysis["sentiment_breakdown"].items()
+        }
+        lead = unquantified_share(analysis["lead_percentage"])
+        method = "unquantified"
+    return {**analysis, "sampling": _summary(design, sentiment, lead, method)}
+
+
+def finalize(analysis: Dict[str, Any], design: Dict[str, Any], comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Scale an analysis of a sample up to all comments.
+
+    Totals and engagement spikes are taken from all comments. Analyses
+    Gemini made by reading the sample itself (no sampling section yet) get
+    topic counts scaled by population / sample and unquantified percentages.
+
+    Args:
+        analysis: Analysis of the sample
+        design: Sample design from stratified_sample
+        comments: All parsed comments
+
+    Returns:
+        The analysis with total_comments, engagement_spikes and sampling set
+    """
+    analysis = {**analysis, "total_comments": design["population"], "engagement_spikes": engagement_spikes(comments)}
+    if analysis.get("sampling"):
+        return analysis
+
+    scale = design["population"] / len(design["strata"])
+    for key in ("top_feedback_topics", "top_discussed_topics"):
+        analysis[key] = [{**topic, "count": round(topic.get("count", 0) * scale)} for topic in analysis.get(key, [])]
+    return apply_estimates(analysis, design)
@@ -0,0 +1,294 @@
+import math
+import os
+import re
+import threading
+import time
+import logging
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from app.config import settings
+from app.services.comment_store import comment_store, published_timestamp
+
+logger = logging.getLogger(__name__)
+
+FILE_SUFFIX = ".bm25.npz"
+# Comments tokenized per comment store read while building
+BUILD_CHUNK_ROWS = 2000
+# BM25 term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+# Numeric fields kept per comment for filtering, as in Pinecone metadata
+FILTER_FIELDS = ("voteCount", "replyCount", "published_at")
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its just me more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your
+comment comments people viewers say said saying think thought
+""".split())
+
+# Comparison operators of Pinecone metadata filters
+OPERATORS = {
+    "$gte": np.greater_equal,
+    "$gt": np.greater,
+    "$lte": np.less_equal,
+    "$lt": np.less
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, with plurals folded to the singular."""
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class _Index:
+    """A loaded BM25 index: CSR postings per term plus per-comment filter fields."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.ids = arrays["ids"]
+        self.terms = {term: row for row, term in enumerate(arrays["terms"].tolist())}
+        self.indptr = arrays["indptr"]
+        self.postings = arrays["postings"]
+        self.frequencies = arrays["frequencies"]
+        self.lengths = arrays["lengths"]
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        self.fields = {name: arrays[name] for name in FILTER_FIELDS}
+
+    def mask(self, metadata_filter: Dict[str, Dict[str, int]]) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        for name, conditions in metadata_filter.items():
+            for operator, value in conditions.items():
+                mask &= OPERATORS[operator](self.fields[name], value)
+        return mask
+
+    def scores(self, terms: Iterable[str]) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            row = self.terms.get(term)
+            if row is None:
+                continue
+            start, end = self.indptr[row], self.indptr[row + 1]
+            documents = self.postings[start:end]
+            frequencies = self.frequencies[start:end]
+            idf = math.log(1 + (len(self.ids) - (end - start) + 0.5) / (end - start + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[documents] / self.average_length)
+            scores[documents] += idf * frequencies * (K1 + 1) / (frequencies + norm)
+        return scores
+
+    def rows(self, ids: Iterable[str]) -> Dict[str, int]:
+        """Row of each stored ID; ids are sorted, as in the comment store."""
+        ids = list(ids)
+        if not ids or not len(self.ids):
+            return {}
+        rows = np.searchsorted(self.ids, ids).clip(max=len(self.ids) - 1)
+        return {comment_id: int(row) for comment_id, row in zip(ids, rows) if self.ids[row] == comment_id}
+
+
+class SparseIndex:
+    """
+    Per-analysis BM25 keyword index over comment text, for hybrid chat retrieval.
+
+    Built from the local comment store once a job has written all of an
+    analysis's comments, and saved as one .npz file per analysis under
+    SPARSE_INDEX_DIR. Alongside the postings it keeps each comment's likes,
+    replies and publish time, so searches take the same metadata filter
+    as the Pinecone query they are fused with. Analyses indexed before the
+    keyword index existed are built on first search.
+    """
+
+    def __init__(self, directory: Optional[str] = None, cache_entries: Optional[int] = None):
+        self.directory = directory or settings.sparse_index_dir
+        self.cache_entries = cache_entries or settings.sparse_index_cache_entries
+        os.makedirs(self.directory, exist_ok=True)
+        # analysis_id -> (file mtime_ns, index)
+        self._cache: "OrderedDict[str, Tuple[int, _Index]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _path(self, analysis_id: str) -> str:
+        return os.path.join(self.directory, f"{analysis_id}{FILE_SUFFIX}")
+
+    def build(self, analysis_id: str) -> bool:
+        """
+        (Re)build an analysis's index from its stored comments.
+        Errors are logged, not raised; chat then falls back to vector search.
+
+        Returns:
+            True if the index was written
+        """
+        try:
+            chunks = comment_store.scan(analysis_id, BUILD_CHUNK_ROWS)
+            if chunks is None:
+                return False
+
+            ids: List[str] = []
+            fields: Dict[str, List[int]] = {name: [] for name in FILTER_FIELDS}
+            vocabulary: Dict[str, int] = {}
+            term_rows: List[int] = []
+            documents: List[int] = []
+            frequencies: List[int] = []
+            lengths: List[int] = []
+            for columns in chunks:
+                for comment_id, text, day, votes, replies in zip(
+                    columns["id"], columns["comment"], columns["date"], columns["voteCount"], columns["replyCount"]
+                ):
+                    tokens = tokenize(text)
+                    for term, count in Counter(tokens).items():
+                        term_rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                        documents.append(len(ids))
+                        frequencies.append(count)
+                    lengths.append(len(tokens))
+                    ids.append(comment_id)
+                    fields["voteCount"].append(votes)
+                    fields["replyCount"].append(replies)
+                    fields["published_at"].append(published_timestamp(day))
+
+            order = np.argsort(np.asarray(term_rows, dtype=np.int32), kind="stable")
+            indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum(np.bincount(np.asarray(term_rows, dtype=np.int64), minlength=len(vocabulary)))
+            arrays = {
+                "ids": np.asarray(ids, dtype=str),
+                "terms": np.asarray(list(vocabulary), dtype=str),
+                "indptr": indptr,
+                "postings": np.asarray(documents, dtype=np.int32)[order],
+                "frequencies": np.asarray(frequencies, dtype=np.float32)[order],
+                "lengths": np.asarray(lengths, dtype=np.float32),
+                **{name: np.asarray(values, dtype=np.int64) for name, values in fields.items()}
+            }
+
+            path = self._path(analysis_id)
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            with self._build_lock:
+                with open(temporary, "wb") as f:
+                    np.savez(f, **arrays)
+                os.replace(temporary, path)
+            logger.info(f"Built keyword index for analysis {analysis_id}: {len(ids)} comments, {len(vocabulary)} terms")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error building keyword index for {analysis_id}: {str(e)}")
+            return False
+
+    def _get(self, analysis_id: str) -> Optional[_Index]:
+        path = self._path(analysis_id)
+        try:
+            version = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            if not self.build(analysis_id):
+                return None
+            version = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            cached = self._cache.get(analysis_id)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(analysis_id)
+                return cached[1]
+
+        with np.load(path) as arrays:
+            index = _Index({name: arrays[name] for name in arrays.files})
+        with self._lock:
+            self._cache[analysis_id] = (version, index)
+            self._cache.move_to_end(analysis_id)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return index
+
+    def search(
+        self,
+        analysis_id: str,
+        query: str,
+        metadata_filter: Dict[str, Dict[str, int]],
+        limit: int,
+        include_ids: Iterable[str] = ()
+    ) -> Dict[str, float]:
+        """
+        BM25-score an analysis's comments against a query.
+
+        Args:
+            analysis_id: Analysis to search
+            query: Query text
+            metadata_filter: Pinecone-style filter, e.g. {"voteCount": {"$gte": 50}}
+            limit: Number of best-scoring comments to return
+            include_ids: Comments whose score is returned even outside the best
+
+        Returns:
+            Comment ID -> BM25 score, for matching comments that pass the filter
+            and for include_ids (0 if the text does not match); empty when the
+            analysis has no index
+        """
+        index = self._get(analysis_id)
+        if index is None:
+            return {}
+
+        scores = index.scores(set(tokenize(query)))
+        scores[~index.mask(metadata_filter)] = 0
+        matching = np.flatnonzero(scores)
+        best = matching[np.argsort(-scores[matching], kind="stable")[:limit]]
+
+        results = {str(index.ids[row]): float(scores[row]) for row in best}
+        for comment_id, row in index.rows(include_ids).items():
+            results.setdefault(comment_id, float(scores[row]))
+        return results
+
+    def quantile(self, analysis_id: str, field: str, q: float) -> Optional[int]:
+        """Value of a filter field at quantile q over an analysis's comments, at least 1."""
+        index = self._get(analysis_id)
+        if index is None or not len(index.ids):
+            return None
+        return max(1, int(np.ceil(np.quantile(index.fields[field], q))))
+
+    def drop(self, analysis_id: str):
+        """Remove an analysis's index."""
+        with self._lock:
+            self._cache.pop(analysis_id, None)
+        try:
+            os.remove(self._path(analysis_id))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, keep: Set[str], min_age_seconds: float) -> List[str]:
+        """
+        Drop indexes of analyses not in keep that are older than min_age_seconds.
+
+        Returns:
+            Analysis IDs whose indexes were dropped
+        """
+        dropped = []
+        cutoff = time.time() - min_age_seconds
+        for name in os.listdir(self.directory):
+            if not name.endswith(FILE_SUFFIX):
+                continue
+            analysis_id = name[:-len(FILE_SUFFIX)]
+            if analysis_id in keep:
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.drop(analysis_id)
+            dropped.append(analysis_id)
+        return dropped
+
+    def size_bytes(self, analysis_id: str) -> int:
+        try:
+            return os.path.getsize(self._path(analysis_id))
+        except FileNotFoundError:
+            return 0
+
+
+# Singleton instance
+sparse_index = SparseIndex()
@@ -0,0 +1,287 @@
+import logging
+import math
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.incremental import MAX_INFLUENCERS, MAX_LEADS, MAX_TOPIC_COMMENTS, MAX_TOPICS, engagement_spikes
+
+logger = logging.getLogger(__name__)
+
+# Mini-batch k-means
+KMEANS_BATCH_SIZE = 256
+KMEANS_MAX_ITERATIONS = 100
+KMEANS_TOLERANCE = 1e-4
+
+SENTIMENTS = ("positive", "neutral", "negative")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans_plus_plus(vectors: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Pick k initial centers, each far (in squared distance) from those already chosen."""
+    centers = [vectors[rng.integers(len(vectors))]]
+    distances = np.sum((vectors - centers[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        total = distances.sum()
+        index = rng.choice(len(vectors), p=distances / total) if total > 0 else rng.integers(len(vectors))
+        centers.append(vectors[index])
+        distances = np.minimum(distances, np.sum((vectors - vectors[index]) ** 2, axis=1))
+    return np.stack(centers)
+
+
+def kmeans(vectors: np.ndarray, k: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mini-batch k-means over unit-normalized vectors (cosine geometry).
+
+    Args:
+        vectors: (n, d) embedding matrix
+        k: Number of clusters (at most n)
+        seed: Random seed, so the same comments give the same topics
+
+    Returns:
+        (k, d) centers and the cluster label of every vector
+    """
+    rng = np.random.default_rng(seed)
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    k = min(k, len(vectors))
+    centers = _kmeans_plus_plus(vectors, k, rng)
+    counts = np.zeros(k)
+
+    for _ in range(KMEANS_MAX_ITERATIONS):
+        batch = vectors[rng.choice(len(vectors), size=min(KMEANS_BATCH_SIZE, len(vectors)), replace=False)]
+        assigned = np.argmax(batch @ centers.T, axis=1)
+        previous = centers.copy()
+        for center in np.unique(assigned):
+            members = batch[assigned == center]
+            counts[center] += len(members)
+            # Per-center learning rate decays as the center absorbs more points
+            rate = len(members) / counts[center]
+            centers[center] = (1 - rate) * centers[center] + rate * members.mean(axis=0)
+        if np.max(np.linalg.norm(centers - previous, axis=1)) < KMEANS_TOLERANCE:
+            break
+
+    centers = _normalize(centers)
+    return centers, np.argmax(vectors @ centers.T, axis=1)
+
+
+def cluster_count(comments: int, max_clusters: int) -> int:
+    """Heuristic number of topics: sqrt(n / 2), between 2 and max_clusters."""
+    return max(2, min(max_clusters, round(math.sqrt(comments / 2))))
+
+
+def build_digest(
+    comments: List[Dict[str, Any]],
+    embeddings: List[List[float]],
+    max_clusters: int,
+    exemplars: int,
+    weights: Optional[List[float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Group comments into topic clusters with counts and exemplars.
+
+    Args:
+        comments: Parsed comments
+        embeddings: Embedding of each comment
+        max_clusters: Upper bound on the number of clusters
+        exemplars: Representative comments kept per cluster
+        weights: Comments each comment stands for, when they are a sample
+
+    Returns:
+        Clusters, largest first, each with its comment indices ("members"),
+        size, estimated comment count ("count", the size unless weighted),
+        total likes and replies, and the indices of the distinct comments
+        closest to its center ("exemplars")
+    """
+    vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+    centers, labels = kmeans(vectors, cluster_count(len(comments), max_clusters))
+
+    clusters = []
+    for center in range(len(centers)):
+        members = np.flatnonzero(labels == center)
+        if not len(members):
+            continue
+        closest = members[np.argsort(-(vectors[members] @ centers[center]))]
+        chosen, seen = [], set()
+        for index in closest:
+            text = " ".join(comments[index]["comment"].lower().split())
+            if text not in seen:
+                seen.add(text)
+                chosen.append(int(index))
+            if len(chosen) == exemplars:
+                break
+        clusters.append({
+            "members": members.tolist(),
+            "size": len(members),
+            "count": round(sum(weights[i] for i in members)) if weights else len(members),
+            "likes": sum(comments[i]["voteCount"] for i in members),
+            "replies": sum(comments[i]["replyCount"] for i in members),
+            "exemplars": chosen
+        })
+
+    clusters.sort(key=lambda cluster: cluster["size"], reverse=True)
+    logger.info(f"Clustered {len(comments)} comments into {len(clusters)} topics")
+    return clusters
+
+
+def _number(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _shares(label: Dict[str, Any]) -> Dict[str, float]:
+    shares = {sentiment: max(0.0, _number(label.get(sentiment))) for sentiment in SENTIMENTS}
+    total = sum(shares.values())
+    if not total:
+        return {"positive": 0.0, "neutral": 1.0, "negative": 0.0}
+    return {sentiment: value / total for sentiment, value in shares.items()}
+
+
+def round_percentages(weights: Dict[str, float]) -> Dict[str, int]:
+    """Round shares to integer percentages that sum to 100."""
+    total = sum(weights.values()) or 1.0
+    exact = {key: 100 * value / total for key, value in weights.items()}
+    rounded = {key: int(value) for key, value in exact.items()}
+    for key in sorted(exact, key=lambda key: exact[key] - rounded[key], reverse=True)[:100 - sum(rounded.values())]:
+        rounded[key] += 1
+    return rounded
+
+
+def _exemplar_leads(
+    comments: List[Dict[str, Any]],
+    labelling: Dict[str, Any],
+    exemplar_ids: Dict[str, int]
+) -> List[Dict[str, Any]]:
+    """Leads Gemini picked among the exemplars."""
+    leads = []
+    for lead in labelling.get("leads", []):
+        index = exemplar_ids.get(str(lead.get("exemplar", "")).strip("[]"))
+        if index is None:
+            continue
+        leads.append({
+            "username": comments[index]["author"],
+            "text": comments[index]["comment"],
+            "timestamp": comments[index]["date"],
+            "sentiment": _number(lead.get("sentiment"), 0.5)
+        })
+    return leads
+
+
+def _classified_leads(comments: List[Dict[str, Any]], classified: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Comments labelled as leads, most likely first."""
+    indices = [index for index, lead in enumerate(classified["lead"]) if lead]
+    indices.sort(key=lambda index: classified["lead_probability"][index], reverse=True)
+    return [
+        {
+            "username": comments[index]["author"],
+            "text": comments[index]["comment"],
+            "timestamp": comments[index]["date"],
+            "sentiment": round(float(classified["positivity"][index]), 2)
+        }
+        for index in indices[:MAX_LEADS]
+    ]
+
+
+def assemble_result(
+    comments: List[Dict[str, Any]],
+    clusters: List[Dict[str, Any]],
+    labelling: Dict[str, Any],
+    exemplar_ids: Dict[str, int],
+    classified: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Build an analysis (AnalysisResult shape) from clusters and their labels.
+
+    Topic counts are cluster counts. Sentiment and lead shares are counted
+    from per-comment labels when classified is given, and otherwise
+    weighted by cluster count (design-weighted for a sample) from Gemini's
+    per-cluster estimates; either way they cover every comment. Engagement spikes and influencers are
+    counted locally from all comments.
+
+    Args:
+        comments: Parsed comments
+        clusters: Output of build_digest
+        labelling: Gemini's cluster labels, leads and insights
+        exemplar_ids: Exemplar reference in the prompt -> comment index
+        classified: Per-comment labels from the comment classifier
+
+    Returns:
+        Analysis without vibe_trend
+    """
+    labels: Dict[int, Dict[str, Any]] = {}
+    for label in labelling.get("clusters", []):
+        try:
+            labels[int(label["cluster"])] = label
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    sentiment_weights = dict.fromkeys(SENTIMENTS, 0.0)
+    lead_weight = 0.0
+    topics = {"feedback": [], "discussion": []}
+    topic_of = {}
+    for number, cluster in enumerate(clusters, 1):
+        label = labels.get(number, {})
+        name = str(label.get("topic") or f"Topic {number}")
+        for sentiment, share in _shares(label).items():
+            sentiment_weights[sentiment] += share * cluster["count"]
+        lead_weight += min(100.0, max(0.0, _number(label.get("lead_share")))) / 100 * cluster["count"]
+        for index in cluster["members"]:
+            topic_of[index] = name
+
+        kind = "feedback" if label.get("kind") == "feedback" else "discussion"
+        topics[kind].append({
+            "topic": name,
+            "count": cluster["count"],
+            "comments": [
+                {"author": comments[i]["author"], "text": comments[i]["comment"][:300]}
+                for i in cluster["exemplars"][:MAX_TOPIC_COMMENTS]
+            ]
+        })
+
+    total = len(comments)
+    # Comments the clusters stand for: the population when they are a sample
+    represented = sum(cluster["count"] for cluster in clusters)
+    if classified:
+        counts = Counter(classified["sentiment"])
+        breakdown = round_percentages({sentiment: counts[sentiment] for sentiment in SENTIMENTS})
+        lead_percentage = round(100 * sum(classified["lead"]) / total) if total else 0
+        leads = _classified_leads(comments, classified)
+    else:
+        breakdown = round_percentages(sentiment_weights)
+        lead_percentage = round(100 * lead_weight / represented) if represented else 0
+        leads = _exemplar_leads(comments, labelling, exemplar_ids)
+
+    engagement: Dict[str, int] = defaultdict(int)
+    author_topics: Dict[str, Counter] = defaultdict(Counter)
+    for index, comment in enumerate(comments):
+        engagement[comment["author"]] += comment["voteCount"] + comment["replyCount"]
+        author_topics[comment["author"]][topic_of.get(index, "")] += 1
+    influencers = sorted(engagement.items(), key=lambda item: item[1], reverse=True)[:MAX_INFLUENCERS]
+
+    return {
+        "sentiment_score": round(breakdown["positive"] + breakdown["neutral"] / 2),
+        "sentiment_breakdown": breakdown,
+        "lead_percentage": lead_percentage,
+        "leads": leads,
+        "top_feedback_topics": topics["feedback"][:MAX_TOPICS],
+        "top_discussed_topics": topics["discussion"][:MAX_TOPICS],
+        "actionable_todos": [],
+        "creator_insights": [str(insight) for insight in labelling.get("creator_insights", [])],
+        "competitor_insights": [str(insight) for insight in labelling.get("competitor_insights", [])],
+        "engagement_spikes": engagement_spikes(comments),
+        "top_influencers": [
+            {
+                "username": author,
+                "influenceScore": score,
+                "mainTopic": author_topics[author].most_common(1)[0][0],
+                "engagementCount": score
+            }
+            for author, score in influencers
+        ],
+        "total_comments": total
+    }
@@ -0,0 +1,624 @@
+"""
+Local stand-ins for the provider SDKs used by the backend.
+
+`install()` registers fake `apify_client`, `openai`, `google.generativeai`,
+`pinecone` and `supabase` modules in `sys.modules`, so it must run before
+anything under `app` is imported. Each fake implements only the SDK surface
+the backend calls and simulates latency, jitter, rate limits and failures
+from a `ProviderProfile`. Embeddings and LLM output are deterministic.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+import uuid
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class SimulatedProviderError(Exception):
+    """Raised by a fake provider to simulate a failed or rate-limited call."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ProviderProfile:
+    """
+    Simulated behaviour of one provider.
+
+    Args:
+        latency_ms: Base latency per call
+        jitter_ms: Uniform jitter added to each call (+/-)
+        failure_rate: Probability that a call raises SimulatedProviderError
+        rate_limit: Calls per second before calls are rejected (0 = unlimited)
+        per_item_ms: Extra latency per input item (texts, vectors, comments)
+    """
+
+    def __init__(
+        self,
+        latency_ms: float,
+        jitter_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        per_item_ms: float = 0.0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.per_item_ms = per_item_ms
+
+
+# Rough production-like defaults; scale them with `scaled()` for quick runs
+DEFAULT_PROFILES: Dict[str, ProviderProfile] = {
+    "apify": ProviderProfile(latency_ms=8000, jitter_ms=2000, per_item_ms=2),
+    "openai_embeddings": ProviderProfile(latency_ms=250, jitter_ms=80, per_item_ms=1, rate_limit=50),
+    "openai_chat": ProviderProfile(latency_ms=1200, jitter_ms=400),
+    "gemini": ProviderProfile(latency_ms=9000, jitter_ms=3000, per_item_ms=5),
+    "pinecone": ProviderProfile(latency_ms=60, jitter_ms=20, per_item_ms=0.2),
+    "supabase": ProviderProfile(latency_ms=25, jitter_ms=10),
+}
+
+
+def scaled(profiles: Dict[str, ProviderProfile], factor: float) -> Dict[str, ProviderProfile]:
+    """Return copies of profiles with all latencies multiplied by factor."""
+    return {
+        name: ProviderProfile(
+            latency_ms=profile.latency_ms * factor,
+            jitter_ms=profile.jitter_ms * factor,
+            failure_rate=profile.failure_rate,
+            rate_limit=profile.rate_limit,
+            per_item_ms=profile.per_item_ms * factor
+        )
+        for name, profile in profiles.items()
+    }
+
+
+class SimulatedProvider:
+    """Applies a profile to calls; thread-safe, so it works under asyncio.to_thread."""
+
+    def __init__(self, name: str, profile: ProviderProfile, seed: int):
+        self.name = name
+        self.profile = profile
+        self._random = random.Random(f"{seed}:{name}")
+        self._lock = threading.Lock()
+        self._tokens = profile.rate_limit
+        self._refilled_at = time.monotonic()
+        self.calls = 0
+        self.failures = 0
+
+    def _admit(self, items: int) -> float:
+        """Decide the outcome of one call and return its latency in seconds."""
+        with self._lock:
+            self.calls += 1
+            if self.profile.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.profile.rate_limit,
+                    self._tokens + (now - self._refilled_at) * self.profile.rate_limit
+                )
+                self._refilled_at = now
+                if self._tokens < 1:
+                    self.failures += 1
+                    raise SimulatedProviderError(f"{self.name}: 429 rate limit exceeded", 429)
+                self._tokens -= 1
+
+            if self._random.random() < self.profile.failure_rate:
+                self.failures += 1
+                raise SimulatedProviderError(f"{self.name}: simulated failure", 503)
+
+            jitter = self._random.uniform(-self.profile.jitter_ms, self.profile.jitter_ms)
+            return max(0.0, self.profile.latency_ms + jitter + self.profile.per_item_ms * items) / 1000
+
+    def call(self, items: int = 1):
+        """Simulate a blocking SDK call."""
+        time.sleep(self._admit(items))
+
+    async def acall(self, items: int = 1):
+        """Simulate an async SDK call."""
+        await asyncio.sleep(self._admit(items))
+
+
+def fake_embedding(text: str) -> List[float]:
+    """Deterministic unit vector for a text; similar texts are not similar."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _ns(**kwargs) -> types.SimpleNamespace:
+    return types.SimpleNamespace(**kwargs)
+
+
+# --- Apify -----------------------------------------------------------------
+
+COMMENT_TEMPLATES = [
+    "This is exactly what I needed, thanks!",
+    "Audio is a bit quiet in the second half.",
+    "Where can I buy the gear you used?",
+    "Could you do a follow-up on advanced settings?",
+    "Not convinced, the intro was too long.",
+    "Great editing, subscribed.",
+    "Is there a discount code for the course?",
+    "I disagree with the point about pricing.",
+]
+# (sentiment, lead) of each template, for training benchmark classifier weights
+COMMENT_LABELS = [
+    ("positive", False),
+    ("negative", False),
+    ("neutral", True),
+    ("neutral", False),
+    ("negative", False),
+    ("positive", False),
+    ("neutral", True),
+    ("negative", False),
+]
+
+
+class FakeApifyClient:
+    def __init__(self, provider: SimulatedProvider, comments_per_video: int):
+        self.provider = provider
+        self.comments_per_video = comments_per_video
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._datasets: Dict[str, List[Dict[str, Any]]] = {}
+
+    def actor(self, actor_id: str):
+        def start(run_input: Dict[str, Any]):
+            run_id = uuid.uuid4().hex
+            urls = [start_url["url"] for start_url in run_input.get("startUrls", [])]
+            max_comments = run_input.get("maxComments", self.comments_per_video)
+            items = []
+            for url in urls:
+                items.extend(self._comments(url, min(max_comments, self.comments_per_video)))
+            self._datasets[run_id] = items
+            # Latency is spent while the backend polls for the result
+            self._runs[run_id] = {
+                "id": run_id,
+                "status": "RUNNING",
+                "defaultDatasetId": run_id,
+                "finishes_at": time.monotonic() + self.provider._admit(len(items))
+            }
+            return self._public(run_id)
+        return _ns(start=start)
+
+    def run(self, run_id: str):
+        def wait_for_finish(wait_secs: int = 5):
+            run = self._runs[run_id]
+            remaining = run["finishes_at"] - time.monotonic()
+            if run["status"] == "RUNNING":
+                time.sleep(max(0.0, min(remaining, wait_secs)))
+                if time.monotonic() >= run["finishes_at"]:
+                    run["status"] = "SUCCEEDED"
+            return self._public(run_id)
+
+        def abort():
+            self._runs[run_id]["status"] = "ABORTED"
+
+        return _ns(wait_for_finish=wait_for_finish, abort=abort)
+
+    def dataset(self, dataset_id: str):
+        return _ns(iterate_items=lambda: iter(self._datasets.get(dataset_id, [])))
+
+    def _public(self, run_id: str) -> Dict[str, Any]:
+        return {key: value for key, value in self._runs[run_id].items() if key != "finishes_at"}
+
+    def _comments(self, url: str, count: int) -> List[Dict[str, Any]]:
+        video_id = (re.search(r"(?:v=|youtu\.be/)([\w-]{11})", url) or re.search(r"(.*)", url)).group(1)
+        rng = random.Random(video_id)
+        return [
+            {
+                "cid": f"{video_id}-{i}",
+                "author": f"viewer{rng.randint(1, count * 2)}",
+                "comment": f"{rng.choice(COMMENT_TEMPLATES)} (#{i})",
+                "publishedTimeText": f"{rng.randint(1, 30)} days ago",
+                "voteCount": rng.randint(0, 500),
+                "replyCount": rng.randint(0, 20),
+                "type": "comment",
+                "videoId": video_id,
+                "pageUrl": url,
+                "authorIsChannelOwner": False
+            }
+            for i in range(count)
+        ]
+
+
+# --- OpenAI ----------------------------------------------------------------
+
+class FakeOpenAI:
+    """Synchronous client; used for embeddings."""
+
+    def __init__(self, provider: SimulatedProvider):
+        def create(model: str, input: List[str]):
+            provider.call(len(input))
+            return _ns(
+                data=[_ns(embedding=fake_embedding(text)) for text in input],
+                usage=_ns(total_tokens=sum(len(text) // 4 for text in input))
+            )
+        self.embeddings = _ns(create=create)
+
+
+class FakeAsyncOpenAI:
+    """Async client; used for chat completions and summaries."""
+
+    def __init__(self, provider: SimulatedProvider):
+        async def create(model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+            prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+            answer = _chat_answer(messages[-1]["content"])
+            usage = _ns(prompt_tokens=prompt_tokens, completion_tokens=len(answer) // 4)
+            if not stream:
+                await provider.acall()
+                return _ns(choices=[_ns(message=_ns(content=answer))], usage=usage)
+            return FakeAsyncStream(_stream_openai(provider, answer, usage))
+        self.chat = _ns(completions=_ns(create=create))
+
+
+class FakeAsyncStream:
+    """Streamed completion; like openai.AsyncStream, closed with `await close()`."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self._chunks
+
+    async def close(self):
+        await self._chunks.aclose()
+
+
+async def _stream_openai(provider: SimulatedProvider, answer: str, usage):
+    words = answer.split(" ")
+    await provider.acall()
+    for i, word in enumerate(words):
+        await asyncio.sleep(0.005)
+        yield _ns(choices=[_ns(delta=_ns(content=word + (" " if i < len(words) - 1 else "")))], usage=None)
+    yield _ns(choices=[], usage=usage)
+
+
+def _chat_answer(question: str) -> str:
+    return f"- Based on the retrieved comments, viewers mostly agree on this point.\n- Question: {question[:80]}"
+
+
+# --- Gemini ----------------------------------------------------------------
+
+class FakeGenerativeModel:
+    def __init__(self, provider: SimulatedProvider, model_name: str):
+        self.provider = provider
+        self.model_name = model_name
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        count_match = re.search(r"Analyze the following (\d+) YouTube comments", prompt)
+        digest_match = re.search(r"were grouped into (\d+) topic clusters", prompt)
+        if count_match:
+            text, items = _analysis_json(prompt, int(count_match.group(1))), int(count_match.group(1))
+        elif digest_match:
+            # Work scales with the exemplars shown, not the comments they stand for
+            text, items = _digest_json(prompt, int(digest_match.group(1))), len(re.findall(r"\[[ER]\d+\]", prompt))
+        else:
+            text, items = _chat_answer(prompt[-200:]), 1
+        usage = _ns(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        await self.provider.acall(items)
+        if not stream:
+            return _ns(text=text, usage_metadata=usage)
+        return _stream_gemini(text, usage)
+
+
+async def _stream_gemini(text: str, usage):
+    chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+    for i, chunk in enumerate(chunks):
+        await asyncio.sleep(0.005)
+        yield _ns(text=chunk, usage_metadata=usage if i == len(chunks) - 1 else None)
+
+
+def _analysis_json(prompt: str, count: int) -> str:
+    authors = re.findall(r"Author: @(\S+)", prompt)[:20] or ["viewer1"]
+    rng = random.Random(count)
+    positive = rng.randint(40, 80)
+    negative = rng.randint(5, 100 - positive)
+    topic = lambda name: {"topic": name, "count": rng.randint(1, max(count // 5, 1)), "comments": [{"author": authors[0], "text": "..."}]}
+    return json.dumps({
+        "sentiment_score": positive,
+        "sentiment_breakdown": {"positive": positive, "neutral": 100 - positive - negative, "negative": negative},
+        "lead_percentage": rng.randint(0, 15),
+        "leads": [{"username": author, "text": "Where can I buy this?", "timestamp": "2026-10-01", "sentiment": 0.8} for author in authors[:5]],
+        "top_feedback_topics": [topic("Audio quality"), topic("Video length")],
+        "top_discussed_topics": [topic("Gear"), topic("Pricing")],
+        "actionable_todos": [],
+        "creator_insights": ["Improve audio levels"] * 5,
+        "competitor_insights": ["Match their editing pace"] * 5,
+        "engagement_spikes": [{"time": "2026-10-01", "count": count // 3}],
+        "top_influencers": [{"username": author, "influenceScore": 50, "mainTopic": "Gear", "engagementCount": 10} for author in authors[:5]],
+        "total_comments": count
+    })
+
+
+def _digest_json(prompt: str, clusters: int) -> str:
+    exemplars = re.findall(r"\[(E\d+)\]", prompt)
+    rng = random.Random(clusters)
+    labels = []
+    for number in range(1, clusters + 1):
+        positive = rng.randint(30, 80)
+        negative = rng.randint(0, 100 - positive)
+        labels.append({
+            "cluster": number,
+            "topic": f"Topic {number}",
+            "kind": "feedback" if number % 2 else "discussion",
+            "positive": positive,
+            "neutral": 100 - positive - negative,
+            "negative": negative,
+            "lead_share": rng.randint(0, 15)
+        })
+    reviews = [
+        {"comment": reference, "sentiment": rng.choice(["positive", "neutral", "negative"]), "lead": rng.random() < 0.3}
+        for reference in re.findall(r"\[(R\d+)\]", prompt)
+    ]
+    return json.dumps({
+        "clusters": labels,
+        "leads": [{"exemplar": exemplar, "sentiment": 0.8} for exemplar in exemplars[:3]],
+        "reviews": reviews,
+        "creator_insights": ["Improve audio levels"] * 5,
+        "competitor_insights": ["Match their editing pace"] * 5
+    })
+
+
+# --- Pinecone --------------------------------------------------------------
+
+# Comparison operators of Pinecone metadata filters
+FILTER_OPERATORS = {
+    "$gte": lambda value, bound: value >= bound,
+    "$gt": lambda value, bound: value > bound,
+    "$lte": lambda value, bound: value <= bound,
+    "$lt": lambda value, bound: value < bound
+}
+
+
+def _matches_filter(metadata: Dict[str, Any], filter: Dict[str, Dict[str, int]]) -> bool:
+    return all(
+        name in metadata and FILTER_OPERATORS[operator](metadata[name], bound)
+        for name, conditions in filter.items()
+        for operator, bound in conditions.items()
+    )
+
+
+class FakeIndex:
+    def __init__(self, provider: SimulatedProvider):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str):
+        self.provider.call(len(vectors))
+        with self._lock:
+            store = self._namespaces.setdefault(namespace, {})
+            for vector in vectors:
+                store[vector["id"]] = {**vector, "array": np.asarray(vector["values"], dtype=np.float32)}
+
+    def query(
+        self,
+        vector: List[float],
+        namespace: str,
+        top_k: int,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        filter: Optional[Dict[str, Dict[str, int]]] = None
+    ):
+        self.provider.call()
+        with self._lock:
+            stored = list(self._namespaces.get(namespace, {}).values())
+        if filter:
+            stored = [item for item in stored if _matches_filter(item["metadata"], filter)]
+        if not stored:
+            return _ns(matches=[])
+        matrix = np.stack([item["array"] for item in stored])
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)[:top_k]
+        return _ns(matches=[
+            _ns(
+                id=stored[i]["id"],
+                score=float(scores[i]),
+                metadata=stored[i]["metadata"] if include_metadata else None,
+                values=stored[i]["values"] if include_values else None
+            )
+            for i in order
+        ])
+
+    def fetch(self, ids: List[str], namespace: str):
+        self.provider.call(len(ids))
+        with self._lock:
+            store = self._namespaces.get(namespace, {})
+            found = [store[vector_id] for vector_id in ids if vector_id in store]
+        return _ns(vectors={
+            item["id"]: _ns(id=item["id"], values=item["values"], metadata=item["metadata"])
+            for item in found
+        })
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = ""):
+        self.provider.call(len(ids or []))
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+            else:
+                store = self._namespaces.get(namespace, {})
+                for vector_id in ids or []:
+                    store.pop(vector_id, None)
+
+    def describe_index_stats(self):
+        with self._lock:
+            return _ns(
+                namespaces={name: _ns(vector_count=len(store)) for name, store in self._namespaces.items()},
+                total_vector_count=sum(len(store) for store in self._namespaces.values())
+            )
+
+
+class FakePinecone:
+    def __init__(self, index: FakeIndex):
+        self._index = index
+        self._names: List[str] = []
+
+    def list_indexes(self):
+        return [_ns(name=name) for name in self._names]
+
+    def create_index(self, name: str, **kwargs):
+        self._names.append(name)
+
+    def Index(self, name: str, **kwargs) -> FakeIndex:
+        return self._index
+
+
+# --- Supabase --------------------------------------------------------------
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self._action = "select"
+        self._payload: Any = None
+        self._filters: List[tuple] = []
+        self._order: Optional[tuple] = None
+        self._limit: Optional[int] = None
+        self._columns = "*"
+
+    def select(self, columns: str = "*"):
+        self._action, self._columns = "select", columns
+        return self
+
+    def insert(self, payload):
+        self._action, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload):
+        self._action, self._payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self._action, self._payload = "update", payload
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append((column, value))
+        return self
+
+    def in_(self, column: str, values):
+        self._filters.append((column, set(values)))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self._limit = end + 1
+        return self
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(
+            row.get(column) in value if isinstance(value, set) else row.get(column) == value
+            for column, value in self._filters
+        )
+
+    def execute(self):
+        self.client.provider.call()
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            if self._action in ("insert", "upsert"):
+                payload = self._payload if isinstance(self._payload, list) else [self._payload]
+                for item in payload:
+                    item = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **item}
+                    key = next((k for k in ("id", "analysis_history_id") if k in item), None)
+                    existing = next((row for row in rows if key and row.get(key) == item[key]), None)
+                    if existing is not None and self._action == "upsert":
+                        existing.update(item)
+                    else:
+                        rows.append(item)
+                return _ns(data=payload)
+            matched = [row for row in rows if self._matches(row)]
+            if self._action == "update":
+                for row in matched:
+                    row.update(self._payload)
+                return _ns(data=matched)
+            if self._action == "delete":
+                self.client.tables[self.table] = [row for row in rows if not self._matches(row)]
+                return _ns(data=matched)
+            if self._order:
+                column, desc = self._order
+                matched.sort(key=lambda row: str(row.get(column, "")), reverse=desc)
+            if self._limit is not None:
+                matched = matched[:self._limit]
+            if self._columns != "*":
+                columns = [column.strip() for column in self._columns.split(",")]
+                matched = [{column: row.get(column) for column in columns} for row in matched]
+            return _ns(data=[dict(row) for row in matched])
+
+
+class FakeSupabase:
+    def __init__(self, provider: SimulatedProvider):
+        self.provider = provider
+        self.lock = threading.Lock()
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+
+# --- Installation ----------------------------------------------------------
+
+class SimulatedProviders:
+    """All simulated providers of one benchmark run."""
+
+    def __init__(self, profiles: Dict[str, ProviderProfile], seed: int = 0, comments_per_video: int = 500):
+        self.providers = {name: SimulatedProvider(name, profile, seed) for name, profile in profiles.items()}
+        self.apify = FakeApifyClient(self.providers["apify"], comments_per_video)
+        self.index = FakeIndex(self.providers["pinecone"])
+        self.supabase = FakeSupabase(self.providers["supabase"])
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: {"calls": p.calls, "failures": p.failures} for name, p in self.providers.items()}
+
+
+def install(simulated: SimulatedProviders):
+    """Register the fake SDK modules. Must run before importing `app`."""
+    def module(name: str, **attrs) -> types.ModuleType:
+        fake = types.ModuleType(name)
+        fake.__dict__.update(attrs)
+        sys.modules[name] = fake
+        return fake
+
+    module("apify_client", ApifyClient=lambda *args, **kwargs: simulated.apify)
+    module(
+        "openai",
+        OpenAI=lambda *args, **kwargs: FakeOpenAI(simulated.providers["openai_embeddings"]),
+        AsyncOpenAI=lambda *args, **kwargs: FakeAsyncOpenAI(simulated.providers["openai_chat"])
+    )
+    generativeai = module(
+        "google.generativeai",
+        configure=lambda **kwargs: None,
+        GenerativeModel=lambda name, **kwargs: FakeGenerativeModel(simulated.providers["gemini"], name)
+    )
+    module("google", generativeai=generativeai)
+    module(
+        "pinecone",
+        Pinecone=lambda *args, **kwargs: FakePinecone(simulated.index),
+        ServerlessSpec=lambda **kwargs: None
+    )
+    module(
+        "supabase",
+        create_client=lambda *args, **kwargs: simulated.supabase,
+        Client=FakeSupabase,
+        ClientOptions=lambda **kwargs: types.SimpleNamespace(httpx_client=None, **kwargs)
+    )
@@ -0,0 +1,285 @@
+"""
+Offline end-to-end benchmark.
+
+Runs the real FastAPI app and job pipeline in-process against the simulated
+providers in `benchmarks.providers`, submitting analyses through
+/api/analyze, polling /api/status and chatting through /api/chat.
+
+Usage (from backend/):
+    python -m benchmarks.run --jobs 20 --users 5 --chat-users 10 --scale 0.1
+    python -m benchmarks.run --fail gemini=0.05 --rate openai_embeddings=20 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from benchmarks.providers import (
+    COMMENT_LABELS, COMMENT_TEMPLATES, DEFAULT_PROFILES, SimulatedProviders, fake_embedding, install, scaled
+)
+
+PERCENTILES = (50, 95, 99)
+
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED")
+
+CHAT_QUESTIONS = [
+    "What do viewers complain about most?",
+    "Which comments show buying intent?",
+    "Summarize the feedback on audio quality",
+    "What follow-up videos are people asking for?",
+]
+
+
+def parse_overrides(values: List[str], cast) -> Dict[str, Any]:
+    """Parse repeated provider=value flags."""
+    overrides = {}
+    for value in values:
+        name, _, raw = value.partition("=")
+        if name not in DEFAULT_PROFILES:
+            raise SystemExit(f"Unknown provider '{name}' (expected one of {', '.join(DEFAULT_PROFILES)})")
+        overrides[name] = cast(raw)
+    return overrides
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {f"p{p}": None for p in PERCENTILES} | {"count": 0}
+    values = np.percentile(np.asarray(samples), PERCENTILES)
+    return {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, values)} | {"count": len(samples)}
+
+
+class SampleRecorder:
+    """Keeps raw observations of labelled histograms, which only store buckets."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def attach(self, histogram, prefix: str, label: str):
+        observe = histogram.observe
+
+        def recording_observe(value: float, **labels: str):
+            self.samples[f"{prefix}.{labels.get(label, '')}"].append(value)
+            observe(value, **labels)
+
+        histogram.observe = recording_observe
+
+    def record(self, name: str, value: float):
+        self.samples[name].append(value)
+
+
+class Benchmark:
+    def __init__(self, args, app, recorder: SampleRecorder):
+        self.args = args
+        self.app = app
+        self.recorder = recorder
+        self.outcomes: Dict[str, int] = defaultdict(int)
+        self.analysis_ids: List[str] = []
+        self.first_analysis = asyncio.Event()
+        self.jobs_done = asyncio.Event()
+        self.lag_ms: List[float] = []
+
+    async def run(self, client) -> float:
+        started = time.perf_counter()
+        lag_task = asyncio.create_task(self._sample_lag())
+        chat_users = [asyncio.create_task(self._chat_user(client, i)) for i in range(self.args.chat_users)]
+
+        await asyncio.gather(*(self._job(client, i) for i in range(self.args.jobs)))
+        elapsed = time.perf_counter() - started
+        self.jobs_done.set()
+        self.first_analysis.set()
+
+        await asyncio.gather(*chat_users)
+        lag_task.cancel()
+        return elapsed
+
+    async def _timed(self, name: str, request):
+        started = time.perf_counter()
+        response = await request
+        self.recorder.record(name, time.perf_counter() - started)
+        return response
+
+    async def _job(self, client, index: int):
+        """Submit one analysis, retrying on 429, and poll it to completion."""
+        await asyncio.sleep(index * self.args.ramp_ms / 1000)
+        url = f"https://www.youtube.com/watch?v=bench{index:06d}"
+        headers = {"X-User-Id": f"user-{index % self.args.users}"}
+
+        while True:
+            response = await self._timed("api.analyze", client.post("/api/analyze", json={"url": url}, headers=headers))
+            if response.status_code != 429:
+                break
+            self.outcomes["rejected_429"] += 1
+            await asyncio.sleep(min(float(response.headers.get("Retry-After", 1)), self.args.max_retry_wait))
+        if response.status_code != 200:
+            self.outcomes[f"submit_{response.status_code}"] += 1
+            return
+
+        job_id = response.json()["job_id"]
+        while True:
+            await asyncio.sleep(self.args.poll_ms / 1000)
+            status = (await self._timed("api.status", client.get(f"/api/status/{job_id}"))).json()
+            if status["status"] in TERMINAL_STATUSES:
+                break
+
+        self.outcomes[status["status"].lower()] += 1
+        if status["status"] == "COMPLETED":
+            self.analysis_ids.append(status["analysis_id"])
+            self.first_analysis.set()
+
+    async def _chat_user(self, client, index: int):
+        """Chat about completed analyses until every job has finished."""
+        await self.first_analysis.wait()
+        session_id = None
+        sent = 0
+        while self.analysis_ids and (sent < self.args.chat_messages or not self.jobs_done.is_set()):
+            analysis_id = self.analysis_ids[index % len(self.analysis_ids)]
+            response = await self._timed("api.chat", client.post("/api/chat", json={
+                "message": CHAT_QUESTIONS[sent % len(CHAT_QUESTIONS)],
+                "model": self.args.chat_model,
+                "analysis_id": analysis_id,
+                "session_id": session_id
+            }))
+            sent += 1
+            if response.status_code == 200:
+                self.outcomes["chat_ok"] += 1
+                session_id = response.json().get("session_id")
+            else:
+                self.outcomes[f"chat_{response.status_code}"] += 1
+            await asyncio.sleep(self.args.think_ms / 1000)
+
+    async def _sample_lag(self):
+        """Exact loop-lag samples; the loop monitor only keeps buckets."""
+        interval = 0.01
+        while True:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.lag_ms.append(max(0.0, (time.perf_counter() - scheduled - interval) * 1000))
+
+
+async def main(args, simulated: SimulatedProviders) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.services.loop_monitor import loop_monitor
+    from app.services.metrics import analysis_stage_seconds, chat_stage_seconds
+
+    recorder = SampleRecorder()
+    recorder.attach(analysis_stage_seconds, "stage", "stage")
+    recorder.attach(chat_stage_seconds, "chat", "stage")
+
+    benchmark = Benchmark(args, app, recorder)
+    await loop_monitor.start()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            elapsed = await benchmark.run(client)
+    finally:
+        await loop_monitor.stop()
+
+    monitor = loop_monitor.snapshot()
+    completed = benchmark.outcomes.get("completed", 0)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "elapsed_seconds": round(elapsed, 2),
+        "jobs_per_minute": round(completed / elapsed * 60, 2) if elapsed else 0.0,
+        "outcomes": dict(benchmark.outcomes),
+        "latency_seconds": {name: percentiles(samples) for name, samples in sorted(recorder.samples.items())},
+        "loop_lag_ms": percentiles(benchmark.lag_ms) | {"max": round(max(benchmark.lag_ms, default=0.0), 2)},
+        "loop_stalls": {site: {"count": stats["count"], "max_ms": stats["max_ms"]} for site, stats in monitor["sites"].items()},
+        "providers": simulated.stats()
+    }
+
+
+def write_classifier_weights(path: str, copies: int = 25):
+    """Train classifier weights on labelled template comments, as tools.train_classifier does."""
+    from app.services.comment_classifier import save_weights, train
+    from app.services.embeddings_service import embeddings_service
+
+    texts, sentiments, leads = [], [], []
+    for i in range(copies):
+        for template, (sentiment, lead) in zip(COMMENT_TEMPLATES, COMMENT_LABELS):
+            texts.append(f"{template} (#{i})")
+            sentiments.append(sentiment)
+            leads.append(lead)
+    embeddings = [fake_embedding(text) for text in texts]
+    save_weights(path, train(embeddings, sentiments, leads, embeddings_service.model))
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nCompleted in {report['elapsed_seconds']}s: {report['jobs_per_minute']} jobs/min")
+    print("Outcomes: " + ", ".join(f"{key}={value}" for key, value in sorted(report["outcomes"].items())))
+
+    print(f"\n{'latency (s)':<28}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in report["latency_seconds"].items():
+        print(f"{name:<28}{stats['count']:>7}" + "".join(f"{stats[f'p{p}']:>10.3f}" for p in PERCENTILES))
+
+    lag = report["loop_lag_ms"]
+    if lag["count"]:
+        print(f"\nEvent-loop lag (ms): p50={lag['p50']:.1f} p95={lag['p95']:.1f} p99={lag['p99']:.1f} max={lag['max']:.1f}")
+    for site, stats in report["loop_stalls"].items():
+        print(f"  stalls in {site}: {stats['count']} (max {stats['max_ms']:.0f}ms)")
+
+    print("\nProviders: " + ", ".join(
+        f"{name} {stats['calls']} calls/{stats['failures']} failed" for name, stats in report["providers"].items()
+    ))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline Quill-AI benchmark with simulated providers")
+    parser.add_argument("--jobs", type=int, default=20, help="Analyses to run")
+    parser.add_argument("--users", type=int, default=5, help="Distinct X-User-Id tenants submitting jobs")
+    parser.add_argument("--chat-users", type=int, default=10, help="Concurrent chat users")
+    parser.add_argument("--chat-messages", type=int, default=5, help="Minimum messages per chat user")
+    parser.add_argument("--chat-model", default="gpt-4o", choices=["gpt-4o", "gemini-2.0-flash-exp"])
+    parser.add_argument("--comments", type=int, default=500, help="Comments scraped per video")
+    parser.add_argument("--scale", type=float, default=0.1, help="Multiply all simulated latencies")
+    parser.add_argument("--fail", action="append", default=[], metavar="PROVIDER=RATE", help="Failure rate (0-1)")
+    parser.add_argument("--rate", action="append", default=[], metavar="PROVIDER=PER_S", help="Rate limit in calls/s (0 = none)")
+    parser.add_argument("--ramp-ms", type=float, default=50, help="Delay between job submissions")
+    parser.add_argument("--poll-ms", type=float, default=500, help="Status poll interval")
+    parser.add_argument("--think-ms", type=float, default=250, help="Pause between chat messages")
+    parser.add_argument("--max-retry-wait", type=float, default=2.0, help="Cap on honoured Retry-After seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    return parser
+
+
+def run():
+    args = build_parser().parse_args()
+
+    profiles = scaled(DEFAULT_PROFILES, args.scale)
+    for name, rate in parse_overrides(args.fail, float).items():
+        profiles[name].failure_rate = rate
+    for name, rate in parse_overrides(args.rate, float).items():
+        profiles[name].rate_limit = rate
+
+    simulated = SimulatedProviders(profiles, seed=args.seed, comments_per_video=args.comments)
+    install(simulated)
+
+    # Settings require credentials; the fakes ignore them
+    for key in ("APIFY_API_TOKEN", "OPENAI_API_KEY", "GOOGLE_API_KEY", "PINECONE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY"):
+        os.environ.setdefault(key, "benchmark")
+    os.environ.setdefault("LOOP_MONITOR_ENABLED", "true")
+    # Simulated users are told apart by X-User-Id, as behind an authenticating proxy
+    os.environ.setdefault("TRUST_USER_ID_HEADER", "true")
+    scratch = tempfile.mkdtemp(prefix="quill-benchmark-")
+    os.environ.setdefault("COMMENT_STORE_DIR", os.path.join(scratch, "comment_store"))
+    os.environ.setdefault("CLASSIFIER_WEIGHTS_PATH", os.path.join(scratch, "comment_classifier.npz"))
+    os.environ.setdefault("SPARSE_INDEX_DIR", os.path.join(scratch, "sparse_index"))
+    if not os.path.exists(os.environ["CLASSIFIER_WEIGHTS_PATH"]):
+        write_classifier_weights(os.environ["CLASSIFIER_WEIGHTS_PATH"])
+
+    report = asyncio.run(main(args, simulated))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(run())
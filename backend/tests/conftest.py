@@ -0,0 +1,21 @@
+"""
+Unit test setup.
+
+Services are module-level singletons that connect to their providers on
+import, so the simulated SDKs from benchmarks.providers are installed and
+placeholder credentials set before any app module is imported. Local
+stores write to a scratch directory.
+"""
+import os
+import tempfile
+
+from benchmarks.providers import DEFAULT_PROFILES, SimulatedProviders, install
+
+install(SimulatedProviders(DEFAULT_PROFILES))
+
+for key in ("APIFY_API_TOKEN", "OPENAI_API_KEY", "GOOGLE_API_KEY", "PINECONE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY"):
+    os.environ.setdefault(key, "test")
+_scratch = tempfile.mkdtemp(prefix="quill-tests-")
+os.environ.setdefault("COMMENT_STORE_DIR", os.path.join(_scratch, "comment_store"))
+os.environ.setdefault("CLASSIFIER_WEIGHTS_PATH", os.path.join(_scratch, "comment_classifier.npz"))
+os.environ.setdefault("SPARSE_INDEX_DIR", os.path.join(_scratch, "sparse_index"))
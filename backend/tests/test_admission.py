@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app.routes import analyze
+from app.services.admission import AdmissionController
+
+
+def make_controller(max_concurrent=1, per_user=2, queued_per_user=5):
+    controller = AdmissionController()
+    controller.max_concurrent = max_concurrent
+    controller.max_running_per_user = per_user
+    controller.max_queued_per_user = queued_per_user
+    controller.max_queue_depth = 100
+    controller.weights = {}
+    return controller
+
+
+class Work:
+    """Starters whose tasks run until finished, recording start order."""
+
+    def __init__(self):
+        self.started = []
+        self.gates = {}
+
+    def starter(self, job_id):
+        def start():
+            self.started.append(job_id)
+            self.gates[job_id] = asyncio.Event()
+            return asyncio.ensure_future(self.gates[job_id].wait())
+        return start
+
+    async def finish(self, job_id):
+        self.gates[job_id].set()
+        # Let the task complete and its done callback dispatch
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    async def finish_all(self):
+        while any(not gate.is_set() for gate in self.gates.values()):
+            for job_id, gate in list(self.gates.items()):
+                if not gate.is_set():
+                    await self.finish(job_id)
+
+
+def test_failed_start_releases_its_slot():
+    async def scenario():
+        controller = make_controller()
+
+        def broken():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            controller.submit_task("a", "job-1", broken)
+        assert controller._running == 0
+        assert "a" not in controller._tenants
+
+        work = Work()
+        assert controller.submit_task("a", "job-2", work.starter("job-2")) is False
+        await work.finish("job-2")
+        assert controller._running == 0
+
+    asyncio.run(scenario())
+
+
+def test_idle_tenant_is_served_before_a_heavy_submitter():
+    async def scenario():
+        controller = make_controller(per_user=1)
+        work = Work()
+        for i in range(4):
+            controller.submit_task("heavy", f"h{i}", work.starter(f"h{i}"))
+        controller.submit_task("light", "l0", work.starter("l0"))
+        assert work.started == ["h0"]
+
+        await work.finish("h0")
+        assert work.started == ["h0", "l0"]
+        await work.finish("l0")
+        await work.finish("h1")
+        assert work.started == ["h0", "l0", "h1", "h2"]
+        await work.finish_all()
+
+    asyncio.run(scenario())
+
+
+def test_tenant_weights_share_slots():
+    async def scenario():
+        controller = make_controller(per_user=1)
+        controller.weights = {"big": 2.0}
+        work = Work()
+        controller.submit_task("small", "blocker", work.starter("blocker"))
+        for i in range(4):
+            controller.submit_task("big", f"b{i}", work.starter(f"b{i}"))
+            controller.submit_task("small", f"s{i}", work.starter(f"s{i}"))
+
+        for _ in range(6):
+            await work.finish(work.started[-1])
+        # Twice the weight: two of "big" for each of "small"
+        assert work.started[1:7] == ["b0", "b1", "s0", "b2", "b3", "s1"]
+        await work.finish_all()
+
+    asyncio.run(scenario())
+
+
+def test_bulk_work_holds_a_slot_per_video():
+    async def scenario():
+        controller = make_controller(max_concurrent=3, per_user=2)
+        work = Work()
+        assert controller.submit_task("a", "bulk", work.starter("bulk"), cost=5) is False
+        # Capped at what one tenant may hold
+        assert controller._running == 2
+
+        assert controller.submit_task("b", "job-1", work.starter("job-1")) is False
+        assert controller.submit_task("c", "job-2", work.starter("job-2")) is True
+        assert controller.estimated_wait("job-2") >= 1
+
+        await work.finish("bulk")
+        assert work.started == ["bulk", "job-1", "job-2"]
+        assert controller._running == 2
+        await work.finish_all()
+
+    asyncio.run(scenario())
+
+
+def test_withdraw_removes_queued_work():
+    async def scenario():
+        controller = make_controller()
+        work = Work()
+        controller.submit_task("a", "running", work.starter("running"))
+        controller.submit_task("a", "queued", work.starter("queued"))
+        assert controller.withdraw("queued") is True
+        assert controller.withdraw("queued") is False
+
+        await work.finish("running")
+        assert work.started == ["running"]
+        assert controller._running == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_tenant_queue_is_rejected():
+    async def scenario():
+        from app.services.admission import AdmissionRejected
+
+        controller = make_controller(per_user=1, queued_per_user=1)
+        work = Work()
+        controller.submit_task("a", "j0", work.starter("j0"))
+        controller.submit_task("a", "j1", work.starter("j1"))
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.submit_task("a", "j2", work.starter("j2"))
+        assert rejected.value.retry_after >= 1
+        await work.finish_all()
+
+    asyncio.run(scenario())
+
+
+def client_request(host="203.0.113.7"):
+    return Request({"type": "http", "client": (host, 50000), "headers": []})
+
+
+def test_user_id_header_is_ignored_unless_trusted(monkeypatch):
+    monkeypatch.setattr(analyze.settings, "trust_user_id_header", False)
+    assert analyze.get_user_id(client_request(), "someone-else") == "203.0.113.7"
+
+    monkeypatch.setattr(analyze.settings, "trust_user_id_header", True)
+    assert analyze.get_user_id(client_request(), "agency-1") == "agency-1"
+    assert analyze.get_user_id(client_request(), None) == "203.0.113.7"
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from app.services.apify_service import ApifyService
+
+
+class FakeClient:
+    """Actor starts block until released; runs record whether they were aborted."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.aborted = []
+
+    def actor(self, actor_id):
+        client = self
+
+        class Actor:
+            def start(self, run_input):
+                client.release.wait(5)
+                return {"id": "run-1", "status": "RUNNING", "defaultDatasetId": "dataset"}
+
+        return Actor()
+
+    def run(self, run_id):
+        client = self
+
+        class Run:
+            def wait_for_finish(self, wait_secs):
+                return None
+
+            def abort(self):
+                client.aborted.append(run_id)
+
+        return Run()
+
+
+def test_cancelling_while_the_run_starts_aborts_it_once_started():
+    async def scenario():
+        service = ApifyService()
+        service.client = FakeClient()
+        task = asyncio.create_task(service._run_actor("actor", {}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        assert task.cancelled()
+        # The start request is still in flight; the run is aborted once it returns
+        assert service.client.aborted == []
+        service.client.release.set()
+        while service._aborts:
+            await asyncio.sleep(0.01)
+        assert service.client.aborted == ["run-1"]
+
+    asyncio.run(scenario())
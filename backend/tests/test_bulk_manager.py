@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app.services import bulk_manager as bulk_module
+from app.services.bulk_manager import BulkManager, build_rollup
+
+
+def result(total, score, positive, leads=0, topics=()):
+    return {
+        "total_comments": total,
+        "sentiment_score": score,
+        "lead_percentage": 10,
+        "sentiment_breakdown": {"positive": positive, "neutral": 100 - positive, "negative": 0},
+        "top_feedback_topics": list(topics),
+        "top_discussed_topics": [],
+        "top_influencers": [],
+        "leads": [{"username": f"lead{i}"} for i in range(leads)]
+    }
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    saved = []
+    deleted = []
+
+    async def save(self, bulk_id, **columns):
+        saved.append((self.jobs[bulk_id]["status"], self.jobs[bulk_id]["error"]))
+
+    async def delete_namespace(namespace):
+        deleted.append(namespace)
+
+    monkeypatch.setattr(BulkManager, "_save", save)
+    monkeypatch.setattr(bulk_module.pinecone_service, "delete_namespace", delete_namespace)
+    manager = BulkManager()
+    manager.saved = saved
+    manager.deleted = deleted
+    return manager
+
+
+def hang_while_scraping(monkeypatch, manager, bulk_id):
+    scraping = asyncio.Event()
+
+    async def fetch_comments_bulk(urls, max_comments):
+        # Pretend one video already has its analysis ID when the job stops
+        manager.jobs[bulk_id]["videos"][0]["analysis_id"] = "analysis-1"
+        scraping.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(bulk_module.apify_service, "fetch_comments_bulk", fetch_comments_bulk)
+    return scraping
+
+
+def test_cancelled_jobs_are_recorded_and_free_their_vectors(manager, monkeypatch):
+    scraping = hang_while_scraping(monkeypatch, manager, "bulk")
+
+    async def scenario():
+        manager.create_bulk_job("bulk", "2 URLs", status="PENDING")
+        task = manager.start_bulk_job("bulk", ["https://a", "https://b"], None, 5, 100)
+        await scraping.wait()
+        assert manager.cancel_bulk_job("bulk")
+        await task
+        assert not manager.cancel_bulk_job("bulk")
+
+    asyncio.run(scenario())
+    job = manager.get_bulk_status("bulk")
+    assert job["status"] == "CANCELLED"
+    assert job["error"] == "Cancelled by user"
+    assert [video["status"] for video in job["videos"]] == ["CANCELLED", "CANCELLED"]
+    assert manager.deleted == ["analysis-1"]
+    assert manager.saved[0] == ("PROCESSING", None)
+    assert manager.saved[-1] == ("CANCELLED", "Cancelled by user")
+    assert "bulk" not in manager.tasks
+
+
+def test_jobs_past_the_deadline_are_cancelled(manager, monkeypatch):
+    hang_while_scraping(monkeypatch, manager, "bulk")
+    monkeypatch.setattr(bulk_module.settings, "bulk_deadline_seconds", 0.05)
+
+    async def scenario():
+        manager.create_bulk_job("bulk", "1 URL", status="PENDING")
+        await manager.start_bulk_job("bulk", ["https://a"], None, 5, 100)
+
+    asyncio.run(scenario())
+    job = manager.get_bulk_status("bulk")
+    assert job["status"] == "CANCELLED"
+    assert job["error"].startswith("Deadline of")
+    assert manager.saved[-1][0] == "CANCELLED"
+
+
+def test_jobs_without_videos_fail_and_are_recorded(manager):
+    async def scenario():
+        manager.create_bulk_job("bulk", "0 URLs", status="PENDING")
+        await manager.start_bulk_job("bulk", [], None, 5, 100)
+
+    asyncio.run(scenario())
+    assert manager.get_bulk_status("bulk")["status"] == "FAILED"
+    assert manager.saved[-1] == ("FAILED", "No videos found to analyze")
+
+
+def test_jobs_that_never_start_are_saved_as_failed(manager):
+    async def scenario():
+        manager.create_bulk_job("bulk", "1 URL", status="PENDING")
+        manager.mark_failed("bulk", "Queue full")
+        await asyncio.gather(*manager._writes)
+
+    asyncio.run(scenario())
+    assert manager.saved == [("FAILED", "Queue full")]
+    assert not manager._writes
+
+
+def test_rollup_weights_scores_by_comment_count():
+    rollup = build_rollup([
+        result(300, 80, 60, leads=2, topics=[{"topic": "Audio", "count": 30, "comments": []}]),
+        result(100, 40, 20, leads=1, topics=[{"topic": "audio ", "count": 5, "comments": []}])
+    ])
+    assert rollup["video_count"] == 2
+    assert rollup["total_comments"] == 400
+    # (80 * 300 + 40 * 100) / 400
+    assert rollup["sentiment_score"] == 70
+    assert rollup["sentiment_breakdown"]["positive"] == 50
+    assert rollup["top_feedback_topics"] == [{"topic": "Audio", "count": 35, "comments": []}]
+    assert rollup["total_leads"] == 3
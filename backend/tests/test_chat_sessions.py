@@ -0,0 +1,84 @@
+import asyncio
+
+from app.services.chat_sessions import TRUNCATED, ChatSession, ChatSessionStore
+
+
+def make_store(max_history_tokens=100, recent_turns=2, summary_tokens=20):
+    store = ChatSessionStore()
+    store.max_history_tokens = max_history_tokens
+    store.recent_turns = recent_turns
+    store.summary_tokens = summary_tokens
+    return store
+
+
+def words(count, word="word"):
+    return " ".join([word] * count)
+
+
+def test_history_is_compacted_into_the_summary_keeping_recent_turns():
+    folded = []
+
+    async def summarize(summary, turns):
+        folded.append(list(turns))
+        return f"{summary}+{len(turns)}"
+
+    async def scenario():
+        store = make_store()
+        session = ChatSession("session", "analysis")
+        for i in range(4):
+            store.record_turn(session, f"question {i}", words(40), summarize)
+        await session.compacting
+        return session
+
+    session = asyncio.run(scenario())
+    assert [question for question, _ in session.turns] == ["question 2", "question 3"]
+    assert [question for question, _ in folded[0]] == ["question 0", "question 1"]
+    assert session.summary == "+2"
+    assert session.history_tokens() <= 100
+
+
+def test_recent_turns_are_shortened_oldest_first_to_fit_the_budget():
+    async def summarize(summary, turns):
+        return summary
+
+    store = make_store()
+    session = ChatSession("session", "analysis")
+    store.record_turn(session, "first", words(60), summarize)
+    store.record_turn(session, "second", words(30), summarize)
+
+    first, second = session.turns
+    assert first[0] == "first"
+    assert first[1].endswith(TRUNCATED)
+    assert second == ("second", words(30))
+    assert session.history_tokens() <= 100 - 20
+
+
+def test_a_single_oversized_turn_is_cut_to_the_budget():
+    async def summarize(summary, turns):
+        return summary
+
+    store = make_store()
+    session = ChatSession("session", "analysis")
+    store.record_turn(session, words(200, "q"), words(100), summarize)
+    question, answer = session.turns[0]
+    assert answer == ""
+    assert question.endswith(TRUNCATED)
+    assert session.history_tokens() <= 80
+
+
+def test_failed_summaries_drop_the_folded_turns():
+    async def summarize(summary, turns):
+        raise RuntimeError("model unavailable")
+
+    async def scenario():
+        store = make_store(recent_turns=1)
+        session = ChatSession("session", "analysis")
+        session.summary = "earlier"
+        for i in range(3):
+            store.record_turn(session, f"question {i}", words(40), summarize)
+        await session.compacting
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.summary == "earlier"
+    assert [question for question, _ in session.turns] == ["question 2"]
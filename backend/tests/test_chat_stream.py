@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import chat
+from app.services.resilience import CircuitOpenError
+
+
+class Chunk:
+    def __init__(self, text=None):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("The response has no text parts")
+        return self._text
+
+
+async def stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def collect(deltas):
+    async def scenario():
+        return [delta async for delta in deltas]
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def no_fast_path(request):
+        return None
+
+    async def prepare_context(request, session):
+        return [0.0], None, "context"
+
+    monkeypatch.setattr(chat, "_fast_path", no_fast_path)
+    monkeypatch.setattr(chat, "_prepare_context", prepare_context)
+    monkeypatch.setattr(chat, "_record_gemini_usage", lambda response: None)
+    app = FastAPI()
+    app.include_router(chat.router)
+    return TestClient(app)
+
+
+def request(model="gemini-2.0-flash-exp"):
+    return {"analysis_id": "analysis", "message": "What do viewers think?", "model": model}
+
+
+def test_gemini_chunks_without_text_are_skipped():
+    deltas = chat._gemini_deltas(stream([Chunk("Mostly "), Chunk(None), Chunk("positive.")]))
+    assert collect(deltas) == ["Mostly ", "positive."]
+
+
+def test_gemini_stream_without_any_text_fails():
+    with pytest.raises(Exception, match="no text"):
+        collect(chat._gemini_deltas(stream([Chunk(None)])))
+
+
+def test_open_circuit_returns_503_before_streaming(client, monkeypatch):
+    async def unavailable(message, context, session):
+        raise CircuitOpenError("gemini", 12)
+
+    monkeypatch.setattr(chat, "_stream_gemini", unavailable)
+    response = client.post("/chat/stream", json=request())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
+
+
+def test_mid_stream_errors_become_an_error_event(client, monkeypatch):
+    async def failing(message, context, session):
+        async def deltas():
+            yield "Partial"
+            raise RuntimeError("connection reset")
+        return deltas()
+
+    monkeypatch.setattr(chat, "_stream_gemini", failing)
+    response = client.post("/chat/stream", json=request())
+    assert response.status_code == 200
+    assert 'data: {"delta": "Partial"}' in response.text
+    assert "event: error" in response.text
+    assert "event: done" not in response.text
+
+
+def test_abandoned_streams_close_the_provider_stream(client, monkeypatch):
+    closed = []
+
+    class OpenAIStream:
+        def __aiter__(self):
+            return stream([])
+
+        async def close(self):
+            closed.append("openai")
+
+    async def endless(message, context, session):
+        async def deltas():
+            try:
+                while True:
+                    yield "word "
+            finally:
+                closed.append("deltas")
+        return deltas()
+
+    async def disconnect():
+        response = await chat.chat_stream(chat.ChatRequest(**request()))
+        body = response.body_iterator
+        await body.__anext__()
+        # The server closes the body when the client goes away
+        await body.aclose()
+        # Closed right away, not when the loop finalizes leftover generators
+        assert closed == ["deltas"]
+
+    monkeypatch.setattr(chat, "_stream_gemini", endless)
+    asyncio.run(disconnect())
+
+    collect(chat._openai_deltas(OpenAIStream()))
+    assert closed == ["deltas", "openai"]
@@ -0,0 +1,151 @@
+import asyncio
+
+import numpy as np
+
+from app.config import settings
+from app.services.comment_classifier import (
+    CALIBRATION_SHARE,
+    SENTIMENTS,
+    CommentClassifier,
+    _softmax,
+    _split,
+    fit_lead_threshold,
+    fit_softmax,
+    fit_temperature,
+    save_weights,
+    train
+)
+from app.services.embeddings_service import embeddings_service
+
+DIMENSIONS = 8
+
+
+def separable(count=300, seed=0):
+    """Embeddings whose first three axes give the sentiment and fourth the lead label."""
+    rng = np.random.default_rng(seed)
+    sentiments = rng.integers(0, 3, count)
+    leads = rng.random(count) < 0.2
+    vectors = 0.1 * rng.standard_normal((count, DIMENSIONS))
+    vectors[np.arange(count), sentiments] += 1.0
+    vectors[leads, 3] += 1.0
+    return vectors, sentiments, leads
+
+
+def test_fit_softmax_separates_classes():
+    vectors, sentiments, _ = separable()
+    weights, bias = fit_softmax(vectors, sentiments, 3)
+    assert weights.shape == (3, DIMENSIONS) and bias.shape == (3,)
+    predicted = np.argmax(vectors @ weights.T + bias, axis=1)
+    assert np.mean(predicted == sentiments) > 0.95
+
+
+def test_fit_temperature_sharpens_underconfident_logits():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 3, 500)
+    # Always right, but with tiny margins
+    logits = np.full((500, 3), 0.0)
+    logits[np.arange(500), labels] = 0.1
+    assert fit_temperature(logits, labels) < 0.2
+
+    # Random logits carry no information, so they are flattened
+    noise = 5 * rng.standard_normal((500, 3))
+    assert fit_temperature(noise, labels) > 5
+
+
+def test_fit_lead_threshold_maximizes_f1():
+    probabilities = np.array([0.1, 0.2, 0.35, 0.4, 0.8, 0.9])
+    labels = np.array([0, 0, 1, 1, 1, 1])
+    assert fit_lead_threshold(probabilities, labels) == 0.35
+    assert fit_lead_threshold(probabilities, np.zeros(6, dtype=int)) == 0.5
+
+
+def test_split_is_stratified_and_disjoint():
+    labels = np.array([0] * 50 + [1] * 10)
+    train_rows, calibration_rows = _split(labels, seed=1)
+    assert not set(train_rows) & set(calibration_rows)
+    assert len(train_rows) + len(calibration_rows) == len(labels)
+    assert np.sum(labels[calibration_rows] == 1) == round(10 * CALIBRATION_SHARE)
+    assert np.sum(labels[calibration_rows] == 0) == round(50 * CALIBRATION_SHARE)
+
+
+def trained_classifier(tmp_path):
+    vectors, sentiments, leads = separable()
+    arrays = train(vectors.tolist(), [SENTIMENTS[label] for label in sentiments], leads.tolist(), embeddings_service.model)
+    assert arrays["metric_sentiment_accuracy"] > 0.95
+    assert arrays["metric_lead_recall"] > 0.9
+    path = str(tmp_path / "weights.npz")
+    save_weights(path, arrays)
+    classifier = CommentClassifier(path)
+    assert asyncio.run(classifier.ensure_ready())
+    return classifier, vectors, sentiments, leads
+
+
+def test_trained_weights_load_and_score(tmp_path):
+    classifier, vectors, sentiments, leads = trained_classifier(tmp_path)
+    scores = classifier.score(vectors.tolist())
+    np.testing.assert_allclose(scores["sentiment"].sum(axis=1), 1.0, rtol=1e-5)
+    labelled = classifier.apply(scores, {})
+    assert np.mean([SENTIMENTS.index(label) for label in labelled["sentiment"]] == sentiments) > 0.95
+    assert np.mean(np.array(labelled["lead"]) == leads) > 0.9
+
+
+def test_missing_or_foreign_weights_leave_the_classifier_off(tmp_path):
+    assert not asyncio.run(CommentClassifier(str(tmp_path / "missing.npz")).ensure_ready())
+
+    vectors, sentiments, leads = separable(60)
+    path = str(tmp_path / "other.npz")
+    save_weights(path, train(vectors.tolist(), [SENTIMENTS[label] for label in sentiments], leads.tolist(), "other-model"))
+    assert not asyncio.run(CommentClassifier(path).ensure_ready())
+
+
+def test_review_candidates_prefer_uncertain_and_engaged_comments(tmp_path, monkeypatch):
+    classifier = CommentClassifier(str(tmp_path / "unused.npz"))
+    classifier.lead_threshold = 0.6
+    monkeypatch.setattr(settings, "classifier_max_reviews", 2)
+    scores = {
+        "sentiment": _softmax(np.array([
+            [5.0, 0.0, 0.0],   # confident, not a lead
+            [0.1, 0.0, 0.0],   # uncertain
+            [0.1, 0.0, 0.0],   # uncertain and heavily engaged
+            [5.0, 0.0, 0.0],   # confident, possible lead
+        ])),
+        "lead": np.array([0.0, 0.0, 0.0, 0.5])
+    }
+    comments = [
+        {"voteCount": 0, "replyCount": 0},
+        {"voteCount": 0, "replyCount": 0},
+        {"voteCount": 500, "replyCount": 20},
+        {"voteCount": 0, "replyCount": 0},
+    ]
+    assert classifier.review_candidates(comments, scores) == [2, 1]
+    monkeypatch.setattr(settings, "classifier_max_reviews", 10)
+    assert sorted(classifier.review_candidates(comments, scores)) == [1, 2, 3]
+
+
+def test_parse_reviews_keeps_valid_entries():
+    classifier = CommentClassifier()
+    reviews = [
+        {"comment": "[R1]", "sentiment": "Negative", "lead": "yes"},
+        {"comment": "R2", "sentiment": "positive", "lead": False},
+        {"comment": "R3", "sentiment": "angry", "lead": True},
+        {"comment": "R9", "sentiment": "neutral", "lead": True},
+        "not a review"
+    ]
+    parsed = classifier.parse_reviews(reviews, {"R1": 4, "R2": 7, "R3": 9})
+    assert parsed == {4: {"sentiment": "negative", "lead": True}, 7: {"sentiment": "positive", "lead": False}}
+
+
+def test_apply_lets_reviews_override_the_classifier():
+    classifier = CommentClassifier()
+    classifier.lead_threshold = 0.5
+    scores = {
+        "sentiment": np.array([[0.8, 0.1, 0.1], [0.1, 0.1, 0.8]]),
+        "lead": np.array([0.9, 0.2])
+    }
+    labelled = classifier.apply(scores, {0: {"sentiment": "neutral", "lead": False}})
+    assert labelled["sentiment"] == ["neutral", "negative"]
+    assert labelled["lead"] == [False, False]
+    assert labelled["positivity"][0] == 0.5
+    assert labelled["positivity"][1] == 0.1 + 0.1 / 2
+    # The scores passed in are not modified
+    assert scores["lead"][0] == 0.9
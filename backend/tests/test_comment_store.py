@@ -0,0 +1,80 @@
+import os
+
+from app.services.comment_store import CommentStore, published_timestamp
+
+
+def make_comment(comment_id, text, votes=0, replies=0, author="viewer", date="2024-03-01"):
+    return {
+        "id": comment_id,
+        "author": author,
+        "comment": text,
+        "date": date,
+        "voteCount": votes,
+        "replyCount": replies,
+        "text_for_embedding": text
+    }
+
+
+def test_put_and_get_round_trip(tmp_path):
+    store = CommentStore(str(tmp_path))
+    comments = [
+        make_comment("b", "Second — with ünïcode ✓", votes=12, replies=3),
+        make_comment("a", "First", votes=-1),
+        make_comment("c", "", author="")
+    ]
+    store.put("analysis", comments)
+
+    documents = store.get("analysis", ["a", "b", "c", "missing"])
+    assert set(documents) == {"a", "b", "c"}
+    assert documents["b"] == {
+        "id": "b",
+        "author": "viewer",
+        "comment": "Second — with ünïcode ✓",
+        "date": "2024-03-01",
+        "voteCount": 12,
+        "replyCount": 3
+    }
+    assert documents["a"]["voteCount"] == -1
+    assert documents["c"]["comment"] == ""
+    assert store.get("other", ["a"]) == {}
+
+
+def test_put_replaces_and_delete_removes(tmp_path):
+    store = CommentStore(str(tmp_path))
+    store.put("analysis", [make_comment("a", "original"), make_comment("b", "kept")])
+    store.put("analysis", [make_comment("a", "edited", votes=5)])
+    assert store.get("analysis", ["a"])["a"]["comment"] == "edited"
+    assert store.get("analysis", ["b"])["b"]["comment"] == "kept"
+
+    store.delete("analysis", ["a"])
+    assert set(store.get("analysis", ["a", "b"])) == {"b"}
+
+    store.drop("analysis")
+    assert not store.exists("analysis")
+    assert not os.listdir(tmp_path)
+
+
+def test_scan_reads_columns_in_id_order_and_chunks(tmp_path):
+    store = CommentStore(str(tmp_path))
+    store.put("analysis", [make_comment(f"c{i:02d}", f"text {i}", votes=i) for i in reversed(range(7))])
+
+    chunks = list(store.scan("analysis", chunk_rows=3))
+    assert [len(chunk["id"]) for chunk in chunks] == [3, 3, 1]
+    assert [comment_id for chunk in chunks for comment_id in chunk["id"]] == [f"c{i:02d}" for i in range(7)]
+    assert [votes for chunk in chunks for votes in chunk["voteCount"]] == list(range(7))
+    assert store.scan("missing", chunk_rows=3) is None
+
+
+def test_a_rewritten_segment_invalidates_the_cached_index(tmp_path):
+    store = CommentStore(str(tmp_path), index_cache_entries=1)
+    store.put("analysis", [make_comment("b", "two")])
+    assert store.get("analysis", ["b"])["b"]["comment"] == "two"
+    # "a" sorts first, so every row moves
+    store.put("analysis", [make_comment("a", "one")])
+    assert store.get("analysis", ["a", "b"])["b"]["comment"] == "two"
+
+
+def test_published_timestamp():
+    assert published_timestamp("1970-01-02") == 86400
+    assert published_timestamp("yesterday") == 0
+    assert published_timestamp(None) == 0
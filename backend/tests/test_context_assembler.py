@@ -0,0 +1,75 @@
+from app.services.context_assembler import (
+    CONTEXT_HEADER,
+    CONTEXT_TOKEN_BUDGETS,
+    ContextAssembler,
+    estimate_tokens
+)
+
+
+def match(comment_id, text, values=None, score=0.5, author="viewer"):
+    return {
+        "id": comment_id,
+        "score": score,
+        "metadata": {"comment_text": text, "author": author, "voteCount": 1, "replyCount": 0, "date": "2024-03-01"},
+        "values": values
+    }
+
+
+def ids(matches):
+    return [item["id"] for item in matches]
+
+
+def test_near_duplicate_vectors_and_repeated_text_are_dropped():
+    assembler = ContextAssembler()
+    matches = [
+        match("a", "The audio is great", [1.0, 0.0, 0.0]),
+        match("b", "the audio is GREAT", [0.0, 1.0, 0.0]),
+        match("c", "Audio is great!", [0.999, 0.01, 0.0]),
+        match("d", "Too long", [0.0, 0.0, 1.0])
+    ]
+    selected = assembler.select([1.0, 0.0, 0.0], matches)
+    assert ids(selected) == ["a", "d"]
+
+
+def test_mmr_prefers_a_different_viewpoint_over_a_rephrasing():
+    assembler = ContextAssembler()
+    assembler.mmr_lambda = 0.3
+    matches = [
+        match("best", "one", [1.0, 0.0]),
+        match("similar", "two", [0.95, 0.31]),
+        match("different", "three", [0.6, -0.8])
+    ]
+    # "similar" is more relevant than "different" but mostly repeats "best"
+    assert ids(assembler.select([1.0, 0.0], matches)) == ["best", "different", "similar"]
+
+    assembler.mmr_lambda = 1.0
+    assert ids(assembler.select([1.0, 0.0], matches)) == ["best", "similar", "different"]
+
+
+def test_without_vectors_score_order_is_kept():
+    assembler = ContextAssembler()
+    matches = [match("low", "low", score=0.1), match("high", "high", score=0.9), match("dup", "HIGH", score=0.5)]
+    assert ids(assembler.select([1.0], matches)) == ["high", "low"]
+
+
+def test_context_stays_within_the_model_budget():
+    assembler = ContextAssembler()
+    assembler.max_comment_chars = 10_000
+    budget = CONTEXT_TOKEN_BUDGETS["gpt-4o"]
+    matches = [match(f"long{i}", f"comment {i} " + "word " * 250, score=1 - i / 100) for i in range(10)]
+    matches.append(match("short", "short and relevant", score=0.01))
+
+    context = assembler.assemble([1.0], matches, "gpt-4o")
+    assert context.startswith(CONTEXT_HEADER)
+    assert estimate_tokens(context) <= budget + 10
+    # Long comments that no longer fit are skipped, but a short one still is added
+    assert "short and relevant" in context
+    assert "comment 0 " in context and "comment 9 " not in context
+
+
+def test_long_comments_are_truncated_at_a_word():
+    assembler = ContextAssembler()
+    assembler.max_comment_chars = 20
+    context = assembler.assemble([1.0], [match("a", "alpha beta gamma delta epsilon")], "gpt-4o")
+    assert "alpha beta gamma…" in context
+    assert "epsilon" not in context
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+class ClientError(Exception):
+    status_code = 400
+
+
+def make_batcher(send, max_batch=10):
+    return EmbeddingBatcher(send, max_batch=max_batch, max_wait_ms=1, max_in_flight=2)
+
+
+def test_concurrent_callers_share_a_request_and_get_their_own_vectors():
+    requests = []
+
+    async def send(texts):
+        requests.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    async def scenario():
+        batcher = make_batcher(send)
+        first, second = await asyncio.gather(batcher.embed(["a", "bb"]), batcher.embed(["ccc"]))
+        assert first == [[1.0], [2.0]]
+        assert second == [[3.0]]
+        assert requests == [["a", "bb", "ccc"]]
+
+    asyncio.run(scenario())
+
+
+def test_empty_texts_are_rejected_before_they_are_queued():
+    async def send(texts):
+        raise AssertionError("nothing should be sent")
+
+    async def scenario():
+        batcher = make_batcher(send)
+        with pytest.raises(ValueError):
+            await batcher.embed(["fine", "  "])
+        assert batcher._pending == []
+
+    asyncio.run(scenario())
+
+
+def test_a_rejected_batch_is_retried_one_text_at_a_time():
+    requests = []
+
+    async def send(texts):
+        requests.append(list(texts))
+        if "bad" in texts:
+            raise ClientError("invalid input")
+        return [[1.0] for _ in texts]
+
+    async def scenario():
+        batcher = make_batcher(send)
+        good, bad = await asyncio.gather(
+            batcher.embed(["one", "two"]),
+            batcher.embed(["bad"]),
+            return_exceptions=True
+        )
+        assert good == [[1.0], [1.0]]
+        assert isinstance(bad, ClientError)
+        assert requests[0] == ["one", "two", "bad"]
+        assert sorted(map(tuple, requests[1:])) == [("bad",), ("one",), ("two",)]
+
+    asyncio.run(scenario())
+
+
+def test_transient_errors_fail_the_batch_without_splitting_it():
+    requests = []
+
+    async def send(texts):
+        requests.append(list(texts))
+        raise ConnectionError("upstream down")
+
+    async def scenario():
+        batcher = make_batcher(send)
+        with pytest.raises(ConnectionError):
+            await batcher.embed(["one", "two"])
+        assert len(requests) == 1
+
+    asyncio.run(scenario())
+
+
+def test_short_responses_fail_the_texts_without_a_vector():
+    async def send(texts):
+        return [[1.0]]
+
+    async def scenario():
+        batcher = make_batcher(send)
+        first, second = await asyncio.wait_for(
+            asyncio.gather(batcher.embed(["one"]), batcher.embed(["two"]), return_exceptions=True),
+            timeout=1
+        )
+        assert first == [[1.0]]
+        assert isinstance(second, Exception)
+
+    asyncio.run(scenario())
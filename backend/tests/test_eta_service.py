@@ -0,0 +1,67 @@
+import pytest
+
+from app.services.eta_service import DEFAULT_STAGE_COSTS, EtaEstimator, RollingQuantile
+
+
+def test_rolling_quantile_interpolates_over_the_window():
+    values = RollingQuantile(window=5)
+    assert values.quantile(0.5) is None
+    for value in (100, 1, 2, 3, 4, 5):
+        values.add(value)
+    # The oldest value fell out of the window
+    assert len(values) == 5
+    assert values.quantile(0.5) == 3
+    assert values.quantile(0.0) == 1
+    assert values.quantile(1.0) == 5
+    assert values.quantile(0.9) == pytest.approx(4.6)
+
+
+def test_stage_costs_scale_with_input_size():
+    estimator = EtaEstimator()
+    # Priors before any history
+    assert estimator.predict_stage("embeddings", {"comments": 100}) == pytest.approx(100 * DEFAULT_STAGE_COSTS["embeddings"])
+    assert estimator.predict_stage("store", {}) == DEFAULT_STAGE_COSTS["store"]
+
+    estimator.record("embeddings", 2.0, {"comments": 100})
+    estimator.record("store", 3.0, {})
+    assert estimator.predict_stage("embeddings", {"comments": 500}) == pytest.approx(10.0)
+    assert estimator.predict_stage("store", {"comments": 500}) == 3.0
+
+    # Without a measured size the timing cannot be normalised, so it is skipped
+    estimator.record("embeddings", 50.0, {"comments": None})
+    assert estimator.snapshot()["embeddings"]["samples"] == 1
+
+
+def history():
+    estimator = EtaEstimator()
+    costs = {
+        "fetch_comments": (10.0, "comments"),
+        "parse": (1.0, None),
+        "embeddings": (20.0, "comments"),
+        "pinecone_upsert": (5.0, "comments"),
+        "gemini": (30.0, "prompt_chars"),
+        "gemini_digest": (12.0, None),
+        "store": (2.0, None)
+    }
+    for stage, (seconds, key) in costs.items():
+        estimator.record(stage, seconds, {key: 1000} if key else {})
+    return estimator
+
+
+SIZES = {"comments": 1000, "prompt_chars": 1000}
+
+
+def test_parallel_branches_count_once():
+    estimator = history()
+    # fetch + parse + max(embeddings + upsert, gemini) + store
+    assert estimator.estimate_remaining({}, {}, SIZES) == 10 + 1 + max(20 + 5, 30) + 2
+    # With a digest, Gemini waits for embeddings and overlaps the upsert
+    assert estimator.estimate_remaining({}, {}, SIZES, digest=True) == 10 + 1 + 20 + max(5, 12) + 2
+
+
+def test_finished_and_running_stages():
+    estimator = history()
+    states = {"fetch_comments": "DONE", "parse": "DONE", "embeddings": "DONE", "pinecone_upsert": "RUNNING", "gemini": "RUNNING"}
+    assert estimator.estimate_remaining(states, {"pinecone_upsert": 2.0, "gemini": 10.0}, SIZES) == max(3, 20) + 2
+    # An overdue stage still counts as one more second
+    assert estimator.estimate_remaining(states, {"pinecone_upsert": 2.0, "gemini": 60.0}, SIZES) == 3 + 2
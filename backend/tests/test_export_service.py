@@ -0,0 +1,103 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import export_service as export_module
+from app.services.comment_classifier import SENTIMENTS
+from app.services.export_service import ExportService
+from app.services.pinecone_service import EMBEDDING_DIMENSION
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def make_columns(ids):
+    return {
+        "id": list(ids),
+        "author": [f"@viewer{i}" for i, _ in enumerate(ids)],
+        "comment": [f"Comment {comment_id}" for comment_id in ids],
+        "date": ["2026-10-01T12:00:00Z", "not a date", "2026-10-03"][:len(ids)],
+        "voteCount": list(range(len(ids))),
+        "replyCount": [0] * len(ids)
+    }
+
+
+def vector(value):
+    return [value] * EMBEDDING_DIMENSION
+
+
+def fake_scores(embeddings):
+    rows = len(embeddings)
+    sentiment = np.zeros((rows, len(SENTIMENTS)), dtype=np.float32)
+    sentiment[:, 0] = 0.9
+    sentiment[:, 1:] = 0.1 / (len(SENTIMENTS) - 1)
+    return {"sentiment": sentiment, "lead": np.full(rows, 0.25, dtype=np.float32)}
+
+
+def test_comments_without_a_vector_get_null_embeddings_and_scores(monkeypatch):
+    monkeypatch.setattr(export_module.comment_classifier, "score", fake_scores)
+    service = ExportService()
+    schema = service.schema("analysis")
+    batch = service._batch(schema, make_columns(["a", "b", "c"]), {"a": vector(0.5), "c": vector(1.0)}, True)
+
+    table = pa.Table.from_batches([batch]).to_pydict()
+    assert table["embedding"][1] is None
+    assert table["embedding"][0] == pytest.approx(vector(0.5))
+    assert table["embedding"][2] == pytest.approx(vector(1.0))
+    assert table["sentiment"] == [SENTIMENTS[0], None, SENTIMENTS[0]]
+    assert table["lead_probability"][1] is None
+    assert table["lead_probability"][0] == pytest.approx(0.25)
+    assert table["date"][1] is None
+    assert str(table["date"][0]) == "2026-10-01"
+
+
+def test_unscored_exports_leave_every_score_null():
+    service = ExportService()
+    batch = service._batch(service.schema("analysis"), make_columns(["a", "b"]), {"a": vector(0.5), "b": vector(0.1)}, False)
+
+    table = pa.Table.from_batches([batch]).to_pydict()
+    assert table["embedding"][0] is not None
+    assert table["sentiment"] == [None, None]
+    assert table["lead_probability"] == [None, None]
+    for label in SENTIMENTS:
+        assert table[f"sentiment_{label}"] == [None, None]
+
+
+def encode(monkeypatch, export_format):
+    stored = {"a": vector(0.5), "c": vector(1.0)}
+
+    async def fetch_vectors(ids, analysis_id):
+        return {comment_id: stored[comment_id] for comment_id in ids if comment_id in stored}
+
+    monkeypatch.setattr(export_module.pinecone_service, "fetch_vectors", fetch_vectors)
+
+    def generate():
+        yield make_columns(["a", "b"])
+        yield make_columns(["c"])
+
+    async def scenario():
+        parts = ExportService()._encode("analysis", export_format, generate(), False)
+        return b"".join([part async for part in parts])
+
+    return asyncio.run(scenario())
+
+
+def test_arrow_export_round_trips(monkeypatch):
+    data = encode(monkeypatch, "arrow")
+    table = pa.ipc.open_stream(data).read_all()
+
+    assert table.column("id").to_pylist() == ["a", "b", "c"]
+    assert table.column("embedding").null_count == 1
+    assert table.schema.metadata[b"analysis_id"] == b"analysis"
+
+
+def test_parquet_export_round_trips(monkeypatch):
+    data = encode(monkeypatch, "parquet")
+    parquet = pq.ParquetFile(pa.BufferReader(data))
+
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert table.column("id").to_pylist() == ["a", "b", "c"]
+    assert table.column("embedding").to_pylist()[1] is None
+    assert table.column("embedding").to_pylist()[2] == pytest.approx(vector(1.0))
@@ -0,0 +1,81 @@
+import asyncio
+import gc
+import time
+
+import httpx
+import pytest
+
+from app.services.http_pool import HttpPool
+
+
+def handler(request):
+    if request.url.path == "/fail":
+        raise httpx.ConnectError("connection refused", request=request)
+    status = 503 if request.url.path == "/busy" else 200
+    return httpx.Response(status, content=b"ok")
+
+
+@pytest.fixture
+def pool():
+    pool = HttpPool()
+    pool.max_per_host = 1
+    pool.timeout = httpx.Timeout(5, pool=0.05)
+    pool.transport._transport = httpx.MockTransport(handler)
+    pool.async_transport._transport = httpx.MockTransport(handler)
+    return pool
+
+
+def host(pool):
+    return pool.snapshot()["hosts"]["api.test"]
+
+
+def test_closing_a_response_releases_its_slot(pool):
+    client = httpx.Client(transport=pool.transport)
+    response = client.send(client.build_request("GET", "https://api.test/"), stream=True)
+    with pytest.raises(httpx.PoolTimeout):
+        client.get("https://api.test/")
+    response.close()
+
+    assert client.get("https://api.test/").status_code == 200
+    stats = host(pool)
+    assert stats["in_flight"] == 0
+    assert stats["waits"] == 1
+
+
+def test_failed_requests_release_their_slot_and_count_as_errors(pool):
+    client = httpx.Client(transport=pool.transport)
+    with pytest.raises(httpx.ConnectError):
+        client.get("https://api.test/fail")
+    assert client.get("https://api.test/busy").status_code == 503
+
+    stats = host(pool)
+    assert stats["in_flight"] == 0
+    assert stats["errors"] == 2
+
+
+def test_unclosed_responses_release_their_slot_when_collected(pool):
+    client = httpx.Client(transport=pool.transport)
+    response = client.send(client.build_request("GET", "https://api.test/"), stream=True)
+    del response
+    gc.collect()
+
+    deadline = time.monotonic() + 1
+    while host(pool)["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert host(pool)["in_flight"] == 0
+    assert client.get("https://api.test/").status_code == 200
+
+
+def test_async_slots_are_released_on_close(pool):
+    async def scenario():
+        client = httpx.AsyncClient(transport=pool.async_transport)
+        response = await client.send(client.build_request("GET", "https://api.test/"), stream=True)
+        with pytest.raises(httpx.PoolTimeout):
+            await client.get("https://api.test/")
+        await response.aclose()
+        assert (await client.get("https://api.test/")).status_code == 200
+
+    asyncio.run(scenario())
+    stats = host(pool)
+    assert stats["in_flight"] == 0
+    assert stats["requests"] == 2
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.models import ChatRequest
+from app.routes import chat
+from app.services.chat_sessions import ChatSession
+from app.services.hybrid_retrieval import has_filters, parse_filters
+
+NOW = datetime(2024, 3, 14, 15, 30, tzinfo=timezone.utc)
+DAY = 86400
+
+
+def timestamp(*date):
+    return int(datetime(*date, tzinfo=timezone.utc).timestamp())
+
+
+def test_engagement_thresholds():
+    metadata_filter, popular, _ = parse_filters("comments with at least 50 likes and more than 3 replies", NOW)
+    assert metadata_filter == {"voteCount": {"$gte": 50}, "replyCount": {"$gte": 4}}
+    assert popular == set()
+
+    metadata_filter, _, _ = parse_filters("100+ likes, over 1,000 upvotes", NOW)
+    # The tighter bound wins
+    assert metadata_filter == {"voteCount": {"$gte": 1001}}
+
+
+def test_relative_engagement_is_returned_for_resolution():
+    metadata_filter, popular, text = parse_filters("What do the most liked comments say about pricing?", NOW)
+    assert metadata_filter == {}
+    assert popular == {"voteCount"}
+    assert "liked" not in text and "pricing" in text
+
+
+def test_relative_and_calendar_periods():
+    metadata_filter, _, _ = parse_filters("complaints in the last week", NOW)
+    assert metadata_filter == {"published_at": {"$gte": int(NOW.timestamp()) - 7 * DAY}}
+
+    metadata_filter, _, _ = parse_filters("past 3 months", NOW)
+    assert metadata_filter == {"published_at": {"$gte": int(NOW.timestamp()) - 90 * DAY}}
+
+    metadata_filter, _, _ = parse_filters("feedback this month", NOW)
+    assert metadata_filter == {"published_at": {"$gte": timestamp(2024, 3, 1)}}
+
+    metadata_filter, _, _ = parse_filters("what did people say yesterday", NOW)
+    assert metadata_filter == {"published_at": {"$gte": timestamp(2024, 3, 13), "$lt": timestamp(2024, 3, 14)}}
+
+
+def test_explicit_date_bounds():
+    metadata_filter, _, _ = parse_filters("since 2024-01-10 and before 2024-02-01", NOW)
+    assert metadata_filter == {"published_at": {"$gte": timestamp(2024, 1, 10), "$lt": timestamp(2024, 2, 1)}}
+
+    metadata_filter, _, _ = parse_filters("after 2024-01-10 until 2024-01-20", NOW)
+    assert metadata_filter == {"published_at": {"$gte": timestamp(2024, 1, 11), "$lt": timestamp(2024, 1, 21)}}
+
+    # An impossible date is ignored rather than failing the question
+    metadata_filter, _, _ = parse_filters("since 2024-02-31", NOW)
+    assert metadata_filter == {}
+
+
+def test_matched_phrases_are_removed_from_the_keyword_text():
+    _, _, text = parse_filters("audio complaints with at least 10 likes since 2024-01-01", NOW)
+    assert text.split() == ["audio", "complaints", "with"]
+
+
+def test_plain_questions_have_no_filters():
+    assert not has_filters("What do viewers think of the intro?")
+    assert has_filters("top comments about the intro")
+
+
+def test_filtered_context_is_not_reused_by_follow_ups(monkeypatch):
+    async def not_expired(analysis_id):
+        return False
+
+    async def embed(texts):
+        return [[1.0, 0.0]]
+
+    async def search(text, embedding, analysis_id):
+        return [{"id": text}]
+
+    monkeypatch.setattr(chat.settings, "chat_hybrid_enabled", True)
+    monkeypatch.setattr(chat.intent_router, "vectors_expired", not_expired)
+    monkeypatch.setattr(chat.embeddings_service, "get_embeddings", embed)
+    monkeypatch.setattr(chat.hybrid_retriever, "search", search)
+    monkeypatch.setattr(chat.context_assembler, "assemble", lambda embedding, comments, model: comments[0]["id"])
+
+    def ask(session, message):
+        request = ChatRequest(analysis_id="analysis", message=message, model="gemini-2.0-flash-exp")
+        return asyncio.run(chat._prepare_context(request, session))[2]
+
+    session = ChatSession("session", "analysis")
+    session.turns.append(("Hi", "Hello"))
+    assert ask(session, "audio complaints since last week") == "audio complaints since last week"
+    assert session.context_embedding is None
+    # The same topic without bounds retrieves afresh instead of reusing the filtered context
+    assert ask(session, "audio complaints") == "audio complaints"
+    assert ask(session, "audio complaints, again") == "audio complaints"
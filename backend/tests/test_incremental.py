@@ -0,0 +1,133 @@
+import asyncio
+
+from app.services import job_manager as job_module
+from app.services.incremental import build_manifest, diff_comments, merge_results
+from app.services.job_manager import JobManager
+
+
+def comment(comment_id, text, author="viewer", date="2024-03-01"):
+    return {"id": comment_id, "comment": text, "author": author, "date": date}
+
+
+def analysis(score, total, topics=(), leads=(), positive=50):
+    return {
+        "sentiment_score": score,
+        "sentiment_breakdown": {"positive": positive, "neutral": 100 - positive, "negative": 0},
+        "lead_percentage": 10,
+        "leads": list(leads),
+        "top_feedback_topics": list(topics),
+        "top_discussed_topics": [],
+        "actionable_todos": [],
+        "creator_insights": [],
+        "competitor_insights": [],
+        "engagement_spikes": [],
+        "top_influencers": [],
+        "total_comments": total,
+        "vibe_trend": [score]
+    }
+
+
+def test_diff_finds_new_edited_and_removed_comments():
+    previous = build_manifest([comment("a", "same"), comment("b", "before"), comment("c", "gone")])
+    changed, removed, unchanged = diff_comments(previous, [
+        comment("a", "same"),
+        comment("b", "after"),
+        comment("d", "new")
+    ])
+    assert [item["id"] for item in changed] == ["b", "d"]
+    assert removed == ["c"]
+    assert unchanged == 1
+
+
+def test_scores_are_weighted_by_comment_count():
+    merged = merge_results(analysis(80, 100), analysis(20, 50, positive=20), unchanged=75, delta_count=25)
+    assert merged["total_comments"] == 100
+    # (80 * 75 + 20 * 25) / 100
+    assert merged["sentiment_score"] == 65
+    assert merged["sentiment_breakdown"]["positive"] == round((50 * 75 + 20 * 25) / 100)
+    assert merged["vibe_trend"] == [65]
+
+
+def test_without_new_comments_the_previous_scores_are_kept():
+    previous = analysis(80, 100)
+    merged = merge_results(previous, analysis(0, 0), unchanged=90, delta_count=0)
+    assert merged["sentiment_score"] == 80
+    assert merged["total_comments"] == 90
+
+
+def test_previous_topic_counts_are_scaled_to_the_unchanged_share():
+    previous = analysis(50, 100, topics=[
+        {"topic": "Audio", "count": 40, "comments": []},
+        {"topic": "Pacing", "count": 1, "comments": []}
+    ])
+    delta = analysis(50, 10, topics=[{"topic": "audio ", "count": 5, "comments": []}])
+    merged = merge_results(previous, delta, unchanged=50, delta_count=10)
+    topics = {topic["topic"].lower(): topic["count"] for topic in merged["top_feedback_topics"]}
+    # Half the previous comments remain: 40 * 0.5 + 5
+    assert topics["audio"] == 25
+    # A topic scaled below one comment is dropped
+    assert "pacing" not in topics
+
+
+def test_leads_and_examples_of_removed_or_edited_comments_are_dropped():
+    previous = analysis(
+        50,
+        3,
+        topics=[{"topic": "Audio", "count": 2, "comments": [
+            {"author": "kept", "text": "the audio is great"},
+            {"author": "edited", "text": "the audio is bad"}
+        ]}],
+        leads=[
+            {"username": "kept", "text": "Where can I buy this?"},
+            {"username": "removed", "text": "Do you ship to Canada?"}
+        ]
+    )
+    current = [
+        comment("a", "Honestly the audio is great. Where can I buy this?", author="kept"),
+        comment("b", "the audio is fine now", author="edited")
+    ]
+    merged = merge_results(previous, analysis(50, 1), unchanged=1, delta_count=1, current=current)
+    assert [lead["username"] for lead in merged["leads"]] == ["kept"]
+    assert merged["top_feedback_topics"][0]["comments"] == [{"author": "kept", "text": "the audio is great"}]
+    assert merged["engagement_spikes"] == [{"time": "2024-03-01", "count": 2}]
+
+
+def test_cancelled_refreshes_remove_only_the_comments_they_added(monkeypatch):
+    base = [comment("a", "same"), comment("b", "before")]
+    fresh = [comment("a", "same"), comment("b", "after"), comment("c", "new")]
+    deleted = []
+
+    async def value(result):
+        return result
+
+    async def fetch_comments(url, max_comments, newest_first):
+        return [{}]
+
+    async def embed_and_analyze(self, job_id, *args):
+        await asyncio.Event().wait()
+
+    async def delete_vectors(ids, analysis_id):
+        deleted.append((ids, analysis_id))
+
+    monkeypatch.setattr(job_module.incremental_service, "find_base_analysis", lambda url, id: value("base"))
+    monkeypatch.setattr(job_module.incremental_service, "load_manifest", lambda id: value(build_manifest(base)))
+    monkeypatch.setattr(job_module.incremental_service, "load_result", lambda id: value(analysis(50, 2)))
+    monkeypatch.setattr(job_module.apify_service, "fetch_comments", fetch_comments)
+    monkeypatch.setattr(job_module, "parse_quill_comments", lambda raw: fresh)
+    monkeypatch.setattr(JobManager, "_embed_and_analyze", embed_and_analyze)
+    monkeypatch.setattr(job_module.pinecone_service, "delete_vectors", delete_vectors)
+
+    async def scenario():
+        manager = JobManager()
+        manager.create_job("job", "https://youtu.be/a", incremental=True)
+        task = asyncio.create_task(manager.process_analysis("job", "https://youtu.be/a"))
+        while not manager.jobs["job"]["added_comment_ids"]:
+            await asyncio.sleep(0)
+        task.cancel()
+        await task
+        return manager.jobs["job"]
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "CANCELLED"
+    # The edited comment "b" keeps its re-embedded vector; the base analysis still includes it
+    assert deleted == [(["c"], "base")]
@@ -0,0 +1,45 @@
+import pytest
+
+from app.services.intent_router import classify
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("How many leads?", "lead_count"),
+    ("how many leads are there in this video?", "lead_count"),
+    ("What's the number of potential leads", "lead_count"),
+    ("Show me the top leads", "leads"),
+    ("who are the leads?", "leads"),
+    ("Who are the top influencers?", "influencers"),
+    ("most influential commenters", "influencers"),
+    ("What's the sentiment?", "sentiment"),
+    ("can you tell me the overall sentiment breakdown", "sentiment"),
+    ("positive vs negative", "sentiment"),
+    ("How many comments were there?", "comment_count"),
+    ("what is the total number of comments", "comment_count"),
+    ("What are the main feedback topics?", "feedback_topics"),
+    ("What are the top topics", "discussed_topics"),
+    ("what are people talking about?", "discussed_topics"),
+])
+def test_aggregate_questions(message, intent):
+    assert classify(message) == intent
+
+
+@pytest.mark.parametrize("message", [
+    # Qualifiers the stored aggregates cannot answer
+    "how many comments are negative?",
+    "how many leads mention pricing",
+    "list comments about pricing that are leads",
+    "what is the sentiment about the audio?",
+    "who are the top influencers talking about pricing?",
+    "what are the main topics in negative comments?",
+    # Open-ended questions
+    "Why is the sentiment so negative?",
+    "give me examples of leads",
+    "What do viewers say about the intro?",
+])
+def test_questions_needing_comments(message):
+    assert classify(message) is None
+
+
+def test_long_questions_skip_the_fast_path():
+    assert classify("how many leads " + "please " * 20) is None
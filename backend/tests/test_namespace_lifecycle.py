@@ -0,0 +1,94 @@
+import uuid
+
+import pytest
+
+from app.services import namespace_lifecycle as lifecycle_module
+from app.services.bulk_manager import bulk_manager
+from app.services.job_manager import job_manager
+from app.services.namespace_lifecycle import NamespaceLifecycle, orphan_grace_seconds
+
+
+def analysis_id():
+    return str(uuid.uuid4())
+
+
+def row(id, url="https://youtu.be/a", tenant="tenant", created_at="2026-10-01T00:00:00+00:00", updated_at=None):
+    return {"id": id, "url": url, "tenant_id": tenant, "created_at": created_at, "updated_at": updated_at}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lifecycle_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture(autouse=True)
+def no_running_jobs(monkeypatch):
+    monkeypatch.setattr(job_manager, "jobs", {})
+    monkeypatch.setattr(bulk_manager, "jobs", {})
+
+
+def test_orphans_are_collected_only_after_the_grace_period(clock):
+    lifecycle = NamespaceLifecycle()
+    orphan = analysis_id()
+    counts = {orphan: 10, "benchmark-fixtures": 5}
+
+    assert lifecycle._candidates(counts, {}) == {}
+    clock[0] += orphan_grace_seconds() - 1
+    assert lifecycle._candidates(counts, {}) == {}
+    clock[0] += 1
+    assert lifecycle._candidates(counts, {}) == {orphan: "orphaned"}
+
+
+def test_grace_period_outlasts_the_longest_deadline(monkeypatch):
+    monkeypatch.setattr(lifecycle_module.settings, "vector_orphan_grace_minutes", 5)
+    monkeypatch.setattr(lifecycle_module.settings, "bulk_deadline_seconds", 7200)
+    assert orphan_grace_seconds() == 7200 + lifecycle_module.ORPHAN_GRACE_MARGIN_SECONDS
+
+    monkeypatch.setattr(lifecycle_module.settings, "vector_orphan_grace_minutes", 180)
+    assert orphan_grace_seconds() == 180 * 60
+
+
+def test_only_the_newest_analyses_per_video_and_tenant_are_kept(clock):
+    old, new, other_tenant = analysis_id(), analysis_id(), analysis_id()
+    rows = {
+        old: row(old, created_at="2026-09-01T00:00:00+00:00", updated_at="2026-09-20T00:00:00+00:00"),
+        new: row(new, created_at="2026-09-10T00:00:00+00:00"),
+        other_tenant: row(other_tenant, tenant="other", created_at="2026-08-01T00:00:00+00:00")
+    }
+    counts = {id: 1 for id in rows}
+    # The refresh on 09-20 makes the older analysis the most recently active
+    assert NamespaceLifecycle()._candidates(counts, rows) == {new: "superseded"}
+
+
+def test_analyses_not_refreshed_within_the_ttl_expire(clock, monkeypatch):
+    monkeypatch.setattr(lifecycle_module.settings, "vector_ttl_days", 30)
+    stale, fresh = analysis_id(), analysis_id()
+    rows = {
+        stale: row(stale, url="https://youtu.be/stale", created_at="2020-01-01T00:00:00+00:00"),
+        fresh: row(fresh, url="https://youtu.be/fresh", created_at="2999-01-01T00:00:00+00:00")
+    }
+    assert NamespaceLifecycle()._candidates({stale: 1, fresh: 1}, rows) == {stale: "expired"}
+
+
+def test_namespaces_of_running_jobs_are_never_collected(clock, monkeypatch):
+    base, superseding, pending, bulk_video, finished = (analysis_id() for _ in range(5))
+    monkeypatch.setattr(job_manager, "jobs", {
+        "refresh": {"status": "PROCESSING", "base_analysis_id": base},
+        "new": {"status": "PROCESSING", "pending_analysis_id": pending},
+        "done": {"status": "FAILED", "pending_analysis_id": finished}
+    })
+    monkeypatch.setattr(bulk_manager, "jobs", {
+        "bulk": {"status": "PROCESSING", "videos": [{"analysis_id": bulk_video}, {"analysis_id": None}]}
+    })
+    rows = {
+        base: row(base, created_at="2026-09-01T00:00:00+00:00"),
+        superseding: row(superseding, created_at="2026-09-10T00:00:00+00:00")
+    }
+    counts = {base: 1, superseding: 1, pending: 1, bulk_video: 1, finished: 1}
+    lifecycle = NamespaceLifecycle()
+    lifecycle._candidates(counts, rows)
+    clock[0] += orphan_grace_seconds()
+
+    assert lifecycle._candidates(counts, rows) == {finished: "orphaned"}
@@ -0,0 +1,41 @@
+import gzip
+import json
+
+from app.routes.analyze import _accepts_gzip, _encoded_response
+from app.services.report_cache import EncodedBody
+
+
+def test_accept_encoding_quality_values():
+    assert _accepts_gzip("gzip")
+    assert _accepts_gzip("br, gzip;q=0.5")
+    assert _accepts_gzip("*")
+    assert not _accepts_gzip(None)
+    assert not _accepts_gzip("identity")
+    assert not _accepts_gzip("gzip;q=0")
+    assert not _accepts_gzip("gzip; q=0.0, br")
+    # An explicit gzip entry overrides the wildcard
+    assert not _accepts_gzip("*, gzip;q=0")
+    assert not _accepts_gzip("*;q=0")
+
+
+def test_each_encoding_has_its_own_etag():
+    encoded = EncodedBody({"sentimentScore": 70})
+
+    plain = _encoded_response(encoded, None, "identity")
+    zipped = _encoded_response(encoded, None, "gzip")
+    assert plain.headers["ETag"] == encoded.etag
+    assert zipped.headers["ETag"] == encoded.gzip_etag != encoded.etag
+    assert "content-encoding" not in plain.headers
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(zipped.body)) == json.loads(plain.body)
+
+
+def test_if_none_match_compares_the_served_encoding():
+    encoded = EncodedBody({"sentimentScore": 70})
+
+    assert _encoded_response(encoded, encoded.gzip_etag, "gzip").status_code == 304
+    assert _encoded_response(encoded, f"W/{encoded.etag}", None).status_code == 304
+    assert _encoded_response(encoded, f'"other", {encoded.etag}', None).status_code == 304
+    # A tag for the other encoding does not match
+    assert _encoded_response(encoded, encoded.etag, "gzip").status_code == 200
+    assert _encoded_response(encoded, encoded.gzip_etag, "gzip;q=0").status_code == 200
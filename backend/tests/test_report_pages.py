@@ -0,0 +1,56 @@
+import pytest
+
+from app.services.report_pages import (
+    MAX_PAGE_SIZE,
+    CursorError,
+    decode_cursor,
+    encode_cursor,
+    paginate,
+    parse_fields
+)
+
+ITEMS = [{"username": f"user{i}", "text": f"lead {i}", "sentiment": "positive"} for i in range(45)]
+
+
+def test_cursors_walk_every_item_once():
+    seen = []
+    cursor = None
+    while True:
+        page = paginate(ITEMS, cursor, 20, "v1")
+        assert page["total"] == 45
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ITEMS
+    assert len(paginate(ITEMS, encode_cursor(40, "v1"), 20, "v1")["items"]) == 5
+
+
+def test_page_size_is_clamped():
+    assert len(paginate(ITEMS, None, 0, "v1")["items"]) == 1
+    many = [{"n": i} for i in range(MAX_PAGE_SIZE + 10)]
+    assert len(paginate(many, None, 10_000, "v1")["items"]) == MAX_PAGE_SIZE
+
+
+def test_fields_project_each_item():
+    page = paginate(ITEMS, None, 2, "v1", fields=["username"])
+    assert page["items"] == [{"username": "user0"}, {"username": "user1"}]
+
+
+def test_cursors_from_another_version_or_garbage_are_rejected():
+    cursor = paginate(ITEMS, None, 20, "v1")["next_cursor"]
+    assert decode_cursor(cursor, "v1") == 20
+    with pytest.raises(CursorError, match="changed"):
+        paginate(ITEMS, cursor, 20, "v2")
+    with pytest.raises(CursorError, match="Invalid"):
+        decode_cursor("not a cursor", "v1")
+    with pytest.raises(CursorError):
+        decode_cursor(encode_cursor(-5, "v1"), "v1")
+
+
+def test_parse_fields():
+    assert parse_fields("leads", None) is None
+    assert parse_fields("leads", "") is None
+    assert parse_fields("leads", "username, text,") == ["username", "text"]
+    with pytest.raises(ValueError, match="influenceScore"):
+        parse_fields("leads", "username,influenceScore")
@@ -0,0 +1,191 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    Resilience,
+    is_retryable
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_resilience(max_attempts=3, failure_threshold=5):
+    resilience = Resilience()
+    resilience.max_attempts = max_attempts
+    resilience.base_delay = resilience.max_delay = 0
+    for breaker in resilience.breakers.values():
+        breaker.failure_threshold = failure_threshold
+    return resilience
+
+
+def failing_then(result, failures, error=ConnectionError):
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error("boom")
+        return result
+
+    return operation, calls
+
+
+def test_client_errors_are_not_retryable():
+    assert is_retryable(ConnectionError())
+    assert is_retryable(StatusError(503))
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(408))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(StatusError(404))
+    assert not is_retryable(CircuitOpenError("openai", 5))
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert 0 < error.value.retry_after <= 60
+
+    # After the reset period one trial call is let through
+    breaker.opened_at = time.monotonic() - 61
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_a_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=60)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 61
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_transient_failures_are_retried():
+    async def scenario():
+        resilience = make_resilience()
+        operation, calls = failing_then("ok", failures=2)
+        assert await resilience.call("openai", operation) == "ok"
+        assert len(calls) == 3
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_and_non_idempotent_calls_are_not_retried():
+    async def scenario():
+        resilience = make_resilience()
+        operation, calls = failing_then("ok", failures=1, error=lambda message: StatusError(400))
+        with pytest.raises(StatusError):
+            await resilience.call("openai", operation)
+        assert len(calls) == 1
+        # A client error is the caller's fault and does not count against the provider
+        assert resilience.breakers["openai"].failures == 0
+
+        operation, calls = failing_then("ok", failures=1)
+        with pytest.raises(ConnectionError):
+            await resilience.call("apify", operation, retry=False)
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    async def scenario():
+        resilience = make_resilience(max_attempts=10, failure_threshold=100)
+        resilience.start_budget(2)
+        operation, calls = failing_then("ok", failures=5)
+        with pytest.raises(ConnectionError):
+            await resilience.call("pinecone", operation)
+        assert len(calls) == 3
+
+        # Unbudgeted calls only stop at max_attempts
+        operation, calls = failing_then("ok", failures=5)
+        assert await resilience.call("pinecone", operation, budgeted=False) == "ok"
+        assert len(calls) == 6
+
+    asyncio.run(scenario())
+
+
+def test_an_open_circuit_fails_fast():
+    async def scenario():
+        resilience = make_resilience(max_attempts=1)
+        breaker = resilience.breakers["gemini"]
+        operation, calls = failing_then("ok", failures=breaker.failure_threshold)
+        for _ in range(breaker.failure_threshold):
+            with pytest.raises(ConnectionError):
+                await resilience.call("gemini", operation)
+        with pytest.raises(CircuitOpenError):
+            await resilience.call("gemini", operation)
+        assert len(calls) == breaker.failure_threshold
+
+    asyncio.run(scenario())
+
+
+def test_a_slow_read_is_hedged_and_the_faster_copy_wins():
+    async def scenario():
+        resilience = make_resilience()
+        resilience.start_budget(1)
+        delays = [1.0, 0.0]
+        started = []
+        cancelled = []
+
+        async def operation():
+            delay = delays[len(started)]
+            started.append(delay)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+            return delay
+
+        began = time.perf_counter()
+        assert await resilience.hedged("pinecone", operation) == 0.0
+        assert time.perf_counter() - began < 0.9
+        assert started == [1.0, 0.0]
+        # The slower copy is cancelled
+        await asyncio.sleep(0)
+        assert cancelled == [1.0]
+
+    asyncio.run(scenario())
+
+
+def test_hedging_needs_budget():
+    async def scenario():
+        resilience = make_resilience()
+        resilience.start_budget(0)
+        started = []
+
+        async def operation():
+            started.append(1)
+            await asyncio.sleep(0.3)
+            return "slow"
+
+        assert await resilience.hedged("pinecone", operation) == "slow"
+        assert len(started) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,167 @@
+import random
+
+import pytest
+
+from app.services.sampling import (
+    MIN_PER_STRATUM,
+    TAKE_ALL,
+    _allocate,
+    apply_estimates,
+    estimate_share,
+    sample_size,
+    stratified_sample
+)
+from app.services.topic_clusters import assemble_result, build_digest
+
+
+def make_comments(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"c{i}",
+            "author": f"author{i % 50}",
+            "voteCount": rng.choice([0, 0, 0, 3, 25, 400]),
+            "replyCount": rng.choice([0, 0, 1]),
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "comment": f"comment {i}"
+        }
+        for i in range(count)
+    ]
+
+
+def test_sample_size_matches_the_normal_approximation():
+    # z^2 * p(1-p) / e^2 = 1.96^2 * 0.25 / 0.02^2 ~ 2401 for a huge population
+    assert sample_size(10_000_000, 0.02, 0.95) in range(2395, 2405)
+    # The finite population correction shrinks it for smaller populations
+    assert sample_size(5000, 0.02, 0.95) < 2401
+    assert sample_size(10, 0.02, 0.95) == 10
+    assert sample_size(0, 0.02, 0.95) == 0
+
+
+def test_allocate_is_proportional_and_sums_to_the_total():
+    sizes = {"a": 600, "b": 300, "c": 100}
+    allocation = _allocate(sizes, 100)
+    assert allocation == {"a": 60, "b": 30, "c": 10}
+
+    sizes = {"a": 5000, "b": 3333, "c": 1667}
+    allocation = _allocate(sizes, 101)
+    assert sum(allocation.values()) == 101
+    for stratum, size in sizes.items():
+        assert abs(allocation[stratum] - 101 * size / 10000) < 1
+
+
+def test_allocate_keeps_a_minimum_per_stratum_and_never_exceeds_its_size():
+    sizes = {"big": 10_000, "tiny": 3, "single": 1}
+    allocation = _allocate(sizes, 50)
+    assert sum(allocation.values()) == 50
+    assert allocation["tiny"] == MIN_PER_STRATUM
+    assert allocation["single"] == 1
+
+    # Asking for more than the population takes every comment
+    assert _allocate({"a": 4, "b": 2}, 10) == {"a": 4, "b": 2}
+
+
+def test_estimate_share_is_exact_when_every_stratum_is_fully_sampled():
+    design = {
+        "population": 10,
+        "strata": ["a"] * 6 + ["b"] * 4,
+        "stratum_sizes": {"a": 6, "b": 4},
+        "confidence": 0.95
+    }
+    flags = [True, True, True, False, False, False] + [True, False, False, False]
+    assert estimate_share(flags, design) == {"estimate": 40.0, "lower": 40.0, "upper": 40.0}
+
+
+def test_estimate_share_weights_strata_by_population():
+    # Stratum a is 90% of the population but only half of the sample
+    design = {
+        "population": 1000,
+        "strata": ["a"] * 10 + ["b"] * 10,
+        "stratum_sizes": {"a": 900, "b": 100},
+        "confidence": 0.95
+    }
+    flags = [True] * 10 + [False] * 10
+    interval = estimate_share(flags, design)
+    assert interval["estimate"] == 90.0
+    # Each stratum is unanimous, so the within-stratum variance is zero
+    assert interval["lower"] == interval["upper"] == 90.0
+
+    flags = [True] * 5 + [False] * 5 + [False] * 10
+    interval = estimate_share(flags, design)
+    assert interval["estimate"] == 45.0
+    assert interval["lower"] < 45.0 < interval["upper"]
+
+
+def test_estimate_share_intervals_cover_the_population_share():
+    comments = make_comments(20_000)
+    rng = random.Random(1)
+    # Independent of the strata, like a comment's sentiment
+    truth = {comment["id"]: rng.random() < 0.3 for comment in comments}
+    expected = 100 * sum(truth.values()) / len(truth)
+
+    covered = 0
+    for seed in range(20):
+        sample, design = stratified_sample(comments, f"video-{seed}")
+        interval = estimate_share([truth[comment["id"]] for comment in sample], design)
+        # Sized for ±2 points (SAMPLING_MARGIN_OF_ERROR), plus rounding
+        assert interval["upper"] - interval["lower"] <= 4.2
+        covered += interval["lower"] <= expected <= interval["upper"]
+    # A 95% interval should rarely miss
+    assert covered >= 17
+
+
+def test_stratified_sample_design():
+    comments = make_comments(20_000)
+    sample, design = stratified_sample(comments, "video")
+    assert design["population"] == len(comments)
+    assert len(sample) == len(design["strata"]) == len(design["weights"])
+    assert len({comment["id"] for comment in sample}) == len(sample)
+    assert design["strata"].count(TAKE_ALL) == 200
+    # Weights add back up to the population
+    assert sum(design["weights"]) == pytest.approx(len(comments))
+
+    # The same seed draws the same sample
+    again, _ = stratified_sample(comments, "video")
+    assert [comment["id"] for comment in again] == [comment["id"] for comment in sample]
+
+
+def test_small_videos_are_not_sampled():
+    # Fewer than SAMPLING_TAKE_ALL comments plus a sample of the rest
+    comments = make_comments(150)
+    sample, design = stratified_sample(comments, "video")
+    assert sample is comments
+    assert design is None
+
+
+def test_digest_shares_are_weighted_by_the_sample_design():
+    comments = make_comments(20_000)
+    sample, design = stratified_sample(comments, "video")
+    take_all = [stratum == TAKE_ALL for stratum in design["strata"]]
+    # The most-engaged comments sit in their own cluster and are all negative leads
+    embeddings = [[1.0, 0.0] if flag else [0.0, 1.0] for flag in take_all]
+    clusters = build_digest(sample, embeddings, max_clusters=2, exemplars=1, weights=design["weights"])
+    labelling = {"clusters": [
+        {
+            "cluster": number,
+            **({"negative": 100, "lead_share": 100} if take_all[cluster["members"][0]] else {"positive": 100, "lead_share": 0})
+        }
+        for number, cluster in enumerate(clusters, 1)
+    ]}
+
+    analysis = assemble_result(sample, clusters, labelling, {})
+    # 200 of 20,000 comments, not 200 of the ~2,600 sampled
+    assert analysis["sentiment_breakdown"] == {"positive": 99, "neutral": 0, "negative": 1}
+    assert analysis["lead_percentage"] == 1
+
+
+def test_gemini_estimates_are_reported_without_bounds():
+    _, design = stratified_sample(make_comments(20_000), "video")
+    analysis = {
+        "sentiment_score": 60,
+        "sentiment_breakdown": {"positive": 50, "neutral": 20, "negative": 30},
+        "lead_percentage": 4
+    }
+    summary = apply_estimates(analysis, design)["sampling"]
+    assert summary["method"] == "unquantified"
+    assert summary["sentiment_breakdown"]["positive"] == {"estimate": 50.0}
+    assert summary["lead_percentage"] == {"estimate": 4.0}
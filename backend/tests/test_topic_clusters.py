@@ -0,0 +1,54 @@
+import numpy as np
+
+from app.services.topic_clusters import cluster_count, kmeans
+
+
+def blobs(seed=0, per_cluster=200, dimensions=16):
+    """Three tight groups of vectors around orthogonal directions."""
+    rng = np.random.default_rng(seed)
+    directions = np.eye(dimensions)[:3]
+    vectors = np.concatenate([
+        direction + 0.05 * rng.standard_normal((per_cluster, dimensions))
+        for direction in directions
+    ])
+    truth = np.repeat(np.arange(3), per_cluster)
+    return vectors, truth
+
+
+def test_kmeans_recovers_well_separated_clusters():
+    vectors, truth = blobs()
+    centers, labels = kmeans(vectors, 3)
+    assert centers.shape == (3, vectors.shape[1])
+    np.testing.assert_allclose(np.linalg.norm(centers, axis=1), 1.0, rtol=1e-5)
+    # Every true group maps to exactly one cluster
+    for group in range(3):
+        assert len(set(labels[truth == group])) == 1
+    assert len(set(labels)) == 3
+
+
+def test_kmeans_is_deterministic_for_a_seed():
+    vectors, _ = blobs()
+    first_centers, first_labels = kmeans(vectors, 3, seed=7)
+    second_centers, second_labels = kmeans(vectors, 3, seed=7)
+    np.testing.assert_array_equal(first_labels, second_labels)
+    np.testing.assert_array_equal(first_centers, second_centers)
+
+
+def test_kmeans_caps_k_at_the_number_of_vectors():
+    vectors = np.array([[1.0, 0.0], [0.0, 1.0]])
+    centers, labels = kmeans(vectors, 5)
+    assert len(centers) == 2
+    assert sorted(labels) == [0, 1]
+
+
+def test_kmeans_handles_zero_vectors():
+    vectors = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    centers, labels = kmeans(vectors, 2)
+    assert np.isfinite(centers).all()
+    assert len(labels) == 3
+
+
+def test_cluster_count_is_bounded():
+    assert cluster_count(2, 12) == 2
+    assert cluster_count(200, 12) == 10
+    assert cluster_count(100_000, 12) == 12
@@ -0,0 +1,73 @@
+"""
+Train the local sentiment & lead classifier shipped with the service.
+
+Reads a labelled, representative sample of comments (JSON lines with
+"text", "sentiment" = positive/neutral/negative and "lead" = true/false),
+embeds it with the service's embedding model, trains both heads, fits
+their temperatures and the lead threshold on a held-out share, and writes
+the weights file loaded from CLASSIFIER_WEIGHTS_PATH.
+
+The sample should be drawn at random from analyzed videos, not picked for
+clear-cut cases, so the learned class priors and the lead threshold match
+production. Needs OPENAI_API_KEY.
+
+Usage (from backend/):
+    python -m tools.train_classifier labelled_comments.jsonl
+    python -m tools.train_classifier labelled_comments.jsonl --out models/comment_classifier.npz
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+
+def read_samples(path: str):
+    texts, sentiments, leads = [], [], []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sample = json.loads(line)
+            texts.append(sample["text"])
+            sentiments.append(sample["sentiment"])
+            leads.append(bool(sample["lead"]))
+    return texts, sentiments, leads
+
+
+async def main(args) -> int:
+    from app.config import settings
+    from app.services.comment_classifier import SENTIMENTS, save_weights, train
+    from app.services.embeddings_service import embeddings_service
+
+    texts, sentiments, leads = read_samples(args.samples)
+    invalid = sorted({label for label in sentiments if label not in SENTIMENTS})
+    if invalid:
+        print(f"Unknown sentiment labels: {', '.join(invalid)}", file=sys.stderr)
+        return 1
+
+    embeddings = await embeddings_service.get_embeddings(texts)
+    arrays = train(embeddings, sentiments, leads, embeddings_service.model, seed=args.seed)
+    out = args.out or settings.classifier_weights_path
+    save_weights(out, arrays)
+
+    print(f"Trained on {len(texts)} comments ({sum(leads)} leads); wrote {out}")
+    print(f"Held out {int(arrays['metric_calibration_samples'])} comments:")
+    print(f"  sentiment accuracy  {float(arrays['metric_sentiment_accuracy']):.3f}")
+    print(f"  lead threshold      {float(arrays['lead_threshold']):.3f}")
+    print(f"  lead precision      {float(arrays['metric_lead_precision']):.3f}")
+    print(f"  lead recall         {float(arrays['metric_lead_recall']):.3f}")
+    print(f"  temperatures        sentiment {float(arrays['sentiment_temperature']):.3f}, "
+          f"lead {float(arrays['lead_temperature']):.3f}")
+    return 0
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Train the local comment classifier")
+    parser.add_argument("samples", help="JSON lines of labelled comments")
+    parser.add_argument("--out", help="Weights file (default: CLASSIFIER_WEIGHTS_PATH)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the train / calibration split")
+    return asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,11 @@
+/*
+  # Allow Cancelled Analysis Jobs
+
+  1. Changes
+    - Allow `CANCELLED` in the `analysis_jobs.status` check constraint
+      (jobs cancelled via DELETE /api/jobs/{job_id} or by the job deadline)
+*/
+
+ALTER TABLE analysis_jobs DROP CONSTRAINT IF EXISTS analysis_jobs_status_check;
+ALTER TABLE analysis_jobs ADD CONSTRAINT analysis_jobs_status_check
+  CHECK (status IN ('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', 'CANCELLED'));
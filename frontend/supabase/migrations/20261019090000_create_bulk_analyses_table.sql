@@ -0,0 +1,35 @@
+/*
+  # Add Bulk Analyses Table
+
+  1. New Tables
+    - `bulk_analyses`
+      - One row per completed bulk (channel / playlist / URL list) analysis
+      - `videos` lists each video's URL, status and analysis_id
+      - `rollup` stores the comment-weighted cross-video summary
+
+  2. Security
+    - Enable RLS
+    - Allow public read/write for demo (adjust in production)
+*/
+
+CREATE TABLE IF NOT EXISTS bulk_analyses (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  source text NOT NULL,
+  status text NOT NULL CHECK (status IN ('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', 'CANCELLED')),
+  videos jsonb NOT NULL,
+  rollup jsonb,
+  created_at timestamptz DEFAULT now(),
+  completed_at timestamptz
+);
+
+ALTER TABLE bulk_analyses ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone can read bulk analyses"
+  ON bulk_analyses FOR SELECT
+  TO anon
+  USING (true);
+
+CREATE POLICY "Anyone can insert bulk analyses"
+  ON bulk_analyses FOR INSERT
+  TO anon
+  WITH CHECK (true);
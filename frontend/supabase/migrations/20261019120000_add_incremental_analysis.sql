@@ -0,0 +1,56 @@
+/*
+  # Incremental Re-analysis
+
+  1. New Tables
+    - `analysis_comment_manifests`
+      - One row per analysis, mapping each comment `cid` to a fingerprint of
+        its text, so a re-scrape can be diffed against what was analyzed
+
+  2. Changes
+    - `analysis_history.updated_at` records the last incremental refresh
+    - Index on `analysis_history(url, created_at)` to find the latest
+      analysis of a video
+    - Allow updates to `analysis_history` and `analysis_details`, which an
+      incremental refresh rewrites in place
+
+  3. Security
+    - Enable RLS
+    - Allow public read/write for demo (adjust in production)
+*/
+
+CREATE TABLE IF NOT EXISTS analysis_comment_manifests (
+  analysis_history_id uuid PRIMARY KEY REFERENCES analysis_history(id) ON DELETE CASCADE,
+  comments jsonb NOT NULL,
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE analysis_comment_manifests ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone can read comment manifests"
+  ON analysis_comment_manifests FOR SELECT
+  TO anon
+  USING (true);
+
+CREATE POLICY "Anyone can insert comment manifests"
+  ON analysis_comment_manifests FOR INSERT
+  TO anon
+  WITH CHECK (true);
+
+CREATE POLICY "Anyone can update comment manifests"
+  ON analysis_comment_manifests FOR UPDATE
+  TO anon
+  USING (true);
+
+ALTER TABLE analysis_history ADD COLUMN IF NOT EXISTS updated_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS idx_analysis_history_url_created ON analysis_history(url, created_at DESC);
+
+CREATE POLICY "Anyone can update analysis history"
+  ON analysis_history FOR UPDATE
+  TO anon
+  USING (true);
+
+CREATE POLICY "Anyone can update analysis details"
+  ON analysis_details FOR UPDATE
+  TO anon
+  USING (true);
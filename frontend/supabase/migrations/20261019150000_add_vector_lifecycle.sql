@@ -0,0 +1,19 @@
+/*
+  # Vector Namespace Lifecycle
+
+  1. Changes
+    - `analysis_history.tenant_id` records the tenant (X-User-Id or client
+      IP) that ran the analysis, for per-tenant index size reports
+    - `analysis_history.vectors_expired_at` is set when the analysis's
+      Pinecone namespace is garbage-collected (superseded or expired); the
+      report remains, but chat and incremental refresh no longer apply
+    - Index on `analysis_history(tenant_id, url)` to group analyses per video
+
+  2. Security
+    - Existing RLS policies cover the new columns
+*/
+
+ALTER TABLE analysis_history ADD COLUMN IF NOT EXISTS tenant_id text;
+ALTER TABLE analysis_history ADD COLUMN IF NOT EXISTS vectors_expired_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS idx_analysis_history_tenant_url ON analysis_history(tenant_id, url);
@@ -0,0 +1,15 @@
+/*
+  # Sampled Analyses
+
+  1. Changes
+    - `analysis_details.sampling` holds the sampling summary of analyses run
+      on a stratified sample of a very large video: population and sample
+      size, confidence level, target margin of error, and the sentiment
+      and lead percentages with their confidence intervals. It is null for
+      analyses of every scraped comment
+
+  2. Security
+    - Existing RLS policies cover the new column
+*/
+
+ALTER TABLE analysis_details ADD COLUMN IF NOT EXISTS sampling jsonb;
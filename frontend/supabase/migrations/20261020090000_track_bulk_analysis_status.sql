@@ -0,0 +1,24 @@
+/*
+  # Track Bulk Analyses From Submission
+
+  1. Changes
+    - `bulk_analyses` rows are now inserted as PENDING when a bulk job is
+      accepted and updated as it starts, fails, is cancelled or completes
+    - New `error` column records why a bulk job failed or was cancelled
+
+  2. Security
+    - Allow public updates, and deletes of rows rejected by admission
+      control, for demo (adjust in production)
+*/
+
+ALTER TABLE bulk_analyses ADD COLUMN IF NOT EXISTS error text;
+
+CREATE POLICY "Anyone can update bulk analyses"
+  ON bulk_analyses FOR UPDATE
+  TO anon
+  USING (true);
+
+CREATE POLICY "Anyone can delete bulk analyses"
+  ON bulk_analyses FOR DELETE
+  TO anon
+  USING (true);